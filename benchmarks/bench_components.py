@@ -0,0 +1,100 @@
+"""Micro-benchmarks of the components' per time step work."""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from vivarium.framework.population import SimulantData
+from vivarium_public_health.risks.data_transformations import pivot_categorical
+from vivarium_public_health.utilities import EntityString, TargetString
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.components import (MagicWandSupplementationInterventionStepWise, SIS,
+                                                      SupplementedDaysObserver)
+from vivarium_conic_vitamin_a_supp.components.data_transformations import (
+    generate_relative_risk_from_distribution,
+    get_population_attributable_fraction_data,
+)
+from vivarium_conic_vitamin_a_supp.components.distributions import DichotomousDistribution
+
+from conftest import START_TIME, STEP_SIZE, MockBuilder
+
+COVERAGE_GAP = EntityString('coverage_gap.lack_of_vitamin_a_supplementation')
+VITAMIN_A_DEFICIENCY_EXPOSURE = TargetString('risk_factor.vitamin_a_deficiency.exposure_parameters')
+# The model specification's configuration of the benchmarked components.
+CONFIGURATION = {
+    'population': {'age_start': 0, 'age_end': 5, 'exit_age': 5},
+    'input_data': {'input_draw_number': 0},
+    'randomness': {'random_seed': 0},
+    'lack_of_vitamin_a_supplementation': {'exposure': 0.45, 'distribution': 'dichotomous',
+                                          'rebinned_exposed': [], 'category_thresholds': []},
+    'vitamin_a_supplementation': {'target_coverage': 0.55, 'intervention_start_year': 2017,
+                                  'intervention_end_year': 2017,
+                                  'affected_value': 'lack_of_vitamin_a_supplementation.exposure_parameters'},
+    'effect_of_lack_of_vitamin_a_supplementation_on_vitamin_a_deficiency': {
+        'exposure_parameters': {'relative_risk': None, 'mean': None, 'se': None,
+                                'log_mean': 0.391875175, 'log_se': 0.174420595, 'tau_squared': 0.072460874},
+    },
+    'metrics': {'supplemented_days': {'by_age': True, 'by_sex': True, 'by_year': True,
+                                      'long_format': {'output_directory': '', 'scenario': 'baseline'}}},
+}
+
+
+@pytest.fixture
+def distribution(make_builder):
+    builder = make_builder(CONFIGURATION)
+    exposure = pivot_categorical(builder.data.load(
+        project_globals.LACK_OF_VITAMIN_A_SUPPLEMENTATION.LACK_OF_VITAMIN_A_SUPPLEMENTATION_EXPOSURE
+    ))
+    return builder.setup_component(DichotomousDistribution(COVERAGE_GAP, exposure))
+
+
+def test_dichotomous_distribution_exposure(benchmark, distribution, population):
+    benchmark(distribution.exposure, population.index)
+
+
+def test_dichotomous_distribution_ppf(benchmark, distribution, population):
+    propensity = pd.Series(np.random.default_rng(0).random(len(population)), index=population.index)
+    benchmark(distribution.ppf, propensity)
+
+
+def test_intervention_adjust_exposure(benchmark, make_builder, population):
+    builder = make_builder(CONFIGURATION)
+    intervention = builder.setup_component(MagicWandSupplementationInterventionStepWise())
+    exposure = pd.Series(0.45, index=population.index)
+    benchmark(intervention.intervention_effect, population.index, exposure)
+
+
+def test_supplemented_days_observer(benchmark, make_builder, population, monkeypatch):
+    # vivarium_public_health bins ages with np.asscalar, which numpy 1.23 removed.
+    monkeypatch.setattr(np, 'asscalar', lambda a: a.item(), raising=False)
+    builder = make_builder(CONFIGURATION)
+    exposure = pd.Series(np.where(np.random.default_rng(0).random(len(population)) < 0.45, 'cat1', 'cat2'),
+                         index=population.index)
+    builder.value.register_value_producer('lack_of_vitamin_a_supplementation.exposure',
+                                          source=lambda index: exposure.loc[index])
+    observer = builder.setup_component(SupplementedDaysObserver())
+    event = SimpleNamespace(index=population.index, time=START_TIME, step_size=STEP_SIZE)
+    benchmark(observer.on_collect_metrics, event)
+
+
+def test_disease_model_initialize_simulants(benchmark, make_builder, population):
+    builder = make_builder(CONFIGURATION)
+    model = builder.setup_component(SIS(project_globals.DIARRHEA_MODEL_NAME))
+    pop_data = SimulantData(population.index, {'sim_state': 'setup'}, START_TIME, STEP_SIZE)
+    benchmark(model.on_initialize_simulants, pop_data)
+
+
+def test_generate_relative_risk_from_distribution(benchmark, population):
+    effect = CONFIGURATION['effect_of_lack_of_vitamin_a_supplementation_on_vitamin_a_deficiency']
+    parameters = {parameter: pd.Series(effect['exposure_parameters'][parameter], index=population.index)
+                  for parameter in ['log_mean', 'log_se', 'tau_squared']}
+    benchmark(generate_relative_risk_from_distribution, np.random.RandomState(0), parameters)
+
+
+def test_population_attributable_fraction_data(benchmark, synthetic_data):
+    # Computed from demographic tables once per simulation, so it doesn't scale with the population.
+    builder = MockBuilder(pd.DataFrame(), CONFIGURATION, synthetic_data)
+    randomness = builder.get_stream('effect_of_lack_of_vitamin_a_supplementation_on_vitamin_a_deficiency')
+    benchmark(get_population_attributable_fraction_data, builder, COVERAGE_GAP, VITAMIN_A_DEFICIENCY_EXPOSURE,
+              randomness)
@@ -0,0 +1,198 @@
+"""Fixtures for the component micro-benchmarks.
+
+Components are set up against :class:`MockBuilder`, a builder that serves
+synthetic artifact data (see :mod:`vivarium_conic_vitamin_a_supp.data.synthetic`)
+and a synthetic population held in memory, with vivarium's own lookup
+tables and value post-processors.  Only the builder plumbing is mocked, so
+the benchmarks time the same code paths a simulation runs.
+
+"""
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+import pytest
+from vivarium.config_tree import ConfigTree
+from vivarium.framework.artifact.manager import filter_data
+from vivarium.framework.lookup import InterpolatedTable
+from vivarium.framework.randomness import IndexMap, RandomnessStream
+from vivarium.framework.values import replace_combiner
+
+from vivarium_conic_vitamin_a_supp.data.synthetic import GBD_AGE_BINS, SyntheticArtifactSpec, make_synthetic_data
+
+POPULATION_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+START_TIME = pd.Timestamp('2017-01-01')
+STEP_SIZE = pd.Timedelta(days=1)
+# The age groups of the modeled ages, zero to five.
+SYNTHETIC_SPEC = SyntheticArtifactSpec(draws=1, years=(2016, 2017), age_bins=GBD_AGE_BINS.iloc[:5])
+
+
+def pytest_addoption(parser):
+    parser.addoption('--max-population-size', type=int, default=max(POPULATION_SIZES),
+                     help='Skip benchmarks at population sizes larger than this.')
+
+
+def pytest_generate_tests(metafunc):
+    if 'population_size' in metafunc.fixturenames:
+        max_size = metafunc.config.getoption('--max-population-size')
+        sizes = [size for size in POPULATION_SIZES if size <= max_size]
+        metafunc.parametrize('population_size', sizes, ids=[f'{size:.0e}' for size in sizes], scope='module')
+
+
+class MockPopulationView:
+
+    def __init__(self, population: pd.DataFrame, columns: List[str] = None):
+        self.population = population
+        self.columns = columns
+
+    def subview(self, columns: List[str]) -> 'MockPopulationView':
+        return MockPopulationView(self.population, columns)
+
+    def get(self, index: pd.Index) -> pd.DataFrame:
+        columns = [c for c in self.columns or self.population.columns if c in self.population]
+        # Lookup tables drop the tracked column the simulation's population views always include.
+        return self.population.loc[index, columns + ['tracked'] if 'tracked' not in columns else columns]
+
+    def update(self, data):
+        if isinstance(data, pd.Series):
+            data = data.to_frame()
+        for column, values in data.items():
+            self.population.loc[values.index, column] = values
+
+
+class MockPipeline:
+
+    def __init__(self, source: Callable, combiner: Callable = replace_combiner, post_processor: Callable = None):
+        self.source = source
+        self.combiner = combiner
+        self.post_processor = post_processor
+        self.mutators = []
+
+    def __call__(self, index: pd.Index, *args):
+        value = self.source(index, *args)
+        for mutator in self.mutators:
+            value = self.combiner(value, mutator, index)
+        return self.post_processor(value, STEP_SIZE) if self.post_processor else value
+
+
+class MockValues:
+
+    def __init__(self):
+        self.pipelines: Dict[str, MockPipeline] = {}
+
+    def register_value_producer(self, name, source, requires_columns=(), requires_values=(), requires_streams=(),
+                                preferred_combiner=replace_combiner, preferred_post_processor=None):
+        self.pipelines[name] = MockPipeline(source, preferred_combiner, preferred_post_processor)
+        return self.pipelines[name]
+
+    register_rate_producer = register_value_producer
+
+    def register_value_modifier(self, name, modifier, requires_columns=(), requires_values=(),
+                                requires_streams=()):
+        self.pipelines.setdefault(name, MockPipeline(lambda index, value=None: value)).mutators.append(modifier)
+
+    def get_value(self, name):
+        return self.pipelines[name]
+
+
+class MockLookup:
+
+    def __init__(self, population: pd.DataFrame, clock: Callable):
+        self.population = population
+        self.clock = clock
+
+    def build_table(self, data, key_columns=('sex',), parameter_columns=('age', 'year'), value_columns=None):
+        if not isinstance(data, pd.DataFrame):
+            return lambda index: pd.Series(data, index=index)
+        parameter_edges = {f'{p}_{edge}' for p in parameter_columns for edge in ['start', 'end']}
+        value_columns = [c for c in data if c not in set(key_columns) | parameter_edges]
+        view = MockPopulationView(self.population, [c for c in list(key_columns) + list(parameter_columns)
+                                                    if c != 'year'])
+        table = InterpolatedTable(data, view, list(key_columns), list(parameter_columns), value_columns,
+                                  interpolation_order=0, clock=self.clock, extrapolate=True, validate=False)
+
+        def lookup(index):
+            values = table(index)
+            return values[value_columns[0]] if len(value_columns) == 1 else values
+        return lookup
+
+
+class MockData:
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+
+    def load(self, key: str, **column_filters):
+        # Mirrors the artifact manager with input draw 0.
+        value = self.data[key]
+        if not isinstance(value, pd.DataFrame):
+            return value
+        value = value.drop(columns=[c for c in value if c.startswith('draw_') and c != 'draw_0'])
+        value = value.reset_index().rename(columns={'draw_0': 'value'})
+        return filter_data(value, None, **column_filters)
+
+
+class MockBuilder:
+    """The parts of the simulation builder the benchmarked components use."""
+
+    def __init__(self, population: pd.DataFrame, configuration: Dict, data: Dict[str, Any]):
+        self._time = START_TIME
+        self.configuration = ConfigTree(configuration, layers=['base', 'override'])
+        self.data = MockData(data)
+        self.lookup = MockLookup(population, self.clock())
+        self.value = MockValues()
+        self.population = self
+        self.population_table = population
+        self.time = self
+        self.randomness = self
+        self.event = self
+        self.listeners: Dict[str, List[Callable]] = {}
+
+    def clock(self):
+        return lambda: self._time
+
+    def step_size(self):
+        return lambda: STEP_SIZE
+
+    def get_stream(self, name, for_initialization=False):
+        return RandomnessStream(name, self.clock(), seed=0, index_map=IndexMap())
+
+    def get_view(self, columns, query=''):
+        return MockPopulationView(self.population_table, list(columns))
+
+    def register_listener(self, event_name, listener, priority=5):
+        self.listeners.setdefault(event_name, []).append(listener)
+
+    def initializes_simulants(self, initializer, creates_columns=(), requires_columns=(), requires_values=(),
+                              requires_streams=()):
+        pass
+
+    def setup_component(self, component):
+        """Sets up a component and its sub-components, as the component manager does."""
+        component.setup(self)
+        for sub_component in getattr(component, 'sub_components', []):
+            self.setup_component(sub_component)
+        return component
+
+
+@pytest.fixture(scope='session')
+def synthetic_data():
+    return make_synthetic_data('Kenya', SYNTHETIC_SPEC)
+
+
+@pytest.fixture(scope='module')
+def population(population_size):
+    random = np.random.default_rng(0)
+    return pd.DataFrame({
+        'age': random.uniform(0, 5, population_size),
+        'sex': pd.Categorical(random.choice(['Male', 'Female'], population_size)),
+        'alive': 'alive',
+        'tracked': True,
+    })
+
+
+@pytest.fixture
+def make_builder(population, synthetic_data):
+    def _make(configuration: Dict = None) -> MockBuilder:
+        return MockBuilder(population, configuration or {}, synthetic_data)
+    return _make
@@ -26,6 +26,7 @@ if __name__ == "__main__":
         'loguru',
         'numpy',
         'pandas',
+        'pyarrow',
         'scipy',
         'tables',
         'pyyaml',
@@ -35,6 +36,7 @@ if __name__ == "__main__":
     extras_require = [
         'vivarium_cluster_tools==1.2.9',
         'vivarium_inputs[data]==4.0.4',
+        'pytest-benchmark',
     ]
 
     setup(
@@ -64,5 +66,12 @@ if __name__ == "__main__":
             [console_scripts]
             make_specs=vivarium_conic_vitamin_a_supp.tools.cli:make_specs
             make_artifacts=vivarium_conic_vitamin_a_supp.tools.cli:make_artifacts
+            convert_artifacts=vivarium_conic_vitamin_a_supp.tools.cli:convert_artifacts
+            make_synthetic_artifacts=vivarium_conic_vitamin_a_supp.tools.cli:make_synthetic_artifacts
+            profile_artifacts=vivarium_conic_vitamin_a_supp.tools.cli:profile_artifacts
+            run_adaptive=vivarium_conic_vitamin_a_supp.tools.cli:run_adaptive
+            process_results=vivarium_conic_vitamin_a_supp.tools.cli:process_results
+            validate_results=vivarium_conic_vitamin_a_supp.tools.cli:validate_results
+            benchmark_scaling=vivarium_conic_vitamin_a_supp.tools.cli:benchmark_scaling
         '''
     )
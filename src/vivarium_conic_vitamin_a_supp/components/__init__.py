@@ -1,5 +1,7 @@
 from .vitamin_a_supplementation import MagicWandSupplementationInterventionStepWise
-from .observer import SupplementedDaysObserver
+from .observer import DisabilityObserver, DiseaseObserver, SupplementedDaysObserver
+from .population import Mortality
 from .disease import SIR_fixed_duration, SIS, NeonatalSIS
 from .effect import RiskEffect
 from .base_risk import Risk
+from .timing import ComponentTimer
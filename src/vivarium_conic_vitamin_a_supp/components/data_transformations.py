@@ -12,7 +12,7 @@ from typing import Union
 import numpy as np
 import pandas as pd
 
-from vivarium.framework.randomness import RandomnessStream
+from vivarium.framework.randomness import RandomnessStream, get_hash
 from vivarium_public_health.utilities import EntityString, TargetString
 from vivarium_public_health.risks.data_transformations import (
     validate_relative_risk_data_source,
@@ -58,7 +58,7 @@ def load_relative_risk_data(builder, risk: EntityString, target: TargetString,
 
     else:  # distribution
         parameters = {k: v for k, v in relative_risk_source.to_dict().items()  if v is not None}
-        random_state = np.random.RandomState(randomness.get_seed())
+        random_state = np.random.RandomState(get_hash(f'{randomness.key}_{randomness.seed}'))
         cat1_value = generate_relative_risk_from_distribution(random_state, parameters)
         relative_risk_data = _make_relative_risk_data(builder, cat1_value)
 
@@ -80,7 +80,7 @@ def generate_relative_risk_from_distribution(random_state: np.random.RandomState
         rr_value = random_state.normal(parameters['mean'], parameters['se'])
     elif 'log_mean' in parameters:  # log distribution
         log_value = parameters['log_mean'] + parameters['log_se']*random_state.randn()
-        if parameters['tau_squared']:
+        if np.any(parameters['tau_squared']):
             log_value += random_state.normal(0, parameters['tau_squared'])
         rr_value = np.exp(log_value)
     else:
@@ -2,12 +2,24 @@ import pandas as pd
 from vivarium_public_health.disease import (DiseaseModel as DiseaseModel_, SusceptibleState,
                                             DiseaseState, RecoveredState)
 
+from vivarium_conic_vitamin_a_supp.utilities import chunk_index, get_chunk_size
+
 
 class DiseaseModel(DiseaseModel_):
 
+    def setup(self, builder):
+        super().setup(builder)
+        self.chunk_size = get_chunk_size(builder.configuration)
+
     def on_initialize_simulants(self, pop_data):
-        population = self.population_view.subview(['age', 'sex']).get(pop_data.index)
-        state_names, weights_bins = self.get_state_weights(pop_data.index, "birth_prevalence")
+        # The state column may not exist yet, so it has to be written in one update.
+        condition_column = pd.concat([self.get_initial_status(chunk)
+                                      for chunk in chunk_index(pop_data.index, self.chunk_size)])
+        self.population_view.update(condition_column)
+
+    def get_initial_status(self, index):
+        population = self.population_view.subview(['age', 'sex']).get(index)
+        state_names, weights_bins = self.get_state_weights(index, "birth_prevalence")
 
         if state_names and not population.empty:
             # only do this if there are states in the model that supply prevalence data
@@ -17,9 +29,18 @@ class DiseaseModel(DiseaseModel_):
                                                                        self.randomness.get_draw(population.index))
 
             condition_column = condition_column.rename(columns={'condition_state': self.state_column})
+            condition_column = condition_column[self.state_column]
         else:
             condition_column = pd.Series(self.initial_state, index=population.index, name=self.state_column)
-        self.population_view.update(condition_column)
+        return condition_column
+
+    def on_time_step(self, event):
+        for chunk in chunk_index(event.index, self.chunk_size):
+            self.transition(chunk, event.time)
+
+    def on_time_step_cleanup(self, event):
+        for chunk in chunk_index(event.index, self.chunk_size):
+            self.cleanup(chunk, event.time)
 
 
 def SIS(cause: str) -> DiseaseModel:
@@ -45,6 +45,11 @@ class RiskEffect(RiskEffect_):
         }
     }
 
+    def setup(self, builder):
+        # Relative risks drawn from a distribution are seeded from this stream.
+        self.randomness = builder.randomness.get_stream(f'effect_of_{self.risk.name}_on_{self.target.name}')
+        super().setup(builder)
+
     def load_relative_risk_data(self, builder):
         return get_relative_risk_data(builder, self.risk, self.target, self.randomness)
 
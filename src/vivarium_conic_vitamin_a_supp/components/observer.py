@@ -1,18 +1,80 @@
 from collections import Counter
+from typing import Dict, Tuple
 
 import pandas as pd
 
-from vivarium_public_health.metrics.utilities import QueryString, get_output_template, get_age_bins, get_group_counts
+from vivarium_public_health.metrics import (DisabilityObserver as DisabilityObserver_,
+                                            DiseaseObserver as DiseaseObserver_)
+from vivarium_public_health.metrics.utilities import (QueryString, OutputTemplate, get_output_template, get_age_bins,
+                                                      get_group_counts, get_age_sex_filter_and_iterables)
+
+from vivarium_conic_vitamin_a_supp.results_processing import long_format
+from vivarium_conic_vitamin_a_supp.utilities import chunk_index, get_chunk_size
+
+
+class DisabilityObserver(DisabilityObserver_):
+    """Counts years lived with disability one chunk of simulants at a time.
+
+    The disability weight pipelines are only evaluated over one chunk of the
+    population at a time.  Counts are summed across chunks, so they only
+    depend on the chunk size through floating point rounding.
+
+    """
+
+    def setup(self, builder):
+        super().setup(builder)
+        self.chunk_size = get_chunk_size(builder.configuration)
+
+    def on_time_step_prepare(self, event):
+        for chunk in chunk_index(event.index, self.chunk_size):
+            super().on_time_step_prepare(event.split(chunk))
+
+
+class DiseaseObserver(DiseaseObserver_):
+    """Counts disease state person time and transitions one chunk of simulants at a time.
+
+    These are the ``{state}_person_time_*`` and ``{transition}_event_count_*``
+    outputs the disease rate checks in
+    :mod:`vivarium_conic_vitamin_a_supp.verification_and_validation.rates`
+    are computed from.  Counts are summed across chunks, so they don't
+    depend on the chunk size.
+
+    """
+
+    def setup(self, builder):
+        super().setup(builder)
+        self.chunk_size = get_chunk_size(builder.configuration)
+
+    def on_time_step_prepare(self, event):
+        for chunk in chunk_index(event.index, self.chunk_size):
+            super().on_time_step_prepare(event.split(chunk))
+
+    def on_collect_metrics(self, event):
+        for chunk in chunk_index(event.index, self.chunk_size):
+            super().on_collect_metrics(event.split(chunk))
 
 
 class SupplementedDaysObserver:
+    """Counts the days simulants spend supplemented with vitamin A.
+
+    By default the counts are reported as wide metrics.  If
+    ``long_format.output_directory`` is configured, they are instead written
+    at the end of the simulation as long format records to a dataset in that
+    directory (see :mod:`vivarium_conic_vitamin_a_supp.results_processing.long_format`),
+    partitioned by the configured scenario, the input draw and the random seed.
+
+    """
 
     configuration_defaults = {
         'metrics': {
             'supplemented_days': {
                 'by_age': False,
                 'by_year': False,
-                'by_sex': False
+                'by_sex': False,
+                'long_format': {
+                    'output_directory': '',
+                    'scenario': 'baseline',
+                },
             }
         }
     }
@@ -28,9 +90,15 @@ class SupplementedDaysObserver:
         self.config = builder.configuration.metrics.supplemented_days
         self.step_size = builder.time.step_size()
         self.age_bins = get_age_bins(builder)
+        self.chunk_size = get_chunk_size(builder.configuration)
 
         self.lack_of_vitamin_a_supplementation = builder.value.get_value("lack_of_vitamin_a_supplementation.exposure")
         self.supplemented_days = Counter()
+        # Maps metric keys to their (year, sex, age group) for long format output.
+        self.strata: Dict[str, Tuple] = {}
+        self.long_format_dir = self.config.long_format.output_directory
+        self.partition = (self.config.long_format.scenario, builder.configuration.input_data.input_draw_number,
+                          builder.configuration.randomness.random_seed)
 
         columns_required = ['tracked', 'alive']
         if self.config.by_age:
@@ -40,10 +108,24 @@ class SupplementedDaysObserver:
         self.population_view = builder.population.get_view(columns_required)
 
         builder.event.register_listener('collect_metrics', self.on_collect_metrics)
-        builder.value.register_value_modifier('metrics', self.metrics)
+        if self.long_format_dir:
+            builder.event.register_listener('simulation_end', self.on_simulation_end)
+        else:
+            builder.value.register_value_modifier('metrics', self.metrics)
 
     def on_collect_metrics(self, event):
-        pop = self.population_view.get(event.index)
+        for chunk in chunk_index(event.index, self.chunk_size):
+            self.supplemented_days.update(self.get_supplemented_days(chunk, event.time))
+        if self.long_format_dir:
+            self.strata.update(self.get_strata(event.time))
+
+    def on_simulation_end(self, event):
+        records = [(self.measure_name, None) + self.strata[key] + (value,)
+                   for key, value in self.supplemented_days.items()]
+        long_format.write_partition(long_format.encode_records(records), self.long_format_dir, *self.partition)
+
+    def get_supplemented_days(self, index: pd.Index, event_time: pd.Timestamp) -> dict:
+        pop = self.population_view.get(index)
         current_lack_of_supplementation_exposure = self.lack_of_vitamin_a_supplementation(pop.index)
 
         # cat 1 represents the exposure to lack of vitamin a supplementation
@@ -52,11 +134,30 @@ class SupplementedDaysObserver:
 
         config = self.config.to_dict().copy()
         base_filter = QueryString(f'alive == "alive"')
-        base_key = get_output_template(**config).substitute(measure=self.measure_name, year=event.time.year)
+        base_key = get_output_template(**config).substitute(measure=self.measure_name, year=event_time.year)
         current_supplemented_count = get_group_counts(current_supplemented_pop, base_filter, base_key,
                                               config, self.age_bins)
-        current_supplemented_count = {k: v * self.step_size().days for k, v in current_supplemented_count.items()}
-        self.supplemented_days.update(current_supplemented_count)
+        step_size_in_days = self.step_size() / pd.Timedelta(days=1)
+        return {k: v * step_size_in_days for k, v in current_supplemented_count.items()}
+
+    def get_strata(self, event_time: pd.Timestamp) -> Dict[str, Tuple]:
+        """Gets the (year, sex, age group) of each metric key counted at a time.
+
+        Fields the observer isn't configured to stratify by are ``None``.
+
+        """
+        config = self.config.to_dict().copy()
+        base_key = get_output_template(**config).substitute(measure=self.measure_name, year=event_time.year)
+        _, (ages, sexes) = get_age_sex_filter_and_iterables(config, self.age_bins)
+        strata = {}
+        for group, age_group in ages:
+            for sex in sexes:
+                key = base_key.substitute(age_start=age_group.age_start, age_end=age_group.age_end,
+                                          sex=sex, age_group=group)
+                strata[key] = (event_time.year if config['by_year'] else None,
+                               OutputTemplate.format_template_value(sex) if config['by_sex'] else None,
+                               OutputTemplate.format_template_value(group) if config['by_age'] else None)
+        return strata
 
     def metrics(self, index: pd.Index, metrics: dict):
         metrics.update(self.supplemented_days)
@@ -0,0 +1,22 @@
+from vivarium_public_health.population import Mortality as Mortality_
+
+from vivarium_conic_vitamin_a_supp.utilities import chunk_index, get_chunk_size
+
+
+class Mortality(Mortality_):
+    """All cause and cause-specific mortality, sampled one chunk of simulants at a time.
+
+    The ``mortality_rate`` pipeline and the relative risks and population
+    attributable fractions that modify it are only evaluated over one chunk
+    of the population at a time.  Deaths are drawn from per-simulant random
+    numbers, so they don't depend on the chunk size.
+
+    """
+
+    def setup(self, builder):
+        super().setup(builder)
+        self.chunk_size = get_chunk_size(builder.configuration)
+
+    def on_time_step(self, event):
+        for chunk in chunk_index(event.index, self.chunk_size):
+            super().on_time_step(event.split(chunk))
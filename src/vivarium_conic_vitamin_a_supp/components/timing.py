@@ -0,0 +1,181 @@
+from collections import defaultdict
+from pathlib import Path
+import time
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+from vivarium.exceptions import VivariumError
+
+TIMING_COLUMNS = ['stage', 'step', 'component', 'phase', 'name', 'calls', 'total_time', 'self_time']
+# Listeners of these events run before timing starts.
+UNTIMED_EVENTS = ['post_setup']
+
+
+class ComponentTimer:
+    """Times the event listeners and value pipeline stages of every component.
+
+    This component is opt-in: it is not part of the model specification, and
+    a simulation without it runs no timing code at all.  Add it as an extra
+    component (the local runner does this for ``--timing`` runs) to wrap, at
+    post setup, every listener of the simulation's events and every source
+    and modifier of its value pipelines.
+
+    Wall time and call counts are recorded per time step for each
+    (component, phase, name), where the phase is ``event``, ``value_source``
+    or ``value_modifier`` and the name is the event or pipeline name.
+    ``total_time`` includes the time of any timed calls made by the wrapped
+    callable, e.g. the pipelines a listener calls, while ``self_time``
+    excludes it, so self times can be summed without double counting.  The
+    work of population initialization and of the end of the simulation is
+    recorded as the ``initialization`` and ``simulation_end`` stages, before
+    and after the ``time_step`` stage steps.  Time spent in pipeline
+    combiners and post processors is only counted in the callers' self
+    time.
+
+    If ``timing.output_path`` is configured, the records are written there
+    as a csv at the end of the simulation.
+
+    The framework has no public API for replacing listeners or pipeline
+    stages, so the timer works on the event and values managers behind the
+    builder interfaces (their ``_manager`` attribute) and on the listener
+    lists and pipeline ``source`` and ``mutators`` they hold.  This matches
+    the internals of vivarium 0.10.9, the version pinned in ``setup.py``;
+    setup fails with a :class:`~vivarium.exceptions.VivariumError` if the
+    managers are not found.
+
+    """
+
+    configuration_defaults = {
+        'timing': {
+            'output_path': '',
+        }
+    }
+
+    @property
+    def name(self):
+        return 'component_timer'
+
+    def setup(self, builder):
+        self.output_path = builder.configuration.timing.output_path
+        # Listeners and pipelines are wrapped in place, so we need the framework's managers.
+        self.events = get_manager(builder.event, ['list_events', 'get_listeners'])
+        self.values = get_manager(builder.value, ['items'])
+
+        self.stage = 'initialization'
+        self.step = 0
+        self.records: List[Tuple] = []
+        # Maps (component, phase, name) to the calls, total time and self time of the current step.
+        self.current: Dict[Tuple[str, str, str], List] = defaultdict(lambda: [0, 0., 0.])
+        # The time spent in timed calls made by each timed call in progress.
+        self.child_times: List[float] = []
+
+        builder.event.register_listener('post_setup', self.on_post_setup)
+        builder.event.register_listener('time_step__prepare', self.on_time_step_prepare, priority=0)
+        builder.event.register_listener('simulation_end', self.on_end_of_steps, priority=0)
+        builder.event.register_listener('simulation_end', self.on_simulation_end, priority=9)
+
+    def on_post_setup(self, event):
+        own_listeners = {self.on_post_setup, self.on_time_step_prepare, self.on_end_of_steps, self.on_simulation_end}
+        for event_name in self.events.list_events():
+            if event_name in UNTIMED_EVENTS:
+                continue
+            for priority, listeners in self.events.get_listeners(event_name).items():
+                ours = [listener for listener in listeners if listener in own_listeners]
+                timed = [self.timed(listener, 'event', event_name)
+                         for listener in listeners if listener not in own_listeners]
+                # Step boundaries are marked before the first and after the last listener of an event.
+                listeners[:] = ours + timed if priority == 0 else timed + ours
+
+        for pipeline_name, pipeline in self.values.items():
+            if pipeline.source is not None:
+                pipeline.source = self.timed(pipeline.source, 'value_source', pipeline_name)
+            pipeline.mutators[:] = [self.timed(mutator, 'value_modifier', pipeline_name)
+                                    for mutator in pipeline.mutators]
+
+    def on_time_step_prepare(self, event):
+        self.end_step()
+        self.stage = 'time_step'
+
+    def on_end_of_steps(self, event):
+        self.end_step()
+        self.stage = 'simulation_end'
+
+    def on_simulation_end(self, event):
+        self.end_step()
+        if self.output_path:
+            output_path = Path(self.output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            self.get_timings().to_csv(output_path, index=False)
+
+    def timed(self, func: Callable, phase: str, name: str) -> Callable:
+        """Wraps a listener, pipeline source or pipeline modifier with a timer."""
+        record = self.current
+        child_times = self.child_times
+        key = (get_owner_name(func), phase, name)
+
+        def _timed(*args, **kwargs):
+            child_times.append(0.)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                child_time = child_times.pop()
+                if child_times:
+                    child_times[-1] += elapsed
+                counts = record[key]
+                counts[0] += 1
+                counts[1] += elapsed
+                counts[2] += elapsed - child_time
+
+        return _timed
+
+    def end_step(self):
+        self.records.extend((self.stage, self.step) + key + tuple(counts) for key, counts in self.current.items())
+        # Clear in place, the timers hold a reference to the current step's record.
+        self.current.clear()
+        self.step += 1
+
+    def get_timings(self) -> pd.DataFrame:
+        """Gets the timing records of the completed steps."""
+        return pd.DataFrame(self.records, columns=TIMING_COLUMNS)
+
+
+def get_manager(interface, methods: List[str]):
+    """Gets the framework manager behind a builder interface.
+
+    Parameters
+    ----------
+    interface
+        The builder interface, e.g. ``builder.event``.
+    methods
+        The methods the timer needs from the manager.
+
+    Returns
+    -------
+        The manager.
+
+    Raises
+    ------
+    VivariumError
+        If the interface does not expose a manager with those methods.
+
+    """
+    manager = getattr(interface, '_manager', None)
+    missing = [method for method in methods if not hasattr(manager, method)]
+    if manager is None or missing:
+        raise VivariumError(f'ComponentTimer requires {type(interface).__name__} to expose its manager as '
+                            f'_manager with the methods {methods}, as in vivarium 0.10.9. Install the '
+                            f'vivarium version pinned in setup.py or run without the timer.')
+    return manager
+
+
+def get_owner_name(func: Callable) -> str:
+    """Gets the name of the component a listener or pipeline stage belongs to."""
+    if hasattr(func, '__self__'):  # A bound method of a component or other object
+        owner = func.__self__
+        return owner.name if hasattr(owner, 'name') else owner.__class__.__name__
+    qualified_name = getattr(func, '__qualname__', None)
+    if qualified_name is not None:  # A function, e.g. a lambda defined in a component's setup
+        return qualified_name.split('.<locals>')[0].split('.')[0]
+    return func.__class__.__name__  # A callable object, e.g. a lookup table or another pipeline
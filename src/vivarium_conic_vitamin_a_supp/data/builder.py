@@ -9,14 +9,24 @@ Some degree of verbosity/boilerplate is fine in the interest of transparancy.
    Logging in this module should be done at the ``debug`` level.
 
 """
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
 from pathlib import Path
+from typing import Any, Dict, Iterable, List
 
 from loguru import logger
 import pandas as pd
-from vivarium.framework.artifact import Artifact
+import tables
+from tables.nodes import filenode
+from vivarium.framework.artifact import Artifact, ArtifactException, EntityKey, hdf
+from vivarium.framework.artifact.artifact import Keys
 
 from vivarium_conic_vitamin_a_supp import globals as project_globals
-from vivarium_conic_vitamin_a_supp.data import loader
+from vivarium_conic_vitamin_a_supp.data.cache import LoaderCache
+from vivarium_conic_vitamin_a_supp.data.manifest import ArtifactManifest, describe, describe_by_draw, get_digest
+from vivarium_conic_vitamin_a_supp.data.storage import DEFAULT_PROFILE, StorageProfile, apply_profile
+from vivarium_conic_vitamin_a_supp.utilities import draw_chunks, is_draw_data
 
 
 def open_artifact(output_path: Path, location: str) -> Artifact:
@@ -43,12 +53,15 @@ def open_artifact(output_path: Path, location: str) -> Artifact:
 
     key = project_globals.METADATA_LOCATIONS
     if key not in artifact:
-        artifact.write(key, [location])
+        write_data_batch(artifact, {key: [location]})
+    elif ArtifactManifest.read(artifact.path) is None:
+        ArtifactManifest.build(artifact.path)
 
     return artifact
 
 
-def load_and_write_data(artifact: Artifact, key: str, location: str):
+def load_and_write_data(artifact: Artifact, key: str, location: str, cache: LoaderCache = None,
+                        profile: StorageProfile = DEFAULT_PROFILE):
     """Loads data and writes it to the artifact if not already present.
 
     Parameters
@@ -60,19 +73,153 @@ def load_and_write_data(artifact: Artifact, key: str, location: str):
     location
         The location associated with the data to load and the artifact to
         write to.
+    cache
+        An optional cache of loader outputs to read the data through.
+    profile
+        The storage profile to write the data with.
+
+    """
+    load_and_write_key_group(artifact, [key], location, cache, profile)
+
+
+def load_and_write_key_group(artifact: Artifact, keys: List[str], location: str, cache: LoaderCache = None,
+                             profile: StorageProfile = DEFAULT_PROFILE):
+    """Loads data for a group of keys and writes it to the artifact in one batch.
+
+    Parameters
+    ----------
+    artifact
+        The artifact to write to.
+    keys
+        The entity keys associated with the data to write.
+    location
+        The location associated with the data to load and the artifact to
+        write to.
+    cache
+        An optional cache of loader outputs to read the data through.
+    profile
+        The storage profile to write the data with.
+
+    """
+    data = {}
+    for key in keys:
+        if key in artifact:
+            logger.debug(f'Data for {key} already in artifact.  Skipping...')
+        else:
+            logger.debug(f'Loading data for {key} for location {location}.')
+            data[key] = get_data(key, location, cache)
+    write_data_batch(artifact, data, profile)
+
+
+def load_and_write_data_by_draw(artifact: Artifact, key: str, location: str, draws_per_chunk: int,
+                                cache: LoaderCache = None, profile: StorageProfile = DEFAULT_PROFILE):
+    """Loads data and streams it to the artifact in draw chunks if not already present.
+
+    Tables of draws are written in the per-draw layout read by
+    :func:`vivarium_conic_vitamin_a_supp.utilities.read_data_by_draw`.  Any
+    other data is written as usual.  With a cache, tables of draws are read
+    back from it one chunk of draws at a time, so only a chunk is held while
+    writing.  Without one, the loaded table is held whole and written a
+    chunk at a time.
+
+    Parameters
+    ----------
+    artifact
+        The artifact to write to.
+    key
+        The entity key associated with the data to write.
+    location
+        The location associated with the data to load and the artifact to
+        write to.
+    draws_per_chunk
+        The number of draws to write at once.
+    cache
+        An optional cache of loader outputs to read the data through.
+    profile
+        The storage profile to write the data with.
 
     """
     if key in artifact:
         logger.debug(f'Data for {key} already in artifact.  Skipping...')
     else:
         logger.debug(f'Loading data for {key} for location {location}.')
-        data = loader.get_data(key, location)
-        logger.debug(f'Writing data for {key} to artifact.')
-        artifact.write(key, data)
-    return artifact.load(key)
+        _write_streaming(artifact, key, get_data(key, location, cache, draws_per_chunk), draws_per_chunk, profile)
 
 
-def write_data(artifact: Artifact, key: str, data: pd.DataFrame):
+def load_and_write_data_concurrently(artifact: Artifact, key_groups: List[List[str]], location: str,
+                                     workers: int = 1, cache: LoaderCache = None, draws_per_chunk: int = None,
+                                     profile: StorageProfile = DEFAULT_PROFILE):
+    """Loads data for many keys concurrently and writes it to the artifact.
+
+    Data pulls for different keys are independent, so they are run in a
+    thread pool while this thread serializes all writes to the artifact.
+    Each key group is written in one batch as soon as all of its data has
+    been pulled.  Keys already in the artifact are skipped.
+
+    Parameters
+    ----------
+    artifact
+        The artifact to write to.
+    key_groups
+        Groups of entity keys associated with the data to write.
+    location
+        The location associated with the data to load and the artifact to
+        write to.
+    workers
+        The maximum number of keys to load at once.
+    cache
+        An optional cache of loader outputs to read the data through.
+    draws_per_chunk
+        If provided, each key is streamed to the artifact in chunks of this
+        many draws as soon as it is loaded instead of being batched with its
+        key group.  With a cache, loaded tables of draws are only held while
+        they are pulled and cached, and are then read back one chunk at a
+        time as they are written (see :func:`load_and_write_data_by_draw`).
+    profile
+        The storage profile to write the data with.
+
+    """
+    pending = {}
+    for group_number, keys in enumerate(key_groups):
+        for key in keys:
+            if key in artifact:
+                logger.debug(f'Data for {key} already in artifact.  Skipping...')
+            else:
+                pending.setdefault(group_number, set()).add(key)
+    loaded = {group_number: {} for group_number in pending}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for group_number, keys in pending.items():
+            for key in keys:
+                logger.debug(f'Loading data for {key} for location {location}.')
+                futures[executor.submit(get_data, key, location, cache, draws_per_chunk)] = group_number, key
+        for future in as_completed(futures):
+            group_number, key = futures[future]
+            if draws_per_chunk is not None:
+                _write_streaming(artifact, key, future.result(), draws_per_chunk, profile)
+                continue
+            loaded[group_number][key] = future.result()
+            pending[group_number].remove(key)
+            if not pending[group_number]:
+                write_data_batch(artifact, loaded.pop(group_number), profile)
+
+
+def get_data(key: str, location: str, cache: LoaderCache = None, draws_per_chunk: int = None):
+    """Loads the data for a key, through the cache if one is provided.
+
+    With a cache and ``draws_per_chunk``, tables of draws are returned as an
+    iterator over chunks of draws read from the cache.
+
+    """
+    if cache is not None:
+        return cache.get_data(key, location, draws_per_chunk)
+    # Local import to avoid data dependencies
+    from vivarium_conic_vitamin_a_supp.data import loader
+    return loader.get_data(key, location)
+
+
+def write_data(artifact: Artifact, key: str, data: pd.DataFrame, profile: StorageProfile = DEFAULT_PROFILE):
     """Writes data to the artifact if not already present.
 
     Parameters
@@ -83,11 +230,201 @@ def write_data(artifact: Artifact, key: str, data: pd.DataFrame):
         The entity key associated with the data to write.
     data
         The data to write.
+    profile
+        The storage profile to write the data with.
 
     """
     if key in artifact:
         logger.debug(f'Data for {key} already in artifact.  Skipping...')
     else:
-        logger.debug(f'Writing data for {key} to artifact.')
-        artifact.write(key, data)
-    return artifact.load(key)
+        write_data_batch(artifact, {key: data}, profile)
+
+
+def write_data_batch(artifact: Artifact, data: Dict[str, Any], profile: StorageProfile = DEFAULT_PROFILE):
+    """Writes data for several keys to the artifact in a single HDF session.
+
+    The layout on disk is the same as :meth:`Artifact.write` produces, but
+    the file is opened once per batch rather than once per key and the
+    artifact keyspace is rewritten once at the end rather than after every
+    key.  Each write is verified against the HDF metadata instead of being
+    read back.  The artifact manifest is updated with the new keys.
+
+    Parameters
+    ----------
+    artifact
+        The artifact to write to.
+    data
+        A mapping between the entity keys to write and their data.
+    profile
+        The storage profile to write the data with.
+
+    """
+    for key, value in data.items():
+        if key in artifact:
+            raise ArtifactException(f'{key} already in artifact.')
+        elif value is None:
+            raise ArtifactException(f'Attempting to write to key {key} with no data.')
+    if not data:
+        return
+    manifest = ArtifactManifest.read(artifact.path)
+
+    pandas_data = {EntityKey(k): apply_profile(v, profile)
+                   for k, v in data.items() if isinstance(v, (pd.DataFrame, pd.Series))}
+    json_data = {EntityKey(k): json.dumps(v).encode('utf-8')
+                 for k, v in data.items() if EntityKey(k) not in pandas_data}
+
+    if pandas_data:
+        with pd.HDFStore(artifact.path, complevel=profile.complevel, complib=profile.complib) as store:
+            for key, value in pandas_data.items():
+                logger.debug(f'Writing data for {key} to artifact.')
+                _put_pandas_data(store, key, value)
+    if json_data:
+        with tables.open_file(artifact.path, 'a') as store:
+            for key, blob in json_data.items():
+                logger.debug(f'Writing data for {key} to artifact.')
+                _put_json_blob(store, key, blob)
+
+    verify_written(artifact, pandas_data, json_data)
+    _append_to_keyspace(artifact, list(data))
+    entries = {str(key): describe(value) for key, value in pandas_data.items()}
+    entries.update({key: describe(value) for key, value in data.items() if key not in entries})
+    _update_manifest(artifact, manifest, entries)
+
+
+def write_data_by_draw(artifact: Artifact, key: str, chunks: Iterable[pd.DataFrame],
+                       profile: StorageProfile = DEFAULT_PROFILE):
+    """Writes a table of draws to the artifact one chunk of draws at a time.
+
+    The index is written once to ``{key}/index`` and every draw to its own
+    ``{key}/draw_{n}`` node, the layout read by
+    :func:`vivarium_conic_vitamin_a_supp.utilities.read_data_by_draw`.
+    Only one chunk needs to be held in memory at a time.  The key is added
+    to the artifact keyspace once all chunks are written, so an interrupted
+    write is redone by the next build.
+
+    Parameters
+    ----------
+    artifact
+        The artifact to write to.
+    key
+        The entity key associated with the data to write.
+    chunks
+        Tables sharing the same index, each holding a subset of the draws.
+    profile
+        The storage profile to write the data with.
+
+    """
+    if key in artifact:
+        raise ArtifactException(f'{key} already in artifact.')
+    key = EntityKey(key)
+    manifest = ArtifactManifest.read(artifact.path)
+
+    logger.debug(f'Writing data for {key} to artifact by draw.')
+    index = None
+    draws, digests = {}, []
+    with pd.HDFStore(artifact.path, complevel=profile.complevel, complib=profile.complib, mode='a') as store:
+        if key.path in store:
+            # Left over from an interrupted write.
+            store.remove(key.path)
+        for chunk in chunks:
+            chunk = apply_profile(chunk, profile)
+            if index is None:
+                index = chunk.index
+                store.put(f'{key.path}/index', index.to_frame(index=False))
+            elif not chunk.index.equals(index):
+                raise ArtifactException(f'Draw chunks for {key} do not share the same index.')
+            for column, values in chunk.items():
+                values = values.reset_index(drop=True)
+                store.put(f'{key.path}/{column}', values)
+                draws[column] = str(values.dtype)
+                digests.append(get_digest(values))
+    if index is None:
+        raise ArtifactException(f'Attempting to write to key {key} with no data.')
+
+    _append_to_keyspace(artifact, [str(key)])
+    _update_manifest(artifact, manifest, {str(key): describe_by_draw(index.to_frame(index=False), draws, digests)})
+
+
+def _write_streaming(artifact: Artifact, key: str, data: Any, draws_per_chunk: int,
+                     profile: StorageProfile = DEFAULT_PROFILE):
+    if is_draw_data(data):
+        data = draw_chunks(data, draws_per_chunk)
+    if isinstance(data, Iterator):
+        write_data_by_draw(artifact, key, data, profile)
+    else:
+        write_data_batch(artifact, {key: data}, profile)
+
+
+def verify_written(artifact: Artifact, pandas_data: Dict[EntityKey, Any], json_data: Dict[EntityKey, bytes]):
+    """Checks written data against the HDF metadata without reading it back.
+
+    Raises
+    ------
+    ArtifactException
+        If the stored row count or columns of a table, or the stored size of
+        a json blob, do not match the data that was written.
+
+    """
+    with pd.HDFStore(artifact.path, mode='r') as store:
+        for key, value in pandas_data.items():
+            storer = store.get_storer(key.path)
+            expected_rows = len(value) if not value.empty else len(value.reset_index())
+            if storer is None or storer.nrows != expected_rows:
+                raise ArtifactException(f'Data for {key} was not fully written to the artifact.')
+            if isinstance(value, pd.DataFrame) and not value.empty:
+                # Multi-index levels are stored as columns alongside the data.
+                stored_columns = {c for _, axis_labels in storer.non_index_axes for c in axis_labels}
+                if not stored_columns.issuperset(value.columns):
+                    raise ArtifactException(f'Columns for {key} were not written to the artifact.')
+    with tables.open_file(artifact.path, 'r') as store:
+        for key, blob in json_data.items():
+            with filenode.open_node(store.get_node(key.path)) as fnode:
+                if fnode.read() != blob:
+                    raise ArtifactException(f'Data for {key} was not fully written to the artifact.')
+
+
+def _put_pandas_data(store: pd.HDFStore, key: EntityKey, data: pd.DataFrame):
+    # Mirrors vivarium.framework.artifact.hdf._write_pandas_data.
+    if data.empty:
+        data = data.reset_index()
+        if data.empty:
+            raise ValueError("Cannot write an empty dataframe that does not have an index.")
+        metadata = {'is_empty': True}
+        data_columns = True
+    else:
+        metadata = {'is_empty': False}
+        data_columns = None
+    store.put(key.path, data, format="table", data_columns=data_columns)
+    store.get_storer(key.path).attrs.metadata = metadata
+
+
+def _put_json_blob(store: tables.File, key: EntityKey, blob: bytes):
+    # Mirrors vivarium.framework.artifact.hdf._write_json_blob.
+    if key.group_prefix not in store:
+        store.create_group('/', key.type)
+    if key.group not in store:
+        store.create_group(key.group_prefix, key.group_name)
+    with filenode.new_node(store, where=key.group, name=key.measure) as fnode:
+        fnode.write(blob)
+
+
+def _append_to_keyspace(artifact: Artifact, keys: List[str]):
+    # Artifact only appends keys one at a time through Keys.append, which
+    # rewrites the keyspace node for every key.  We rewrite it once through
+    # the public hdf API instead and then replace the artifact's in-memory
+    # keyspace with a Keys read back from disk, exactly as Artifact.__init__
+    # builds it.  In vivarium 0.10.9 (pinned in setup.py) the artifact only
+    # uses ``_keys`` in ``keys``, ``write`` and ``remove``, all of which read
+    # the keyspace from it, so the artifact behaves as if it had been reopened.
+    keyspace = artifact.keys + keys
+    hdf.remove(artifact.path, Keys.keyspace_node)
+    hdf.write(artifact.path, Keys.keyspace_node, keyspace)
+    artifact._keys = Keys(Path(artifact.path))
+
+
+def _update_manifest(artifact: Artifact, manifest: ArtifactManifest, entries: Dict[str, Dict]):
+    # The manifest is read before writing, so it's missing if it didn't match the artifact beforehand.
+    if manifest is None:
+        ArtifactManifest.build(artifact.path)
+    else:
+        manifest.update(artifact.keys, entries)
@@ -0,0 +1,284 @@
+"""An on-disk cache of loader outputs for artifact builds.
+
+Entries are content addressed: the file name is a hash of the artifact key,
+the location (for loaders whose data depends on it), the loader function,
+and the versions of the packages the data is pulled through.  An upgrade to
+any of those packages or a change of loader therefore misses the cache
+rather than serving stale data.
+
+Tables are stored as Parquet files and everything else (e.g. metadata) as
+json.  The cache is bounded in size; when it grows past its limit the least
+recently used entries are evicted.
+
+Tables of draws can be read back a chunk of draws at a time, reading only
+the chunk's columns from the Parquet entry, so that streaming a table into
+an artifact holds a single chunk in memory rather than the whole table.
+
+.. admonition::
+
+   Logging in this module should be done at the ``debug`` level.
+
+"""
+from functools import lru_cache
+import hashlib
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Iterator, List, Optional, Union
+import uuid
+
+from loguru import logger
+import pandas as pd
+import pyarrow.parquet as pq
+
+from vivarium_conic_vitamin_a_supp.utilities import draw_chunks, is_draw_data
+
+
+VERSIONED_PACKAGES = ('vivarium_inputs', 'gbd_mapping', 'vivarium', 'vivarium_conic_vitamin_a_supp')
+TABLE_SUFFIX = '.parquet'
+OBJECT_SUFFIX = '.json'
+
+
+@lru_cache()
+def get_package_versions() -> str:
+    """Gets the versions of the packages loader outputs depend on."""
+    from importlib import metadata
+    versions = []
+    for package in VERSIONED_PACKAGES:
+        try:
+            versions.append(f'{package}=={metadata.version(package)}')
+        except metadata.PackageNotFoundError:
+            versions.append(f'{package}==unknown')
+    return ','.join(versions)
+
+
+def get_cache_key(key: str, location: str, load_function: Callable) -> str:
+    """Builds the content address of the data for a key.
+
+    Parameters
+    ----------
+    key
+        The artifact key of the data.
+    location
+        The location of the data, or ``None`` for data that is the same for
+        every location.
+    load_function
+        The function that loads the data.
+
+    Returns
+    -------
+        A hex digest identifying the data.
+
+    """
+    loader_name = f'{load_function.__module__}.{load_function.__qualname__}'
+    content = json.dumps([key, location, loader_name, get_package_versions()])
+    return hashlib.sha256(content.encode('utf8')).hexdigest()
+
+
+class LoaderCache:
+    """A size-bounded on-disk cache of loader outputs.
+
+    The cache is safe to share between threads and between processes
+    building different locations.
+
+    Attributes
+    ----------
+    hits
+        The number of loads served from the cache.
+    misses
+        The number of loads that had to go to the loader.
+
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], max_size: float = 50.):
+        """
+        Parameters
+        ----------
+        cache_dir
+            The directory holding the cache entries.  It will be created if
+            it doesn't exist.
+        max_size
+            The maximum size of the cache in GB.
+
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = int(max_size * 1024**3)
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def get_data(self, key: str, location: str, draws_per_chunk: int = None) -> Any:
+        """Retrieves the data for a key from the cache or the loader.
+
+        Parameters
+        ----------
+        key
+            The key that will eventually get put in the artifact with
+            the requested data.
+        location
+            The location to get data for.
+        draws_per_chunk
+            If provided, tables of draws are returned as chunks of this many
+            draws (see :meth:`load`).
+
+        Returns
+        -------
+            The requested data.
+
+        """
+        # Local import to avoid data dependencies
+        from vivarium_conic_vitamin_a_supp.data import loader
+        load_function = loader.get_loader(key)
+        return self.load(key, location, load_function,
+                         location_independent=load_function in loader.LOCATION_INDEPENDENT_LOADERS,
+                         draws_per_chunk=draws_per_chunk)
+
+    def load(self, key: str, location: str, load_function: Callable[[str, str], Any],
+             location_independent: bool = False, draws_per_chunk: int = None) -> Any:
+        """Retrieves the data for a key from the cache or a load function.
+
+        Parameters
+        ----------
+        key
+            The key that will eventually get put in the artifact with
+            the requested data.
+        location
+            The location to get data for.
+        load_function
+            The function that loads the data on a cache miss.  It is called
+            with the key and the location.
+        location_independent
+            Whether the data is the same for every location, so a single
+            cache entry is shared by all locations.
+        draws_per_chunk
+            If provided, a table of draws is returned as an iterator over
+            tables of this many draws each, read from the cache entry one
+            chunk at a time.  On a miss the whole table is held while it is
+            loaded and cached, since loaders return every draw at once, and
+            is released before the first chunk is read back.
+
+        Returns
+        -------
+            The requested data.
+
+        """
+        if draws_per_chunk is not None and draws_per_chunk < 1:
+            raise ValueError(f'Draw chunks must hold at least one draw. You specified {draws_per_chunk}.')
+        cache_key = get_cache_key(key, None if location_independent else location, load_function)
+
+        data = self._read(cache_key, draws_per_chunk)
+        if data is not None:
+            logger.debug(f'Loader cache hit for {key}.')
+            self._count(hit=True)
+            return data
+
+        logger.debug(f'Loader cache miss for {key}.')
+        self._count(hit=False)
+        data = load_function(key, location)
+        self._write(cache_key, data)
+        self.evict()
+        if draws_per_chunk is not None and is_draw_data(data):
+            try:
+                return self._read_chunks(self.cache_dir / f'{cache_key}{TABLE_SUFFIX}', draws_per_chunk)
+            except FileNotFoundError:  # Not cacheable, or already evicted by another build.
+                return draw_chunks(data, draws_per_chunk)
+        return data
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits its size limit."""
+        entries = []
+        for path in self.cache_dir.iterdir():
+            if path.suffix in (TABLE_SUFFIX, OBJECT_SUFFIX):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:  # Evicted by another build.
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            logger.debug(f'Evicting {path.name} from the loader cache.')
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def summary(self) -> str:
+        return (f'Loader cache at {str(self.cache_dir)}: {self.hits} hits, {self.misses} misses '
+                f'({self.hit_rate:.0%} hit rate).')
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _read(self, cache_key: str, draws_per_chunk: int = None) -> Any:
+        for suffix in (TABLE_SUFFIX, OBJECT_SUFFIX):
+            path = self.cache_dir / f'{cache_key}{suffix}'
+            try:
+                if suffix == TABLE_SUFFIX:
+                    data = self._read_chunks(path, draws_per_chunk) if draws_per_chunk is not None else None
+                    if data is None:
+                        data = pd.read_parquet(path)
+                else:
+                    with path.open() as f:
+                        data = json.load(f)
+            except FileNotFoundError:
+                continue
+            # Mark the entry as recently used.
+            try:
+                os.utime(path)
+            except FileNotFoundError:  # Evicted by another build since it was read.
+                pass
+            return data
+        return None
+
+    @staticmethod
+    def _read_chunks(path: Path, draws_per_chunk: int) -> Optional[Iterator[pd.DataFrame]]:
+        """Opens a table entry for reading a chunk of draws at a time, if it's a table of draws."""
+        parquet_file = pq.ParquetFile(path)
+        schema = parquet_file.schema_arrow
+        # Range indices are stored as metadata rather than as columns.
+        index_columns = [c for c in (schema.pandas_metadata or {}).get('index_columns', []) if isinstance(c, str)]
+        columns = [c for c in schema.names if c not in index_columns]
+        if not columns or not all(c.startswith('draw_') for c in columns):
+            parquet_file.close()
+            return None
+        # The open file stays readable even if the entry is evicted while the chunks are read.
+        return _iterate_chunks(parquet_file, columns, draws_per_chunk)
+
+    def _write(self, cache_key: str, data: Any):
+        suffix = TABLE_SUFFIX if isinstance(data, pd.DataFrame) else OBJECT_SUFFIX
+        path = self.cache_dir / f'{cache_key}{suffix}'
+        # Write to a temporary file first so readers never see a partial entry.
+        temp_path = self.cache_dir / f'{cache_key}.{uuid.uuid4().hex}.tmp'
+        try:
+            if suffix == TABLE_SUFFIX:
+                data.to_parquet(temp_path)
+            else:
+                with temp_path.open('w') as f:
+                    json.dump(data, f)
+            temp_path.replace(path)
+        except (TypeError, ValueError) as e:
+            logger.debug(f'Data for {cache_key} cannot be cached: {e}')
+            if temp_path.exists():
+                temp_path.unlink()
+
+
+def _iterate_chunks(parquet_file: pq.ParquetFile, columns: List[str], draws_per_chunk: int) -> Iterator[pd.DataFrame]:
+    with parquet_file:
+        for start in range(0, len(columns), draws_per_chunk):
+            yield parquet_file.read(columns=columns[start:start + draws_per_chunk],
+                                    use_pandas_metadata=True).to_pandas()
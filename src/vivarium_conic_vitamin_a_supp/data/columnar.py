@@ -0,0 +1,240 @@
+"""Columnar artifact storage.
+
+A columnar artifact is a directory holding one uncompressed Arrow IPC
+(Feather v2) file per table and one json file per metadata key (e.g.
+``*.restrictions`` and ``*.categories``), plus a ``keyspace.json`` manifest
+recording the kind and index columns of every key.  Tables are memory
+mapped on load and only the index columns and the requested draw are
+materialized, so loading a single draw does not decode the rest of the
+table and any number of processes can read the files at once.
+
+.. admonition::
+
+   Logging in this module should be done at the ``debug`` level.
+
+"""
+import json
+from pathlib import Path
+import time
+from typing import Any, Dict, List, Union
+
+from loguru import logger
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+from vivarium.framework.artifact import Artifact, ArtifactException
+
+from vivarium_conic_vitamin_a_supp.utilities import is_draw_data
+
+KEYSPACE_FILE = 'keyspace.json'
+TABLE_SUFFIX = '.arrow'
+OBJECT_SUFFIX = '.json'
+COLUMNAR_ARTIFACT_SUFFIX = '.columnar'
+
+
+class ColumnarArtifact:
+    """Read access to a columnar artifact.
+
+    This mirrors the loading interface of
+    :class:`vivarium.framework.artifact.Artifact`.
+
+    """
+
+    def __init__(self, path: Union[str, Path], draw: int = None):
+        """
+        Parameters
+        ----------
+        path
+            The artifact directory.
+        draw
+            If provided, tables are loaded with only this draw (and any
+            ``value`` column), like an HDF artifact filtered by draw.
+
+        """
+        self._path = Path(path)
+        self._draw = draw
+        with (self._path / KEYSPACE_FILE).open() as f:
+            self._keyspace = json.load(f)
+        self._cache = {}
+
+    @property
+    def path(self) -> str:
+        return str(self._path)
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self._keyspace)
+
+    def load(self, entity_key: str) -> Any:
+        """Loads the data associated with the provided entity key."""
+        if entity_key not in self:
+            raise ArtifactException(f"{entity_key} should be in {self.path}.")
+
+        if entity_key not in self._cache:
+            entry = self._keyspace[entity_key]
+            if entry['kind'] == 'object':
+                with (self._path / f'{entity_key}{OBJECT_SUFFIX}').open() as f:
+                    data = json.load(f)
+            else:
+                data = self._load_table(entity_key, entry)
+            self._cache[entity_key] = data
+        return self._cache[entity_key]
+
+    def _load_table(self, entity_key: str, entry: Dict) -> pd.DataFrame:
+        with pa.memory_map(str(self._path / f'{entity_key}{TABLE_SUFFIX}')) as source:
+            table = pa.ipc.open_file(source).read_all()
+        columns = entry['columns']
+        if self._draw is not None:
+            # Same column selection as a draw filtered HDF artifact.
+            columns = [c for c in columns if c in (f'draw_{self._draw}', 'value')]
+        data = table.select(entry['index'] + columns).to_pandas()
+        return data.set_index(entry['index']) if entry['index'] else data
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._keyspace
+
+    def __repr__(self):
+        return f'ColumnarArtifact(path={self.path}, draw={self._draw})'
+
+
+def get_columnar_path(hdf_path: Union[str, Path], output_dir: Union[str, Path]) -> Path:
+    """Gets the columnar artifact path for an HDF artifact."""
+    return Path(output_dir) / f'{Path(hdf_path).stem}{COLUMNAR_ARTIFACT_SUFFIX}'
+
+
+def export_artifact(hdf_path: Union[str, Path], output_path: Union[str, Path]):
+    """Writes a copy of an HDF artifact in the columnar format.
+
+    Keys stored in the per-draw HDF layout are exported as regular tables of
+    draws.
+
+    Parameters
+    ----------
+    hdf_path
+        The HDF artifact to export.
+    output_path
+        The directory to write the columnar artifact to.
+
+    """
+    # Local import to avoid a cycle through the plugins package.
+    from vivarium_conic_vitamin_a_supp.plugins.artifact import get_keys_by_draw, read_all_draws
+
+    artifact = Artifact(hdf_path)
+    output_path = Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+    keys_by_draw = get_keys_by_draw(artifact.path, artifact.keys)
+
+    keyspace = {}
+    for key in artifact.keys:
+        if key == 'metadata.keyspace':
+            continue
+        logger.debug(f'Exporting {key}.')
+        if key in keys_by_draw:
+            data = read_all_draws(artifact.path, key)
+            index_columns = [c for c in data if not str(c).startswith('draw_')]
+            data = data.set_index(index_columns)
+        else:
+            data = artifact.load(key)
+        keyspace[key] = write_key(output_path, key, data)
+        artifact.clear_cache()
+
+    with (output_path / KEYSPACE_FILE).open('w') as f:
+        json.dump(keyspace, f, indent=2)
+
+
+def write_key(output_path: Path, key: str, data: Any) -> Dict:
+    """Writes the data for one key and returns its keyspace entry."""
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    if not isinstance(data, pd.DataFrame):
+        with (output_path / f'{key}{OBJECT_SUFFIX}').open('w') as f:
+            json.dump(data, f)
+        return {'kind': 'object'}
+
+    index_columns = [name for name in data.index.names if name is not None]
+    entry = {
+        'kind': 'draws' if is_draw_data(data) else 'table',
+        'index': index_columns,
+        'columns': [str(c) for c in data.columns],
+    }
+    table = pa.Table.from_pandas(data.reset_index(drop=not index_columns), preserve_index=False)
+    # Uncompressed so tables can be memory mapped without decoding.
+    feather.write_feather(table, str(output_path / f'{key}{TABLE_SUFFIX}'), compression='uncompressed')
+    return entry
+
+
+def import_artifact(columnar_path: Union[str, Path], hdf_path: Union[str, Path]):
+    """Writes a copy of a columnar artifact in the HDF format.
+
+    Parameters
+    ----------
+    columnar_path
+        The columnar artifact directory to import.
+    hdf_path
+        The HDF artifact to write.  It must not already exist.
+
+    """
+    hdf_path = Path(hdf_path)
+    if hdf_path.exists():
+        raise FileExistsError(f'An artifact already exists at {str(hdf_path)}.')
+    columnar = ColumnarArtifact(columnar_path)
+    artifact = Artifact(hdf_path)
+    for key in columnar.keys:
+        logger.debug(f'Importing {key}.')
+        artifact.write(key, columnar.load(key))
+
+
+def benchmark_loads(hdf_path: Union[str, Path], columnar_path: Union[str, Path], draw: int = 0) -> pd.DataFrame:
+    """Times loading every key of an artifact for a single draw in both formats.
+
+    Parameters
+    ----------
+    hdf_path
+        The HDF artifact.
+    columnar_path
+        The columnar copy of the artifact.
+    draw
+        The draw to load, as a simulation configured with
+        ``input_draw_number`` would.
+
+    Returns
+    -------
+        Load times in seconds for each key and format, and whether the
+        loaded data matches.
+
+    """
+    # Local import to avoid a cycle through the plugins package.
+    from vivarium_conic_vitamin_a_supp.plugins.artifact import get_keys_by_draw
+
+    hdf_artifact = Artifact(hdf_path, filter_terms=[f'draw == {draw}'])
+    columnar_artifact = ColumnarArtifact(columnar_path, draw=draw)
+    keys_by_draw = get_keys_by_draw(hdf_artifact.path, hdf_artifact.keys)
+
+    results = []
+    for key in columnar_artifact.keys:
+        if key not in hdf_artifact or key in keys_by_draw:
+            continue  # Keys stored by draw can't be loaded through the HDF artifact.
+        start = time.perf_counter()
+        hdf_data = hdf_artifact.load(key)
+        hdf_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        columnar_data = columnar_artifact.load(key)
+        columnar_time = time.perf_counter() - start
+
+        results.append({'key': key, 'hdf': hdf_time, 'columnar': columnar_time,
+                        'matches': _matches(hdf_data, columnar_data)})
+        hdf_artifact.clear_cache()
+    return pd.DataFrame(results, columns=['key', 'hdf', 'columnar', 'matches']).set_index('key')
+
+
+def _matches(left: Any, right: Any) -> bool:
+    if isinstance(left, pd.Series):
+        left = left.to_frame()
+    if isinstance(left, pd.DataFrame):
+        try:
+            pd.testing.assert_frame_equal(left, right, check_dtype=False, check_categorical=False)
+        except AssertionError:
+            return False
+        return True
+    return left == right
@@ -12,6 +12,8 @@ for an example.
 
    No logging is done here. Logging is done in vivarium inputs itself and forwarded.
 """
+from typing import Callable
+
 from gbd_mapping import causes, risk_factors, covariates
 import pandas as pd
 from vivarium.framework.artifact import EntityKey
@@ -36,6 +38,23 @@ def get_data(lookup_key: str, location: str) -> pd.DataFrame:
     -------
         The requested data.
 
+    """
+    return get_loader(lookup_key)(lookup_key, location)
+
+
+def get_loader(lookup_key: str) -> Callable:
+    """Gets the function that loads the data for a key.
+
+    Parameters
+    ----------
+    lookup_key
+        The key that will eventually get put in the artifact with
+        the requested data.
+
+    Returns
+    -------
+        A function taking the key and a location and returning the data.
+
     """
     mapping = {
         project_globals.POPULATION.STRUCTURE: load_population_structure,
@@ -68,7 +87,7 @@ def get_data(lookup_key: str, location: str) -> pd.DataFrame:
         project_globals.VITAMIN_A_DEFICIENCY.VITAMIN_A_DEFICIENCY_PAF: load_standard_data,
         project_globals.VITAMIN_A_DEFICIENCY.VITAMIN_A_DEFICIENCY_DISTRIBUTION: load_metadata,
     }
-    return mapping[lookup_key](lookup_key, location)
+    return mapping[lookup_key]
 
 
 def load_population_structure(key: str, location: str) -> pd.DataFrame:
@@ -105,6 +124,14 @@ def load_metadata(key: str, location: str):
 # TODO - add project-specific data functions here
 
 
+# Loaders whose data is the same for every location.
+LOCATION_INDEPENDENT_LOADERS = (
+    load_age_bins,
+    load_theoretical_minimum_risk_life_expectancy,
+    load_metadata,
+)
+
+
 def get_entity(key: str):
     # Map of entity types to their gbd mappings.
     type_map = {
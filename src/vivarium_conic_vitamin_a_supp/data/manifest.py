@@ -0,0 +1,315 @@
+"""Artifact manifests.
+
+A manifest is a json sidecar written next to an artifact
+(``{location}.manifest.json`` next to ``{location}.hdf``) that describes
+every key in it: the HDF node holding the data, its shape, index, dtypes,
+number of draws, compressed bytes on disk and a checksum of its contents.
+Listing the keys of an artifact or checking whether it holds a key only
+needs the manifest, so neither opens the HDF file.
+
+The manifest records the size and modification time of the artifact it
+describes.  If the artifact is changed by anything other than the
+artifact builder, the manifest no longer matches and is ignored until it
+is rebuilt.
+
+.. admonition::
+
+   Logging in this module should be done at the ``debug`` level.
+
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Set, Union
+import uuid
+
+from loguru import logger
+import pandas as pd
+from vivarium.framework.artifact import Artifact, ArtifactException, EntityKey, hdf
+from vivarium.framework.artifact.artifact import Keys, _parse_draw_filters
+
+from vivarium_conic_vitamin_a_supp.data.storage import get_key_sizes
+from vivarium_conic_vitamin_a_supp.utilities import is_draw_data
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+def get_manifest_path(artifact_path: Union[str, Path]) -> Path:
+    """Gets the path of the manifest of an artifact."""
+    artifact_path = Path(artifact_path)
+    return artifact_path.parent / f'{artifact_path.stem}{MANIFEST_SUFFIX}'
+
+
+def get_digest(data: Union[pd.DataFrame, pd.Series]) -> str:
+    """Gets a checksum of the contents of a table as it is stored in an artifact."""
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    if data.empty:
+        # Empty tables are stored with their index as columns.
+        data = data.reset_index()
+    digest = hashlib.sha256(json.dumps([str(c) for c in data.columns]).encode('utf8'))
+    digest.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def combine_digests(digests: List[str]) -> str:
+    """Gets a single checksum from the checksums of the parts of a key."""
+    return hashlib.sha256(''.join(digests).encode('utf8')).hexdigest()
+
+
+def describe(data: Any) -> Dict:
+    """Describes the data written to an artifact key.
+
+    Returns
+    -------
+        The manifest entry of the data, without its size on disk.
+
+    """
+    if not isinstance(data, (pd.DataFrame, pd.Series)):
+        blob = json.dumps(data).encode('utf-8')
+        return {'kind': 'object', 'shape': None, 'index': [], 'dtypes': {}, 'draws': 0,
+                'checksum': hashlib.sha256(blob).hexdigest()}
+
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    return {
+        'kind': 'draws' if is_draw_data(frame) else 'table',
+        'shape': list(frame.shape),
+        'index': [name for name in frame.index.names if name is not None],
+        'dtypes': {str(c): str(dtype) for c, dtype in frame.dtypes.items()},
+        'draws': sum(str(c).startswith('draw_') for c in frame.columns),
+        'checksum': get_digest(data),
+    }
+
+
+def describe_by_draw(index: pd.DataFrame, draws: Dict[str, str], draw_digests: List[str]) -> Dict:
+    """Describes a table of draws written in the per-draw layout.
+
+    Parameters
+    ----------
+    index
+        The index table of the key.
+    draws
+        The dtype of each draw, in draw order.
+    draw_digests
+        The checksum of each draw, in draw order.
+
+    """
+    return {
+        'kind': 'by_draw',
+        'shape': [len(index), len(draws)],
+        'index': list(index.columns),
+        'dtypes': dict(draws),
+        'draws': len(draws),
+        'checksum': combine_digests([get_digest(index)] + draw_digests),
+    }
+
+
+class ArtifactManifest:
+    """The keys of an artifact and a description of the data at each one."""
+
+    def __init__(self, artifact_path: Union[str, Path], keys: List[str], entries: Dict[str, Dict]):
+        self.artifact_path = Path(artifact_path)
+        self._keys = list(keys)
+        self.entries = entries
+
+    @property
+    def path(self) -> Path:
+        return get_manifest_path(self.artifact_path)
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self._keys)
+
+    @property
+    def keys_by_draw(self) -> Set[str]:
+        return {key for key, entry in self.entries.items() if entry['kind'] == 'by_draw'}
+
+    @classmethod
+    def read(cls, artifact_path: Union[str, Path]) -> Union['ArtifactManifest', None]:
+        """Reads the manifest of an artifact.
+
+        Returns
+        -------
+            The manifest, or ``None`` if the artifact has no manifest or has
+            changed since its manifest was written.
+
+        """
+        path = get_manifest_path(artifact_path)
+        try:
+            with path.open() as f:
+                manifest = json.load(f)
+            stat = Path(artifact_path).stat()
+        except FileNotFoundError:
+            return None
+        if manifest['artifact'] != _get_artifact_stamp(stat):
+            logger.debug(f'Manifest at {str(path)} is out of date.')
+            return None
+        return cls(artifact_path, manifest['keys'], manifest['entries'])
+
+    @classmethod
+    def build(cls, artifact_path: Union[str, Path]) -> 'ArtifactManifest':
+        """Builds a manifest by reading every key of an artifact."""
+        # Local import to avoid a cycle through the plugins package.
+        from vivarium_conic_vitamin_a_supp.plugins.artifact import get_keys_by_draw
+
+        logger.debug(f'Building manifest for {str(artifact_path)}.')
+        artifact = Artifact(artifact_path)
+        keys_by_draw = get_keys_by_draw(artifact.path, artifact.keys)
+        entries = {}
+        for key in artifact.keys:
+            if key == Keys.keyspace_node:
+                continue  # Changes with every write.
+            elif key in keys_by_draw:
+                entries[key] = _describe_stored_by_draw(artifact.path, key)
+            else:
+                entries[key] = describe(artifact.load(key))
+                artifact.clear_cache()
+        manifest = cls(artifact_path, artifact.keys, {})
+        manifest.update(artifact.keys, entries)
+        return manifest
+
+    def update(self, keys: List[str], entries: Dict[str, Dict]):
+        """Records newly written keys and writes the manifest.
+
+        Parameters
+        ----------
+        keys
+            The artifact keyspace.
+        entries
+            Descriptions of the newly written keys.
+
+        """
+        sizes = get_key_sizes(self.artifact_path, entries)
+        for key, entry in entries.items():
+            self.entries[key] = dict(entry, node=EntityKey(key).path, bytes=sizes[key])
+        self._keys = list(keys)
+        self.write()
+
+    def write(self):
+        """Writes the manifest, stamped with the current state of the artifact."""
+        manifest = {
+            'artifact': _get_artifact_stamp(self.artifact_path.stat()),
+            'keys': self._keys,
+            'entries': self.entries,
+        }
+        # Write to a temporary file first so readers never see a partial manifest.
+        temp_path = self.path.parent / f'{self.path.name}.{uuid.uuid4().hex}.tmp'
+        with temp_path.open('w') as f:
+            json.dump(manifest, f, indent=2)
+        temp_path.replace(self.path)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._keys
+
+    def __repr__(self):
+        return f'ArtifactManifest(artifact_path={str(self.artifact_path)}, keys={len(self._keys)})'
+
+
+def find_corrupt_keys(artifact_path: Union[str, Path]) -> List[str]:
+    """Finds the keys of an artifact whose contents don't match its manifest.
+
+    Raises
+    ------
+    ArtifactException
+        If the artifact has no up to date manifest.
+
+    """
+    manifest = ArtifactManifest.read(artifact_path)
+    if manifest is None:
+        raise ArtifactException(f'No up to date manifest found for {str(artifact_path)}.')
+    artifact = Artifact(artifact_path)
+    corrupt = []
+    for key, entry in manifest.entries.items():
+        if entry['kind'] == 'by_draw':
+            actual = _describe_stored_by_draw(artifact.path, key)
+        else:
+            actual = describe(artifact.load(key))
+            artifact.clear_cache()
+        if actual['checksum'] != entry['checksum']:
+            corrupt.append(key)
+    return corrupt
+
+
+class LazyArtifact:
+    """Read access to an artifact that lists its keys from the manifest.
+
+    Listing keys and membership checks never open the HDF file, and each
+    key is only read from it on first load.  This mirrors the loading
+    interface of :class:`vivarium.framework.artifact.Artifact`.
+
+    """
+
+    def __init__(self, path: Union[str, Path], filter_terms: List[str] = None):
+        """
+        Parameters
+        ----------
+        path
+            The path to the artifact.  It must have an up to date manifest.
+        filter_terms
+            Filters applied to tables as they are loaded.
+
+        Raises
+        ------
+        ArtifactException
+            If the artifact has no up to date manifest.
+
+        """
+        self._path = Path(path)
+        self.manifest = ArtifactManifest.read(path)
+        if self.manifest is None:
+            raise ArtifactException(f'No up to date manifest found for {str(path)}.')
+        self._filter_terms = filter_terms
+        self._draw_column_filter = _parse_draw_filters(filter_terms)
+        self._cache = {}
+
+    @property
+    def path(self) -> str:
+        return str(self._path)
+
+    @property
+    def keys(self) -> List[str]:
+        return self.manifest.keys
+
+    @property
+    def filter_terms(self) -> List[str]:
+        return self._filter_terms
+
+    def load(self, entity_key: str) -> Any:
+        """Loads the data associated with the provided entity key."""
+        if entity_key not in self:
+            raise ArtifactException(f"{entity_key} should be in {self.path}.")
+
+        if entity_key not in self._cache:
+            logger.debug(f'Reading {entity_key} from {self.path}.')
+            data = hdf.load(self._path, entity_key, self._filter_terms, self._draw_column_filter)
+            if data is None:
+                raise ArtifactException(f"Data for {entity_key} is not available. Check your model specification.")
+            self._cache[entity_key] = data
+        return self._cache[entity_key]
+
+    def clear_cache(self):
+        self._cache = {}
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.manifest
+
+    def __repr__(self):
+        return f'LazyArtifact(path={self.path}, keys={len(self.keys)})'
+
+
+def _describe_stored_by_draw(artifact_path: str, key: str) -> Dict:
+    key = EntityKey(key)
+    with pd.HDFStore(artifact_path, mode='r') as store:
+        index = store.get(f'{key.path}/index')
+        draw_nodes = [n for n in store.get_node(key.path)._v_children if n.startswith('draw_')]
+        draws, digests = {}, []
+        for node in sorted(draw_nodes, key=lambda n: int(n.split('_')[-1])):
+            values = store.get(f'{key.path}/{node}')
+            draws[node] = str(values.dtype)
+            digests.append(get_digest(values))
+    return describe_by_draw(index, draws, digests)
+
+
+def _get_artifact_stamp(stat: os.stat_result) -> Dict[str, int]:
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
@@ -0,0 +1,134 @@
+"""Storage profiles for artifact data.
+
+A storage profile controls how data is encoded when it is written to an
+artifact: whether string demographic columns (e.g. ``sex``,
+``affected_entity`` and ``parameter``) are stored as categoricals, the
+floating point precision of draws, and the HDF compression codec and level.
+
+Downcasting draws to ``float32`` is only done when the largest relative
+error it introduces is within the profile's tolerance.  Otherwise the key
+is kept at full precision.
+
+.. admonition::
+
+   Logging in this module should be done at the ``debug`` level.
+
+"""
+from pathlib import Path
+from typing import Any, Dict, Iterable, NamedTuple, Union
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+import tables
+from vivarium.framework.artifact import EntityKey
+
+from vivarium_conic_vitamin_a_supp.utilities import is_draw_data
+
+
+class StorageProfile(NamedTuple):
+    name: str
+    categorical: bool
+    draw_dtype: str
+    complib: str
+    complevel: int
+    max_relative_error: float = 0.
+
+
+DEFAULT_PROFILE = StorageProfile('default', categorical=False, draw_dtype='float64', complib='zlib', complevel=9)
+STORAGE_PROFILES = {
+    profile.name: profile for profile in [
+        DEFAULT_PROFILE,
+        StorageProfile('compact', categorical=True, draw_dtype='float32', complib='blosc:zstd', complevel=9,
+                       max_relative_error=1e-6),
+        StorageProfile('fast', categorical=True, draw_dtype='float64', complib='blosc:lz4', complevel=1),
+    ]
+}
+
+
+def get_storage_profile(name: str) -> StorageProfile:
+    """Gets a storage profile by name."""
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f'Storage profile must be one of {list(STORAGE_PROFILES)}. You specified {name}.')
+    return STORAGE_PROFILES[name]
+
+
+def apply_profile(data: Any, profile: StorageProfile) -> Any:
+    """Encodes data for writing under a storage profile.
+
+    Parameters
+    ----------
+    data
+        The data to encode.  Only tables are changed.
+    profile
+        The storage profile to encode the data with.
+
+    Returns
+    -------
+        The encoded data.
+
+    """
+    if not isinstance(data, pd.DataFrame):
+        return data
+    if profile.categorical:
+        data = to_categorical(data)
+    if profile.draw_dtype != 'float64' and is_draw_data(data):
+        with np.errstate(under='ignore', over='ignore'):  # Measured below.
+            downcast = data.astype(profile.draw_dtype)
+        error = get_max_relative_error(data, downcast)
+        if error <= profile.max_relative_error:
+            data = downcast
+        else:
+            logger.debug(f'Keeping draws as float64: a {profile.draw_dtype} downcast has a relative error '
+                         f'of {error:.3g}, more than the tolerance of {profile.max_relative_error:.3g}.')
+    return data
+
+
+def to_categorical(data: pd.DataFrame) -> pd.DataFrame:
+    """Converts string index levels and columns of a table to categoricals.
+
+    Numeric demographics like ``age_start`` and ``year_start`` are left as
+    they are, since simulations interpolate over them.  A single level index
+    is also left as it is, since HDF tables can't store it as a categorical.
+
+    """
+    index_names = list(data.index.names)
+    multi_index = data.index.nlevels > 1 and all(name is not None for name in index_names)
+    if multi_index:
+        data = data.reset_index()
+    string_columns = [c for c in data if data[c].dtype == object and data[c].map(type).eq(str).all()]
+    data = data.astype({c: 'category' for c in string_columns})
+    return data.set_index(index_names) if multi_index else data
+
+
+def get_max_relative_error(original: pd.DataFrame, downcast: pd.DataFrame) -> float:
+    """Gets the largest relative difference between a table and its downcast copy."""
+    original = original.to_numpy(dtype=np.float64)
+    downcast = downcast.to_numpy(dtype=np.float64)
+    if not np.array_equal(np.isfinite(original), np.isfinite(downcast)):
+        return np.inf  # Overflow
+    finite = np.isfinite(original)
+    original, downcast = original[finite], downcast[finite]
+    nonzero = original != 0
+    if not nonzero.any():
+        return 0.
+    return float(np.max(np.abs(downcast[nonzero] - original[nonzero]) / np.abs(original[nonzero])))
+
+
+def get_key_sizes(artifact_path: Union[str, Path], keys: Iterable[str]) -> Dict[str, int]:
+    """Gets the compressed bytes on disk of each key in an artifact."""
+    sizes = {}
+    with tables.open_file(str(artifact_path), mode='r') as file:
+        for key in keys:
+            node = file.get_node(EntityKey(key).path)
+            leaves = [node] if isinstance(node, tables.Leaf) else file.walk_nodes(node, 'Leaf')
+            sizes[key] = sum(_get_leaf_size(leaf) for leaf in leaves)
+    return sizes
+
+
+def _get_leaf_size(leaf: tables.Leaf) -> int:
+    try:
+        return leaf.size_on_disk
+    except NotImplementedError:
+        # Variable length arrays (e.g. object columns of fixed format tables) only report their size in memory.
+        return leaf.size_in_memory
@@ -0,0 +1,357 @@
+"""Synthetic artifacts for running the model offline.
+
+A synthetic artifact holds every key the model specification loads,
+i.e. everything in ``globals.SYNTHETIC_ARTIFACT_KEY_GROUPS`` plus the
+location keys, with the shapes, index columns and metadata the loaders
+produce.  The values are made up but internally consistent: prevalence is
+the steady state of incidence, remission and excess mortality,
+cause-specific mortality is prevalence times excess mortality, all-cause
+mortality is a background rate plus every cause-specific rate and the
+population attributable fractions follow from the exposure and relative
+risks.  Each draw scales every cause's rates by its own random factor.
+
+The age bins, years, number of draws and the number of vitamin A
+deficiency exposure categories are configurable, so the model can be run
+and benchmarked at any population size without access to GBD data.
+
+.. admonition::
+
+   Logging in this module should be done at the ``debug`` level.
+
+"""
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Sequence, Tuple, Union
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+from vivarium.framework.artifact import Artifact
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.data.manifest import ArtifactManifest
+from vivarium_conic_vitamin_a_supp.data.storage import DEFAULT_PROFILE, StorageProfile, apply_profile
+
+DEMOGRAPHIC_COLUMNS = ['sex', 'age_start', 'age_end', 'year_start', 'year_end']
+SEXES = ('Male', 'Female')
+
+# The GBD 2017 age groups: (age_group_id, age_group_name, age_start, age_end).
+GBD_AGE_BINS = pd.DataFrame([
+    (2, 'Early Neonatal', 0., 0.01917808),
+    (3, 'Late Neonatal', 0.01917808, 0.07671233),
+    (4, 'Post Neonatal', 0.07671233, 1.),
+    (5, '1 to 4', 1., 5.),
+    (6, '5 to 9', 5., 10.),
+    (7, '10 to 14', 10., 15.),
+    (8, '15 to 19', 15., 20.),
+    (9, '20 to 24', 20., 25.),
+    (10, '25 to 29', 25., 30.),
+    (11, '30 to 34', 30., 35.),
+    (12, '35 to 39', 35., 40.),
+    (13, '40 to 44', 40., 45.),
+    (14, '45 to 49', 45., 50.),
+    (15, '50 to 54', 50., 55.),
+    (16, '55 to 59', 55., 60.),
+    (17, '60 to 64', 60., 65.),
+    (18, '65 to 69', 65., 70.),
+    (19, '70 to 74', 70., 75.),
+    (20, '75 to 79', 75., 80.),
+    (30, '80 to 84', 80., 85.),
+    (31, '85 to 89', 85., 90.),
+    (32, '90 to 94', 90., 95.),
+    (235, '95 plus', 95., 125.),
+], columns=['age_group_id', 'age_group_name', 'age_start', 'age_end'])
+
+
+class CauseProfile(NamedTuple):
+    """The under five rates a synthetic cause is built around."""
+    incidence_rate: float
+    excess_mortality_rate: float
+    disability_weight: float
+    # Per year.  Causes without remission have a fixed duration instead.
+    remission_rate: float = None
+    duration: float = None
+    birth_prevalence: float = None
+
+
+CAUSE_PROFILES = {
+    project_globals.DIARRHEA_MODEL_NAME: CauseProfile(incidence_rate=3., excess_mortality_rate=0.5,
+                                                      disability_weight=0.1, remission_rate=365 / 4.3),
+    project_globals.MEASLES_MODEL_NAME: CauseProfile(incidence_rate=0.02, excess_mortality_rate=3.,
+                                                     disability_weight=0.05, duration=10 / 365),
+    project_globals.LRI_MODEL_NAME: CauseProfile(incidence_rate=0.4, excess_mortality_rate=2.,
+                                                 disability_weight=0.05, remission_rate=365 / 7.8,
+                                                 birth_prevalence=0.002),
+}
+# Incidence at ages five and older relative to incidence under five.
+OLDER_INCIDENCE_SCALE = 0.25
+BACKGROUND_MORTALITY_RATE = 0.002
+VITAMIN_A_DEFICIENCY_PREVALENCE = 0.3
+VITAMIN_A_DEFICIENCY_RELATIVE_RISK = 1.5
+VITAMIN_A_DEFICIENCY_DISABILITY_WEIGHT = 0.01
+LACK_OF_VITAMIN_A_SUPPLEMENTATION_EXPOSURE = 0.45
+LACK_OF_VITAMIN_A_SUPPLEMENTATION_RELATIVE_RISK = 1.48
+
+
+class SyntheticArtifactSpec(NamedTuple):
+    """The shape of a synthetic artifact.
+
+    Attributes
+    ----------
+    draws
+        The number of draws of every table of draws.
+    years
+        The years covered by demographic data.  The population components
+        need at least two.
+    age_bins
+        The age groups covered by demographic data, with the columns of
+        ``population.age_bins``.
+    exposure_categories
+        The number of vitamin A deficiency exposure categories.  The last is
+        the unexposed category.  More than two makes the risk ordered
+        polytomous.
+    draw_spread
+        The standard deviation of the log of each draw's scale factor.
+    seed
+        The seed of the draw scale factors.
+
+    """
+    draws: int = 10
+    years: Tuple[int, ...] = tuple(range(2013, 2018))
+    age_bins: pd.DataFrame = GBD_AGE_BINS
+    exposure_categories: int = 2
+    draw_spread: float = 0.1
+    seed: int = 0
+
+
+def make_synthetic_data(location: str, spec: SyntheticArtifactSpec = SyntheticArtifactSpec()) -> Dict[str, Any]:
+    """Makes the data for every key of a synthetic artifact.
+
+    Parameters
+    ----------
+    location
+        The location to label the data with.
+    spec
+        The shape of the artifact.
+
+    Returns
+    -------
+        A mapping between entity keys and their data.
+
+    """
+    if spec.draws < 1:
+        raise ValueError(f'A synthetic artifact needs at least one draw. You specified {spec.draws}.')
+    if len(spec.years) < 2:
+        # The base population can't compute its demographic proportions from a single year of data.
+        raise ValueError(f'A synthetic artifact needs at least two years. You specified {spec.years}.')
+    if spec.exposure_categories < 2:
+        raise ValueError(f'A risk needs at least two exposure categories. '
+                         f'You specified {spec.exposure_categories}.')
+    random = np.random.default_rng(spec.seed)
+    demography = get_demographic_dimensions(spec)
+    age = demography['age_start'].to_numpy()
+    under_five = age < 5
+
+    # Tables are indexed by their demographic columns, as the artifact's draw filter expects.
+    data = {
+        project_globals.METADATA_LOCATIONS: [location],
+        project_globals.POPULATION_LOCATION: location,
+        project_globals.POPULATION.AGE_BINS: spec.age_bins.set_index(list(spec.age_bins)),
+        project_globals.POPULATION.DEMOGRAPHY: demography.set_index(DEMOGRAPHIC_COLUMNS),
+        project_globals.POPULATION.STRUCTURE: get_population_structure(demography),
+        project_globals.POPULATION.TMRLE: get_life_expectancy(spec.age_bins),
+        project_globals.POPULATION.COV_LBBS_ESTIMATE: get_live_births(demography),
+    }
+
+    csmr_total = np.zeros((len(demography), spec.draws))
+    exposure, relative_risk = get_vitamin_a_deficiency_exposure(spec)
+    for cause, profile in CAUSE_PROFILES.items():
+        scale = random.lognormal(0., spec.draw_spread, spec.draws)
+        incidence = profile.incidence_rate * np.where(under_five, 1., OLDER_INCIDENCE_SCALE)[:, None] * scale
+        emr = np.full_like(incidence, profile.excess_mortality_rate) * scale
+        if profile.remission_rate is not None:
+            remission = np.full_like(incidence, profile.remission_rate)
+            prevalence = incidence / (incidence + remission + emr)
+        else:
+            remission = None
+            prevalence = incidence * profile.duration
+        csmr = prevalence * emr
+        csmr_total += csmr
+
+        prefix = f'cause.{cause}'
+        data.update({
+            f'{prefix}.incidence_rate': to_draws(demography, incidence),
+            f'{prefix}.prevalence': to_draws(demography, prevalence),
+            f'{prefix}.excess_mortality_rate': to_draws(demography, emr),
+            f'{prefix}.cause_specific_mortality_rate': to_draws(demography, csmr),
+            f'{prefix}.disability_weight': to_draws(demography, np.full_like(incidence,
+                                                                              profile.disability_weight)),
+            f'{prefix}.restrictions': get_restrictions(spec.age_bins),
+        })
+        if remission is not None:
+            data[f'{prefix}.remission_rate'] = to_draws(demography, remission)
+        if profile.birth_prevalence is not None:
+            births = demography.loc[demography['age_start'] == demography['age_start'].min(),
+                                    ['sex', 'year_start', 'year_end']]
+            data[f'{prefix}.birth_prevalence'] = to_draws(births, np.full((len(births), spec.draws),
+                                                                          profile.birth_prevalence) * scale)
+
+    # High neonatal mortality falling off through childhood and rising again with old age.
+    acmr = BACKGROUND_MORTALITY_RATE + 0.9 / (1 + 30 * age) ** 2 + 1e-4 * np.exp(0.09 * age)
+    data[project_globals.POPULATION.ACMR] = to_draws(demography, acmr[:, None] + csmr_total)
+    data.update(get_vitamin_a_deficiency_data(demography, spec, exposure, relative_risk))
+    data.update(get_coverage_gap_data(demography, spec))
+    return data
+
+
+def write_synthetic_artifact(path: Union[str, Path], location: str,
+                             spec: SyntheticArtifactSpec = SyntheticArtifactSpec(),
+                             profile: StorageProfile = DEFAULT_PROFILE) -> Artifact:
+    """Writes a synthetic artifact and its manifest.
+
+    Parameters
+    ----------
+    path
+        The path of the artifact to write.  Any existing file is replaced.
+    location
+        The location to label the data with.
+    spec
+        The shape of the artifact.
+    profile
+        The storage profile to write the data with.
+
+    Returns
+    -------
+        The synthetic artifact.
+
+    """
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    artifact = Artifact(path)
+    for key, value in make_synthetic_data(location, spec).items():
+        logger.debug(f'Writing synthetic data for {key} to artifact.')
+        artifact.write(key, apply_profile(value, profile))
+    ArtifactManifest.build(path)
+    return artifact
+
+
+def get_demographic_dimensions(spec: SyntheticArtifactSpec) -> pd.DataFrame:
+    rows = [(sex, age_start, age_end, year, year + 1)
+            for sex in SEXES
+            for age_start, age_end in spec.age_bins[['age_start', 'age_end']].itertuples(index=False)
+            for year in spec.years]
+    return pd.DataFrame(rows, columns=DEMOGRAPHIC_COLUMNS)
+
+
+def get_population_structure(demography: pd.DataFrame) -> pd.DataFrame:
+    width = demography['age_end'] - demography['age_start']
+    structure = demography.assign(value=1e5 * width * np.exp(-0.03 * demography['age_start']))
+    return structure.set_index(DEMOGRAPHIC_COLUMNS)
+
+
+def get_life_expectancy(age_bins: pd.DataFrame) -> pd.DataFrame:
+    life_expectancy = age_bins[['age_start', 'age_end']].copy()
+    life_expectancy['value'] = np.maximum(1.5, 88. - 0.95 * life_expectancy['age_start'])
+    return life_expectancy.set_index(['age_start', 'age_end'])
+
+
+def get_live_births(demography: pd.DataFrame) -> pd.DataFrame:
+    population = get_population_structure(demography).groupby(['sex', 'year_start', 'year_end'])['value'].sum()
+    # A crude birth rate of 4%, as in the project's locations.
+    mean_value = 0.04 * population.groupby(['year_start', 'year_end']).transform('sum') / len(SEXES)
+    births = []
+    for parameter, scale in [('mean_value', 1.), ('lower_value', 0.9), ('upper_value', 1.1)]:
+        births.append((mean_value * scale).rename('value').reset_index().assign(parameter=parameter))
+    return pd.concat(births, ignore_index=True).set_index(['sex', 'year_start', 'year_end', 'parameter'])
+
+
+def get_restrictions(age_bins: pd.DataFrame) -> Dict[str, Any]:
+    age_group_ids = age_bins['age_group_id'].tolist()
+    return {
+        'yld_only': False,
+        'yll_only': False,
+        'violence': False,
+        'yll_age_group_id_start': age_group_ids[0],
+        'yll_age_group_id_end': age_group_ids[-1],
+        'yld_age_group_id_start': age_group_ids[0],
+        'yld_age_group_id_end': age_group_ids[-1],
+    }
+
+
+def get_vitamin_a_deficiency_exposure(spec: SyntheticArtifactSpec) -> Tuple[np.ndarray, np.ndarray]:
+    """Gets the exposure and relative risk of each vitamin A deficiency category."""
+    exposed = spec.exposure_categories - 1
+    exposure = np.append(np.full(exposed, VITAMIN_A_DEFICIENCY_PREVALENCE / exposed),
+                         1 - VITAMIN_A_DEFICIENCY_PREVALENCE)
+    # The most exposed category is the first, as in GBD.
+    relative_risk = np.append(np.linspace(VITAMIN_A_DEFICIENCY_RELATIVE_RISK, 1., exposed + 1)[:-1]
+                              if exposed > 1 else [VITAMIN_A_DEFICIENCY_RELATIVE_RISK], 1.)
+    return exposure, relative_risk
+
+
+def get_vitamin_a_deficiency_data(demography: pd.DataFrame, spec: SyntheticArtifactSpec,
+                                  exposure: np.ndarray, relative_risk: np.ndarray) -> Dict[str, Any]:
+    categories = [f'cat{i + 1}' for i in range(spec.exposure_categories)]
+    names = {category: f'exposed, level {i + 1}' for i, category in enumerate(categories[:-1])}
+    names[categories[-1]] = 'unexposed'
+    if spec.exposure_categories == 2:
+        names[categories[0]] = 'exposed'
+    affected = [project_globals.DIARRHEA_MODEL_NAME, project_globals.MEASLES_MODEL_NAME,
+                project_globals.LRI_MODEL_NAME]
+    paf = 1 - 1 / (exposure * relative_risk).sum()
+
+    keys = project_globals.VITAMIN_A_DEFICIENCY
+    return {
+        keys.VITAMIN_A_DEFICIENCY_CATEGORIES: names,
+        keys.VITAMIN_A_DEFICIENCY_DISTRIBUTION: 'dichotomous' if spec.exposure_categories == 2 else 'ordered_polytomous',
+        keys.VITAMIN_A_DEFICIENCY_RESTRICTIONS: get_restrictions(spec.age_bins),
+        keys.VITAMIN_A_DEFICIENCY_EXPOSURE: to_categorical_draws(demography, categories, exposure, spec.draws),
+        keys.VITAMIN_A_DEFICIENCY_RELATIVE_RISK: pd.concat([
+            to_categorical_draws(demography, categories, relative_risk, spec.draws, cause, 'incidence_rate')
+            for cause in affected
+        ]),
+        keys.VITAMIN_A_DEFICIENCY_PAF: pd.concat([
+            to_draws(demography.assign(affected_entity=cause, affected_measure='incidence_rate'),
+                     np.full((len(demography), spec.draws), paf))
+            for cause in affected
+        ]),
+        keys.VITAMIN_A_DEFICIENCY_DISABILITY_WEIGHT: to_draws(
+            demography, np.full((len(demography), spec.draws), VITAMIN_A_DEFICIENCY_DISABILITY_WEIGHT)
+        ),
+    }
+
+
+def get_coverage_gap_data(demography: pd.DataFrame, spec: SyntheticArtifactSpec) -> Dict[str, Any]:
+    categories = ['cat1', 'cat2']
+    exposure = np.array([LACK_OF_VITAMIN_A_SUPPLEMENTATION_EXPOSURE, 1 - LACK_OF_VITAMIN_A_SUPPLEMENTATION_EXPOSURE])
+    relative_risk = np.array([LACK_OF_VITAMIN_A_SUPPLEMENTATION_RELATIVE_RISK, 1.])
+    keys = project_globals.LACK_OF_VITAMIN_A_SUPPLEMENTATION
+    return {
+        keys.LACK_OF_VITAMIN_A_SUPPLEMENTATION_CATEGORIES: {'cat1': 'exposed', 'cat2': 'unexposed'},
+        keys.LACK_OF_VITAMIN_A_SUPPLEMENTATION_DISTRIBUTION: 'dichotomous',
+        keys.LACK_OF_VITAMIN_A_SUPPLEMENTATION_EXPOSURE: to_categorical_draws(demography, categories, exposure,
+                                                                             spec.draws),
+        keys.LACK_OF_VITAMIN_A_SUPPLEMENTATION_RELATIVE_RISK: to_categorical_draws(
+            demography, categories, relative_risk, spec.draws, project_globals.VITAMIN_A_MODEL_NAME,
+            'exposure_parameters'
+        ),
+    }
+
+
+def to_draws(index: pd.DataFrame, values: np.ndarray) -> pd.DataFrame:
+    """Makes a table of draws indexed by the columns of ``index``."""
+    values = np.asarray(values, dtype=float)
+    return pd.DataFrame(values, index=pd.MultiIndex.from_frame(index.reset_index(drop=True)),
+                        columns=[f'draw_{i}' for i in range(values.shape[1])])
+
+
+def to_categorical_draws(demography: pd.DataFrame, categories: Sequence[str], values: np.ndarray, draws: int,
+                         affected_entity: str = None, affected_measure: str = None) -> pd.DataFrame:
+    """Makes a table of draws with one row per demographic group and category."""
+    tables = []
+    for category, value in zip(categories, values):
+        index = demography.assign(parameter=category)
+        if affected_entity is not None:
+            index = index.assign(affected_entity=affected_entity, affected_measure=affected_measure)
+        tables.append(to_draws(index, np.full((len(index), draws), value)))
+    return pd.concat(tables)
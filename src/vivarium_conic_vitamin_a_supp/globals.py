@@ -1,5 +1,3 @@
-import itertools
-
 from typing import NamedTuple
 
 ####################
@@ -14,6 +12,11 @@ MAKE_ARTIFACT_MEM = '10G'
 MAKE_ARTIFACT_CPU = '1'
 MAKE_ARTIFACT_RUNTIME = '3:00:00'
 MAKE_ARTIFACT_SLEEP = 10
+MAKE_ARTIFACT_MAX_RETRIES = 2
+MAKE_ARTIFACT_RETRY_BACKOFF = 60  # Seconds
+MAKE_ARTIFACT_HISTORY_FILE = '.build_history.json'
+LOADER_CACHE_DIR_NAME = '.loader_cache'
+LOADER_CACHE_SIZE = 50  # GB
 
 LOCATIONS = [
     'Kenya',
@@ -27,6 +30,8 @@ LOCATIONS = [
 #############
 
 METADATA_LOCATIONS = 'metadata.locations'
+# Loaded by the population components, but not written by the artifact builder.
+POPULATION_LOCATION = 'population.location'
 
 
 class __Population(NamedTuple):
@@ -107,9 +112,46 @@ class __VITAMIN_A_DEFICIENCY(NamedTuple):
         return self.name.replace('_', ' ')
 
 
+class __LRI(NamedTuple):
+    LRI_CAUSE_SPECIFIC_MORTALITY_RATE: str = 'cause.lower_respiratory_infections.cause_specific_mortality_rate'
+    LRI_PREVALENCE: str = 'cause.lower_respiratory_infections.prevalence'
+    LRI_BIRTH_PREVALENCE: str = 'cause.lower_respiratory_infections.birth_prevalence'
+    LRI_INCIDENCE_RATE: str = 'cause.lower_respiratory_infections.incidence_rate'
+    LRI_REMISSION_RATE: str = 'cause.lower_respiratory_infections.remission_rate'
+    LRI_EXCESS_MORTALITY_RATE: str = 'cause.lower_respiratory_infections.excess_mortality_rate'
+    LRI_DISABILITY_WEIGHT: str = 'cause.lower_respiratory_infections.disability_weight'
+    LRI_RESTRICTIONS: str = 'cause.lower_respiratory_infections.restrictions'
+
+    @property
+    def name(self):
+        return 'lower_respiratory_infections'
+
+    @property
+    def log_name(self):
+        return 'lower respiratory infections'
+
+
+class __LACK_OF_VITAMIN_A_SUPPLEMENTATION(NamedTuple):
+    LACK_OF_VITAMIN_A_SUPPLEMENTATION_CATEGORIES: str = 'coverage_gap.lack_of_vitamin_a_supplementation.categories'
+    LACK_OF_VITAMIN_A_SUPPLEMENTATION_EXPOSURE: str = 'coverage_gap.lack_of_vitamin_a_supplementation.exposure'
+    LACK_OF_VITAMIN_A_SUPPLEMENTATION_RELATIVE_RISK: str = \
+        'coverage_gap.lack_of_vitamin_a_supplementation.relative_risk'
+    LACK_OF_VITAMIN_A_SUPPLEMENTATION_DISTRIBUTION: str = 'coverage_gap.lack_of_vitamin_a_supplementation.distribution'
+
+    @property
+    def name(self):
+        return 'lack_of_vitamin_a_supplementation'
+
+    @property
+    def log_name(self):
+        return self.name.replace('_', ' ')
+
+
 DIARRHEA = __DIARRHEA()
 MEASLES = __MEASLES()
 VITAMIN_A_DEFICIENCY = __VITAMIN_A_DEFICIENCY()
+LRI = __LRI()
+LACK_OF_VITAMIN_A_SUPPLEMENTATION = __LACK_OF_VITAMIN_A_SUPPLEMENTATION()
 
 
 MAKE_ARTIFACT_KEY_GROUPS = [
@@ -119,6 +161,12 @@ MAKE_ARTIFACT_KEY_GROUPS = [
     VITAMIN_A_DEFICIENCY
 ]
 
+# Synthetic artifacts also hold the keys of the model specification that the artifact builder doesn't pull.
+SYNTHETIC_ARTIFACT_KEY_GROUPS = MAKE_ARTIFACT_KEY_GROUPS + [
+    LRI,
+    LACK_OF_VITAMIN_A_SUPPLEMENTATION
+]
+
 
 ###########################
 # Disease Model variables #
@@ -222,10 +270,10 @@ COLUMN_TEMPLATES = {
 
 POP_STATES = ('living', 'dead', 'tracked', 'untracked')
 SEXES = ('male', 'female')
-# TODO - add literals for years in the model
-YEARS = ()
-# TODO - add literals for ages in the model
-AGE_GROUPS = ()
+# The model specification runs from 2017-01-01 to 2017-12-31.
+YEARS = (2017,)
+# The GBD age groups under the model's exit age of five, as the observers label them.
+AGE_GROUPS = ('early_neonatal', 'late_neonatal', 'post_neonatal', '1_to_4')
 
 CAUSES_OF_DEATH = (
     'other_causes',
@@ -261,8 +309,8 @@ DISEASE_MODEL_MAP = {
     }
 }
 
-STATES = (state for model in DISEASE_MODELS for state in DISEASE_MODEL_MAP[model]['states'])
-TRANSITIONS = (transition for model in DISEASE_MODELS for transition in DISEASE_MODEL_MAP[model]['transitions'])
+STATES = tuple(state for model in DISEASE_MODELS for state in DISEASE_MODEL_MAP[model]['states'])
+TRANSITIONS = tuple(transition for model in DISEASE_MODELS for transition in DISEASE_MODEL_MAP[model]['transitions'])
 
 TEMPLATE_FIELD_MAP = {
     'POP_STATE': POP_STATES,
@@ -277,19 +325,6 @@ TEMPLATE_FIELD_MAP = {
 
 
 def RESULT_COLUMNS(kind='all'):
-    if kind not in COLUMN_TEMPLATES and kind != 'all':
-        raise ValueError(f'Unknown result column type {kind}')
-    columns = []
-    if kind == 'all':
-        for k in COLUMN_TEMPLATES:
-            columns += RESULT_COLUMNS(k)
-        columns = list(STANDARD_COLUMNS.values()) + columns
-    else:
-        template = COLUMN_TEMPLATES[kind]
-        filtered_field_map = {field: values
-                              for field, values in TEMPLATE_FIELD_MAP.items() if f'{{{field}}}' in template}
-        fields, value_groups = filtered_field_map.keys(), itertools.product(*filtered_field_map.values())
-        for value_group in value_groups:
-            columns.append(template.format(**{field: value for field, value in zip(fields, value_group)}))
-    return columns
-
+    # Local import since the schema is compiled from the definitions above.
+    from vivarium_conic_vitamin_a_supp.results_processing.schema import RESULTS_SCHEMA
+    return RESULTS_SCHEMA.get_columns(kind)
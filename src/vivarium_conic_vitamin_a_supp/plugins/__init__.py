@@ -0,0 +1,3 @@
+from .artifact import ColumnarArtifactManager, DrawAwareArtifactManager
+from .clock import AdaptiveStepClock
+from .randomness import CounterBasedRandomnessManager
@@ -0,0 +1,159 @@
+"""
+=======================
+Draw-Aware Data Loading
+=======================
+
+This module contains a drop-in replacement for the ``vivarium``
+:class:`~vivarium.framework.artifact.manager.ArtifactManager` that reads
+draw-dimensioned keys from the per-draw artifact layout.
+
+Keys written by draw (see ``make_artifacts --draws-per-chunk``) are stored
+as an index table at ``{key}/index`` and one series per draw at
+``{key}/draw_{n}``.  For those keys a simulation only reads the index and
+the single draw it was configured with, rather than decoding every draw of
+the table and then selecting one column.  All other keys are loaded from the
+artifact as usual, so artifacts can mix both layouts.  If the artifact has
+an up to date manifest (see :mod:`vivarium_conic_vitamin_a_supp.data.manifest`),
+its keys and layout are read from the manifest and the HDF file is only
+opened to load data.
+
+It also contains a manager for artifacts in the memory-mapped columnar
+format (see :mod:`vivarium_conic_vitamin_a_supp.data.columnar`).
+
+Either manager is enabled by swapping in the ``data`` plugin in the model
+specification:
+
+.. code-block:: yaml
+
+   plugins:
+       required:
+           data:
+               controller: "vivarium_conic_vitamin_a_supp.plugins.DrawAwareArtifactManager"
+               builder_interface: "vivarium.framework.artifact.ArtifactInterface"
+
+"""
+from typing import Any, Iterable, Set, Union
+
+import pandas as pd
+import tables
+from loguru import logger
+from vivarium.config_tree import ConfigTree
+from vivarium.framework.artifact import Artifact, ArtifactException, EntityKey
+from vivarium.framework.artifact.manager import (ArtifactManager, filter_data, get_base_filter_terms,
+                                                 parse_artifact_path_config)
+
+from vivarium_conic_vitamin_a_supp.data.columnar import ColumnarArtifact
+from vivarium_conic_vitamin_a_supp.data.manifest import LazyArtifact
+from vivarium_conic_vitamin_a_supp.utilities import read_data_by_draw
+
+
+def get_keys_by_draw(artifact_path: str, keys: Iterable[str]) -> Set[str]:
+    """Finds the keys of an artifact stored in the per-draw layout.
+
+    Parameters
+    ----------
+    artifact_path
+        The artifact to inspect.
+    keys
+        The keys in the artifact keyspace.
+
+    Returns
+    -------
+        The entity keys whose data is stored by draw.
+
+    """
+    with tables.open_file(artifact_path, mode='r') as file:
+        return {key for key in keys if f'{EntityKey(key).path}/index' in file}
+
+
+def read_all_draws(artifact_path: str, key: str) -> pd.DataFrame:
+    """Reads every draw of a key from the per-draw layout.
+
+    Returns
+    -------
+        The index columns followed by one ``draw_{n}`` column per draw, in
+        draw order.
+
+    """
+    key = EntityKey(key)
+    with pd.HDFStore(artifact_path, mode='r') as store:
+        index = store.get(f'{key.path}/index')
+        draw_nodes = [n for n in store.get_node(key.path)._v_children if n.startswith('draw_')]
+        draw_nodes = sorted(draw_nodes, key=lambda n: int(n.split('_')[-1]))
+        draws = pd.DataFrame({n: store.get(f'{key.path}/{n}').values for n in draw_nodes}, index=index.index)
+    return pd.concat([index, draws], axis=1)
+
+
+class DrawAwareArtifactManager(ArtifactManager):
+    """An artifact manager that reads single draws from the per-draw layout."""
+
+    def __init__(self):
+        super().__init__()
+        self.draw = None
+        self.keys_by_draw = set()
+
+    @property
+    def name(self):
+        return 'draw_aware_artifact_manager'
+
+    def setup(self, builder):
+        super().setup(builder)
+        self.draw = builder.configuration.input_data.input_draw_number
+        if isinstance(self.artifact, LazyArtifact):
+            self.keys_by_draw = self.artifact.manifest.keys_by_draw
+        elif self.artifact is not None:
+            self.keys_by_draw = get_keys_by_draw(self.artifact.path, self.artifact.keys)
+
+    def _load_artifact(self, configuration: ConfigTree) -> Union[Artifact, LazyArtifact, None]:
+        if not configuration.input_data.artifact_path:
+            return None
+        artifact_path = parse_artifact_path_config(configuration)
+        try:
+            artifact = LazyArtifact(artifact_path, get_base_filter_terms(configuration))
+        except ArtifactException:
+            return super()._load_artifact(configuration)
+        logger.debug(f'Running simulation from artifact located at {artifact_path}, listed by its manifest.')
+        logger.debug(f'Artifact base filter terms are {artifact.filter_terms}.')
+        logger.debug(f'Artifact additional filter terms are {self.config_filter_term}.')
+        return artifact
+
+    def load(self, entity_key: str, **column_filters: Union[str, int]) -> Any:
+        if entity_key not in self.keys_by_draw:
+            return super().load(entity_key, **column_filters)
+
+        if self.draw is not None:
+            data = read_data_by_draw(self.artifact.path, entity_key, self.draw)
+        else:
+            data = read_all_draws(self.artifact.path, entity_key)
+            # Matches the base manager, which renames the first draw column.
+            first_draw = [c for c in data if 'draw' in c][0]
+            data = data.rename(columns={first_draw: 'value'})
+        return filter_data(data, self.config_filter_term, **column_filters)
+
+    def __repr__(self):
+        return "DrawAwareArtifactManager()"
+
+
+class ColumnarArtifactManager(ArtifactManager):
+    """An artifact manager for artifacts in the columnar format.
+
+    The configured ``input_data.artifact_path`` must point to a columnar
+    artifact directory.  Tables are memory mapped and only their index
+    columns and the configured input draw are read.
+
+    """
+
+    @property
+    def name(self):
+        return 'columnar_artifact_manager'
+
+    def _load_artifact(self, configuration: ConfigTree) -> Union[ColumnarArtifact, None]:
+        if not configuration.input_data.artifact_path:
+            return None
+        artifact_path = parse_artifact_path_config(configuration)
+        logger.debug(f'Running simulation from columnar artifact located at {artifact_path}.')
+        logger.debug(f'Artifact additional filter terms are {self.config_filter_term}.')
+        return ColumnarArtifact(artifact_path, configuration.input_data.input_draw_number)
+
+    def __repr__(self):
+        return "ColumnarArtifactManager()"
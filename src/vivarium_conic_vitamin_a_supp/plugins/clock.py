@@ -0,0 +1,206 @@
+"""
+=========================
+Adaptive Simulation Clock
+=========================
+
+This module contains a drop-in replacement for the ``vivarium``
+:class:`~vivarium.framework.time.DateTimeClock` that chooses the length of
+each time step from the current hazards in the simulation rather than using
+a fixed daily step.
+
+The clock is enabled by swapping it in as the ``clock`` plugin in the model
+specification:
+
+.. code-block:: yaml
+
+   plugins:
+       required:
+           clock:
+               controller: "vivarium_conic_vitamin_a_supp.plugins.AdaptiveStepClock"
+               builder_interface: "vivarium.framework.time.TimeInterface"
+
+"""
+import numpy as np
+import pandas as pd
+
+from vivarium.framework.time import DateTimeClock
+from vivarium_public_health.utilities import DAYS_PER_YEAR
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.utilities import chunk_index, get_chunk_size
+
+
+RATE_PIPELINES = [
+    f'{project_globals.DIARRHEA_WITH_CONDITION_STATE_NAME}.incidence_rate',
+    f'{project_globals.MEASLES_WITH_CONDITION_STATE_NAME}.incidence_rate',
+    f'{project_globals.LRI_WITH_CONDITION_STATE_NAME}.incidence_rate',
+    'mortality_rate',
+]
+REMISSION_RATE_PIPELINES = [
+    f'{project_globals.DIARRHEA_WITH_CONDITION_STATE_NAME}.remission_rate',
+    f'{project_globals.LRI_WITH_CONDITION_STATE_NAME}.remission_rate',
+]
+
+
+class AdaptiveStepClock(DateTimeClock):
+    """A date-time clock with a hazard-driven step size.
+
+    At the end of every time step the clock evaluates the annual rates in
+    the configured rate pipelines over the tracked, living simulants at risk
+    of each event and picks the longest whole-day step for which the
+    largest per-simulant event probability, ``1 - exp(-rate * dt)``, stays
+    below ``max_event_probability``.  A ``{state}.incidence_rate`` pipeline
+    is evaluated only over simulants in ``susceptible_to_{state}`` and a
+    ``{state}.remission_rate`` pipeline only over simulants in ``state``,
+    read from the disease model column of the same name.  Like the model's
+    components, the pipelines are evaluated one ``population.chunk_size``
+    slice of simulants at a time.  Rate pipelines in ``vivarium`` are rescaled
+    to the current step size before they are converted to probabilities, so
+    every transition and every piece of step-size dependent accounting
+    (ageing, person time, supplemented days) follows the actual step length.
+
+    Steps never cross a calendar year boundary so that the yearly
+    intervention schedule and the ``by_year`` metrics stay aligned with the
+    daily-step model, and they are bounded above by ``max_step_size``, which
+    should not exceed the shortest fixed disease duration in the model
+    (e.g. the 10 day measles duration).
+
+    The default ``rate_pipelines`` leave out the diarrhea and LRI remission
+    rates (``REMISSION_RATE_PIPELINES``).  Episodes last about five days, so
+    with remission rates included any ``max_event_probability`` low enough to
+    be useful keeps steps at ``min_step_size`` whenever any simulant is
+    infected, which in a population of any size is always.  Without them,
+    steps are bounded by diarrhea incidence, the largest of the remaining
+    rates, and the default ``max_event_probability`` gives steps of about
+    three days.  Remission is then only checked once per step, which
+    lengthens episodes; add the remission pipelines back to keep daily steps
+    during episodes.  ``benchmark_scaling --compare-clocks DAYS`` measures
+    both the speedup and the cost in accuracy against the daily-step model.
+
+    """
+
+    configuration_defaults = {
+        'time': {
+            'start': {
+                'year': 2005,
+                'month': 7,
+                'day': 2
+            },
+            'end': {
+                'year': 2010,
+                'month': 7,
+                'day': 2,
+            },
+            'step_size': 1,  # Days
+            'adaptive_step_size': {
+                'min_step_size': 1,  # Days
+                'max_step_size': 10,  # Days
+                'max_event_probability': 0.05,
+                'rate_pipelines': RATE_PIPELINES,
+            }
+        }
+    }
+
+    def __init__(self):
+        super().__init__()
+        self._next_step_size = None
+
+    @property
+    def name(self):
+        return "adaptive_step_clock"
+
+    def setup(self, builder):
+        super().setup(builder)
+        config = builder.configuration.time.adaptive_step_size
+        self.min_step_size = pd.Timedelta(days=config.min_step_size)
+        self.max_step_size = pd.Timedelta(days=config.max_step_size)
+        self.max_event_probability = config.max_event_probability
+        self.rates = {pipeline: builder.value.get_value(pipeline) for pipeline in config.rate_pipelines}
+        self.population = builder.population
+        self.chunk_size = get_chunk_size(builder.configuration)
+
+        builder.event.register_listener('post_setup', self.on_post_setup)
+        builder.event.register_listener('collect_metrics', self.on_collect_metrics, priority=9)
+
+    def on_post_setup(self, event):
+        # The clock is set up before the population manager, so views can only be made now.
+        self.population_view = self.population.get_view([], query="tracked == True and alive == 'alive'")
+
+    def on_collect_metrics(self, event):
+        max_rate = 0.
+        for chunk in chunk_index(event.index, self.chunk_size):
+            population = self.population_view.get(chunk)
+            max_rate = max([max_rate] + [self.get_max_rate(rate, get_at_risk_index(name, population))
+                                         for name, rate in self.rates.items()])
+        next_step_start = self.time + self.step_size
+        self._next_step_size = self.get_step_size(max_rate, next_step_start)
+
+    def step_forward(self):
+        super().step_forward()
+        if self._next_step_size is not None:
+            self._step_size, self._next_step_size = self._next_step_size, None
+
+    @staticmethod
+    def get_max_rate(rate, index: pd.Index) -> float:
+        """Gets the largest annual rate a pipeline produces for the population."""
+        if rate.source is None or index.empty:
+            # Pipelines can be named in the configuration without being
+            # produced by any component in this particular model.
+            return 0.
+        value = rate(index, skip_post_processor=True)
+        if isinstance(value, pd.DataFrame):  # e.g. cause-specific mortality rates
+            value = value.sum(axis=1)
+        return float(np.max(value))
+
+    def get_step_size(self, max_rate: float, step_start: pd.Timestamp) -> pd.Timedelta:
+        """Chooses the size of the step beginning at ``step_start``.
+
+        Parameters
+        ----------
+        max_rate
+            The largest annual event rate any simulant is currently exposed to.
+        step_start
+            The time at which the step begins.
+
+        Returns
+        -------
+            The length of the step, in whole days.
+
+        """
+        if max_rate > 0:
+            step_in_years = -np.log(1 - self.max_event_probability) / max_rate
+            step_size = pd.Timedelta(days=int(step_in_years * DAYS_PER_YEAR))
+        else:
+            step_size = self.max_step_size
+        step_size = min(max(step_size, self.min_step_size), self.max_step_size)
+
+        next_boundary = min(pd.Timestamp(year=step_start.year + 1, month=1, day=1), self.stop_time)
+        if step_start < next_boundary:
+            step_size = min(step_size, next_boundary - step_start)
+        return step_size
+
+    def __repr__(self):
+        return "AdaptiveStepClock()"
+
+
+def get_at_risk_index(pipeline: str, population: pd.DataFrame) -> pd.Index:
+    """Gets the simulants a rate pipeline applies to.
+
+    Parameters
+    ----------
+    pipeline
+        The name of the rate pipeline.
+    population
+        The tracked, living simulants and their state table columns.
+
+    Returns
+    -------
+        The simulants in the source state of the pipeline's transition, or
+        every simulant for rates that aren't transitions of a disease model.
+
+    """
+    state, _, rate = pipeline.rpartition('.')
+    source_states = {'incidence_rate': f'susceptible_to_{state}', 'remission_rate': state}
+    if rate not in source_states or state not in population:
+        return population.index
+    return population.index[population[state] == source_states[rate]]
@@ -0,0 +1,350 @@
+"""
+============================
+Counter-Based Random Numbers
+============================
+
+This module contains an alternative backend for the ``vivarium`` common
+random number system built on the counter-based Philox generator from
+:mod:`numpy`.
+
+The default ``vivarium`` streams hash the configured key columns of every
+simulant through an index map and then sample a full ``map_size`` array of
+uniforms for every draw.  Here every uniform is instead a pure function of
+(seed, stream name, simulation time, simulant id): the first three make up
+the Philox key and the simulant id is the position in the counter sequence.
+Draws are therefore reproducible between branches of a comparison for the
+same simulant at the same time, independent of the order in which decisions
+are made, and there is no hash map to size.
+
+Simulants are identified by their position in the state table, so this
+backend assumes that the simulants created in the branches being compared
+line up one to one, as they do for this model.
+
+The backend also provides two opt-in variance reduction techniques, set in
+the ``randomness.variance_reduction`` configuration block:
+
+``antithetic``
+    Random seeds are paired (0 and 1, 2 and 3, ...).  Both members of a pair
+    share the same underlying uniforms, the even seed uses ``u`` and the odd
+    seed uses ``1 - u``.  Results from a pair must be averaged before they
+    are treated as a replicate.  The adaptive local runner does this when
+    the model specification enables antithetic randomness, and
+    ``process_results --antithetic`` and
+    :class:`~vivarium_conic_vitamin_a_supp.results_processing.ResultsAggregator`
+    with ``antithetic=True`` do it when summarizing a grid.
+``stratified_initialization``
+    Draws from propensity streams used to initialize simulants (streams
+    whose name contains ``initial``, e.g. the risk exposure propensities and
+    the initial disease states) are stratified over each cohort of
+    simulants created together: each of the ``n`` simulants of a cohort
+    falls in a distinct one of ``n`` equal width strata of the unit
+    interval.  A simulant's stratum depends only on its position in the
+    cohort, so draws don't change when a cohort is drawn in chunks (see
+    ``population.chunk_size``).  Draws spanning simulants of several
+    cohorts, or from streams outside a simulation, are stratified over the
+    simulants drawn together.
+
+The backend is enabled by swapping in the ``randomness`` plugin in the model
+specification:
+
+.. code-block:: yaml
+
+   plugins:
+       required:
+           randomness:
+               controller: "vivarium_conic_vitamin_a_supp.plugins.CounterBasedRandomnessManager"
+               builder_interface: "vivarium.framework.randomness.RandomnessInterface"
+
+"""
+import hashlib
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from vivarium.framework.randomness import (RandomnessManager, RandomnessStream, RandomnessError,
+                                           Array, Index, _normalize_shape, _set_residual_probability)
+from vivarium.framework.utilities import rate_to_probability
+
+
+PHILOX_BUFFER_SIZE = 4  # 64 bit outputs per Philox counter increment.
+UINT64_MODULUS = 2**64
+INITIALIZATION_STREAM_MARKER = 'initial'
+
+
+def get_philox_key(key: str, time: Any) -> int:
+    """Builds a 128 bit Philox key from a stream key and a simulation time.
+
+    Parameters
+    ----------
+    key
+        A string identifying the seed, the stream and any additional key.
+    time
+        The current simulation time.
+
+    Returns
+    -------
+        An integer with the hashed stream key in the high 64 bits and the
+        simulation time in the low 64 bits.
+
+    """
+    stream_hash = int(hashlib.sha256(key.encode('utf8')).hexdigest(), 16) % UINT64_MODULUS
+    time_value = pd.Timestamp(time).value if not isinstance(time, (int, float, np.number)) else int(time)
+    return (stream_hash << 64) | (time_value % UINT64_MODULUS)
+
+
+def random(philox_key: int, index: Index) -> pd.Series:
+    """Produces uniform random numbers for the simulant ids in an index.
+
+    Only the counter range spanned by the index is generated.
+
+    Parameters
+    ----------
+    philox_key
+        The 128 bit Philox key for this draw.
+    index
+        An integer index of simulant ids.
+
+    Returns
+    -------
+    pandas.Series
+        A series of random numbers indexed by the provided index.
+
+    """
+    if len(index) == 0:
+        return pd.Series(index=index, dtype=float)
+    if not pd.api.types.is_integer_dtype(index):
+        raise RandomnessError('Counter based randomness requires an integer simulant index.')
+
+    ids = index.values
+    first, last = ids.min(), ids.max()
+    if first < 0:
+        raise RandomnessError('Simulant ids must be greater than or equal to zero.')
+
+    bit_generator = np.random.Philox(key=philox_key)
+    start = first - first % PHILOX_BUFFER_SIZE
+    bit_generator.advance(start // PHILOX_BUFFER_SIZE)
+    raw_draws = np.random.Generator(bit_generator).random(last - start + 1)
+    return pd.Series(raw_draws[ids - start], index=index)
+
+
+def stratify(draw: pd.Series, strata_key: int) -> pd.Series:
+    """Spreads a set of uniform draws over equal width strata.
+
+    Each of the ``n`` draws is assigned to a distinct stratum
+    ``[k / n, (k + 1) / n)`` by a random permutation and keeps its relative
+    position within the stratum.
+
+    Parameters
+    ----------
+    draw
+        Uniform random numbers indexed by simulant.
+    strata_key
+        The 128 bit Philox key used to permute the strata.
+
+    Returns
+    -------
+    pandas.Series
+        Stratified uniform random numbers with the same index as ``draw``.
+
+    """
+    if draw.empty:
+        return draw
+    return stratify_cohort(draw, strata_key, pd.RangeIndex(len(draw)), len(draw))
+
+
+def stratify_cohort(draw: pd.Series, strata_key: int, positions: np.ndarray, cohort_size: int) -> pd.Series:
+    """Spreads uniform draws for simulants of a cohort over the cohort's strata.
+
+    The strata of the whole cohort are permuted, so a simulant's stratum
+    depends only on its position in the cohort and not on which other
+    simulants are drawn with it.
+
+    Parameters
+    ----------
+    draw
+        Uniform random numbers indexed by simulant.
+    strata_key
+        The 128 bit Philox key used to permute the strata.
+    positions
+        The position of each simulant in its cohort.
+    cohort_size
+        The number of simulants in the cohort.
+
+    Returns
+    -------
+    pandas.Series
+        Stratified uniform random numbers with the same index as ``draw``.
+
+    """
+    strata = np.argsort(random(strata_key, pd.RangeIndex(cohort_size)).values)
+    return pd.Series((strata[np.asarray(positions)] + draw.values) / cohort_size, index=draw.index)
+
+
+class CounterBasedRandomnessStream(RandomnessStream):
+    """A randomness stream backed by the Philox counter-based generator.
+
+    This exposes the same interface as
+    :class:`vivarium.framework.randomness.RandomnessStream`.
+
+    Attributes
+    ----------
+    antithetic
+        Whether this stream produces the antithetic (``1 - u``) member of a
+        pair of draws.
+    stratified
+        Whether draws from this stream are stratified over the cohort of the
+        simulants drawn, or over the simulants drawn together if they don't
+        belong to a single cohort known to the manager.
+
+    """
+
+    def __init__(self, key: str, clock: Callable, seed: Any, manager: 'RandomnessManager' = None,
+                 for_initialization: bool = False, antithetic: bool = False, stratified: bool = False):
+        super().__init__(key, clock, seed, manager=manager, for_initialization=for_initialization)
+        self.antithetic = antithetic
+        self.stratified = stratified
+
+    def copy_with_additional_key(self, key: Any) -> 'CounterBasedRandomnessStream':
+        copy_key = '_'.join([self.key, key])
+        if self._for_initialization:
+            raise RandomnessError('Initialization streams cannot be copied.')
+        elif self._manager:
+            return self._manager.get_randomness_stream(copy_key)
+        else:
+            return CounterBasedRandomnessStream(copy_key, self.clock, self.seed,
+                                                antithetic=self.antithetic, stratified=self.stratified)
+
+    def _philox_key(self, additional_key: Any = None) -> int:
+        return get_philox_key('_'.join([self.key, str(additional_key), str(self.seed)]), self.clock())
+
+    def _random(self, index: Index, additional_key: Any = None) -> pd.Series:
+        if self._for_initialization:
+            # Key columns are still being generated, so simulants are
+            # identified by their position in the new cohort.
+            draw = random(self._philox_key(additional_key), pd.RangeIndex(len(index)))
+            draw.index = index
+        else:
+            draw = random(self._philox_key(additional_key), index)
+
+        if self.stratified:
+            strata_key = self._philox_key(f'{additional_key}_strata')
+            cohort = self._manager.get_cohort(index) if self._manager is not None else None
+            if cohort is None:
+                draw = stratify(draw, strata_key)
+            elif not draw.empty:
+                start, size = cohort
+                draw = stratify_cohort(draw, strata_key, draw.index.values - start, size)
+        if self.antithetic:
+            draw = 1 - draw
+        return draw
+
+    def get_draw(self, index: Index, additional_key: Any = None) -> pd.Series:
+        return self._random(index, additional_key)
+
+    def filter_for_rate(self, population: Union[pd.DataFrame, pd.Series, Index],
+                        rate: Array, additional_key: Any = None) -> Union[pd.DataFrame, pd.Series, Index]:
+        return self.filter_for_probability(population, rate_to_probability(rate), additional_key)
+
+    def filter_for_probability(self, population: Union[pd.DataFrame, pd.Series, Index],
+                               probability: Array, additional_key: Any = None) -> Union[pd.DataFrame, pd.Series, Index]:
+        if population.empty:
+            return population
+
+        index = population if isinstance(population, pd.Index) else population.index
+        draw = self._random(index, additional_key)
+        mask = np.array(draw < probability)
+        return population[mask]
+
+    def choice(self, index: Index, choices: Array, p: Array = None, additional_key: Any = None) -> pd.Series:
+        p = _set_residual_probability(_normalize_shape(p, index)) if p is not None else np.ones((len(index), len(choices)))
+        p = p / p.sum(axis=1, keepdims=True)
+
+        draw = self._random(index, additional_key)
+
+        p_bins = np.cumsum(p, axis=1)
+        choice_index = (draw.values[np.newaxis].T > p_bins).sum(axis=1)
+
+        return pd.Series(np.array(choices)[choice_index], index=index)
+
+    def __repr__(self) -> str:
+        return "CounterBasedRandomnessStream(key={!r}, clock={!r}, seed={!r})".format(self.key, self.clock(),
+                                                                                       self.seed)
+
+
+class CounterBasedRandomnessManager(RandomnessManager):
+    """Access point for counter-based common random number generation.
+
+    Simulants still have to be registered, which validates that the
+    configured ``randomness.key_columns`` exist, but no index map is built.
+
+    """
+
+    configuration_defaults = {
+        'randomness': {
+            **RandomnessManager.configuration_defaults['randomness'],
+            'variance_reduction': {
+                'antithetic': False,
+                'stratified_initialization': False,
+            },
+        }
+    }
+
+    def __init__(self):
+        super().__init__()
+        self._antithetic = False
+        self._stratified_initialization = False
+        # The first simulant id and size of every cohort of simulants created together.
+        self._cohorts: List[Tuple[int, int]] = []
+
+    @property
+    def name(self):
+        return "counter_based_randomness_manager"
+
+    def setup(self, builder):
+        super().setup(builder)
+        config = builder.configuration.randomness
+        self._stratified_initialization = config.variance_reduction.stratified_initialization
+        if config.variance_reduction.antithetic:
+            # Both members of a seed pair share their random numbers.
+            pair, member = divmod(int(config.random_seed), 2)
+            self._seed = str(pair)
+            if config.additional_seed is not None:
+                self._seed += str(config.additional_seed)
+            self._antithetic = bool(member)
+
+    def _get_randomness_stream(self, decision_point: str,
+                               for_initialization: bool = False) -> CounterBasedRandomnessStream:
+        if decision_point in self._decision_points:
+            raise RandomnessError(f"Two separate places are attempting to create "
+                                  f"the same randomness stream for {decision_point}")
+        stratified = self._stratified_initialization and INITIALIZATION_STREAM_MARKER in decision_point
+        stream = CounterBasedRandomnessStream(key=decision_point, clock=self._clock, seed=self._seed,
+                                              manager=self, for_initialization=for_initialization,
+                                              antithetic=self._antithetic, stratified=stratified)
+        self._decision_points[decision_point] = stream
+        return stream
+
+    def register_simulants(self, simulants: pd.DataFrame):
+        if not all(k in simulants.columns for k in self._key_columns):
+            raise RandomnessError("The simulants dataframe does not have all specified key_columns.")
+        index = simulants.index
+        if self._stratified_initialization and not index.empty and index.max() - index.min() + 1 == len(index):
+            self._cohorts.append((int(index.min()), len(index)))
+
+    def get_cohort(self, index: Index) -> Optional[Tuple[int, int]]:
+        """Gets the first simulant id and size of the cohort all simulants in an index belong to, if any."""
+        if len(index) == 0:
+            return None
+        first, last = index.min(), index.max()
+        for start, size in reversed(self._cohorts):
+            if start <= first and last < start + size:
+                return start, size
+        return None
+
+    def __str__(self):
+        return "CounterBasedRandomnessManager()"
+
+    def __repr__(self) -> str:
+        return (f"CounterBasedRandomnessManager(seed={self._seed}, key_columns={self._key_columns}, "
+                f"antithetic={self._antithetic})")
@@ -0,0 +1,5 @@
+from .statistics import DrawSummary, ExactQuantiles, QuantileSketch, RunningMoments
+from .aggregation import ResultsAggregator, aggregate_job_outputs
+from .schema import RESULTS_SCHEMA, ResultsSchema
+from .incremental import ResultsLedger, process_outputs
+from .timing import read_timings, summarize_timings
@@ -0,0 +1,529 @@
+"""Streaming aggregation of simulation outputs.
+
+Each simulation job reports a wide set of metrics whose names are built from
+``globals.COLUMN_TEMPLATES``, e.g.
+``death_due_to_measles_in_2017_among_female_in_age_group_1_to_4``.  The
+:class:`ResultsAggregator` reads job outputs one at a time, parses every
+metric name into a :class:`Stratum` (measure, cause, year, sex, age group)
+once per distinct set of output columns, and keeps running sums and job
+counts per (scenario, input draw).  Its memory use grows with the number of
+strata and (scenario, draw) pairs, not with the number of jobs.
+
+For grids run with antithetic randomness (see
+:mod:`vivarium_conic_vitamin_a_supp.plugins.randomness`) the aggregator
+averages the two members of each random seed pair into a single replicate
+as soon as both have been added, so seed-level statistics count pairs
+rather than negatively correlated seeds.
+
+Metrics the project's observers write as long format records (see
+:mod:`vivarium_conic_vitamin_a_supp.results_processing.long_format`) rather
+than in the wide outputs are added with :meth:`ResultsAggregator.add_records`.
+They are held until the wide output of their job is added and are then
+summed along with it.
+
+"""
+import json
+from pathlib import Path
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.results_processing.schema import RESULTS_SCHEMA
+from vivarium_conic_vitamin_a_supp.results_processing.statistics import DrawSummary
+from vivarium_conic_vitamin_a_supp.results_processing.variance_reduction import get_antithetic_pair
+
+GROUP_COLUMNS = [project_globals.OUTPUT_SCENARIO_COLUMN, project_globals.INPUT_DRAW_COLUMN]
+# Template fields that name what a measure is about.
+CAUSE_FIELDS = ('CAUSE_OF_DEATH', 'CAUSE_OF_DISABILITY', 'STATE', 'TRANSITION', 'POP_STATE')
+
+
+class Stratum(NamedTuple):
+    """What a single metric measures.
+
+    For state person time and transition counts, ``cause`` holds the state
+    or transition, and for population counts the population state.  Fields
+    that don't appear in a metric's template are ``None``.
+
+    """
+    measure: str
+    cause: Optional[str]
+    year: Optional[int]
+    sex: Optional[str]
+    age_group: Optional[str]
+
+
+STRATUM_COLUMNS = list(Stratum._fields)
+
+
+def _compile_template(template: str) -> 're.Pattern':
+    field_patterns = {'YEAR': r'\d+', 'SEX': '|'.join(project_globals.SEXES)}
+    parts = re.split(r'{(\w+)}', template)
+    # Literal text and field names alternate.
+    pattern = ''.join(re.escape(part) if i % 2 == 0 else f'(?P<{part}>{field_patterns.get(part, ".+?")})'
+                      for i, part in enumerate(parts))
+    return re.compile(pattern)
+
+
+TEMPLATE_PATTERNS = {kind: _compile_template(template) for kind, template in project_globals.COLUMN_TEMPLATES.items()}
+
+
+def parse_column(column: str) -> Optional[Stratum]:
+    """Parses a metric name into the stratum it measures.
+
+    Columns in the compiled results schema are looked up directly.  Others,
+    e.g. from models with states the globals don't list, are matched against
+    the column templates.
+
+    Returns
+    -------
+        The stratum, or ``None`` if the column isn't a metric (e.g. the
+        scenario, input draw or random seed columns).
+
+    """
+    if column in RESULTS_SCHEMA:
+        fields = RESULTS_SCHEMA.get_fields(column)
+        return _to_stratum(fields.pop('kind'), fields)
+    for kind, pattern in TEMPLATE_PATTERNS.items():
+        match = pattern.fullmatch(column)
+        if match:
+            return _to_stratum(kind, match.groupdict())
+    return None
+
+
+def _to_stratum(kind: str, fields: Dict[str, Any]) -> Stratum:
+    if kind in project_globals.STANDARD_COLUMNS:
+        # Standard columns are measured by their own name.
+        kind = project_globals.STANDARD_COLUMNS[kind]
+    return Stratum(
+        measure=kind,
+        cause=next((fields[f] for f in CAUSE_FIELDS if f in fields), None),
+        year=int(fields['YEAR']) if 'YEAR' in fields else None,
+        sex=fields.get('SEX'),
+        age_group=fields.get('AGE_GROUP'),
+    )
+
+
+class ResultsAggregator:
+    """Running sums of simulation metrics per (scenario, input draw).
+
+    A metric missing from a job's output counts as zero for that job.
+
+    Parameters
+    ----------
+    antithetic
+        Whether the jobs were run with antithetic randomness.  If so, each
+        job is held until the other member of its random seed pair is added
+        and the pair is then summed as the average of the two jobs.  Jobs
+        whose partner hasn't been added are left out of every summary.
+        Long format records are held in the same way until their job's
+        wide output is added.
+
+    """
+
+    def __init__(self, antithetic: bool = False):
+        self.antithetic = antithetic
+        self._strata: Dict[Stratum, int] = {}
+        self._schemas: Dict[Tuple[str, ...], Tuple[List[str], np.ndarray]] = {}
+        self._sums: Dict[Tuple[str, int], np.ndarray] = {}
+        self._counts: Dict[Tuple[str, int], int] = {}
+        # Maps (scenario, input draw, antithetic pair) to the random seed and metrics of a job awaiting its partner.
+        self._unpaired: Dict[Tuple[str, int, int], Tuple[int, np.ndarray]] = {}
+        # Maps (scenario, input draw, random seed) to the long format records of a job awaiting its wide output.
+        self._records: Dict[Tuple[str, int, int], np.ndarray] = {}
+
+    @property
+    def jobs(self) -> int:
+        """The number of job outputs added."""
+        return sum(self._counts.values()) * (2 if self.antithetic else 1) + len(self._unpaired)
+
+    @property
+    def replicates(self) -> int:
+        """The number of replicates summed, i.e. jobs or complete antithetic pairs."""
+        return sum(self._counts.values())
+
+    @property
+    def unpaired_jobs(self) -> int:
+        """The number of antithetic jobs still waiting for their partner."""
+        return len(self._unpaired)
+
+    @property
+    def held_records(self) -> int:
+        """The number of jobs whose long format records await their wide output."""
+        return len(self._records)
+
+    @property
+    def strata(self) -> List[Stratum]:
+        return list(self._strata)
+
+    @property
+    def groups(self) -> List[Tuple[str, int]]:
+        """The (scenario, input draw) pairs seen so far."""
+        return list(self._sums)
+
+    def add(self, metrics: Dict[str, Any]):
+        """Adds the output of a single job.
+
+        Parameters
+        ----------
+        metrics
+            The job's metrics, along with its scenario and input draw.
+
+        """
+        columns, positions = self._get_schema(tuple(metrics))
+        values = np.fromiter((metrics[c] for c in columns), dtype=float, count=len(columns))
+        group = (metrics[project_globals.OUTPUT_SCENARIO_COLUMN], int(metrics[project_globals.INPUT_DRAW_COLUMN]))
+        seed = metrics.get(project_globals.RANDOM_SEED_COLUMN)
+        if self.antithetic:
+            self._add_pair_member(group, int(seed), positions, values)
+            return
+        self._accumulate(group, positions, values, 1)
+        if seed is not None:
+            self._add_held_records(group, int(seed))
+
+    def add_frame(self, data: pd.DataFrame):
+        """Adds the outputs of many jobs, one per row of a wide table."""
+        columns, positions = self._get_schema(tuple(data.columns))
+        if self.antithetic:
+            groups = zip(data[project_globals.OUTPUT_SCENARIO_COLUMN], data[project_globals.INPUT_DRAW_COLUMN],
+                         data[project_globals.RANDOM_SEED_COLUMN])
+            for (scenario, draw, seed), values in zip(groups, data[columns].astype(float).to_numpy()):
+                self._add_pair_member((scenario, int(draw)), int(seed), positions, values)
+            return
+        grouped = data[columns].astype(float).groupby([data[c] for c in GROUP_COLUMNS])
+        sums, counts = grouped.sum(), grouped.size()
+        for (scenario, draw), values in zip(sums.index, sums.to_numpy()):
+            self._accumulate((scenario, int(draw)), positions, values, int(counts[(scenario, draw)]))
+        if self._records and project_globals.RANDOM_SEED_COLUMN in data:
+            jobs = data[GROUP_COLUMNS + [project_globals.RANDOM_SEED_COLUMN]].itertuples(index=False)
+            for scenario, draw, seed in jobs:
+                self._add_held_records((scenario, int(draw)), int(seed))
+
+    def add_records(self, data: pd.DataFrame):
+        """Adds the long format records of many jobs.
+
+        Records hold metrics that are missing from the jobs' wide outputs.
+        Each job's records are held until its wide output is added, and are
+        then summed as part of that output (so with antithetic randomness
+        they only count once the job's random seed pair is complete).  The
+        records of a job must be added before its wide output.
+
+        Parameters
+        ----------
+        data
+            Decoded records with their partition columns, as read by
+            :func:`~vivarium_conic_vitamin_a_supp.results_processing.long_format.read_dataset`.
+
+        """
+        positions = self._get_positions(data[STRATUM_COLUMNS])
+        values = data['value'].to_numpy(dtype=float)
+        group_columns = GROUP_COLUMNS + [project_globals.RANDOM_SEED_COLUMN]
+        for (scenario, draw, seed), rows in data.groupby(group_columns, sort=False, observed=True).indices.items():
+            self._hold_records((scenario, int(draw), int(seed)), positions[rows], values[rows])
+
+    def merge(self, other: 'ResultsAggregator'):
+        """Adds all the job outputs summarized by another aggregator."""
+        if other.antithetic != self.antithetic:
+            raise ValueError('Aggregators of antithetic and independent random seeds cannot be merged.')
+        positions = np.array([self._get_position(stratum) for stratum in other._strata], dtype=int)
+        for group, sums in other._sums.items():
+            self._accumulate(group, positions[:len(sums)], sums, other._counts[group])
+        for key, values in other._records.items():
+            self._hold_records(key, positions[:len(values)], values)
+        for (scenario, draw, _), (seed, values) in other._unpaired.items():
+            self._add_pair_member((scenario, draw), seed, positions[:len(values)], values)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Gets the running sums and job counts as a long table.
+
+        The aggregator can be rebuilt from the table with :meth:`from_frame`.
+        Antithetic jobs still waiting for their partner are kept as rows with
+        their random seed and a count of zero, and long format records still
+        waiting for their job's wide output as rows with their random seed
+        and no count.
+
+        """
+        columns = GROUP_COLUMNS + STRATUM_COLUMNS + ['sum', 'count', project_globals.RANDOM_SEED_COLUMN]
+        strata = pd.DataFrame(list(self._strata), columns=STRATUM_COLUMNS)
+        tables = []
+        for (scenario, draw), sums in self._sums.items():
+            tables.append(strata.assign(**{project_globals.OUTPUT_SCENARIO_COLUMN: scenario,
+                                           project_globals.INPUT_DRAW_COLUMN: draw,
+                                           'sum': np.pad(sums, (0, len(strata) - len(sums))),
+                                           'count': self._counts[(scenario, draw)]}))
+        for (scenario, draw, _), (seed, values) in self._unpaired.items():
+            tables.append(strata.iloc[:len(values)].assign(**{project_globals.OUTPUT_SCENARIO_COLUMN: scenario,
+                                                              project_globals.INPUT_DRAW_COLUMN: draw,
+                                                              'sum': values, 'count': 0,
+                                                              project_globals.RANDOM_SEED_COLUMN: seed}))
+        for (scenario, draw, seed), values in self._records.items():
+            tables.append(strata.iloc[:len(values)].assign(**{project_globals.OUTPUT_SCENARIO_COLUMN: scenario,
+                                                              project_globals.INPUT_DRAW_COLUMN: draw,
+                                                              'sum': values, 'count': np.nan,
+                                                              project_globals.RANDOM_SEED_COLUMN: seed}))
+        if not tables:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(tables, ignore_index=True).reindex(columns=columns)
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, antithetic: bool = False) -> 'ResultsAggregator':
+        """Rebuilds an aggregator from the table written by :meth:`to_frame`."""
+        aggregator = cls(antithetic)
+        positions = aggregator._get_positions(data[STRATUM_COLUMNS])
+        sums, counts = data['sum'].to_numpy(), data['count'].to_numpy()
+        seeds = data.get(project_globals.RANDOM_SEED_COLUMN, pd.Series(np.nan, index=data.index))
+        held = data['count'].isna().to_numpy()
+        unpaired = seeds.notna().to_numpy() & ~held
+        summed_rows = seeds.isna().to_numpy()
+        summed = data[summed_rows].reset_index(drop=True)
+        summed_positions, summed_sums = positions[summed_rows], sums[summed_rows]
+        summed_counts = counts[summed_rows]
+        for (scenario, draw), rows in summed.groupby(GROUP_COLUMNS, sort=False).indices.items():
+            aggregator._accumulate((scenario, int(draw)), summed_positions[rows], summed_sums[rows],
+                                   int(summed_counts[rows[0]]))
+        group_columns = GROUP_COLUMNS + [project_globals.RANDOM_SEED_COLUMN]
+        for (scenario, draw, seed), rows in data[unpaired].groupby(group_columns, sort=False).indices.items():
+            rows = np.flatnonzero(unpaired)[rows]
+            aggregator._add_pair_member((scenario, int(draw)), int(seed), positions[rows], sums[rows])
+        for (scenario, draw, seed), rows in data[held].groupby(group_columns, sort=False).indices.items():
+            rows = np.flatnonzero(held)[rows]
+            aggregator._hold_records((scenario, int(draw), int(seed)), positions[rows], sums[rows])
+        return aggregator
+
+    def tidy(self) -> pd.DataFrame:
+        """Gets the mean of each metric over random seeds per (scenario, input draw).
+
+        Returns
+        -------
+            A long table with the scenario, input draw and stratum columns,
+            the mean ``value`` and the number of replicates (jobs, or
+            antithetic pairs) it is a mean of.
+
+        """
+        strata = pd.DataFrame(list(self._strata), columns=STRATUM_COLUMNS)
+        tables = []
+        for (scenario, draw), sums in self._sums.items():
+            count = self._counts[(scenario, draw)]
+            values = np.zeros(len(strata))
+            values[:len(sums)] = sums / count
+            tables.append(strata.assign(**{project_globals.OUTPUT_SCENARIO_COLUMN: scenario,
+                                           project_globals.INPUT_DRAW_COLUMN: draw,
+                                           'value': values, 'count': count}))
+        if not tables:
+            return pd.DataFrame(columns=GROUP_COLUMNS + STRATUM_COLUMNS + ['value', 'count'])
+        return pd.concat(tables, ignore_index=True)[GROUP_COLUMNS + STRATUM_COLUMNS + ['value', 'count']]
+
+    def summarize(self, interval: float = 0.95, compression: Optional[float] = None) -> pd.DataFrame:
+        """Summarizes each metric across input draws.
+
+        Parameters
+        ----------
+        interval
+            The width of the uncertainty interval across draws.
+        compression
+            If given, the interval bounds are estimated from quantile
+            sketches with this compression (see :meth:`sketch_draws`) rather
+            than computed exactly.  The sketches are built from the per-draw
+            sums the aggregator holds anyway, so this saves no memory; it is
+            a validation mode for comparing sketched bounds to exact ones.
+
+        Returns
+        -------
+            The mean, standard deviation and uncertainty interval bounds over
+            input draws of each metric, per scenario and stratum.
+
+        """
+        group_columns = [project_globals.OUTPUT_SCENARIO_COLUMN] + STRATUM_COLUMNS
+        if compression is not None:
+            return self.sketch_draws(compression).to_frame(group_columns, interval)
+        return _summarize(self.tidy().groupby(group_columns, dropna=False, sort=False)['value'], interval)
+
+    def sketch_draws(self, compression: Optional[float] = 100.) -> DrawSummary:
+        """Sketches the distribution across input draws of each metric.
+
+        The summary is built from the running sums of every (scenario,
+        draw), which the aggregator keeps, so sketching does not reduce the
+        aggregator's memory use.  Memory is only saved by summarizing
+        aggregators over separate draws, e.g. built by separate workers or
+        for separate locations, and merging their draw summaries once the
+        aggregators themselves have been discarded.  Each draw's outputs
+        must all be in one aggregator, since a draw's value is final only
+        once all of its jobs have been added.
+
+        Parameters
+        ----------
+        compression
+            The compression of the quantile sketches.  If ``None``, the
+            summary keeps every draw and its quantiles are exact.
+
+        Returns
+        -------
+            The draw summary, keyed by scenario and the stratum fields.
+
+        """
+        summary = DrawSummary(compression)
+        for (scenario, draw), sums in self._sums.items():
+            count = self._counts[(scenario, draw)]
+            values = np.zeros(len(self._strata))
+            values[:len(sums)] = sums / count
+            for stratum, value in zip(self._strata, values):
+                summary.add((scenario,) + stratum, value)
+        return summary
+
+    def summarize_averted(self, baseline: str, interval: float = 0.95) -> pd.DataFrame:
+        """Summarizes the amount of each metric averted relative to a baseline.
+
+        The averted amount is computed per input draw, as the baseline value
+        less the scenario value, and then summarized across draws.  Averted
+        DALYs are included as the ``dalys`` measure when the total YLLs and
+        YLDs are reported.
+
+        Parameters
+        ----------
+        baseline
+            The scenario to compare the others to.
+        interval
+            The width of the uncertainty interval across draws.
+
+        Returns
+        -------
+            The mean, standard deviation and uncertainty interval bounds over
+            input draws of each averted metric, per scenario and stratum.
+
+        """
+        tidy = self.tidy()
+        scenario_column, draw_column = GROUP_COLUMNS
+        is_baseline = tidy[scenario_column] == baseline
+        if not is_baseline.any():
+            raise ValueError(f'Baseline scenario {baseline} has no results.')
+        averted = tidy[~is_baseline].merge(tidy.loc[is_baseline, [draw_column] + STRATUM_COLUMNS + ['value']],
+                                           on=[draw_column] + STRATUM_COLUMNS, suffixes=('', '_baseline'))
+        averted['value'] = averted['value_baseline'] - averted['value']
+
+        totals = [project_globals.TOTAL_YLLS_COLUMN, project_globals.TOTAL_YLDS_COLUMN]
+        is_total = averted['measure'].isin(totals)
+        if set(averted.loc[is_total, 'measure']) == set(totals):
+            dalys = averted[is_total].groupby(GROUP_COLUMNS, as_index=False, sort=False)['value'].sum()
+            averted = pd.concat([averted, dalys.assign(measure='dalys')], ignore_index=True)
+
+        group_columns = [scenario_column] + STRATUM_COLUMNS
+        return _summarize(averted.groupby(group_columns, dropna=False, sort=False)['value'], interval)
+
+    def _get_schema(self, columns: Tuple[str, ...]) -> Tuple[List[str], np.ndarray]:
+        if columns not in self._schemas:
+            metric_columns, positions = [], []
+            for column in columns:
+                stratum = parse_column(column)
+                if stratum is not None:
+                    metric_columns.append(column)
+                    positions.append(self._get_position(stratum))
+            ignored = set(columns).difference(metric_columns, GROUP_COLUMNS)
+            logger.debug(f'Parsed a new output schema with {len(metric_columns)} metrics. '
+                         f'Ignoring columns {sorted(ignored)}.')
+            self._schemas[columns] = metric_columns, np.array(positions, dtype=int)
+        return self._schemas[columns]
+
+    def _get_positions(self, strata: pd.DataFrame) -> np.ndarray:
+        strata = strata.astype(object).where(strata.notna(), None)
+        return np.array([self._get_position(Stratum(measure, cause, None if year is None else int(year),
+                                                    sex, age_group))
+                         for measure, cause, year, sex, age_group in strata.itertuples(index=False)], dtype=int)
+
+    def _get_position(self, stratum: Stratum) -> int:
+        if stratum not in self._strata:
+            self._strata[stratum] = len(self._strata)
+        return self._strata[stratum]
+
+    def _hold_records(self, key: Tuple[str, int, int], positions: np.ndarray, values: np.ndarray):
+        records = np.zeros(len(self._strata))
+        held = self._records.get(key, np.zeros(0))
+        records[:len(held)] += held
+        np.add.at(records, positions, values)
+        self._records[key] = records
+
+    def _add_held_records(self, group: Tuple[str, int], seed: int):
+        records = self._records.pop(group + (seed,), None)
+        if records is not None:
+            # The job was counted with its wide output.
+            self._accumulate(group, np.arange(len(records)), records, 0)
+
+    def _add_pair_member(self, group: Tuple[str, int], seed: int, positions: np.ndarray, values: np.ndarray):
+        member = np.zeros(len(self._strata))
+        np.add.at(member, positions, values)
+        records = self._records.pop(group + (seed,), np.zeros(0))
+        member[:len(records)] += records
+        key = group + (int(get_antithetic_pair(seed)),)
+        if key not in self._unpaired:
+            self._unpaired[key] = seed, member
+            return
+        partner_seed, partner = self._unpaired.pop(key)
+        if partner_seed == seed:
+            raise ValueError(f'Random seed {seed} was added twice for scenario {group[0]} and draw {group[1]}.')
+        member[:len(partner)] += partner
+        self._accumulate(group, np.arange(len(member)), member / 2, 1)
+
+    def _accumulate(self, group: Tuple[str, int], positions: np.ndarray, values: np.ndarray, count: int):
+        sums = self._sums.get(group, np.zeros(0))
+        if len(sums) < len(self._strata):
+            # New strata were seen since this group was last updated.
+            sums = np.concatenate([sums, np.zeros(len(self._strata) - len(sums))])
+        np.add.at(sums, positions, values)
+        self._sums[group] = sums
+        self._counts[group] = self._counts.get(group, 0) + count
+
+
+def _summarize(values: 'pd.core.groupby.SeriesGroupBy', interval: float) -> pd.DataFrame:
+    summary = pd.DataFrame({
+        'mean': values.mean(),
+        'std': values.std(),
+        'lower': values.quantile((1 - interval) / 2),
+        'upper': values.quantile((1 + interval) / 2),
+        'draws': values.size(),
+    })
+    return summary.reset_index()
+
+
+def aggregate_job_outputs(paths: Iterable[Union[str, Path]],
+                          aggregator: ResultsAggregator = None) -> ResultsAggregator:
+    """Streams job outputs from files into an aggregator.
+
+    Parameters
+    ----------
+    paths
+        Job output files: json files with the metrics of one job (as written
+        by the local runner), hdf/csv tables with one row per job, or the
+        files or root directories of long format datasets.  They are read
+        one at a time, long format records first.
+    aggregator
+        An aggregator to add the outputs to.  A new one is made if not
+        provided.
+
+    Returns
+    -------
+        The aggregator holding the outputs.
+
+    """
+    # Local import to avoid a cycle, long format records are encoded with the parser in this module.
+    from vivarium_conic_vitamin_a_supp.results_processing import long_format
+
+    aggregator = aggregator if aggregator is not None else ResultsAggregator()
+    paths = [Path(path) for path in paths]
+    # Long format records are held by the aggregator until their jobs' wide outputs are added.
+    for path in sorted(paths, key=lambda p: not (p.is_dir() or p.suffix == '.parquet')):
+        if path.is_dir():
+            aggregator.add_records(long_format.read_dataset(path))
+        elif path.suffix == '.parquet':
+            aggregator.add_records(long_format.read_partition_file(path))
+        elif path.suffix == '.json':
+            with path.open() as f:
+                aggregator.add(json.load(f))
+        elif path.suffix == '.hdf':
+            aggregator.add_frame(pd.read_hdf(path))
+        elif path.suffix == '.csv':
+            aggregator.add_frame(pd.read_csv(path))
+        else:
+            raise ValueError(f'Unknown job output format {path.suffix} for {str(path)}.')
+    return aggregator
@@ -0,0 +1,203 @@
+"""Incremental processing of simulation outputs.
+
+Job outputs (the per-job json files written by the local runner and the
+files of any long format dataset in a subdirectory, see
+:mod:`vivarium_conic_vitamin_a_supp.results_processing.long_format`) are
+ingested as they appear in an output directory.  Long format files are
+ingested along with the json output of their job, which the runner writes
+once the simulation has finished.  Each is read exactly once:
+a ledger in the output directory records the outputs already ingested, along
+with a state file holding the running sums of a
+:class:`~vivarium_conic_vitamin_a_supp.results_processing.aggregation.ResultsAggregator`
+over them.  Processing a directory only reads outputs missing from the
+ledger, so processing a finished grid again costs a directory listing.
+
+The processing files kept in the output directory are
+
+- ``.results_ledger.json``: the ingested outputs and the current state file.
+- ``.results_state_{n}.parquet``: the running sums of the ingested outputs.
+- ``summary.csv``: each metric per scenario, summarized across draws.
+- ``averted.csv``: with a baseline scenario, the amount of each metric
+  averted relative to the baseline, summarized across draws.
+
+The ledger is replaced last, so if processing is interrupted the outputs of
+the interrupted pass are ingested again by the next one.
+
+Outputs of grids run with antithetic randomness are averaged over random
+seed pairs.  An output whose partner hasn't been written yet is kept in the
+state file until it has one, and is left out of the summaries until then.
+
+.. admonition::
+
+   Logging in this module should be done at the ``debug`` level.
+
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Union
+import uuid
+
+from loguru import logger
+import pandas as pd
+
+from vivarium_conic_vitamin_a_supp.results_processing.aggregation import ResultsAggregator, aggregate_job_outputs
+from vivarium_conic_vitamin_a_supp.results_processing.long_format import PARTITION_FILE_PATTERN, get_partition
+
+LEDGER_FILE = '.results_ledger.json'
+SUMMARY_FILE = 'summary.csv'
+AVERTED_FILE = 'averted.csv'
+
+
+class ResultsLedger:
+    """The job outputs of a directory that have been ingested."""
+
+    def __init__(self, output_dir: Union[str, Path], ingested: Dict[str, int] = None, state: str = None,
+                 generation: int = 0):
+        """
+        Parameters
+        ----------
+        output_dir
+            The directory holding the job outputs.
+        ingested
+            The paths of the ingested outputs, relative to the output
+            directory, and their sizes in bytes.
+        state
+            The name of the state file holding the running sums of the
+            ingested outputs.
+        generation
+            The number of times the ledger has been committed.
+
+        """
+        self.output_dir = Path(output_dir)
+        self.ingested = dict(ingested) if ingested is not None else {}
+        self.state = state
+        self.generation = generation
+
+    @property
+    def path(self) -> Path:
+        return self.output_dir / LEDGER_FILE
+
+    @classmethod
+    def read(cls, output_dir: Union[str, Path]) -> 'ResultsLedger':
+        """Reads the ledger of an output directory, or starts an empty one."""
+        path = Path(output_dir) / LEDGER_FILE
+        if not path.exists():
+            return cls(output_dir)
+        with path.open() as f:
+            ledger = json.load(f)
+        return cls(output_dir, ledger['ingested'], ledger['state'], ledger['generation'])
+
+    def find_new_outputs(self) -> List[Path]:
+        """Finds the job outputs in the directory that haven't been ingested.
+
+        Long format files are only found once the json output of their job
+        has been written, so a job's records and wide output are ingested
+        in the same pass.
+
+        """
+        paths = [path for path in self.output_dir.glob(f'*/{PARTITION_FILE_PATTERN}')
+                 if (self.output_dir / get_job_output_name(*get_partition(path))).exists()]
+        paths += self.output_dir.glob('*.json')
+        # Hidden files are processing files or outputs still being written.
+        return sorted(path for path in paths
+                      if not path.name.startswith('.') and self._get_name(path) not in self.ingested)
+
+    def load_aggregator(self, antithetic: bool = False) -> ResultsAggregator:
+        """Loads the running sums of the ingested outputs."""
+        if self.state is None:
+            return ResultsAggregator(antithetic)
+        return ResultsAggregator.from_frame(pd.read_parquet(self.output_dir / self.state), antithetic)
+
+    def write_state(self, aggregator: ResultsAggregator) -> str:
+        """Writes the running sums to a new state file and returns its name."""
+        name = f'.results_state_{self.generation + 1}.parquet'
+        aggregator.to_frame().to_parquet(self.output_dir / name, index=False)
+        return name
+
+    def commit(self, state: str, paths: List[Path]):
+        """Records newly ingested outputs and the state file that includes them."""
+        old_state = self.state
+        self.ingested.update({self._get_name(path): path.stat().st_size for path in paths})
+        self.state = state
+        self.generation += 1
+        ledger = {'ingested': self.ingested, 'state': self.state, 'generation': self.generation}
+        temp_path = self.output_dir / f'{LEDGER_FILE}.{uuid.uuid4().hex}.tmp'
+        with temp_path.open('w') as f:
+            json.dump(ledger, f, indent=2)
+        temp_path.replace(self.path)
+        if old_state is not None and old_state != state:
+            (self.output_dir / old_state).unlink(missing_ok=True)
+
+    def _get_name(self, path: Path) -> str:
+        return path.relative_to(self.output_dir).as_posix()
+
+    def __len__(self) -> int:
+        return len(self.ingested)
+
+    def __repr__(self):
+        return f'ResultsLedger(output_dir={str(self.output_dir)}, ingested={len(self.ingested)})'
+
+
+def get_job_output_name(scenario: str, input_draw: int, random_seed: int) -> str:
+    """Gets the name of a job's json output, as written by the local runner."""
+    return f'{scenario}_draw_{input_draw}_seed_{random_seed}.json'
+
+
+def process_outputs(output_dir: Union[str, Path], baseline: str = None, interval: float = 0.95,
+                    antithetic: bool = False) -> int:
+    """Ingests new job outputs and updates the persisted summaries.
+
+    Parameters
+    ----------
+    output_dir
+        The directory holding the job outputs.
+    baseline
+        If given, also summarize the metrics averted relative to this
+        scenario once it has results.
+    interval
+        The width of the uncertainty intervals across draws.
+    antithetic
+        Whether the grid was run with antithetic randomness, so outputs are
+        averaged over random seed pairs.
+
+    Returns
+    -------
+        The number of newly ingested output files.
+
+    """
+    output_dir = Path(output_dir)
+    ledger = ResultsLedger.read(output_dir)
+    new_outputs = ledger.find_new_outputs()
+    if not new_outputs:
+        logger.debug(f'No new job outputs in {str(output_dir)}.')
+        return 0
+
+    logger.debug(f'Ingesting {len(new_outputs)} new job outputs from {str(output_dir)}.')
+    aggregator = aggregate_job_outputs(new_outputs, ledger.load_aggregator(antithetic))
+    if aggregator.unpaired_jobs:
+        logger.debug(f'{aggregator.unpaired_jobs} job outputs are waiting for their antithetic partner.')
+    if aggregator.held_records:
+        logger.debug(f'Long format records of {aggregator.held_records} jobs are waiting for their job output.')
+    state = ledger.write_state(aggregator)
+    write_summaries(output_dir, aggregator, baseline, interval)
+    ledger.commit(state, new_outputs)
+    return len(new_outputs)
+
+
+def write_summaries(output_dir: Path, aggregator: ResultsAggregator, baseline: str = None,
+                    interval: float = 0.95):
+    """Writes the summary tables of the aggregated outputs."""
+    _write_csv(aggregator.summarize(interval), output_dir / SUMMARY_FILE)
+    if baseline is None:
+        return
+    if baseline in {scenario for scenario, _ in aggregator.groups}:
+        _write_csv(aggregator.summarize_averted(baseline, interval), output_dir / AVERTED_FILE)
+    else:
+        logger.debug(f'No results for baseline scenario {baseline} yet.')
+
+
+def _write_csv(data: pd.DataFrame, path: Path):
+    # Readers of a running grid's summaries should never see a partial file.
+    temp_path = path.parent / f'.{path.name}.{uuid.uuid4().hex}.tmp'
+    data.to_csv(temp_path, index=False)
+    temp_path.replace(path)
@@ -0,0 +1,202 @@
+"""Long-format, dictionary-encoded simulation results.
+
+Rather than one wide row per simulation with a column per stratum, results
+can be written as long records with one row per (measure, stratum): integer
+codes for the measure, cause, sex and age group, the year and the value.
+The codes index into :data:`CODEBOOK`, which is fixed by the project globals,
+so records written by different simulations share codes without any
+coordination.  A stratum field a measure isn't stratified by is coded
+``-1``.
+
+Records are written to a Parquet dataset partitioned by scenario, input
+draw and random seed in hive layout
+(``scenario=baseline/input_draw=0/random_seed=3/part-*.parquet``).  Each
+write goes to its own uniquely named file, so any number of simulations can
+append to the same dataset at once.  The files are ingested by
+:func:`~vivarium_conic_vitamin_a_supp.results_processing.aggregation.aggregate_job_outputs`
+alongside the wide job outputs.
+
+"""
+from pathlib import Path
+from typing import Any, Iterable, Mapping, Tuple, Union
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.results_processing.aggregation import parse_column
+from vivarium_conic_vitamin_a_supp.results_processing.schema import RESULTS_SCHEMA
+
+LONG_FORMAT_COLUMNS = ['measure', 'cause', 'year', 'sex', 'age_group', 'value']
+PARTITION_COLUMNS = [project_globals.OUTPUT_SCENARIO_COLUMN, project_globals.INPUT_DRAW_COLUMN,
+                     project_globals.RANDOM_SEED_COLUMN]
+# Matches the files of a dataset, relative to its root directory.
+PARTITION_FILE_PATTERN = '/'.join(f'{column}=*' for column in PARTITION_COLUMNS) + '/part-*.parquet'
+# Measures recorded by the project's own observers.
+OBSERVER_MEASURES = ('supplemented_days',)
+
+# Codes are positions in these tuples, so new values must only ever be appended.
+CODEBOOK = {
+    'measure': (tuple(project_globals.STANDARD_COLUMNS.values()) + tuple(project_globals.COLUMN_TEMPLATES)
+                + OBSERVER_MEASURES),
+    'cause': tuple(dict.fromkeys(project_globals.POP_STATES + project_globals.CAUSES_OF_DEATH
+                                 + project_globals.CAUSES_OF_DISABILITY + project_globals.STATES
+                                 + project_globals.TRANSITIONS)),
+    'sex': project_globals.SEXES,
+    'age_group': project_globals.AGE_GROUPS,
+}
+COLUMN_DTYPES = {'measure': np.int16, 'cause': np.int16, 'year': np.int16, 'sex': np.int8, 'age_group': np.int8,
+                 'value': np.float64}
+
+_CODES = {field: {value: code for code, value in enumerate(values)} for field, values in CODEBOOK.items()}
+
+
+def encode_records(records: Iterable[Tuple[str, Any, Any, Any, Any, float]]) -> pd.DataFrame:
+    """Encodes result records.
+
+    Parameters
+    ----------
+    records
+        (measure, cause, year, sex, age group, value) tuples.  Fields the
+        measure isn't stratified by are ``None``.
+
+    Returns
+    -------
+        The records with coded strata, in the long format columns.
+
+    Raises
+    ------
+    ValueError
+        If a record has a value that isn't in the codebook.
+
+    """
+    data = pd.DataFrame(list(records), columns=LONG_FORMAT_COLUMNS)
+    for field, codes in _CODES.items():
+        unknown = set(data[field].dropna()).difference(codes)
+        if unknown:
+            raise ValueError(f'Values {sorted(unknown)} of {field} are not in the long format codebook.')
+        data[field] = data[field].map(codes)
+    data['year'] = data['year'].astype(float)
+    return data.fillna({field: -1 for field in LONG_FORMAT_COLUMNS if field != 'value'}).astype(COLUMN_DTYPES)
+
+
+def encode_metrics(metrics: Mapping[str, float]) -> pd.DataFrame:
+    """Encodes the result columns of a wide metrics dict as long records.
+
+    Metrics that aren't in the results schema are dropped.
+
+    """
+    return encode_records(tuple(parse_column(column)) + (value,)
+                          for column, value in metrics.items() if column in RESULTS_SCHEMA)
+
+
+def decode(data: pd.DataFrame) -> pd.DataFrame:
+    """Replaces strata codes with categorical values and missing years with NaN."""
+    data = data.copy()
+    for field, values in CODEBOOK.items():
+        data[field] = pd.Categorical.from_codes(data[field], categories=list(values))
+    data['year'] = data['year'].where(data['year'] >= 0)
+    return data
+
+
+def get_partition_path(output_dir: Union[str, Path], scenario: str, input_draw: int, random_seed: int) -> Path:
+    values = [scenario, input_draw, random_seed]
+    return Path(output_dir).joinpath(*[f'{column}={value}' for column, value in zip(PARTITION_COLUMNS, values)])
+
+
+def write_partition(data: pd.DataFrame, output_dir: Union[str, Path], scenario: str, input_draw: int,
+                    random_seed: int) -> Path:
+    """Appends encoded records for one simulation to a long format dataset.
+
+    Returns
+    -------
+        The path of the written file.
+
+    """
+    path = get_partition_path(output_dir, scenario, input_draw, random_seed)
+    path.mkdir(parents=True, exist_ok=True)
+    name = f'part-{uuid.uuid4().hex}.parquet'
+    # Dataset readers skip hidden files, so a partial write is never read.
+    temp_path = path / f'.{name}.tmp'
+    table = pa.Table.from_pandas(data[LONG_FORMAT_COLUMNS].astype(COLUMN_DTYPES), preserve_index=False)
+    pq.write_table(table, temp_path)
+    return temp_path.replace(path / name)
+
+
+def read_dataset(output_dir: Union[str, Path], decode_codes: bool = True, **partitions: Any) -> pd.DataFrame:
+    """Reads a long format dataset.
+
+    Parameters
+    ----------
+    output_dir
+        The root directory of the dataset.
+    decode_codes
+        Whether to replace strata codes with their values.
+    partitions
+        Partition values to select, e.g. ``scenario='baseline'``.
+
+    Returns
+    -------
+        The partition columns followed by the long format columns.
+
+    """
+    dataset = ds.dataset(output_dir, format='parquet', partitioning='hive')
+    expression = None
+    for column, value in partitions.items():
+        term = ds.field(column) == value
+        expression = term if expression is None else expression & term
+    data = dataset.to_table(filter=expression).to_pandas()
+    data = data[PARTITION_COLUMNS + LONG_FORMAT_COLUMNS]
+    return decode(data) if decode_codes else data
+
+
+def get_partition(path: Union[str, Path]) -> Tuple[str, int, int]:
+    """Gets the scenario, input draw and random seed of a dataset file from its path.
+
+    Raises
+    ------
+    ValueError
+        If the file is not in a partition directory of a dataset.
+
+    """
+    partition = dict(part.partition('=')[::2] for part in Path(path).parent.parts[-len(PARTITION_COLUMNS):])
+    if list(partition) != PARTITION_COLUMNS:
+        raise ValueError(f'{str(path)} is not in a long format dataset partition.')
+    scenario, draw, seed = (partition[column] for column in PARTITION_COLUMNS)
+    return scenario, int(draw), int(seed)
+
+
+def read_partition_file(path: Union[str, Path], decode_codes: bool = True) -> pd.DataFrame:
+    """Reads a single file of a long format dataset.
+
+    The partition values are read from the hive layout of the file's path,
+    as when reading the whole dataset.
+
+    Parameters
+    ----------
+    path
+        A ``part-*.parquet`` file of the dataset.
+    decode_codes
+        Whether to replace strata codes with their values.
+
+    Returns
+    -------
+        The partition columns followed by the long format columns.
+
+    Raises
+    ------
+    ValueError
+        If the file is not in a partition directory of a dataset.
+
+    """
+    path = Path(path)
+    get_partition(path)
+    dataset = ds.dataset([str(path)], format='parquet', partitioning='hive',
+                         partition_base_dir=str(path.parents[len(PARTITION_COLUMNS)]))
+    data = dataset.to_table().to_pandas()
+    data = data[PARTITION_COLUMNS + LONG_FORMAT_COLUMNS]
+    return decode(data) if decode_codes else data
@@ -0,0 +1,138 @@
+"""The compiled schema of simulation result columns.
+
+Every result column the simulation can report is expanded from
+``globals.COLUMN_TEMPLATES`` once, at import, into :data:`RESULTS_SCHEMA`.
+The schema holds an integer-coded :class:`pandas.MultiIndex` over the column
+kind and every template field, and a mapping from each column name to its
+codes, so metric dicts can be parsed and converted to arrays with dictionary
+lookups rather than string formatting or regular expressions.
+
+"""
+import itertools
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+
+
+class ResultsSchema:
+    """All result columns and the template fields they are stratified by.
+
+    Attributes
+    ----------
+    kinds
+        The standard column names followed by the column template kinds.
+    fields
+        The template fields, in ``TEMPLATE_FIELD_MAP`` order.
+    columns
+        Every result column, in ``RESULT_COLUMNS('all')`` order.
+    index
+        One row per result column with a level for the kind and one for each
+        field.  Fields a column's template doesn't have are missing.
+    coordinates
+        A mapping from each column to its integer codes in the index.
+
+    """
+
+    def __init__(self, templates: Mapping[str, str], standard_columns: Mapping[str, str],
+                 field_map: Mapping[str, Sequence[Any]]):
+        self.kinds = list(standard_columns) + list(templates)
+        self.fields = list(field_map)
+        self._levels = [self.kinds] + [list(field_map[field]) for field in self.fields]
+
+        missing = (-1,) * len(self.fields)
+        self.columns, codes = [], []
+        for kind, column in standard_columns.items():
+            self.columns.append(column)
+            codes.append((self.kinds.index(kind),) + missing)
+        for kind, template in templates.items():
+            template_fields = [field for field in self.fields if f'{{{field}}}' in template]
+            kind_code = self.kinds.index(kind)
+            for value_codes in itertools.product(*[range(len(field_map[field])) for field in template_fields]):
+                field_codes = dict(zip(template_fields, value_codes))
+                self.columns.append(template.format(**{field: field_map[field][code]
+                                                       for field, code in field_codes.items()}))
+                codes.append((kind_code,) + tuple(field_codes.get(field, -1) for field in self.fields))
+
+        self.coordinates: Dict[str, Tuple[int, ...]] = dict(zip(self.columns, codes))
+        self._positions = {column: position for position, column in enumerate(self.columns)}
+        self.index = pd.MultiIndex(levels=self._levels, codes=np.array(codes).T.tolist(),
+                                   names=['kind'] + [field.lower() for field in self.fields])
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __contains__(self, column: str) -> bool:
+        return column in self._positions
+
+    def get_fields(self, column: str) -> Dict[str, Any]:
+        """Gets the kind and template field values of a result column.
+
+        Raises
+        ------
+        KeyError
+            If the column is not in the schema.
+
+        """
+        kind_code, *field_codes = self.coordinates[column]
+        fields = {'kind': self.kinds[kind_code]}
+        fields.update({field: self._levels[i + 1][code]
+                       for i, (field, code) in enumerate(zip(self.fields, field_codes)) if code >= 0})
+        return fields
+
+    def get_columns(self, kind: str = 'all', **fields: Any) -> List[str]:
+        """Gets the result columns of a kind with some template fields held fixed.
+
+        Field values are matched on their string form, so ``YEAR='2017'``
+        selects the same columns as ``YEAR=2017``.
+
+        """
+        if kind not in self.kinds and kind != 'all':
+            raise ValueError(f'Unknown result column type {kind}')
+        mask = np.ones(len(self.columns), dtype=bool)
+        if kind != 'all':
+            mask &= self.index.codes[0] == self.kinds.index(kind)
+        for field, value in fields.items():
+            level = self.fields.index(field) + 1
+            values = [str(v) for v in self._levels[level]]
+            code = values.index(str(value)) if str(value) in values else -2
+            mask &= self.index.codes[level] == code
+        return [column for column, selected in zip(self.columns, mask) if selected]
+
+    def get_positions(self, columns: Sequence[str]) -> np.ndarray:
+        """Gets the positions of result columns in the schema columns.
+
+        Raises
+        ------
+        KeyError
+            If a column is not in the schema.
+
+        """
+        return np.array([self._positions[column] for column in columns], dtype=int)
+
+    def to_array(self, metrics: Mapping[str, float]) -> np.ndarray:
+        """Converts a metrics dict to an array aligned with the schema columns.
+
+        Metrics not in the schema are ignored and columns without a metric
+        are zero.
+
+        """
+        values = np.zeros(len(self.columns))
+        for column, value in metrics.items():
+            position = self._positions.get(column)
+            if position is not None:
+                values[position] = value
+        return values
+
+    def to_series(self, values: np.ndarray) -> pd.Series:
+        """Labels an array aligned with the schema columns with the schema index."""
+        return pd.Series(values, index=self.index, name='value')
+
+    def __repr__(self):
+        return f'ResultsSchema(columns={len(self.columns)}, fields={self.fields})'
+
+
+RESULTS_SCHEMA = ResultsSchema(project_globals.COLUMN_TEMPLATES, project_globals.STANDARD_COLUMNS,
+                               project_globals.TEMPLATE_FIELD_MAP)
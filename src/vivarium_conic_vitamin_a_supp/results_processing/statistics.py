@@ -0,0 +1,280 @@
+"""Streaming summary statistics for simulation outputs."""
+import math
+from typing import Dict, Hashable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+class RunningMoments:
+    """Online mean and variance accumulator (Welford's algorithm).
+
+    Accumulators built from separate streams of observations can be merged
+    without revisiting the observations.
+
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self._m2 = 0.
+
+    def update(self, value: float):
+        """Adds a single observation."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def merge(self, other: 'RunningMoments'):
+        """Adds all the observations summarized by another accumulator."""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta**2 * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self) -> float:
+        """The sample variance of the observations."""
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    def confidence_interval_half_width(self, confidence: float = 0.95) -> float:
+        """The half width of the t-based confidence interval for the mean."""
+        if self.count < 2:
+            return math.inf
+        t = stats.t.ppf((1 + confidence) / 2, self.count - 1)
+        return t * math.sqrt(self.variance / self.count)
+
+    def relative_confidence_interval_width(self, confidence: float = 0.95) -> float:
+        """The full confidence interval width relative to the magnitude of the mean."""
+        half_width = self.confidence_interval_half_width(confidence)
+        if half_width == 0:
+            return 0.
+        if self.mean == 0:
+            return math.inf
+        return 2 * half_width / abs(self.mean)
+
+    def __repr__(self):
+        return f'RunningMoments(count={self.count}, mean={self.mean}, variance={self.variance})'
+
+
+class QuantileSketch:
+    """A mergeable sketch of the distribution of a stream of values (a t-digest).
+
+    Values are summarized by weighted centroids whose size is bounded by
+    the ``k1`` scale function, so centroids near the tails stay small and
+    extreme quantiles keep their accuracy.  The sketch holds on the order of
+    ``compression`` centroids regardless of how many values it has seen,
+    and sketches built from separate streams merge into a sketch of the
+    combined stream.  Until the sketch first compresses, it holds every
+    value and its quantiles are exact.
+
+    The exact mean and variance of the values are tracked alongside the
+    sketch.
+
+    """
+
+    # Values are buffered and compressed in batches of this many times the compression.
+    buffer_factor = 5
+
+    def __init__(self, compression: float = 100.):
+        self.compression = compression
+        self.moments = RunningMoments()
+        self.min = math.inf
+        self.max = -math.inf
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer: List[float] = []
+        self._compressed = False
+
+    @property
+    def count(self) -> int:
+        return self.moments.count
+
+    def update(self, value: float):
+        """Adds a single value."""
+        self._buffer.append(value)
+        self.moments.update(value)
+        self.min, self.max = min(self.min, value), max(self.max, value)
+        if len(self._buffer) >= self.buffer_factor * self.compression:
+            self._compress()
+
+    def merge(self, other: 'QuantileSketch'):
+        """Adds all the values summarized by another sketch."""
+        other._flush()
+        self._means = np.concatenate([self._means, other._means])
+        self._weights = np.concatenate([self._weights, other._weights])
+        self._compressed |= other._compressed
+        self.moments.merge(other.moments)
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        self._compress()
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> Union[float, np.ndarray]:
+        """Estimates quantiles of the values.
+
+        Quantiles are interpolated between the centers of the centroids,
+        with the minimum and maximum values at the ends.
+
+        """
+        self._flush()
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else math.nan
+        if not self._compressed:
+            return np.quantile(self._means, q)
+        total = self._weights.sum()
+        centers = np.cumsum(self._weights) - self._weights / 2
+        positions = np.concatenate([[0.], centers, [total]])
+        values = np.concatenate([[self.min], self._means, [self.max]])
+        return np.interp(np.asarray(q) * total, positions, values)
+
+    def _flush(self):
+        if self._buffer:
+            self._compress()
+
+    def _compress(self):
+        means = np.concatenate([self._means, self._buffer])
+        weights = np.concatenate([self._weights, np.ones(len(self._buffer))])
+        self._buffer = []
+        if len(means) <= self.compression and not self._compressed:
+            # Few enough values to hold them all.
+            self._means, self._weights = means, weights
+            return
+
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        merged_means, merged_weights = [means[0]], [weights[0]]
+        weight_so_far = 0.
+        limit = self._get_weight_limit(0., total)
+        for mean, weight in zip(means[1:], weights[1:]):
+            if weight_so_far + merged_weights[-1] + weight <= limit:
+                new_weight = merged_weights[-1] + weight
+                merged_means[-1] += (mean - merged_means[-1]) * weight / new_weight
+                merged_weights[-1] = new_weight
+            else:
+                weight_so_far += merged_weights[-1]
+                limit = self._get_weight_limit(weight_so_far, total)
+                merged_means.append(mean)
+                merged_weights.append(weight)
+        self._means, self._weights = np.array(merged_means), np.array(merged_weights)
+        self._compressed = True
+
+    def _get_weight_limit(self, weight_so_far: float, total: float) -> float:
+        # The cumulative weight at which the next centroid spans one unit of k1(q) = d / 2pi * asin(2q - 1).
+        k = self.compression / (2 * math.pi) * math.asin(2 * weight_so_far / total - 1)
+        q = (math.sin(min(k + 1, self.compression / 4) * 2 * math.pi / self.compression) + 1) / 2
+        return q * total
+
+    def __repr__(self):
+        return (f'QuantileSketch(compression={self.compression}, count={self.count}, '
+                f'centroids={len(self._means) + len(self._buffer)})')
+
+
+class ExactQuantiles:
+    """Holds every value of a stream to compute exact quantiles.
+
+    It has the interface of :class:`QuantileSketch`, and is used to validate
+    the error of sketched quantiles.
+
+    """
+
+    def __init__(self):
+        self.moments = RunningMoments()
+        self._values: List[float] = []
+
+    @property
+    def count(self) -> int:
+        return self.moments.count
+
+    @property
+    def min(self) -> float:
+        return min(self._values, default=math.inf)
+
+    @property
+    def max(self) -> float:
+        return max(self._values, default=-math.inf)
+
+    def update(self, value: float):
+        self._values.append(value)
+        self.moments.update(value)
+
+    def merge(self, other: 'ExactQuantiles'):
+        self._values.extend(other._values)
+        self.moments.merge(other.moments)
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> Union[float, np.ndarray]:
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else math.nan
+        return np.quantile(self._values, q)
+
+    def __repr__(self):
+        return f'ExactQuantiles(count={self.count})'
+
+
+class DrawSummary:
+    """Distributions across input draws of many metrics.
+
+    Each metric, identified by a key such as a (scenario, stratum) tuple,
+    gets its own quantile sketch and exact moments.  Summaries built by
+    separate workers or for separate locations can be merged.
+
+    """
+
+    def __init__(self, compression: Optional[float] = 100.):
+        """
+        Parameters
+        ----------
+        compression
+            The compression of each metric's quantile sketch.  If ``None``,
+            every value is kept and quantiles are exact.
+
+        """
+        self.compression = compression
+        self.sketches: Dict[Hashable, Union[QuantileSketch, ExactQuantiles]] = {}
+
+    def add(self, key: Hashable, value: float):
+        """Adds the value of a metric for one input draw."""
+        if key not in self.sketches:
+            self.sketches[key] = self._make_sketch()
+        self.sketches[key].update(value)
+
+    def merge(self, other: 'DrawSummary'):
+        """Adds the draws summarized by another draw summary."""
+        for key, sketch in other.sketches.items():
+            if key not in self.sketches:
+                self.sketches[key] = self._make_sketch()
+            self.sketches[key].merge(sketch)
+
+    def to_frame(self, names: List[str], interval: float = 0.95) -> pd.DataFrame:
+        """Summarizes every metric.
+
+        Parameters
+        ----------
+        names
+            The names of the parts of the metric keys.
+        interval
+            The width of the uncertainty interval across draws.
+
+        Returns
+        -------
+            The key columns followed by the mean, standard deviation,
+            uncertainty interval bounds and number of draws of each metric.
+
+        """
+        quantiles = [(1 - interval) / 2, (1 + interval) / 2]
+        rows = []
+        for key, sketch in self.sketches.items():
+            lower, upper = sketch.quantile(quantiles)
+            rows.append(tuple(key) + (sketch.moments.mean, math.sqrt(sketch.moments.variance), lower, upper,
+                                      sketch.count))
+        return pd.DataFrame(rows, columns=list(names) + ['mean', 'std', 'lower', 'upper', 'draws'])
+
+    def _make_sketch(self) -> Union[QuantileSketch, ExactQuantiles]:
+        return ExactQuantiles() if self.compression is None else QuantileSketch(self.compression)
+
+    def __repr__(self):
+        return f'DrawSummary(compression={self.compression}, metrics={len(self.sketches)})'
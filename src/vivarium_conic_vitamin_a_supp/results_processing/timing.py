@@ -0,0 +1,62 @@
+"""Summaries of component timing records.
+
+Simulations run with the
+:class:`~vivarium_conic_vitamin_a_supp.components.timing.ComponentTimer`
+write one csv of timing records per job.  The records of a grid are
+summarized here into the average cost of each (component, phase, name) per
+job and per time step.
+
+.. admonition::
+
+   Logging in this module should be done at the ``debug`` level.
+
+"""
+from pathlib import Path
+from typing import Union
+
+from loguru import logger
+import pandas as pd
+
+TIMING_KEYS = ['component', 'phase', 'name']
+
+
+def read_timings(timing_dir: Union[str, Path]) -> pd.DataFrame:
+    """Reads the timing records of every job in a directory.
+
+    The records are labeled with the job names, taken from the file names.
+
+    """
+    paths = sorted(Path(timing_dir).glob('*.csv'))
+    logger.debug(f'Reading {len(paths)} timing files from {str(timing_dir)}.')
+    if not paths:
+        return pd.DataFrame()
+    return pd.concat([pd.read_csv(path).assign(job=path.stem) for path in paths], ignore_index=True)
+
+
+def summarize_timings(timings: pd.DataFrame) -> pd.DataFrame:
+    """Summarizes timing records across jobs.
+
+    Parameters
+    ----------
+    timings
+        Timing records of one or more jobs, labeled by a ``job`` column.
+
+    Returns
+    -------
+        The calls, total time and self time of each (component, phase,
+        name), averaged over jobs.  ``self_time_per_step`` is the average
+        self time of a time step, so it excludes population initialization
+        and the end of the simulation, and ``share`` is the fraction of all
+        timed self time.  Rows are sorted from the most to the least self
+        time.
+
+    """
+    jobs = timings['job'].nunique()
+    time_steps = timings[timings['stage'] == 'time_step']
+    step_count = time_steps.groupby('job')['step'].nunique().sum()
+
+    summary = timings.groupby(TIMING_KEYS)[['calls', 'total_time', 'self_time']].sum() / jobs
+    summary['self_time_per_step'] = time_steps.groupby(TIMING_KEYS)['self_time'].sum() / max(step_count, 1)
+    summary['self_time_per_step'] = summary['self_time_per_step'].fillna(0.)
+    summary['share'] = summary['self_time'] / summary['self_time'].sum()
+    return summary.sort_values('self_time', ascending=False).reset_index()
@@ -0,0 +1,18 @@
+"""Aggregation helpers for simulations run with variance reduction.
+
+Simulations run with antithetic randomness (see
+:mod:`vivarium_conic_vitamin_a_supp.plugins.randomness`) produce results in
+negatively correlated pairs of random seeds.  The members of a pair are not
+independent replicates, so they are averaged into a single replicate before
+any summary statistics are computed across seeds, as
+:class:`~vivarium_conic_vitamin_a_supp.results_processing.aggregation.ResultsAggregator`
+does with ``antithetic=True``.
+
+"""
+import pandas as pd
+
+
+def get_antithetic_pair(random_seed: pd.Series) -> pd.Series:
+    """Maps random seeds onto the antithetic pair they belong to."""
+    return random_seed // 2
+
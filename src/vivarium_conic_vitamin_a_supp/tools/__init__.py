@@ -1,3 +1,9 @@
 from .app_logging import configure_logging_to_terminal
 from .make_specs import build_model_specifications
 from .make_artifacts import build_artifacts
+from .columnar_artifacts import convert_artifacts
+from .synthetic_artifacts import make_synthetic_artifacts
+from .storage_profiles import profile_artifacts
+from .process_results import process_results
+from .validate_results import validate_results
+from .scaling_benchmark import benchmark_scaling
@@ -4,7 +4,7 @@ from typing import TextIO
 from loguru import logger
 
 
-def add_logging_sink(sink: TextIO, verbose: int, colorize: bool = False, serialize: bool = False):
+def add_logging_sink(sink: TextIO, verbose: int, colorize: bool = False, serialize: bool = False) -> int:
     """Adds a logging sink to the global process logger.
 
     Parameters
@@ -19,15 +19,20 @@ def add_logging_sink(sink: TextIO, verbose: int, colorize: bool = False, seriali
         Whether the logs should be converted to JSON before they're dumped
         to the logging sink.
 
+    Returns
+    -------
+        The id of the new sink, which can be passed to ``logger.remove``.
+
     """
     message_format = ('<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <green>{elapsed}</green> | '
                       '<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>')
     if verbose == 0:
-        logger.add(sink, colorize=colorize, level="WARNING", format=message_format, serialize=serialize)
+        level = "WARNING"
     elif verbose == 1:
-        logger.add(sink, colorize=colorize, level="INFO", format=message_format, serialize=serialize)
-    elif verbose >= 2:
-        logger.add(sink, colorize=colorize, level="DEBUG", format=message_format, serialize=serialize)
+        level = "INFO"
+    else:
+        level = "DEBUG"
+    return logger.add(sink, colorize=colorize, level=level, format=message_format, serialize=serialize)
 
 
 def configure_logging_to_terminal(verbose: int):
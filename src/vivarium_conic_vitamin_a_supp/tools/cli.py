@@ -16,16 +16,29 @@ The application will look for the model spec based on the python environment
 that is active and these files don't need to be specified if the
 default names and location are used.
 """
+from typing import Tuple
+
 import click
 from loguru import logger
+import yaml
 from vivarium.framework.utilities import handle_exceptions
 
 from vivarium_conic_vitamin_a_supp import paths
 import vivarium_conic_vitamin_a_supp.globals as project_globals
+from vivarium_conic_vitamin_a_supp.data.storage import STORAGE_PROFILES
+from vivarium_conic_vitamin_a_supp.verification_and_validation import rates
 
 from vivarium_conic_vitamin_a_supp.tools import configure_logging_to_terminal
 from vivarium_conic_vitamin_a_supp.tools import build_model_specifications
 from vivarium_conic_vitamin_a_supp.tools import build_artifacts
+from vivarium_conic_vitamin_a_supp.tools import convert_artifacts as convert_artifact_formats
+from vivarium_conic_vitamin_a_supp.tools import make_synthetic_artifacts as make_synthetic_artifact_files
+from vivarium_conic_vitamin_a_supp.tools import profile_artifacts as profile_artifact_storage
+from vivarium_conic_vitamin_a_supp.tools import process_results as process_grid_results
+from vivarium_conic_vitamin_a_supp.tools import validate_results as validate_grid_results
+from vivarium_conic_vitamin_a_supp.tools import benchmark_scaling as benchmark_model_scaling
+from vivarium_conic_vitamin_a_supp.tools import local_runner
+from vivarium_conic_vitamin_a_supp.tools import scaling_benchmark
 
 
 @click.command()
@@ -68,7 +81,7 @@ def make_specs(template: str, location: str, output_dir: str, verbose: int, with
               show_default=True,
               type=click.Choice(project_globals.LOCATIONS + ['all']),
               help=('Location for which to make an artifact. Note: prefer building archives on the cluster.\n'
-                    'If you specify location "all" you must be on a cluster node.'))
+                    'If you specify location "all" off the cluster, artifacts are built in a local process pool.'))
 @click.option('-o', '--output-dir',
               default=str(paths.ARTIFACT_ROOT),
               show_default=True,
@@ -77,13 +90,407 @@ def make_specs(template: str, location: str, output_dir: str, verbose: int, with
 @click.option('-a', '--append',
               is_flag=True,
               help='Append to the artifact instead of overwriting.')
+@click.option('-w', '--workers',
+              default=1,
+              show_default=True,
+              type=click.IntRange(min=1),
+              help='Number of artifacts to build at once when building all locations off the cluster.')
+@click.option('-m', '--memory-budget',
+              default=None,
+              type=click.FloatRange(min=0),
+              help=(f'Memory in GB available to local artifact builds. Each build is assumed to need '
+                    f'{project_globals.MAKE_ARTIFACT_MEM}.'))
+@click.option('-k', '--key-workers',
+              default=1,
+              show_default=True,
+              type=click.IntRange(min=1),
+              help='Number of artifact keys to load at once within each artifact build.')
+@click.option('--cache-dir',
+              default=None,
+              type=click.Path(file_okay=False),
+              help=(f'Directory of the on-disk cache of loader outputs. Defaults to '
+                    f'{project_globals.LOADER_CACHE_DIR_NAME} in the output directory.'))
+@click.option('--no-cache',
+              is_flag=True,
+              help='Pull all data from the loaders without reading or writing the loader cache.')
+@click.option('-d', '--draws-per-chunk',
+              default=None,
+              type=click.IntRange(min=1),
+              help=('Stream tables of draws to the artifact in chunks of this many draws, using the '
+                    'per-draw "{key}/draw_{n}" layout. With the loader cache, tables are read back from it '
+                    'one chunk at a time, so a table is only held whole while it is first pulled.'))
+@click.option('-s', '--storage-profile',
+              default='default',
+              show_default=True,
+              type=click.Choice(list(STORAGE_PROFILES)),
+              help=('How artifact data is encoded: categorical demographics, float32 draws and the '
+                    'compression codec and level. Compare profiles with profile_artifacts.'))
 @click.option('-v', 'verbose',
               count=True,
               help='Configure logging verbosity.')
 @click.option('--pdb', 'with_debugger',
               is_flag=True,
               help='Drop into python debugger if an error occurs.')
-def make_artifacts(location: str, output_dir: str, append: bool, verbose: int, with_debugger: bool) -> None:
+def make_artifacts(location: str, output_dir: str, append: bool, workers: int, memory_budget: float,
+                   key_workers: int, cache_dir: str, no_cache: bool, draws_per_chunk: int, storage_profile: str,
+                   verbose: int, with_debugger: bool) -> None:
     configure_logging_to_terminal(verbose)
     main = handle_exceptions(build_artifacts, logger, with_debugger=with_debugger)
-    main(location, output_dir, append, verbose)
+    main(location, output_dir, append, verbose, workers, memory_budget, key_workers, not no_cache, cache_dir,
+         draws_per_chunk, storage_profile)
+
+
+@click.command()
+@click.option('-l', '--location',
+              default='all',
+              show_default=True,
+              type=click.Choice(project_globals.LOCATIONS + ['all']),
+              help='Location to write a synthetic artifact for. Specify locations in globals.py')
+@click.option('-o', '--output-dir',
+              required=True,
+              type=click.Path(file_okay=False),
+              help='The directory to write the synthetic artifacts to.')
+@click.option('-d', '--draws',
+              default=10,
+              show_default=True,
+              type=click.IntRange(min=1),
+              help='The number of draws of every table of draws.')
+@click.option('-y', '--year', 'years',
+              multiple=True,
+              type=int,
+              help='A year covered by demographic data. May be given more than once. '
+                   'Defaults to 2013 through 2017.')
+@click.option('--max-age',
+              type=click.FloatRange(min=0, min_open=True),
+              help='Only write age groups starting before this age.')
+@click.option('--exposure-categories',
+              default=2,
+              show_default=True,
+              type=click.IntRange(min=2),
+              help='The number of vitamin A deficiency exposure categories.')
+@click.option('--seed',
+              default=0,
+              show_default=True,
+              type=int,
+              help='The seed of the draw values.')
+@click.option('--storage-profile',
+              default='default',
+              show_default=True,
+              type=click.Choice(list(STORAGE_PROFILES)),
+              help='How to encode and compress artifact data.')
+@click.option('-v', 'verbose',
+              count=True,
+              help='Configure logging verbosity.')
+@click.option('--pdb', 'with_debugger',
+              is_flag=True,
+              help='Drop into python debugger if an error occurs.')
+def make_synthetic_artifacts(location: str, output_dir: str, draws: int, years: Tuple[int, ...], max_age: float,
+                             exposure_categories: int, seed: int, storage_profile: str, verbose: int,
+                             with_debugger: bool) -> None:
+    """Write artifacts of made up data holding every key the model loads.
+
+    Synthetic artifacts run the model specification without GBD data, e.g.
+    for testing or benchmarking at arbitrary population sizes.
+    """
+    configure_logging_to_terminal(verbose)
+    main = handle_exceptions(make_synthetic_artifact_files, logger, with_debugger=with_debugger)
+    main(location, output_dir, draws, years, max_age, exposure_categories, seed, storage_profile)
+
+
+@click.command()
+@click.option('-l', '--location',
+              default='all',
+              show_default=True,
+              type=click.Choice(project_globals.LOCATIONS + ['all']),
+              help='Location of the artifact to convert.')
+@click.option('-i', '--input-dir',
+              default=str(paths.ARTIFACT_ROOT),
+              show_default=True,
+              type=click.Path(exists=True, file_okay=False),
+              help='The directory holding the artifacts to convert.')
+@click.option('-o', '--output-dir',
+              required=True,
+              type=click.Path(file_okay=False),
+              help='The directory to write the converted artifacts to.')
+@click.option('--to',
+              default='columnar',
+              show_default=True,
+              type=click.Choice(['columnar', 'hdf']),
+              help='The artifact format to convert to.')
+@click.option('-b', '--benchmark',
+              is_flag=True,
+              help='Compare single draw load times of the HDF and columnar artifacts after converting.')
+@click.option('--draw',
+              default=0,
+              show_default=True,
+              type=click.IntRange(min=0),
+              help='The input draw to load when benchmarking.')
+@click.option('-v', 'verbose',
+              count=True,
+              help='Configure logging verbosity.')
+@click.option('--pdb', 'with_debugger',
+              is_flag=True,
+              help='Drop into python debugger if an error occurs.')
+def convert_artifacts(location: str, input_dir: str, output_dir: str, to: str, benchmark: bool, draw: int,
+                      verbose: int, with_debugger: bool) -> None:
+    """Convert artifacts between the HDF and memory-mapped columnar formats.
+
+    Columnar artifacts are read in simulations with the
+    ``ColumnarArtifactManager`` data plugin.
+    """
+    configure_logging_to_terminal(verbose)
+    main = handle_exceptions(convert_artifact_formats, logger, with_debugger=with_debugger)
+    main(location, input_dir, output_dir, to, benchmark, draw)
+
+
+@click.command()
+@click.option('-l', '--location',
+              default='all',
+              show_default=True,
+              type=click.Choice(project_globals.LOCATIONS + ['all']),
+              help='Location of the artifact to profile.')
+@click.option('-i', '--input-dir',
+              default=str(paths.ARTIFACT_ROOT),
+              show_default=True,
+              type=click.Path(exists=True, file_okay=False),
+              help='The directory holding the artifacts to profile.')
+@click.option('-o', '--output-dir',
+              required=True,
+              type=click.Path(file_okay=False),
+              help='The directory to write the rewritten artifacts and the report to.')
+@click.option('-p', '--profile', 'profiles',
+              multiple=True,
+              default=list(STORAGE_PROFILES),
+              show_default=True,
+              type=click.Choice(list(STORAGE_PROFILES)),
+              help='A storage profile to compare. May be given more than once.')
+@click.option('--draw',
+              default=0,
+              show_default=True,
+              type=click.IntRange(min=0),
+              help='The input draw to load when timing loads.')
+@click.option('-v', 'verbose',
+              count=True,
+              help='Configure logging verbosity.')
+@click.option('--pdb', 'with_debugger',
+              is_flag=True,
+              help='Drop into python debugger if an error occurs.')
+def profile_artifacts(location: str, input_dir: str, output_dir: str, profiles: Tuple[str, ...], draw: int,
+                      verbose: int, with_debugger: bool) -> None:
+    """Report artifact bytes on disk and load time per key for each storage profile."""
+    configure_logging_to_terminal(verbose)
+    main = handle_exceptions(profile_artifact_storage, logger, with_debugger=with_debugger)
+    main(location, input_dir, output_dir, list(profiles), draw)
+
+
+@click.command()
+@click.argument('model_specification', type=click.Path(exists=True, dir_okay=False))
+@click.option('-b', '--branches',
+              default=str(paths.MODEL_SPEC_DIR / 'branches' / 'scenarios.yaml'),
+              show_default=True,
+              type=click.Path(exists=True, dir_okay=False),
+              help='The branches file describing the scenarios and input draws to run.')
+@click.option('-o', '--output-dir',
+              required=True,
+              type=click.Path(file_okay=False),
+              help='The directory to write job outputs to.')
+@click.option('--outcome', 'outcomes',
+              multiple=True,
+              default=(f'deaths:CAUSE_OF_DEATH={project_globals.MEASLES_WITH_CONDITION_STATE_NAME}',
+                       f'deaths:CAUSE_OF_DEATH={project_globals.DIARRHEA_WITH_CONDITION_STATE_NAME}'),
+              show_default=True,
+              help=('An outcome whose estimate must converge, given as a result column type from globals.py '
+                    'and fixed template fields, e.g. "deaths:CAUSE_OF_DEATH=measles". May be repeated.'))
+@click.option('--baseline',
+              default=None,
+              help='Track outcomes averted relative to this scenario.')
+@click.option('--target-width',
+              default=0.1,
+              show_default=True,
+              type=click.FloatRange(min=0),
+              help='Target 95% confidence interval width relative to the outcome estimates.')
+@click.option('--min-seeds', default=3, show_default=True, type=click.IntRange(min=2),
+              help='Minimum random seeds per input draw.')
+@click.option('--max-seeds', default=50, show_default=True, type=click.IntRange(min=2),
+              help='Maximum random seeds per input draw.')
+@click.option('--job-budget', default=None, type=click.IntRange(min=1),
+              help='Maximum total number of simulations to run.')
+@click.option('-w', '--workers', default=1, show_default=True, type=click.IntRange(min=1),
+              help='Number of simulations to run at once.')
+@click.option('--long-format',
+              is_flag=True,
+              help='Write observer results as long format records to a partitioned Parquet dataset.')
+@click.option('--timing',
+              is_flag=True,
+              help='Time the listeners and value pipelines of every component and summarize them across jobs.')
+@click.option('-v', 'verbose',
+              count=True,
+              help='Configure logging verbosity.')
+@click.option('--pdb', 'with_debugger',
+              is_flag=True,
+              help='Drop into python debugger if an error occurs.')
+def run_adaptive(model_specification: str, branches: str, output_dir: str, outcomes: Tuple[str, ...],
+                 baseline: str, target_width: float, min_seeds: int, max_seeds: int, job_budget: int,
+                 workers: int, long_format: bool, timing: bool, verbose: int, with_debugger: bool) -> None:
+    """Run random seeds locally until outcome estimates reach a target precision.
+
+    Seeds are launched for each input draw in the branches file until the
+    running estimates of every outcome meet the target relative confidence
+    interval width, or until ``--max-seeds`` is reached.
+    """
+    configure_logging_to_terminal(verbose)
+    input_draws, _, scenarios = local_runner.load_branches(branches)
+    main = handle_exceptions(local_runner.run_adaptive_grid, logger, with_debugger=with_debugger)
+    main(model_specification, scenarios, input_draws, [local_runner.parse_outcome(o) for o in outcomes],
+         output_dir, target_width, baseline=baseline, min_seeds=min_seeds, max_seeds=max_seeds,
+         job_budget=job_budget, workers=workers, long_format=long_format, timing=timing)
+
+
+@click.command()
+@click.argument('output_dir', type=click.Path(exists=True, file_okay=False))
+@click.option('--baseline',
+              default=None,
+              help='Also summarize metrics averted relative to this scenario.')
+@click.option('-w', '--watch',
+              is_flag=True,
+              help='Keep processing job outputs as they are written.')
+@click.option('--poll-interval',
+              default=30.,
+              show_default=True,
+              type=click.FloatRange(min=0),
+              help='Seconds between checks for new job outputs when watching.')
+@click.option('--max-idle',
+              default=None,
+              type=click.FloatRange(min=0),
+              help='Stop watching after this many seconds without new job outputs.')
+@click.option('--antithetic',
+              is_flag=True,
+              help='Average job outputs over antithetic random seed pairs.')
+@click.option('-v', 'verbose',
+              count=True,
+              help='Configure logging verbosity.')
+@click.option('--pdb', 'with_debugger',
+              is_flag=True,
+              help='Drop into python debugger if an error occurs.')
+def process_results(output_dir: str, baseline: str, watch: bool, poll_interval: float, max_idle: float,
+                    antithetic: bool, verbose: int, with_debugger: bool) -> None:
+    """Summarize the job outputs in OUTPUT_DIR, ingesting each job only once.
+
+    Summaries are written to OUTPUT_DIR and updated as new job outputs
+    appear, so partial results are available while a grid is still running.
+    """
+    configure_logging_to_terminal(verbose)
+    main = handle_exceptions(process_grid_results, logger, with_debugger=with_debugger)
+    main(output_dir, baseline, watch, poll_interval, max_idle, antithetic)
+
+
+@click.command()
+@click.argument('output_dir', type=click.Path(exists=True, file_okay=False))
+@click.option('-a', '--artifact', 'artifact_path',
+              required=True,
+              type=click.Path(exists=True, dir_okay=False),
+              help='The artifact the grid ran with.')
+@click.option('--tolerance',
+              default=rates.DEFAULT_RELATIVE_TOLERANCE,
+              show_default=True,
+              type=click.FloatRange(min=0),
+              help='The largest acceptable relative error of a simulated rate.')
+@click.option('--min-person-time',
+              default=rates.DEFAULT_MIN_PERSON_TIME,
+              show_default=True,
+              type=click.FloatRange(min=0),
+              help='Strata with less person time than this in a rate denominator are never flagged.')
+@click.option('-v', 'verbose',
+              count=True,
+              help='Configure logging verbosity.')
+@click.option('--pdb', 'with_debugger',
+              is_flag=True,
+              help='Drop into python debugger if an error occurs.')
+def validate_results(output_dir: str, artifact_path: str, tolerance: float, min_person_time: float,
+                     verbose: int, with_debugger: bool) -> None:
+    """Compare simulated incidence, prevalence and excess mortality in OUTPUT_DIR to the artifact.
+
+    Every job is compared to the input draw it ran with, and strata outside
+    the tolerance are flagged in OUTPUT_DIR/validation.csv.
+    """
+    configure_logging_to_terminal(verbose)
+    main = handle_exceptions(validate_grid_results, logger, with_debugger=with_debugger)
+    main(output_dir, artifact_path, tolerance, min_person_time)
+
+
+@click.command()
+@click.option('-l', '--location',
+              required=True,
+              type=click.Choice(project_globals.LOCATIONS),
+              help='Location of the artifact to run against.')
+@click.option('-i', '--input-dir',
+              required=True,
+              type=click.Path(exists=True, file_okay=False),
+              help='The directory holding the artifact, e.g. one written by make_synthetic_artifacts.')
+@click.option('-o', '--output-dir',
+              required=True,
+              type=click.Path(file_okay=False),
+              help='The directory to write the model specification and measurements to.')
+@click.option('-t', '--template',
+              default=str(paths.MODEL_SPEC_DIR / 'model_spec.in'),
+              show_default=True,
+              type=click.Path(exists=True, dir_okay=False),
+              help='The model specification template to benchmark.')
+@click.option('-n', '--population-size', 'population_sizes',
+              multiple=True,
+              default=scaling_benchmark.DEFAULT_POPULATION_SIZES,
+              show_default=True,
+              type=click.IntRange(min=1),
+              help='A population size to run. May be repeated.')
+@click.option('-s', '--step-size', 'step_sizes',
+              multiple=True,
+              default=scaling_benchmark.DEFAULT_STEP_SIZES,
+              show_default=True,
+              type=click.IntRange(min=1),
+              help='A time step size in days to run. May be repeated.')
+@click.option('--steps',
+              default=10,
+              show_default=True,
+              type=click.IntRange(min=1),
+              help='The number of time steps to time in every configuration.')
+@click.option('--compare-clocks', 'clock_comparison_days',
+              default=None,
+              type=click.IntRange(min=1),
+              help='Also compare this many simulated days with the adaptive step clock against daily steps.')
+@click.option('--comparison-population-size',
+              default=10_000,
+              show_default=True,
+              type=click.IntRange(min=1),
+              help='The population size of the clock comparison runs.')
+@click.option('--comparison-seeds',
+              default=3,
+              show_default=True,
+              type=click.IntRange(min=1),
+              help='The number of random seeds to run with each clock.')
+@click.option('--adaptive-step-size',
+              default=None,
+              help=('Overrides of the adaptive step clock configuration as a YAML mapping, '
+                    'e.g. "{max_event_probability: 0.1}".'))
+@click.option('-v', 'verbose',
+              count=True,
+              help='Configure logging verbosity.')
+@click.option('--pdb', 'with_debugger',
+              is_flag=True,
+              help='Drop into python debugger if an error occurs.')
+def benchmark_scaling(location: str, input_dir: str, output_dir: str, template: str,
+                      population_sizes: Tuple[int, ...], step_sizes: Tuple[int, ...], steps: int,
+                      clock_comparison_days: int, comparison_population_size: int, comparison_seeds: int,
+                      adaptive_step_size: str, verbose: int, with_debugger: bool) -> None:
+    """Measure how runs of the model specification scale with population and step size.
+
+    Every combination of population size and step size is run in its own
+    process, and setup time, step time, throughput and peak memory are
+    written to OUTPUT_DIR/scaling.json.  With ``--compare-clocks``, outcomes
+    of the adaptive step clock are compared with daily steps in
+    OUTPUT_DIR/clock_comparison.json.
+    """
+    configure_logging_to_terminal(verbose)
+    adaptive_step_size = yaml.safe_load(adaptive_step_size) if adaptive_step_size else None
+    main = handle_exceptions(benchmark_model_scaling, logger, with_debugger=with_debugger)
+    main(location, input_dir, output_dir, population_sizes, step_sizes, steps, template, clock_comparison_days,
+         comparison_population_size, comparison_seeds, adaptive_step_size)
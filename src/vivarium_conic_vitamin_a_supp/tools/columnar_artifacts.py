@@ -0,0 +1,79 @@
+"""Main application functions for converting artifacts to and from the columnar format.
+
+.. admonition::
+
+   Logging in this module should typically be done at the ``info`` level.
+   Use your best judgement.
+
+"""
+from pathlib import Path
+
+from loguru import logger
+import pandas as pd
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.data import columnar
+from vivarium_conic_vitamin_a_supp.utilities import sanitize_location, len_longest_location
+
+HDF_FORMAT = 'hdf'
+COLUMNAR_FORMAT = 'columnar'
+
+
+def convert_artifacts(location: str, input_dir: str, output_dir: str, to: str, benchmark: bool, draw: int = 0):
+    """Main application function for converting artifacts between formats.
+
+    Parameters
+    ----------
+    location
+        The location of the artifact to convert.  Must be one of the
+        locations specified in the project globals or the string 'all'.
+    input_dir
+        The directory holding the artifacts to convert.
+    output_dir
+        The directory to write the converted artifacts to.
+    to
+        The format to convert to, either 'columnar' or 'hdf'.
+    benchmark
+        Whether to compare single draw load times of the HDF and columnar
+        artifacts after converting.
+    draw
+        The draw to load when benchmarking.
+
+    """
+    locations = project_globals.LOCATIONS if location == 'all' else [location]
+    input_dir, output_dir = Path(input_dir), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    benchmarks = {}
+    for loc in locations:
+        hdf_path = (input_dir if to == COLUMNAR_FORMAT else output_dir) / f'{sanitize_location(loc)}.hdf'
+        columnar_path = columnar.get_columnar_path(hdf_path, output_dir if to == COLUMNAR_FORMAT else input_dir)
+        if to == COLUMNAR_FORMAT:
+            logger.info(f'Exporting {str(hdf_path)} to {str(columnar_path)}.')
+            columnar.export_artifact(hdf_path, columnar_path)
+        else:
+            logger.info(f'Importing {str(columnar_path)} to {str(hdf_path)}.')
+            columnar.import_artifact(columnar_path, hdf_path)
+
+        if benchmark:
+            benchmarks[loc] = columnar.benchmark_loads(hdf_path, columnar_path, draw)
+
+    if benchmarks:
+        log_benchmarks(benchmarks)
+    logger.info('**Done**')
+
+
+def log_benchmarks(benchmarks: dict):
+    """Logs total single draw load times for each location and format."""
+    width = len_longest_location()
+    logger.info('Single draw load times (seconds)')
+    logger.info(f'{"location":<{width}} | {"hdf":>8} | {"columnar":>8} | {"speedup":>7} | mismatched keys')
+    for location, results in benchmarks.items():
+        hdf_time, columnar_time = results['hdf'].sum(), results['columnar'].sum()
+        speedup = hdf_time / columnar_time if columnar_time else float('inf')
+        mismatched = results.index[~results['matches']].tolist()
+        logger.info(f'{location:<{width}} | {hdf_time:>8.3f} | {columnar_time:>8.3f} | {speedup:>6.1f}x | '
+                    f'{mismatched if mismatched else "none"}')
+
+    slowest = pd.concat(benchmarks).groupby(level='key')['hdf'].mean().nlargest(5)
+    logger.info(f'Slowest keys to load from HDF: {slowest.round(3).to_dict()}')
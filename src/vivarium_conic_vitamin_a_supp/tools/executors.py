@@ -0,0 +1,430 @@
+"""Job executors for artifact builds.
+
+An executor runs artifact builds somewhere: on the cluster through DRMAA,
+in a local process pool, or in-process for tests.  All executors share the
+same interface, so :func:`run_jobs` can submit builds, wait for them to
+finish, and retry failures with backoff on any of them.
+
+Each finished build records its runtime and peak memory in a
+:class:`ResourceHistory`, and later submissions size their memory and
+runtime requests from it rather than from the fixed defaults in the
+project globals.
+
+.. admonition::
+
+   Logging in this module should typically be done at the ``info`` level.
+   Use your best judgement.
+
+"""
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+import json
+import math
+from pathlib import Path
+import shutil
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from loguru import logger
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.utilities import sanitize_location, len_longest_location
+from vivarium_conic_vitamin_a_supp.tools.app_logging import decode_status
+
+# Headroom over the largest recorded peak memory and runtime of a build.
+MEMORY_HEADROOM = 1.25
+RUNTIME_HEADROOM = 1.5
+MINIMUM_RUNTIME = 0.25  # Hours
+# Memory requests grow by this factor with every retry of a build.
+RETRY_MEMORY_FACTOR = 1.5
+HISTORY_LENGTH = 10
+# Local worker processes can only be replaced after every build from Python 3.11,
+# so only then does a worker's peak memory belong to a single build.
+FRESH_PROCESS_PER_BUILD = sys.version_info >= (3, 11)
+
+
+class BuildJob(NamedTuple):
+    location: str
+    path: Path
+    key_workers: int = 1
+    cache_dir: Optional[Path] = None
+    draws_per_chunk: Optional[int] = None
+    storage_profile: str = 'default'
+
+    @property
+    def args(self) -> List[str]:
+        """The command line arguments of the build script for this job."""
+        return [str(self.path), f'"{self.location}"', str(self.key_workers),
+                f'"{self.cache_dir if self.cache_dir is not None else ""}"', str(self.draws_per_chunk or 0),
+                self.storage_profile]
+
+
+class ResourceRequest(NamedTuple):
+    memory: float  # GB
+    threads: int
+    runtime: float  # Hours
+
+
+class JobResult(NamedTuple):
+    location: str
+    succeeded: bool
+    runtime: float  # Seconds
+    peak_memory: Optional[float]  # GB
+    error: Optional[str] = None
+    attempts: int = 1
+
+
+def parse_memory(memory: str) -> float:
+    """Converts a cluster memory request like ``'10G'`` to GB."""
+    units = {'K': 1 / 1024**2, 'M': 1 / 1024, 'G': 1, 'T': 1024}
+    memory = memory.strip().upper()
+    if memory[-1] in units:
+        return float(memory[:-1]) * units[memory[-1]]
+    return float(memory) / 1024**3  # Bytes
+
+
+def parse_runtime(runtime: str) -> float:
+    """Converts a cluster runtime request like ``'3:00:00'`` to hours."""
+    hours, minutes, seconds = [int(part) for part in runtime.split(':')]
+    return hours + minutes / 60 + seconds / 3600
+
+
+def format_runtime(hours: float) -> str:
+    """Converts hours to a cluster runtime request like ``'3:00:00'``."""
+    seconds = int(math.ceil(hours * 3600))
+    return f'{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+
+
+class ResourceHistory:
+    """Runtimes and peak memory of past artifact builds, by location.
+
+    The history is stored as json and rewritten after every recorded build,
+    so it persists across invocations of ``make_artifacts``.
+
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        try:
+            with self.path.open() as f:
+                self._records = json.load(f)
+        except FileNotFoundError:
+            self._records = {}
+
+    def record(self, result: JobResult):
+        """Records the resource usage of a finished build."""
+        records = self._records.setdefault(result.location, [])
+        records.append({'succeeded': result.succeeded, 'runtime': result.runtime,
+                        'peak_memory': result.peak_memory, 'time': time.time()})
+        self._records[result.location] = records[-HISTORY_LENGTH:]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open('w') as f:
+            json.dump(self._records, f, indent=2)
+
+    def get_request(self, location: str, threads: int) -> ResourceRequest:
+        """Sizes the resource request of a build from past successful builds.
+
+        Locations without any successful builds on record get the defaults
+        from the project globals.
+
+        """
+        memory = parse_memory(project_globals.MAKE_ARTIFACT_MEM)
+        runtime = parse_runtime(project_globals.MAKE_ARTIFACT_RUNTIME)
+        succeeded = [r for r in self._records.get(location, []) if r['succeeded']]
+        peaks = [r['peak_memory'] for r in succeeded if r['peak_memory']]
+        if peaks:
+            memory = float(math.ceil(max(peaks) * MEMORY_HEADROOM))
+        if succeeded:
+            runtime = max(max(r['runtime'] for r in succeeded) * RUNTIME_HEADROOM / 3600, MINIMUM_RUNTIME)
+        return ResourceRequest(memory=memory, threads=threads, runtime=runtime)
+
+
+class Executor(ABC):
+    """Runs artifact builds.
+
+    Subclasses submit builds to a backend and wait for them to finish.
+
+    """
+
+    @abstractmethod
+    def submit(self, job: BuildJob, resources: ResourceRequest) -> str:
+        """Submits a build and returns its job id."""
+        pass
+
+    @abstractmethod
+    def wait(self, timeout: float = None) -> Optional[Tuple[str, JobResult]]:
+        """Blocks until a build finishes.
+
+        Parameters
+        ----------
+        timeout
+            The longest time to wait in seconds.  If not provided, waits
+            until a build finishes.
+
+        Returns
+        -------
+            The job id and result of the finished build, or ``None`` if no
+            build finished before the timeout.
+
+        """
+        pass
+
+    def status(self) -> Dict[str, str]:
+        """Gets the status of each unfinished build, by job id."""
+        return {}
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class DrmaaExecutor(Executor):
+    """Runs each build as a cluster job submitted through DRMAA."""
+
+    def __init__(self, script: Union[str, Path]):
+        """
+        Parameters
+        ----------
+        script
+            The python script that builds a single artifact from the
+            arguments in :attr:`BuildJob.args`.
+
+        """
+        from vivarium_cluster_tools.psimulate.utilities import get_drmaa
+        self._drmaa = get_drmaa()
+        self._script = str(script)
+        self._session = self._drmaa.Session()
+        self._session.initialize()
+        self._jobs = {}
+
+    def submit(self, job: BuildJob, resources: ResourceRequest) -> str:
+        job_template = self._session.createJobTemplate()
+        job_template.remoteCommand = shutil.which("python")
+        job_template.args = [self._script] + job.args
+        job_template.nativeSpecification = (f'-V '  # Export all environment variables
+                                            f'-b y '  # Command is a binary (python)
+                                            f'-P {project_globals.CLUSTER_PROJECT} '
+                                            f'-q {project_globals.CLUSTER_QUEUE} '
+                                            f'-l fmem={math.ceil(resources.memory)}G '
+                                            f'-l fthread={resources.threads} '
+                                            f'-l h_rt={format_runtime(resources.runtime)} '
+                                            f'-l archive=TRUE '  # Need J-drive access for data
+                                            f'-N {sanitize_location(job.location)}_artifact')  # Name of the job
+        job_id = self._session.runJob(job_template)
+        self._session.deleteJobTemplate(job_template)
+        self._jobs[job_id] = (job.location, time.time())
+        return job_id
+
+    def wait(self, timeout: float = None) -> Optional[Tuple[str, JobResult]]:
+        if timeout is None:
+            timeout = self._drmaa.Session.TIMEOUT_WAIT_FOREVER
+        try:
+            info = self._session.wait(self._drmaa.Session.JOB_IDS_SESSION_ANY, timeout)
+        except self._drmaa.ExitTimeoutException:
+            return None
+        location, start = self._jobs.pop(info.jobId)
+
+        usage = info.resourceUsage or {}
+        runtime = float(usage.get('ru_wallclock', time.time() - start))
+        if 'ru_maxrss' in usage:
+            peak_memory = float(usage['ru_maxrss']) / 1024**2  # KB
+        elif 'maxvmem' in usage:
+            peak_memory = float(usage['maxvmem']) / 1024**3  # Bytes
+        else:
+            peak_memory = None
+
+        succeeded = bool(info.hasExited) and int(info.exitStatus) == 0
+        if succeeded:
+            error = None
+        elif info.hasSignal:
+            error = f'Job terminated by signal {info.terminatedSignal}.'
+        else:
+            error = f'Job exited with status {info.exitStatus}.'
+        return info.jobId, JobResult(location, succeeded, runtime, peak_memory, error)
+
+    def status(self) -> Dict[str, str]:
+        return {job_id: decode_status(self._drmaa, self._session.jobStatus(job_id)) for job_id in self._jobs}
+
+    def close(self):
+        self._session.exit()
+
+
+class LocalExecutor(Executor):
+    """Runs builds in a local process pool.
+
+    Before Python 3.11 worker processes are reused between builds, so local
+    builds report no peak memory and their memory requests keep the default.
+
+    """
+
+    def __init__(self, run_job: Callable[[BuildJob], JobResult], workers: int = 1):
+        """
+        Parameters
+        ----------
+        run_job
+            A picklable function that builds an artifact in a worker process
+            and reports how it went.
+        workers
+            The maximum number of builds to run at once.
+
+        """
+        # A fresh process per build keeps peak memory measurements per build.
+        options = {'max_tasks_per_child': 1} if FRESH_PROCESS_PER_BUILD else {}
+        self._pool = ProcessPoolExecutor(max_workers=workers, **options)
+        self._run_job = run_job
+        self._futures: Dict[Future, Tuple[str, str]] = {}
+        self._count = 0
+
+    def submit(self, job: BuildJob, resources: ResourceRequest) -> str:
+        self._count += 1
+        job_id = f'local-{self._count}'
+        self._futures[self._pool.submit(self._run_job, job)] = job_id, job.location
+        return job_id
+
+    def wait(self, timeout: float = None) -> Optional[Tuple[str, JobResult]]:
+        done, _ = wait(self._futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            return None
+        future = done.pop()
+        job_id, location = self._futures.pop(future)
+        try:
+            result = future.result()
+        except Exception as e:  # The worker process died, e.g. it ran out of memory.
+            result = JobResult(location, False, 0., None, f'{type(e).__name__}: {e}')
+        return job_id, result
+
+    def status(self) -> Dict[str, str]:
+        return {job_id: 'running' if future.running() else 'queued_active'
+                for future, (job_id, _) in self._futures.items()}
+
+    def close(self):
+        self._pool.shutdown()
+
+
+class FakeExecutor(Executor):
+    """Runs builds in-process, one per call to :meth:`wait`, for tests.
+
+    Attributes
+    ----------
+    submissions
+        Every submitted job and the resources requested for it, in order.
+
+    """
+
+    def __init__(self, run_job: Callable[[BuildJob, ResourceRequest], JobResult]):
+        """
+        Parameters
+        ----------
+        run_job
+            A function that stands in for a build and reports how it went.
+
+        """
+        self._run_job = run_job
+        self._queue: List[Tuple[str, BuildJob, ResourceRequest]] = []
+        self.submissions: List[Tuple[BuildJob, ResourceRequest]] = []
+
+    def submit(self, job: BuildJob, resources: ResourceRequest) -> str:
+        job_id = f'fake-{len(self.submissions) + 1}'
+        self._queue.append((job_id, job, resources))
+        self.submissions.append((job, resources))
+        return job_id
+
+    def wait(self, timeout: float = None) -> Optional[Tuple[str, JobResult]]:
+        if not self._queue:
+            time.sleep(timeout or 0)
+            return None
+        job_id, job, resources = self._queue.pop(0)
+        return job_id, self._run_job(job, resources)
+
+    def status(self) -> Dict[str, str]:
+        return {job_id: 'queued_active' for job_id, _, _ in self._queue}
+
+
+def run_jobs(executor: Executor, jobs: List[BuildJob], history: ResourceHistory,
+             max_retries: int = project_globals.MAKE_ARTIFACT_MAX_RETRIES,
+             backoff: float = project_globals.MAKE_ARTIFACT_RETRY_BACKOFF,
+             verbose: int = 0) -> Dict[str, JobResult]:
+    """Runs builds to completion, retrying failures.
+
+    Parameters
+    ----------
+    executor
+        The executor to run the builds with.
+    jobs
+        The builds to run, one per location.
+    history
+        The resource history that sizes each request and records each
+        finished build.
+    max_retries
+        The number of times a failed build is resubmitted.
+    backoff
+        The delay in seconds before the first retry of a build.  It doubles
+        with every further retry.  The memory request of a retry also grows
+        by ``RETRY_MEMORY_FACTOR``, since running out of memory is the most
+        common reason for a build to fail.
+    verbose
+        Whether to log the status of unfinished builds while waiting.
+
+    Returns
+    -------
+        The result of the last attempt of each build, by location.
+
+    """
+    jobs = {job.location: job for job in jobs}
+    attempts = {location: 0 for location in jobs}
+    running, retry_at, results = {}, {}, {}
+    width = len_longest_location()
+
+    def submit(location: str):
+        job = jobs[location]
+        attempts[location] += 1
+        request = history.get_request(location, max(int(project_globals.MAKE_ARTIFACT_CPU), job.key_workers))
+        request = request._replace(memory=request.memory * RETRY_MEMORY_FACTOR ** (attempts[location] - 1))
+        job_id = executor.submit(job, request)
+        running[job_id] = location
+        logger.info(f'Submitted job {job_id} to build artifact for {location} (attempt {attempts[location]}, '
+                    f'{math.ceil(request.memory)}G, {format_runtime(request.runtime)}).')
+
+    for location in jobs:
+        submit(location)
+
+    while running or retry_at:
+        now = time.time()
+        for location in [l for l, ready in retry_at.items() if ready <= now]:
+            del retry_at[location]
+            submit(location)
+
+        # Wake up for the next retry and, when verbose, to report on progress.
+        timeout = min([ready - now for ready in retry_at.values()]
+                      + ([project_globals.MAKE_ARTIFACT_SLEEP] if verbose else []), default=None)
+        event = executor.wait(max(timeout, 0) if timeout is not None else None) if running else None
+        if event is None:
+            if running and verbose:
+                for job_id, status in executor.status().items():
+                    logger.info(f'{running[job_id]:<{width}}: {status:>15}')
+            elif not running:
+                time.sleep(max(timeout, 0))
+            continue
+
+        job_id, result = event
+        location = running.pop(job_id)
+        history.record(result)
+        result = result._replace(attempts=attempts[location])
+        if result.succeeded:
+            logger.info(f'{location:<{width}}: finished after {result.runtime / 60:.1f} minutes')
+            results[location] = result
+        elif attempts[location] <= max_retries:
+            delay = backoff * 2 ** (attempts[location] - 1)
+            reason = (result.error or 'unknown error').strip().splitlines()[-1]
+            logger.warning(f'{location:<{width}}: failed ({reason}). Retrying in {delay:g} seconds.')
+            retry_at[location] = time.time() + delay
+        else:
+            logger.error(f'{location:<{width}}: failed after {attempts[location]} attempts.')
+            results[location] = result
+    return results
@@ -0,0 +1,498 @@
+"""Main application functions for running simulation grids locally.
+
+A grid is the cross product of the branches, input draws and random seeds
+described by a branches file (e.g.
+``model_specifications/branches/scenarios.yaml``).  Each job in the grid is
+run in its own process and writes its metrics to a json file in the output
+directory.
+
+Instead of running a fixed number of random seeds per (branch, draw), the
+runner can keep launching seeds only until the running estimates of a set
+of outcomes meet a target relative confidence interval width.  Free workers
+always go to the (branch, draw) whose estimates are least precise.
+
+Grids run with antithetic randomness (see
+:mod:`vivarium_conic_vitamin_a_supp.plugins.randomness`) are run in rounds
+of random seed pairs, and the adaptive runner averages each pair into a
+single replicate before updating its estimates.
+
+A job that raises is logged and skipped rather than stopping the grid.  The
+adaptive runner abandons the failed job's round and gives the draw a round
+of new seeds in its place.
+
+Either runner can also time every job's components with the
+:class:`~vivarium_conic_vitamin_a_supp.components.timing.ComponentTimer`,
+writing each job's timing records to the ``timing`` subdirectory of the
+output directory and a summary across jobs to ``timing_summary.csv``.
+
+.. admonition::
+
+   Logging in this module should typically be done at the ``info`` level.
+   Use your best judgement.
+
+"""
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import functools
+import itertools
+import json
+import math
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple, Union
+
+from loguru import logger
+import yaml
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.results_processing.schema import RESULTS_SCHEMA
+from vivarium_conic_vitamin_a_supp.results_processing.statistics import RunningMoments
+from vivarium_conic_vitamin_a_supp.results_processing.timing import read_timings, summarize_timings
+
+
+BASELINE_SCENARIO = 'baseline'
+LONG_FORMAT_DIR = 'long_format'
+TIMING_DIR = 'timing'
+TIMING_SUMMARY_FILE = 'timing_summary.csv'
+
+
+class Job(NamedTuple):
+    """A single simulation in a grid."""
+    scenario: str
+    branch_configuration: dict
+    input_draw: int
+    random_seed: int
+
+    @property
+    def name(self) -> str:
+        return f'{self.scenario}_draw_{self.input_draw}_seed_{self.random_seed}'
+
+
+class Outcome(NamedTuple):
+    """A simulation outcome summed over a subset of the result columns.
+
+    For example ``Outcome('deaths', {'CAUSE_OF_DEATH': 'measles'})`` is the
+    total number of measles deaths over all years, sexes and age groups.
+
+    """
+    kind: str
+    fields: Dict[str, str]
+
+    @property
+    def name(self) -> str:
+        return '_'.join([self.kind] + list(self.fields.values()))
+
+    @property
+    def columns(self) -> List[str]:
+        return get_outcome_columns(self.kind, **self.fields)
+
+    def value(self, metrics: Dict[str, float]) -> float:
+        return sum(metrics.get(column, 0.) for column in self.columns)
+
+
+def get_outcome_columns(kind: str, **fields: str) -> List[str]:
+    """Gets the result columns of a kind with some template fields held fixed.
+
+    Parameters
+    ----------
+    kind
+        A key of ``globals.COLUMN_TEMPLATES``.
+    fields
+        Template fields and the single values they should take.
+
+    Returns
+    -------
+        The matching result column names.
+
+    """
+    if kind not in project_globals.COLUMN_TEMPLATES:
+        raise ValueError(f'Unknown result column type {kind}')
+    template = project_globals.COLUMN_TEMPLATES[kind]
+    template_fields = [f for f in project_globals.TEMPLATE_FIELD_MAP if f'{{{f}}}' in template]
+    unknown_fields = set(fields).difference(template_fields)
+    if unknown_fields:
+        raise ValueError(f'Fields {unknown_fields} are not in the {kind} template {template}.')
+    return RESULTS_SCHEMA.get_columns(kind, **fields)
+
+
+def parse_outcome(outcome: str) -> Outcome:
+    """Parses an outcome of the form ``kind:FIELD=value,FIELD=value``."""
+    kind, _, fields = outcome.partition(':')
+    fields = dict(field.split('=') for field in fields.split(',') if field)
+    return Outcome(kind, fields)
+
+
+def get_scenario_name(branch_configuration: dict) -> str:
+    """Builds a readable scenario name from a branch configuration."""
+    def flatten(d, prefix=()):
+        for key, value in d.items():
+            if isinstance(value, dict):
+                yield from flatten(value, prefix + (key,))
+            else:
+                yield '_'.join(prefix[-1:] + (key, str(value)))
+    name = '_'.join(flatten(branch_configuration))
+    return name if name else BASELINE_SCENARIO
+
+
+def load_branches(branches_path: Union[str, Path]) -> Tuple[List[int], List[int], Dict[str, dict]]:
+    """Reads the input draws, random seeds and scenarios from a branches file.
+
+    Returns
+    -------
+        The input draws, the random seeds and a mapping between scenario
+        names and branch configurations.
+
+    """
+    with Path(branches_path).open() as f:
+        branches_spec = yaml.full_load(f)
+    input_draws = list(range(branches_spec.get('input_draw_count', 1)))
+    random_seeds = list(range(branches_spec.get('random_seed_count', 1)))
+    branches = branches_spec.get('branches') or [{}]
+    scenarios = {get_scenario_name(branch): branch for branch in branches}
+    return input_draws, random_seeds, scenarios
+
+
+def run_job(model_specification: str, job: Job, long_format_dir: str = None,
+            timing_dir: str = None) -> Dict[str, float]:
+    """Runs a single simulation and returns its metrics.
+
+    If ``long_format_dir`` is given, the project's observers write their
+    results there as long format records instead of reporting them as
+    metrics.  If ``timing_dir`` is given, the simulation's components are
+    timed and the timing records are written there as ``{job name}.csv``.
+
+    """
+    # Local import to avoid simulation setup costs for the parent process.
+    from vivarium.framework.engine import SimulationContext
+    from vivarium_conic_vitamin_a_supp.components import ComponentTimer
+
+    configuration = {
+        'input_data': {'input_draw_number': job.input_draw},
+        'randomness': {'random_seed': job.random_seed},
+    }
+    if long_format_dir is not None:
+        configuration['metrics'] = {
+            'supplemented_days': {'long_format': {'output_directory': long_format_dir, 'scenario': job.scenario}},
+        }
+    components = []
+    if timing_dir is not None:
+        components.append(ComponentTimer())
+        configuration['timing'] = {'output_path': str(Path(timing_dir) / f'{job.name}.csv')}
+    simulation = SimulationContext(model_specification, components=components, configuration=configuration)
+    simulation.configuration.update(job.branch_configuration, layer='override', source='branch')
+    simulation.setup()
+    simulation.initialize_simulants()
+    simulation.run()
+    simulation.finalize()
+    metrics = dict(simulation.report(print_results=False))
+    metrics.update({
+        project_globals.OUTPUT_SCENARIO_COLUMN: job.scenario,
+        project_globals.INPUT_DRAW_COLUMN: job.input_draw,
+        project_globals.RANDOM_SEED_COLUMN: job.random_seed,
+    })
+    return metrics
+
+
+def write_job_output(output_dir: Path, job: Job, metrics: Dict[str, float]):
+    # Write to a hidden file first so results processing never reads a partial output.
+    temp_path = output_dir / f'.{job.name}.json.tmp'
+    with temp_path.open('w') as f:
+        json.dump(metrics, f, default=float)
+    temp_path.replace(output_dir / f'{job.name}.json')
+
+
+def run_grid(model_specification: str, jobs: Iterable[Job], output_dir: Union[str, Path], workers: int = 1,
+             job_runner: Callable[[str, Job], Dict[str, float]] = run_job, long_format: bool = False,
+             timing: bool = False) -> List[Job]:
+    """Runs every job in a grid.
+
+    Parameters
+    ----------
+    model_specification
+        Path to the rendered model specification.
+    jobs
+        The jobs to run.
+    output_dir
+        The directory the job outputs are written to.
+    workers
+        The number of simulations to run at once.
+    job_runner
+        The function that runs a single job.
+    long_format
+        Whether the project's observers should write long format records to
+        the ``long_format`` subdirectory of the output directory.
+    timing
+        Whether to time the components of every job.
+
+    Returns
+    -------
+        The jobs that failed.  Their errors are logged and they have no
+        output.
+
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    job_runner = _with_long_format(job_runner, output_dir) if long_format else job_runner
+    job_runner = _with_timing(job_runner, output_dir) if timing else job_runner
+    failed_jobs = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(job_runner, model_specification, job): job for job in jobs}
+        logger.info(f'Submitted {len(futures)} jobs to {workers} workers.')
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                metrics = future.result()
+            except Exception:
+                logger.exception(f'{job.name} failed. Skipping it.')
+                failed_jobs.append(job)
+                continue
+            write_job_output(output_dir, job, metrics)
+            logger.info(f'Finished {job.name}.')
+    if failed_jobs:
+        logger.info(f'{len(failed_jobs)} of {len(futures)} jobs failed: {[job.name for job in failed_jobs]}.')
+    if timing:
+        write_timing_summary(output_dir)
+    return failed_jobs
+
+
+class ReplicateTracker:
+    """Tracks the running estimates for one input draw of a grid.
+
+    A round is one random seed, or with antithetic randomness one pair of
+    random seeds, run for every scenario tracked here.  With a baseline
+    scenario the tracked values are the outcomes averted relative to the
+    baseline at the same seed, otherwise they are the outcomes themselves.
+    The values of the two seeds of an antithetic pair are averaged into a
+    single replicate.  A round with a failed job is abandoned.
+
+    """
+
+    def __init__(self, input_draw: int, scenarios: List[str], outcomes: List[Outcome], baseline: str = None,
+                 antithetic: bool = False):
+        self.input_draw = input_draw
+        self.scenarios = scenarios
+        self.outcomes = outcomes
+        self.baseline = baseline
+        self.antithetic = antithetic
+        self.rounds_launched = 0
+        self._pending = {}
+        self._failed_rounds = set()
+        compared = [s for s in scenarios if s != baseline]
+        self.moments = {(scenario, outcome.name): RunningMoments() for scenario in compared for outcome in outcomes}
+
+    @property
+    def rounds_completed(self) -> int:
+        return min([m.count for m in self.moments.values()], default=0)
+
+    def relative_ci_width(self) -> float:
+        """The widest relative confidence interval of the tracked estimates."""
+        return max([m.relative_confidence_interval_width() for m in self.moments.values()], default=0.)
+
+    def is_converged(self, target: float, min_seeds: int) -> bool:
+        return self.rounds_completed >= min_seeds and self.relative_ci_width() <= target
+
+    @property
+    def rounds_failed(self) -> int:
+        return len(self._failed_rounds)
+
+    @property
+    def rounds_outstanding(self) -> int:
+        """The launched rounds that have neither completed nor failed."""
+        return self.rounds_launched - self.rounds_completed - self.rounds_failed
+
+    @property
+    def seeds_per_round(self) -> int:
+        return 2 if self.antithetic else 1
+
+    def get_round_seeds(self, round_number: int) -> List[int]:
+        """Gets the random seeds run in a round."""
+        return [round_number * self.seeds_per_round + member for member in range(self.seeds_per_round)]
+
+    def add_result(self, job: Job, metrics: Dict[str, float]):
+        round_number = job.random_seed // self.seeds_per_round
+        if round_number in self._failed_rounds:
+            return
+        results = self._pending.setdefault(round_number, {})
+        results[(job.scenario, job.random_seed)] = metrics
+        if len(results) < len(self.scenarios) * self.seeds_per_round:
+            return
+
+        del self._pending[round_number]
+        for scenario, outcome in itertools.product(self.scenarios, self.outcomes):
+            if scenario == self.baseline:
+                continue
+            values = []
+            for seed in self.get_round_seeds(round_number):
+                value = outcome.value(results[(scenario, seed)])
+                if self.baseline is not None:
+                    value = outcome.value(results[(self.baseline, seed)]) - value
+                values.append(value)
+            self.moments[(scenario, outcome.name)].update(sum(values) / len(values))
+
+    def add_failure(self, job: Job):
+        """Abandons the round of a failed job, discarding the results it already has."""
+        round_number = job.random_seed // self.seeds_per_round
+        self._pending.pop(round_number, None)
+        self._failed_rounds.add(round_number)
+
+    def summary(self) -> Dict[str, float]:
+        return {f'{scenario}.{outcome}': m.mean for (scenario, outcome), m in self.moments.items()}
+
+
+def run_adaptive_grid(model_specification: str, scenarios: Dict[str, dict], input_draws: List[int],
+                      outcomes: List[Outcome], output_dir: Union[str, Path], target_relative_ci_width: float,
+                      baseline: str = None, min_seeds: int = 3, max_seeds: int = 50, job_budget: int = None,
+                      workers: int = 1, job_runner: Callable[[str, Job], Dict[str, float]] = run_job,
+                      long_format: bool = False, timing: bool = False,
+                      antithetic: bool = None) -> Dict[int, ReplicateTracker]:
+    """Runs random seeds for each draw until the outcome estimates converge.
+
+    Parameters
+    ----------
+    model_specification
+        Path to the rendered model specification.
+    scenarios
+        Mapping between scenario names and branch configurations.
+    input_draws
+        The input draws to run.
+    outcomes
+        The outcomes whose estimates must converge.
+    output_dir
+        The directory the job outputs are written to.
+    target_relative_ci_width
+        The width of the 95% confidence interval of every outcome estimate,
+        relative to the estimate, at which a draw stops receiving seeds.
+    baseline
+        If given, the outcomes are estimated as the amount averted relative
+        to this scenario at the same random seed.
+    min_seeds
+        The minimum number of seeds to run for every draw.  With antithetic
+        randomness, seeds are counted in pairs.
+    max_seeds
+        The maximum number of seeds to run for any draw, including seeds
+        with failed jobs.  With antithetic randomness, seeds are counted in
+        pairs.
+    job_budget
+        An optional cap on the total number of simulations to run.
+    workers
+        The number of simulations to run at once.
+    job_runner
+        The function that runs a single job.
+    long_format
+        Whether the project's observers should write long format records to
+        the ``long_format`` subdirectory of the output directory.
+    timing
+        Whether to time the components of every job.
+    antithetic
+        Whether the model specification uses antithetic randomness, so seeds
+        are run and averaged in pairs.  Read from the model specification's
+        ``randomness.variance_reduction`` configuration if not given.
+
+    Returns
+    -------
+        The trackers holding the final estimates for each input draw.
+
+    """
+    if baseline is not None and baseline not in scenarios:
+        raise ValueError(f'Baseline scenario {baseline} is not one of the scenarios {list(scenarios)}.')
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    job_budget = job_budget if job_budget is not None else math.inf
+    job_runner = _with_long_format(job_runner, output_dir) if long_format else job_runner
+    job_runner = _with_timing(job_runner, output_dir) if timing else job_runner
+
+    antithetic = uses_antithetic_randomness(model_specification) if antithetic is None else antithetic
+    if antithetic:
+        logger.info('Running random seeds in antithetic pairs.')
+
+    trackers = {draw: ReplicateTracker(draw, list(scenarios), outcomes, baseline, antithetic)
+                for draw in input_draws}
+    round_size = len(scenarios) * (2 if antithetic else 1)
+
+    def needs_seeds(tracker: ReplicateTracker) -> bool:
+        if tracker.rounds_launched >= max_seeds:
+            return False
+        if tracker.rounds_launched - tracker.rounds_failed < min_seeds:
+            return True
+        # Only judge convergence once every launched round has come back.
+        return tracker.rounds_outstanding == 0 and not tracker.is_converged(target_relative_ci_width, min_seeds)
+
+    def next_round() -> List[Job]:
+        candidates = [t for t in trackers.values() if needs_seeds(t)]
+        if not candidates:
+            return []
+        # Give the next round to the draw with the least precise estimates.
+        tracker = max(candidates, key=lambda t: (t.rounds_launched - t.rounds_failed < min_seeds,
+                                                 t.relative_ci_width()))
+        seeds = tracker.get_round_seeds(tracker.rounds_launched)
+        tracker.rounds_launched += 1
+        return [Job(scenario, branch, tracker.input_draw, seed)
+                for seed in seeds for scenario, branch in scenarios.items()]
+
+    jobs_launched = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        while True:
+            while len(futures) < workers and jobs_launched + round_size <= job_budget:
+                jobs = next_round()
+                if not jobs:
+                    break
+                for job in jobs:
+                    futures[executor.submit(job_runner, model_specification, job)] = job
+                jobs_launched += len(jobs)
+            if not futures:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = futures.pop(future)
+                tracker = trackers[job.input_draw]
+                try:
+                    metrics = future.result()
+                except Exception:
+                    logger.exception(f'{job.name} failed. Abandoning its round of seeds.')
+                    tracker.add_failure(job)
+                    continue
+                write_job_output(output_dir, job, metrics)
+                tracker.add_result(job, metrics)
+                logger.info(f'Finished {job.name}. Draw {job.input_draw} relative CI width: '
+                            f'{tracker.relative_ci_width():.3f} after {tracker.rounds_completed} seeds.')
+
+    for draw, tracker in trackers.items():
+        status = 'converged' if tracker.is_converged(target_relative_ci_width, min_seeds) else 'not converged'
+        failures = f', {tracker.rounds_failed} failed' if tracker.rounds_failed else ''
+        logger.info(f'Draw {draw}: {tracker.rounds_completed} seeds{failures}, {status}, '
+                    f'relative CI width {tracker.relative_ci_width():.3f}.')
+    logger.info(f'Ran {jobs_launched} simulations.')
+    if timing:
+        write_timing_summary(output_dir)
+    return trackers
+
+
+def uses_antithetic_randomness(model_specification: Union[str, Path]) -> bool:
+    """Whether a model specification configures antithetic randomness."""
+    with Path(model_specification).open() as f:
+        spec = yaml.full_load(f) or {}
+    configuration = spec.get('configuration') or {}
+    variance_reduction = (configuration.get('randomness') or {}).get('variance_reduction') or {}
+    return bool(variance_reduction.get('antithetic', False))
+
+
+def write_timing_summary(output_dir: Path, top: int = 10):
+    """Summarizes the timing records of a grid's jobs and logs the costliest components."""
+    timings = read_timings(output_dir / TIMING_DIR)
+    if timings.empty:
+        logger.info(f'No timing records found in {str(output_dir / TIMING_DIR)}.')
+        return
+    summary = summarize_timings(timings)
+    summary.to_csv(output_dir / TIMING_SUMMARY_FILE, index=False)
+    table = summary.head(top).to_string(index=False, float_format='{:.4g}'.format)
+    logger.info(f'Costliest components, averaged over {timings["job"].nunique()} jobs:\n{table}')
+    logger.info(f'Timing summary written to {str(output_dir / TIMING_SUMMARY_FILE)}.')
+
+
+def _with_long_format(job_runner: Callable, output_dir: Path) -> Callable[[str, Job], Dict[str, float]]:
+    return functools.partial(job_runner, long_format_dir=str(output_dir / LONG_FORMAT_DIR))
+
+
+def _with_timing(job_runner: Callable, output_dir: Path) -> Callable[[str, Job], Dict[str, float]]:
+    return functools.partial(job_runner, timing_dir=str(output_dir / TIMING_DIR))
+
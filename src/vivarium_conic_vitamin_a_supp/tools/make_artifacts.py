@@ -6,23 +6,28 @@
    Use your best judgement.
 
 """
-import shutil
+import resource
 import sys
 import time
+import traceback
 import click
 
 from pathlib import Path
-from typing import Union
+from typing import Dict, Union
 from loguru import logger
 
-import vivarium_cluster_tools as vct
-
 from vivarium_conic_vitamin_a_supp import globals as project_globals
 from vivarium_conic_vitamin_a_supp.utilities import sanitize_location, delete_if_exists, len_longest_location
-from vivarium_conic_vitamin_a_supp.tools.app_logging import add_logging_sink, decode_status
+from vivarium_conic_vitamin_a_supp.tools.app_logging import add_logging_sink
+from vivarium_conic_vitamin_a_supp.tools.executors import (FRESH_PROCESS_PER_BUILD, BuildJob, DrmaaExecutor, Executor,
+                                                           JobResult, LocalExecutor, ResourceHistory, parse_memory,
+                                                           run_jobs)
 
 
 def running_from_cluster() -> bool:
+    # Local import so the tools package can be imported without the cluster tools installed.
+    import vivarium_cluster_tools as vct
+
     on_cluster = True
     try:
         vct.get_cluster_name()
@@ -32,6 +37,9 @@ def running_from_cluster() -> bool:
 
 
 def check_for_existing(output_dir: Path, location: str, append: bool):
+    # Local import to avoid data dependencies
+    from vivarium_conic_vitamin_a_supp.data.manifest import ArtifactManifest, get_manifest_path
+
     existing_artifacts = set([item.stem for item in output_dir.iterdir()
                               if item.is_file() and item.suffix == '.hdf'])
     locations = set([sanitize_location(loc) for loc in project_globals.LOCATIONS])
@@ -44,16 +52,31 @@ def check_for_existing(output_dir: Path, location: str, append: bool):
                       abort=True)
         for loc in existing:
             path = output_dir / f'{loc}.hdf'
-            logger.info(f'Deleting artifact at {str(path)}.')
-            path.unlink()
-
-
-def build_single(location: str, output_dir: str, append: bool):
+            delete_if_exists(path, get_manifest_path(path))
+    elif existing:
+        total_keys = sum(len(list(key_group)) for key_group in project_globals.MAKE_ARTIFACT_KEY_GROUPS)
+        for loc in sorted(existing):
+            # Reads only the manifest, not the artifact itself.
+            manifest = ArtifactManifest.read(output_dir / f'{loc}.hdf')
+            if manifest is not None:
+                built = sum(key in manifest for key_group in project_globals.MAKE_ARTIFACT_KEY_GROUPS
+                            for key in key_group)
+                logger.info(f'Appending to the {loc} artifact, which has {built} of {total_keys} keys.')
+            else:
+                logger.info(f'Appending to the {loc} artifact, which has no up to date manifest.')
+
+
+def build_single(location: str, output_dir: str, append: bool, key_workers: int = 1, cache_dir: Path = None,
+                 draws_per_chunk: int = None, storage_profile: str = 'default'):
     path = Path(output_dir) / f'{sanitize_location(location)}.hdf'
-    build_single_location_artifact(path, location)
+    build_single_location_artifact(path, location, key_workers=key_workers, cache_dir=cache_dir,
+                                   draws_per_chunk=draws_per_chunk, storage_profile=storage_profile)
 
 
-def build_artifacts(location: str, output_dir: str, append: bool, verbose: int):
+def build_artifacts(location: str, output_dir: str, append: bool, verbose: int,
+                    workers: int = 1, memory_budget: float = None, key_workers: int = 1,
+                    use_cache: bool = True, cache_dir: str = None, draws_per_chunk: int = None,
+                    storage_profile: str = 'default'):
     """Main application function for building artifacts.
     Parameters
     ----------
@@ -70,28 +93,54 @@ def build_artifacts(location: str, output_dir: str, append: bool, verbose: int):
         directory.  Has no effect if artifacts are not found.
     verbose
         How noisy the logger should be.
+    workers
+        The maximum number of artifacts to build at once when building all
+        artifacts off the cluster.
+    memory_budget
+        The memory, in GB, available to local artifact builds.  Each build
+        is assumed to need ``MAKE_ARTIFACT_MEM``.  Has no effect on the
+        cluster.
+    key_workers
+        The number of keys to load at once within each artifact build.
+    use_cache
+        Whether loader outputs should be read through an on-disk cache
+        shared by all builds.
+    cache_dir
+        The directory of the loader cache.  Defaults to a directory in the
+        output directory.
+    draws_per_chunk
+        If provided, tables of draws are streamed to the artifacts in chunks
+        of this many draws using the per-draw layout.
+    storage_profile
+        The name of the storage profile to write artifact data with.
     """
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
     check_for_existing(output_dir, location, append)
 
+    if use_cache:
+        cache_dir = Path(cache_dir) if cache_dir is not None else output_dir / project_globals.LOADER_CACHE_DIR_NAME
+    else:
+        cache_dir = None
+
     if location in project_globals.LOCATIONS:
-        build_single(location, output_dir, append)
+        build_single(location, output_dir, append, key_workers, cache_dir, draws_per_chunk, storage_profile)
     elif location == 'all':
         if running_from_cluster():
             # parallel build when on cluster
-            build_all_artifacts(output_dir, verbose)
+            build_all_artifacts(output_dir, verbose, key_workers, cache_dir, draws_per_chunk, storage_profile)
         else:
-            # serial build when not on cluster
-            for loc in project_globals.LOCATIONS:
-                build_single(loc, output_dir, append)
+            # local process pool build when not on cluster
+            build_all_artifacts_locally(output_dir, workers, memory_budget, key_workers, cache_dir,
+                                        draws_per_chunk, storage_profile, verbose)
     else:
         raise ValueError(f'Location must be one of {project_globals.LOCATIONS} or the string "all". '
                          f'You specified {location}.')
 
 
-def build_all_artifacts(output_dir: Path, verbose: int):
+def build_all_artifacts(output_dir: Path, verbose: int, key_workers: int = 1, cache_dir: Path = None,
+                        draws_per_chunk: int = None, storage_profile: str = 'default'):
     """Builds artifacts for all locations in parallel.
     Parameters
     ----------
@@ -99,55 +148,171 @@ def build_all_artifacts(output_dir: Path, verbose: int):
         The directory where the artifacts will be built.
     verbose
         How noisy the logger should be.
+    key_workers
+        The number of keys to load at once within each artifact build.
+    cache_dir
+        The directory of the loader cache, if one is used.
+    draws_per_chunk
+        The number of draws to stream to the artifacts at once, if streaming.
+    storage_profile
+        The name of the storage profile to write artifact data with.
     Note
     ----
         This function should not be called directly.  It is intended to be
         called by the :func:`build_artifacts` function located in the same
         module.
     """
-    from vivarium_cluster_tools.psimulate.utilities import get_drmaa
-    drmaa = get_drmaa()
-
-    jobs = {}
-    with drmaa.Session() as session:
-        for location in project_globals.LOCATIONS:
-            path = output_dir / f'{sanitize_location(location)}.hdf'
-
-            job_template = session.createJobTemplate()
-            job_template.remoteCommand = shutil.which("python")
-            job_template.args = [__file__, str(path), f'"{location}"']
-            job_template.nativeSpecification = (f'-V '  # Export all environment variables
-                                                f'-b y '  # Command is a binary (python)
-                                                f'-P {project_globals.CLUSTER_PROJECT} '  
-                                                f'-q {project_globals.CLUSTER_QUEUE} '  
-                                                f'-l fmem={project_globals.MAKE_ARTIFACT_MEM} '
-                                                f'-l fthread={project_globals.MAKE_ARTIFACT_CPU} '
-                                                f'-l h_rt={project_globals.MAKE_ARTIFACT_RUNTIME} '
-                                                f'-l archive=TRUE '  # Need J-drive access for data
-                                                f'-N {sanitize_location(location)}_artifact')  # Name of the job
-            jobs[location] = (session.runJob(job_template), drmaa.JobState.UNDETERMINED)
-            logger.info(f'Submitted job {jobs[location][0]} to build artifact for {location}.')
-            session.deleteJobTemplate(job_template)
-
-        if verbose:
-            logger.info('Entering monitoring loop.')
-            logger.info('-------------------------')
-            logger.info('')
-
-            while any([job[1] not in [drmaa.JobState.DONE, drmaa.JobState.FAILED] for job in jobs.values()]):
-                for location, (job_id, status) in jobs.items():
-                    jobs[location] = (job_id, session.jobStatus(job_id))
-                    logger.info(f'{location:<35}: {decode_status(drmaa, jobs[location][1]):>15}')
-                logger.info('')
-                time.sleep(project_globals.MAKE_ARTIFACT_SLEEP)
-                logger.info('Checking status again')
-                logger.info('---------------------')
-                logger.info('')
+    with DrmaaExecutor(__file__) as executor:
+        run_artifact_builds(executor, output_dir, verbose, key_workers, cache_dir, draws_per_chunk, storage_profile)
+
 
+def get_local_worker_count(workers: int, memory_budget: float = None) -> int:
+    """Bounds the number of concurrent local builds by a memory budget.
+
+    Parameters
+    ----------
+    workers
+        The requested number of concurrent builds.
+    memory_budget
+        The memory, in GB, available to all builds.  If not provided, only
+        the requested number of workers is used as a bound.
+
+    Returns
+    -------
+        The number of artifacts to build at once.
+
+    """
+    workers = min(workers, len(project_globals.LOCATIONS))
+    if memory_budget is not None:
+        per_build = parse_memory(project_globals.MAKE_ARTIFACT_MEM)
+        if memory_budget < per_build:
+            raise ValueError(f'A memory budget of {memory_budget}G cannot fit a single artifact build, '
+                             f'which needs {project_globals.MAKE_ARTIFACT_MEM}.')
+        workers = min(workers, int(memory_budget // per_build))
+    return max(workers, 1)
+
+
+def build_all_artifacts_locally(output_dir: Path, workers: int = 1, memory_budget: float = None,
+                                key_workers: int = 1, cache_dir: Path = None, draws_per_chunk: int = None,
+                                storage_profile: str = 'default', verbose: int = 0):
+    """Builds artifacts for all locations in a local process pool.
+    Parameters
+    ----------
+    output_dir
+        The directory where the artifacts will be built.
+    workers
+        The maximum number of artifacts to build at once.
+    memory_budget
+        The memory, in GB, available to all builds.
+    key_workers
+        The number of keys to load at once within each artifact build.
+    cache_dir
+        The directory of the loader cache, if one is used.
+    draws_per_chunk
+        The number of draws to stream to the artifacts at once, if streaming.
+    storage_profile
+        The name of the storage profile to write artifact data with.
+    verbose
+        How noisy the logger should be.
+    Note
+    ----
+        This function should not be called directly.  It is intended to be
+        called by the :func:`build_artifacts` function located in the same
+        module.
+    """
+    workers = get_local_worker_count(workers, memory_budget)
+    logger.info(f'Building {len(project_globals.LOCATIONS)} artifacts locally with {workers} worker(s). '
+                f'Logs are written to {str(output_dir / "logs")}.')
+    with LocalExecutor(_build_local_artifact, workers) as executor:
+        run_artifact_builds(executor, output_dir, verbose, key_workers, cache_dir, draws_per_chunk, storage_profile)
+
+
+def run_artifact_builds(executor: Executor, output_dir: Path, verbose: int, key_workers: int = 1,
+                        cache_dir: Path = None, draws_per_chunk: int = None, storage_profile: str = 'default'):
+    """Builds artifacts for all locations with an executor.
+
+    Failed builds are retried with backoff, and the runtime and peak memory
+    of every build are recorded in the output directory to size the
+    resource requests of later builds.
+
+    Parameters
+    ----------
+    executor
+        The executor to run the builds with.
+    output_dir
+        The directory where the artifacts will be built.
+    verbose
+        How noisy the logger should be.
+    key_workers
+        The number of keys to load at once within each artifact build.
+    cache_dir
+        The directory of the loader cache, if one is used.
+    draws_per_chunk
+        The number of draws to stream to the artifacts at once, if streaming.
+    storage_profile
+        The name of the storage profile to write artifact data with.
+
+    Raises
+    ------
+    RuntimeError
+        If any build still failed after all of its retries.
+
+    """
+    jobs = [BuildJob(location, output_dir / f'{sanitize_location(location)}.hdf', key_workers, cache_dir,
+                     draws_per_chunk, storage_profile)
+            for location in project_globals.LOCATIONS]
+    history = ResourceHistory(output_dir / project_globals.MAKE_ARTIFACT_HISTORY_FILE)
+
+    start = time.time()
+    results = run_jobs(executor, jobs, history, verbose=verbose)
+    log_build_summary(results, time.time() - start)
+
+    failed = [location for location, result in results.items() if not result.succeeded]
+    if failed:
+        raise RuntimeError(f'Artifact builds failed for {failed}. See the logs in {str(output_dir / "logs")}.')
     logger.info('**Done**')
 
 
-def build_single_location_artifact(path: Union[str, Path], location: str, log_to_file: bool = False):
+def _build_local_artifact(job: BuildJob) -> JobResult:
+    """Builds one artifact in a worker process, capturing any failure."""
+    # Build logs go to the location log file rather than the terminal.
+    logger.remove()
+    start = time.time()
+    try:
+        build_single_location_artifact(job.path, job.location, log_to_file=True, key_workers=job.key_workers,
+                                       cache_dir=job.cache_dir, draws_per_chunk=job.draws_per_chunk,
+                                       storage_profile=job.storage_profile)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    if FRESH_PROCESS_PER_BUILD:
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024**2  # KB on Linux
+    else:
+        # A reused worker's peak memory includes every build it ran before this one.
+        peak_memory = None
+    return JobResult(job.location, error is None, time.time() - start, peak_memory, error)
+
+
+def log_build_summary(results: Dict[str, JobResult], wall_time: float):
+    """Logs the runtime, peak memory and status of each artifact build."""
+    width = len_longest_location()
+    logger.info('Artifact build summary')
+    logger.info('----------------------')
+    for location in project_globals.LOCATIONS:
+        if location not in results:
+            continue
+        result = results[location]
+        status = 'finished' if result.succeeded else f'failed: {result.error.strip().splitlines()[-1]}'
+        peak_memory = f'{result.peak_memory:.1f}G' if result.peak_memory is not None else 'unknown'
+        logger.info(f'{location:<{width}}: {result.runtime / 60:>7.1f} minutes | {peak_memory:>7} peak memory | '
+                    f'{result.attempts} attempt(s) | {status}')
+    logger.info(f'Total build time: {sum(r.runtime for r in results.values()) / 60:.1f} minutes '
+                f'in {wall_time / 60:.1f} minutes of wall time')
+
+
+def build_single_location_artifact(path: Union[str, Path], location: str, log_to_file: bool = False,
+                                   key_workers: int = 1, cache_dir: Union[str, Path] = None,
+                                   draws_per_chunk: int = None, storage_profile: str = 'default'):
     """Builds an artifact for a single location.
     Parameters
     ----------
@@ -158,6 +323,20 @@ def build_single_location_artifact(path: Union[str, Path], location: str, log_to
         specified in the project globals.
     log_to_file
         Whether we should write the application logs to a file.
+    key_workers
+        The number of keys to load at once.  Loading is done in a thread
+        pool while all writes to the artifact happen in this thread.
+    cache_dir
+        The directory of an on-disk cache to read loader outputs through.
+        If not provided, all data is pulled from the loaders.
+    draws_per_chunk
+        If provided, tables of draws are written one chunk of this many
+        draws at a time to the per-draw layout read by
+        :func:`vivarium_conic_vitamin_a_supp.utilities.read_data_by_draw`,
+        and each key is written as soon as it is loaded.
+    storage_profile
+        The name of the storage profile to write artifact data with.  See
+        :mod:`vivarium_conic_vitamin_a_supp.data.storage`.
     Note
     ----
         This function should not be called directly.  It is intended to be
@@ -166,27 +345,62 @@ def build_single_location_artifact(path: Union[str, Path], location: str, log_to
     """
     location = location.strip('"')
     path = Path(path)
+    log_sink = None
     if log_to_file:
         log_file = path.parent / 'logs' / f'{sanitize_location(location)}.log'
         if log_file.exists():
             log_file.unlink()
-        add_logging_sink(log_file, verbose=2)
+        log_sink = add_logging_sink(log_file, verbose=2)
 
     # Local import to avoid data dependencies
     from vivarium_conic_vitamin_a_supp.data import builder
+    from vivarium_conic_vitamin_a_supp.data.cache import LoaderCache
+    from vivarium_conic_vitamin_a_supp.data.storage import get_storage_profile
 
-    logger.info(f'Building artifact for {location} at {str(path)}.')
-    artifact = builder.open_artifact(path, location)
-
-    for key_group in project_globals.MAKE_ARTIFACT_KEY_GROUPS:
-        logger.info(f'Loading and writing {key_group.log_name} data')
-        for key in key_group:
-            builder.load_and_write_data(artifact, key, location)
-
-    logger.info(f'**Done building -- {location}**')
+    try:
+        logger.info(f'Building artifact for {location} at {str(path)}.')
+        artifact = builder.open_artifact(path, location)
+        cache = LoaderCache(cache_dir, project_globals.LOADER_CACHE_SIZE) if cache_dir is not None else None
+        profile = get_storage_profile(storage_profile)
+
+        if key_workers == 1 and draws_per_chunk is not None:
+            for key_group in project_globals.MAKE_ARTIFACT_KEY_GROUPS:
+                logger.info(f'Streaming {key_group.log_name} data in chunks of {draws_per_chunk} draws')
+                for key in key_group:
+                    builder.load_and_write_data_by_draw(artifact, key, location, draws_per_chunk, cache, profile)
+        elif key_workers == 1:
+            for key_group in project_globals.MAKE_ARTIFACT_KEY_GROUPS:
+                logger.info(f'Loading and writing {key_group.log_name} data')
+                builder.load_and_write_key_group(artifact, list(key_group), location, cache, profile)
+        else:
+            # Load across key groups so the build takes about as long as the slowest key.
+            key_groups = [list(key_group) for key_group in project_globals.MAKE_ARTIFACT_KEY_GROUPS]
+            logger.info(f'Loading and writing data for {sum(len(g) for g in key_groups)} keys '
+                        f'with {key_workers} workers')
+            builder.load_and_write_data_concurrently(artifact, key_groups, location, key_workers, cache,
+                                                     draws_per_chunk, profile)
+
+        if cache is not None:
+            logger.info(cache.summary())
+
+        logger.info(f'**Done building -- {location}**')
+    except Exception:
+        logger.exception(f'Failed building artifact for {location}.')
+        raise
+    finally:
+        if log_sink is not None:
+            # Worker processes may build several locations.
+            logger.remove(log_sink)
 
 
 if __name__ == "__main__":
     artifact_path = sys.argv[1]
     artifact_location = sys.argv[2]
-    build_single_location_artifact(artifact_path, artifact_location, log_to_file=True)
+    artifact_key_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    artifact_cache_dir = (sys.argv[4].strip('"') or None) if len(sys.argv) > 4 else None
+    artifact_draws_per_chunk = (int(sys.argv[5]) or None) if len(sys.argv) > 5 else None
+    artifact_storage_profile = sys.argv[6] if len(sys.argv) > 6 else 'default'
+    build_single_location_artifact(artifact_path, artifact_location, log_to_file=True,
+                                   key_workers=artifact_key_workers, cache_dir=artifact_cache_dir,
+                                   draws_per_chunk=artifact_draws_per_chunk,
+                                   storage_profile=artifact_storage_profile)
@@ -0,0 +1,56 @@
+"""Main application functions for processing simulation results as jobs finish.
+
+.. admonition::
+
+   Logging in this module should typically be done at the ``info`` level.
+   Use your best judgement.
+
+"""
+from pathlib import Path
+import time
+from typing import Union
+
+from loguru import logger
+
+from vivarium_conic_vitamin_a_supp.results_processing import incremental
+
+
+def process_results(output_dir: Union[str, Path], baseline: str = None, watch: bool = False,
+                    poll_interval: float = 30., max_idle: float = None, antithetic: bool = False):
+    """Main application function for processing simulation results.
+
+    Parameters
+    ----------
+    output_dir
+        The directory the grid writes its job outputs to, e.g. a run
+        directory under ``paths.RESULTS_ROOT``.
+    baseline
+        If given, also summarize the metrics averted relative to this
+        scenario.
+    watch
+        Whether to keep processing new job outputs as they are written.
+    poll_interval
+        Seconds between checks for new job outputs when watching.
+    max_idle
+        When watching, stop after this many seconds without new job outputs.
+        Watch until interrupted if not given.
+    antithetic
+        Whether the grid was run with antithetic randomness, so outputs are
+        averaged over random seed pairs.
+
+    """
+    output_dir = Path(output_dir)
+    last_update = time.monotonic()
+    while True:
+        ingested = incremental.process_outputs(output_dir, baseline, antithetic=antithetic)
+        if ingested:
+            last_update = time.monotonic()
+            jobs = len(incremental.ResultsLedger.read(output_dir))
+            logger.info(f'Ingested {ingested} new job outputs. Summaries in {str(output_dir)} '
+                        f'now include {jobs} jobs.')
+        elif not watch:
+            logger.info(f'No new job outputs in {str(output_dir)}.')
+        if not watch or (max_idle is not None and time.monotonic() - last_update >= max_idle):
+            break
+        time.sleep(poll_interval)
+    logger.info('**Done**')
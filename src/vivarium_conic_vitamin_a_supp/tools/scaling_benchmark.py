@@ -0,0 +1,374 @@
+"""Main application functions for benchmarking how full simulations scale.
+
+The model specification template is rendered against a local artifact and
+run once for every combination of population size and time step size.
+Each configuration runs in a freshly spawned process, so its peak resident
+memory is not inflated by the configurations measured before it.
+
+The accuracy of the
+:class:`~vivarium_conic_vitamin_a_supp.plugins.AdaptiveStepClock` can also be
+compared with the daily-step model: both clocks run the full model
+specification for the same random seeds, and the outcome totals of each
+(measure, cause) are compared along with the number of steps and wall time
+each clock needed.
+
+.. admonition::
+
+   Logging in this module should typically be done at the ``info`` level.
+   Use your best judgement.
+
+"""
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import multiprocessing
+from pathlib import Path
+import platform
+import resource
+import statistics
+import time
+from typing import Any, Dict, List, NamedTuple, Sequence, Union
+
+from jinja2 import Template
+from loguru import logger
+import numpy as np
+import pandas as pd
+import vivarium
+
+from vivarium_conic_vitamin_a_supp import paths
+from vivarium_conic_vitamin_a_supp.results_processing.aggregation import parse_column
+from vivarium_conic_vitamin_a_supp.utilities import sanitize_location
+
+DEFAULT_POPULATION_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_STEP_SIZES = (1, 7)
+SCALING_FILE = 'scaling.json'
+CLOCK_COMPARISON_FILE = 'clock_comparison.json'
+DAILY_CLOCK = 'vivarium.framework.time.DateTimeClock'
+ADAPTIVE_CLOCK = 'vivarium_conic_vitamin_a_supp.plugins.AdaptiveStepClock'
+
+
+class ScalingMeasurement(NamedTuple):
+    """The cost of running one configuration of the model specification."""
+    population_size: int
+    step_size: int
+    steps: int
+    # Days of simulation time covered by the steps, read from the simulation clock.
+    simulated_days: float
+    # Seconds to set up the simulation and initialize the population.
+    setup_time: float
+    # Seconds of wall time per time step.
+    step_time_mean: float
+    step_time_median: float
+    step_time_max: float
+    simulant_steps_per_second: float
+    simulant_days_per_second: float
+    # Peak resident memory of the process in GB.
+    peak_memory: float
+
+
+def render_model_specification(template: Union[str, Path], location: str, artifact_dir: Union[str, Path],
+                               output_dir: Union[str, Path]) -> Path:
+    """Renders the model specification template for a local artifact.
+
+    Returns the path of the rendered model specification.
+
+    """
+    template = Template(Path(template).read_text())
+    sanitized_location = sanitize_location(location)
+    path = Path(output_dir) / f'{sanitized_location}.yaml'
+    path.write_text(template.render(
+        location_proper=location,
+        location_sanitized=sanitized_location,
+        artifact_directory=str(Path(artifact_dir).resolve()),
+    ))
+    return path
+
+
+class ClockProbe:
+    """Counts time steps and reads the simulation clock."""
+
+    @property
+    def name(self):
+        return 'clock_probe'
+
+    def setup(self, builder):
+        self.clock = builder.time.clock()
+        self.steps = 0
+        builder.event.register_listener('time_step', self.on_time_step)
+
+    def on_time_step(self, event):
+        self.steps += 1
+
+
+def get_clock_plugin(controller: str) -> Dict[str, Any]:
+    return {'required': {'clock': {'controller': controller,
+                                   'builder_interface': 'vivarium.framework.time.TimeInterface'}}}
+
+
+def measure_configuration(model_specification: str, population_size: int, step_size: int,
+                          steps: int) -> ScalingMeasurement:
+    """Runs a simulation for a number of time steps and measures its cost."""
+    # Local import to avoid simulation setup costs for the parent process.
+    from vivarium.framework.engine import SimulationContext
+
+    configuration = {
+        'population': {'population_size': population_size},
+        'time': {'step_size': step_size},
+    }
+    probe = ClockProbe()
+    start = time.perf_counter()
+    simulation = SimulationContext(model_specification, components=[probe], configuration=configuration)
+    simulation.setup()
+    simulation.initialize_simulants()
+    setup_time = time.perf_counter() - start
+
+    start_time = probe.clock()
+    step_times = []
+    for _ in range(steps):
+        start = time.perf_counter()
+        simulation.step()
+        step_times.append(time.perf_counter() - start)
+    # The clock may not follow the configured step size, e.g. with the adaptive step clock plugin.
+    simulated_days = (probe.clock() - start_time) / pd.Timedelta(days=1)
+
+    step_time_mean = statistics.mean(step_times)
+    return ScalingMeasurement(
+        population_size=population_size,
+        step_size=step_size,
+        steps=steps,
+        simulated_days=simulated_days,
+        setup_time=setup_time,
+        step_time_mean=step_time_mean,
+        step_time_median=statistics.median(step_times),
+        step_time_max=max(step_times),
+        simulant_steps_per_second=population_size / step_time_mean,
+        simulant_days_per_second=population_size * simulated_days / sum(step_times),
+        peak_memory=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024**2,  # KB
+    )
+
+
+def format_measurements(measurements: Sequence[ScalingMeasurement]) -> pd.DataFrame:
+    """Formats measurements as a comparison table.
+
+    Throughput is also given relative to the smallest population at the
+    same step size, so values below one show where per simulant costs grow
+    with the population.
+
+    """
+    table = pd.DataFrame(measurements, columns=ScalingMeasurement._fields)
+    table = table.sort_values(['step_size', 'population_size']).reset_index(drop=True)
+    smallest = table.groupby('step_size')['simulant_steps_per_second'].transform('first')
+    table['relative_throughput'] = table['simulant_steps_per_second'] / smallest
+    return table
+
+
+def run_to_end(model_specification: str, population_size: int, random_seed: int, days: int,
+               adaptive_step_size: Dict = None) -> Dict[str, Any]:
+    """Runs a simulation for a number of days and totals its outcomes.
+
+    Parameters
+    ----------
+    model_specification
+        Path to the rendered model specification.
+    population_size
+        The number of simulants.
+    random_seed
+        The random seed of the simulation.
+    days
+        The number of days to simulate from the configured start time.
+    adaptive_step_size
+        If given, the simulation runs with the adaptive step clock and this
+        ``time.adaptive_step_size`` configuration.  Otherwise it runs with
+        the daily-step clock.
+
+    Returns
+    -------
+        The number of time steps, the wall time in seconds and the totals of
+        every (measure, cause) of the simulation's metrics.
+
+    """
+    # Local import to avoid simulation setup costs for the parent process.
+    from vivarium.framework.engine import SimulationContext
+
+    configuration = {
+        'population': {'population_size': population_size},
+        'randomness': {'random_seed': random_seed},
+        'time': {'step_size': 1},
+    }
+    if adaptive_step_size:
+        configuration['time']['adaptive_step_size'] = adaptive_step_size
+    plugin_configuration = get_clock_plugin(ADAPTIVE_CLOCK if adaptive_step_size is not None else DAILY_CLOCK)
+    probe = ClockProbe()
+    simulation = SimulationContext(model_specification, components=[probe], configuration=configuration,
+                                   plugin_configuration=plugin_configuration)
+    start = simulation.configuration.time.start
+    end = pd.Timestamp(year=start.year, month=start.month, day=start.day) + pd.Timedelta(days=days)
+    simulation.configuration.update({'time': {'end': {'year': end.year, 'month': end.month, 'day': end.day}}},
+                                    layer='override', source='clock_comparison')
+
+    wall_start = time.perf_counter()
+    simulation.setup()
+    simulation.initialize_simulants()
+    simulation.run()
+    simulation.finalize()
+    wall_time = time.perf_counter() - wall_start
+
+    outcomes = {}
+    for column, value in simulation.report(print_results=False).items():
+        stratum = parse_column(column)
+        if stratum is not None:
+            outcome = stratum.measure if stratum.cause is None else f'{stratum.measure}.{stratum.cause}'
+            outcomes[outcome] = outcomes.get(outcome, 0.) + float(value)
+    return {'steps': probe.steps, 'wall_time': wall_time, 'outcomes': outcomes}
+
+
+def summarize_clock_comparison(daily_runs: Sequence[Dict], adaptive_runs: Sequence[Dict]) -> pd.DataFrame:
+    """Compares the outcome totals of daily-step and adaptive-step runs.
+
+    Runs are paired by position, i.e. by random seed.  ``difference`` is the
+    mean paired difference of the adaptive from the daily totals and
+    ``difference_se`` its standard error, which is ``NaN`` for a single
+    seed.  Differences within about two standard errors are consistent with
+    random variation alone.
+
+    """
+    daily = pd.DataFrame([run['outcomes'] for run in daily_runs]).fillna(0.)
+    adaptive = pd.DataFrame([run['outcomes'] for run in adaptive_runs]).reindex(columns=daily.columns).fillna(0.)
+    differences = adaptive - daily
+    table = pd.DataFrame({
+        'daily': daily.mean(),
+        'adaptive': adaptive.mean(),
+        'difference': differences.mean(),
+        'difference_se': differences.std(ddof=1) / np.sqrt(len(differences)),
+    })
+    table['relative_difference'] = table['difference'] / table['daily'].where(table['daily'] != 0)
+    return table.rename_axis('outcome').reset_index()
+
+
+def compare_clocks(model_specification: str, output_dir: Path, population_size: int, days: int, seeds: int,
+                   adaptive_step_size: Dict = None) -> pd.DataFrame:
+    """Compares the adaptive step clock with daily steps and writes ``clock_comparison.json``."""
+    adaptive_step_size = adaptive_step_size if adaptive_step_size is not None else {}
+    spawn = multiprocessing.get_context('spawn')
+    runs = {'daily': [], 'adaptive': []}
+    for seed in range(seeds):
+        for clock, clock_configuration in [('daily', None), ('adaptive', adaptive_step_size)]:
+            logger.info(f'Running {days} days with {population_size} simulants, the {clock} clock and seed {seed}.')
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                run = executor.submit(run_to_end, str(model_specification), population_size, seed, days,
+                                      clock_configuration).result()
+            logger.info(f'Ran {run["steps"]} steps in {run["wall_time"]:.1f} seconds.')
+            runs[clock].append(run)
+
+    table = summarize_clock_comparison(runs['daily'], runs['adaptive'])
+    output = {
+        'model_specification': str(model_specification),
+        'population_size': population_size,
+        'days': days,
+        'adaptive_step_size': adaptive_step_size,
+        'runs': {clock: [{'random_seed': seed, 'steps': run['steps'], 'wall_time': run['wall_time']}
+                         for seed, run in enumerate(clock_runs)] for clock, clock_runs in runs.items()},
+        'outcomes': table.replace({np.nan: None}).to_dict(orient='records'),
+    }
+    with (output_dir / CLOCK_COMPARISON_FILE).open('w') as f:
+        json.dump(output, f, indent=2)
+
+    for clock, clock_runs in runs.items():
+        logger.info(f'The {clock} clock took {np.mean([r["steps"] for r in clock_runs]):.0f} steps and '
+                    f'{np.mean([r["wall_time"] for r in clock_runs]):.1f} seconds on average.')
+    formatted = table.to_string(index=False, float_format='{:.4g}'.format)
+    logger.info(f'Adaptive against daily steps:\n{formatted}')
+    logger.info(f'Clock comparison written to {str(output_dir / CLOCK_COMPARISON_FILE)}.')
+    return table
+
+
+def benchmark_scaling(location: str, artifact_dir: Union[str, Path], output_dir: Union[str, Path],
+                      population_sizes: Sequence[int] = DEFAULT_POPULATION_SIZES,
+                      step_sizes: Sequence[int] = DEFAULT_STEP_SIZES, steps: int = 10,
+                      template: Union[str, Path] = None, clock_comparison_days: int = None,
+                      clock_comparison_population_size: int = 10_000, clock_comparison_seeds: int = 3,
+                      adaptive_step_size: Dict = None) -> List[ScalingMeasurement]:
+    """Main application function for benchmarking the model specification.
+
+    The measurements are written to ``scaling.json`` in the output
+    directory, along with the rendered model specification.  If
+    ``clock_comparison_days`` is given, the adaptive step clock is also
+    compared with daily steps and the comparison is written to
+    ``clock_comparison.json``.
+
+    Parameters
+    ----------
+    location
+        The location of the artifact to run against.
+    artifact_dir
+        The directory holding the artifact, e.g. one written by
+        ``make_synthetic_artifacts``.
+    output_dir
+        The directory to write the model specification and measurements to.
+    population_sizes
+        The population sizes to run.
+    step_sizes
+        The time step sizes to run, in days.
+    steps
+        The number of time steps to time in every configuration.
+    template
+        The model specification template.  Defaults to the project's
+        ``model_spec.in``.
+    clock_comparison_days
+        The number of days to simulate with each clock when comparing them.
+    clock_comparison_population_size
+        The population size of the clock comparison runs.
+    clock_comparison_seeds
+        The number of random seeds to run with each clock.
+    adaptive_step_size
+        Overrides of the adaptive step clock's ``time.adaptive_step_size``
+        configuration in the comparison runs.
+
+    Returns
+    -------
+        The measurements of every configuration.
+
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    template = template if template is not None else paths.MODEL_SPEC_DIR / 'model_spec.in'
+    model_specification = render_model_specification(template, location, artifact_dir, output_dir)
+    logger.info(f'Rendered {str(model_specification)} from {str(template)}.')
+
+    measurements = []
+    spawn = multiprocessing.get_context('spawn')
+    for step_size, population_size in itertools.product(step_sizes, population_sizes):
+        logger.info(f'Running {steps} steps of {step_size} days with {population_size} simulants.')
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            measurement = executor.submit(measure_configuration, str(model_specification),
+                                          population_size, step_size, steps).result()
+        logger.info(f'Set up in {measurement.setup_time:.1f} seconds, {measurement.step_time_mean:.3f} seconds '
+                    f'per step, peak memory {measurement.peak_memory:.2f} GB.')
+        measurements.append(measurement)
+
+    _write_measurements(output_dir / SCALING_FILE, model_specification, measurements)
+    table = format_measurements(measurements)
+    table = table.to_string(index=False, float_format='{:.4g}'.format)
+    logger.info(f'Scaling of {str(model_specification)}:\n{table}')
+    logger.info(f'Measurements written to {str(output_dir / SCALING_FILE)}.')
+
+    if clock_comparison_days is not None:
+        compare_clocks(model_specification, output_dir, clock_comparison_population_size, clock_comparison_days,
+                       clock_comparison_seeds, adaptive_step_size)
+    logger.info('**Done**')
+    return measurements
+
+
+def _write_measurements(path: Path, model_specification: Path, measurements: List[ScalingMeasurement]):
+    output = {
+        'model_specification': str(model_specification),
+        'environment': {
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'vivarium': vivarium.__version__,
+            'cpu_count': multiprocessing.cpu_count(),
+        },
+        'measurements': [m._asdict() for m in measurements],
+    }
+    with path.open('w') as f:
+        json.dump(output, f, indent=2)
@@ -0,0 +1,127 @@
+"""Main application functions for comparing artifact storage profiles.
+
+.. admonition::
+
+   Logging in this module should typically be done at the ``info`` level.
+   Use your best judgement.
+
+"""
+from pathlib import Path
+import time
+from typing import List
+
+from loguru import logger
+import pandas as pd
+from vivarium.framework.artifact import Artifact
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.data import storage
+from vivarium_conic_vitamin_a_supp.utilities import is_draw_data, len_longest_location, sanitize_location
+
+REPORT_FILE = 'storage_report.csv'
+
+
+def profile_artifacts(location: str, input_dir: str, output_dir: str, profiles: List[str], draw: int = 0):
+    """Main application function for comparing artifact storage profiles.
+
+    Each artifact is rewritten under every profile and the bytes on disk and
+    single draw load time of every key are reported, along with the largest
+    relative error introduced by downcasting draws.
+
+    Parameters
+    ----------
+    location
+        The location of the artifact to profile.  Must be one of the
+        locations specified in the project globals or the string 'all'.
+    input_dir
+        The directory holding the artifacts to profile.
+    output_dir
+        The directory to write the rewritten artifacts and the report to.
+        Each profile gets its own subdirectory.
+    profiles
+        The names of the storage profiles to compare.
+    draw
+        The draw to load when timing loads.
+
+    """
+    locations = project_globals.LOCATIONS if location == 'all' else [location]
+    input_dir, output_dir = Path(input_dir), Path(output_dir)
+
+    reports = []
+    for loc in locations:
+        source_path = input_dir / f'{sanitize_location(loc)}.hdf'
+        for profile in [storage.get_storage_profile(name) for name in profiles]:
+            path = output_dir / profile.name / source_path.name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists():
+                path.unlink()
+            logger.info(f'Writing {str(source_path)} to {str(path)} with the {profile.name} storage profile.')
+            report = rewrite_artifact(source_path, path, profile)
+            report['load_time'] = time_loads(path, report.index, draw)
+            reports.append(report.assign(location=loc, profile=profile.name))
+
+    report = pd.concat(reports).reset_index().set_index(['location', 'profile', 'key'])
+    report.to_csv(output_dir / REPORT_FILE)
+    log_report(report)
+    logger.info(f'Report written to {str(output_dir / REPORT_FILE)}.')
+    logger.info('**Done**')
+
+
+def rewrite_artifact(source_path: Path, path: Path, profile: storage.StorageProfile) -> pd.DataFrame:
+    """Writes a copy of an artifact with a storage profile.
+
+    Returns
+    -------
+        The bytes on disk of each key and the largest relative error
+        introduced by encoding its draws.
+
+    """
+    # Local import to avoid data dependencies
+    from vivarium_conic_vitamin_a_supp.data import builder
+    from vivarium_conic_vitamin_a_supp.plugins.artifact import get_keys_by_draw, read_all_draws
+
+    source = Artifact(source_path)
+    keys_by_draw = get_keys_by_draw(source.path, source.keys)
+    artifact = Artifact(path)
+
+    errors = {}
+    for key in source.keys:
+        if key == 'metadata.keyspace':
+            continue
+        if key in keys_by_draw:
+            data = read_all_draws(source.path, key)
+            data = data.set_index([c for c in data if not str(c).startswith('draw_')])
+        else:
+            data = source.load(key)
+        errors[key] = (storage.get_max_relative_error(data, storage.apply_profile(data, profile))
+                       if is_draw_data(data) else 0.)
+        builder.write_data_batch(artifact, {key: data}, profile)
+        source.clear_cache()
+
+    sizes = storage.get_key_sizes(path, errors)
+    return pd.DataFrame({'bytes': pd.Series(sizes), 'max_relative_error': pd.Series(errors)}).rename_axis('key')
+
+
+def time_loads(path: Path, keys: List[str], draw: int) -> pd.Series:
+    """Times loading each key of an artifact for a single draw."""
+    artifact = Artifact(path, filter_terms=[f'draw == {draw}'])
+    times = {}
+    for key in keys:
+        start = time.perf_counter()
+        artifact.load(key)
+        times[key] = time.perf_counter() - start
+        artifact.clear_cache()
+    return pd.Series(times)
+
+
+def log_report(report: pd.DataFrame):
+    """Logs total bytes on disk and load time for each location and profile."""
+    totals = report.groupby(level=['location', 'profile']).agg(
+        {'bytes': 'sum', 'load_time': 'sum', 'max_relative_error': 'max'}
+    )
+    width = len_longest_location()
+    logger.info('Storage profile summary')
+    logger.info(f'{"location":<{width}} | {"profile":>8} | {"MB":>9} | {"load (s)":>8} | max relative error')
+    for (location, profile), row in totals.iterrows():
+        logger.info(f'{location:<{width}} | {profile:>8} | {row["bytes"] / 1024**2:>9.2f} | '
+                    f'{row["load_time"]:>8.3f} | {row["max_relative_error"]:.3g}')
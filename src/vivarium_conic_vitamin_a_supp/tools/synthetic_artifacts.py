@@ -0,0 +1,73 @@
+"""Main application functions for writing synthetic artifacts.
+
+.. admonition::
+
+   Logging in this module should typically be done at the ``info`` level.
+   Use your best judgement.
+
+"""
+from pathlib import Path
+import time
+from typing import Sequence
+
+from loguru import logger
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.data import synthetic
+from vivarium_conic_vitamin_a_supp.data.storage import get_storage_profile
+from vivarium_conic_vitamin_a_supp.utilities import sanitize_location
+
+
+def make_synthetic_artifacts(location: str, output_dir: str, draws: int = 10, years: Sequence[int] = None,
+                             max_age: float = None, exposure_categories: int = 2, seed: int = 0,
+                             storage_profile: str = 'default'):
+    """Main application function for writing synthetic artifacts.
+
+    Artifacts are written to ``{output_dir}/{location}.hdf``, where model
+    specifications made with ``make_specs -o`` pointed at the same
+    directory expect them.
+
+    Parameters
+    ----------
+    location
+        The location to write an artifact for.  Must be one of the locations
+        specified in the project globals or the string 'all'.
+    output_dir
+        The directory to write the artifacts to.
+    draws
+        The number of draws of every table of draws.
+    years
+        The years covered by demographic data.  Defaults to the years of
+        :class:`~vivarium_conic_vitamin_a_supp.data.synthetic.SyntheticArtifactSpec`.
+    max_age
+        If provided, only age groups starting before this age are written.
+    exposure_categories
+        The number of vitamin A deficiency exposure categories.
+    seed
+        The seed of the draw values.
+    storage_profile
+        The name of the storage profile to write artifact data with.
+
+    """
+    locations = project_globals.LOCATIONS if location == 'all' else [location]
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    age_bins = synthetic.GBD_AGE_BINS
+    if max_age is not None:
+        age_bins = age_bins[age_bins['age_start'] < max_age].reset_index(drop=True)
+    spec = synthetic.SyntheticArtifactSpec(draws=draws, age_bins=age_bins, exposure_categories=exposure_categories,
+                                           seed=seed)
+    if years:
+        spec = spec._replace(years=tuple(years))
+    profile = get_storage_profile(storage_profile)
+
+    for loc in locations:
+        path = output_dir / f'{sanitize_location(loc)}.hdf'
+        logger.info(f'Writing synthetic artifact for {loc} with {draws} draws, {len(spec.years)} years '
+                    f'and {len(spec.age_bins)} age groups to {str(path)}.')
+        start = time.perf_counter()
+        synthetic.write_synthetic_artifact(path, loc, spec, profile)
+        logger.info(f'Wrote {str(path)} in {time.perf_counter() - start:.1f} seconds '
+                    f'({path.stat().st_size / 2**20:.1f} MB).')
+    logger.info('**Done**')
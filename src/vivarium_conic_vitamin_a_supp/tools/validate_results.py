@@ -0,0 +1,59 @@
+"""Main application functions for validating simulated rates against the artifact.
+
+.. admonition::
+
+   Logging in this module should typically be done at the ``info`` level.
+   Use your best judgement.
+
+"""
+from pathlib import Path
+import time
+from typing import Union
+
+from loguru import logger
+
+from vivarium_conic_vitamin_a_supp.verification_and_validation import rates
+
+VALIDATION_FILE = 'validation.csv'
+
+
+def validate_results(output_dir: Union[str, Path], artifact_path: Union[str, Path],
+                     relative_tolerance: float = rates.DEFAULT_RELATIVE_TOLERANCE,
+                     min_person_time: float = rates.DEFAULT_MIN_PERSON_TIME):
+    """Main application function for validating the jobs of a grid.
+
+    The simulated incidence rate, prevalence and excess mortality rate of
+    every job are compared to the artifact inputs and the comparison is
+    written to ``validation.csv`` in the output directory.
+
+    Parameters
+    ----------
+    output_dir
+        The directory holding the grid's job outputs.
+    artifact_path
+        The artifact the grid ran with.
+    relative_tolerance
+        The largest acceptable relative error of a simulated rate.
+    min_person_time
+        Strata with less person time than this in a rate's denominator are
+        never flagged.
+
+    """
+    output_dir = Path(output_dir)
+    outputs = rates.read_outputs(output_dir)
+    if outputs.empty:
+        logger.info(f'No job outputs found in {str(output_dir)}.')
+        return
+
+    logger.info(f'Validating {len(outputs)} jobs in {str(output_dir)} against {str(artifact_path)}.')
+    start = time.perf_counter()
+    result = rates.validate_rates(outputs, artifact_path, relative_tolerance, min_person_time)
+    logger.info(f'Compared {len(result)} job strata in {time.perf_counter() - start:.2f} seconds.')
+    result.to_csv(output_dir / VALIDATION_FILE, index=False)
+
+    checked = result[result['denominator'] >= min_person_time]
+    flagged = checked.groupby(['measure', 'cause'], sort=False)['flagged'].agg(['sum', 'size'])
+    for (measure, cause), (count, total) in flagged.iterrows():
+        logger.info(f'{cause} {measure}: {count} of {total} job strata outside tolerance.')
+    logger.info(f'Validation written to {str(output_dir / VALIDATION_FILE)}.')
+    logger.info('**Done**')
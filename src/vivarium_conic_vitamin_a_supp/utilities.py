@@ -1,11 +1,11 @@
 import click
 import pandas as pd
 
-from typing import NamedTuple, Union, List
+from typing import Iterator, NamedTuple, Union, List
 from pathlib import Path
 from loguru import logger
 
-from vivarium_public_health.risks.data_transformations import pivot_categorical
+from vivarium.framework.artifact import EntityKey
 
 from vivarium_conic_vitamin_a_supp import globals as project_globals
 
@@ -53,9 +53,94 @@ def delete_if_exists(*paths: Union[Path, List[Path]], confirm=False):
             p.unlink()
 
 
-def read_data_by_draw(artifact_path: str, key : str, draw: int) -> pd.DataFrame:
-    """Reads data from the artifact on a per-draw basis. This
-    is necessary for Low Birthweight Short Gestation (LBWSG) data.
+def get_chunk_size(configuration) -> Union[int, None]:
+    """Gets the number of simulants per slice of per-step component work.
+
+    The chunk size is read from ``population.chunk_size`` in the simulation
+    configuration.  It is optional; when it is unset (or null) the whole
+    population is processed at once.
+
+    The project's ``Mortality``, disease models, ``DisabilityObserver``,
+    ``DiseaseObserver`` and ``SupplementedDaysObserver`` and the adaptive
+    step clock process one slice at a time, as do the rate, risk exposure
+    and disability weight pipelines they call.  Population creation outside the disease models,
+    the ``vivarium_public_health`` ``MortalityObserver`` (which only reads
+    state table columns when metrics are reported) and the state table
+    itself still cover the whole population.
+
+    Parameters
+    ----------
+    configuration
+        The simulation configuration.
+
+    Returns
+    -------
+        The configured chunk size or ``None`` if chunking is disabled.
+
+    """
+    population_config = configuration.population
+    chunk_size = population_config.chunk_size if 'chunk_size' in population_config else None
+    if chunk_size is not None and int(chunk_size) < 1:
+        raise ValueError(f'population.chunk_size must be a positive integer. You specified {chunk_size}.')
+    return int(chunk_size) if chunk_size is not None else None
+
+
+def chunk_index(index: pd.Index, chunk_size: Union[int, None]) -> Iterator[pd.Index]:
+    """Splits a population index into consecutive slices.
+
+    Parameters
+    ----------
+    index
+        The index of the simulants to process.
+    chunk_size
+        The maximum number of simulants in a slice.  If ``None``, the whole
+        index is yielded as a single slice.
+
+    Yields
+    ------
+        Consecutive slices of the index.
+
+    """
+    if chunk_size is None or len(index) <= chunk_size:
+        yield index
+    else:
+        for start in range(0, len(index), chunk_size):
+            yield index[start:start + chunk_size]
+
+
+def is_draw_data(data) -> bool:
+    """Whether data is a table of draws, i.e. has only ``draw_{n}`` columns."""
+    return (isinstance(data, pd.DataFrame) and not data.columns.empty
+            and all(str(c).startswith('draw_') for c in data.columns))
+
+
+def draw_chunks(data: pd.DataFrame, draws_per_chunk: int) -> Iterator[pd.DataFrame]:
+    """Splits a table of draws into consecutive groups of draw columns.
+
+    Parameters
+    ----------
+    data
+        A table with one column per draw.
+    draws_per_chunk
+        The maximum number of draw columns in a chunk.
+
+    Yields
+    ------
+        Tables with the same index as ``data`` and a subset of its draws.
+
+    """
+    if draws_per_chunk < 1:
+        raise ValueError(f'Draw chunks must hold at least one draw. You specified {draws_per_chunk}.')
+    for start in range(0, len(data.columns), draws_per_chunk):
+        yield data.iloc[:, start:start + draws_per_chunk]
+
+
+def read_data_by_draw(artifact_path: str, key: str, draw: int) -> pd.DataFrame:
+    """Reads a single draw of data from the artifact's per-draw layout.
+
+    Data written by draw is stored as an index table at ``{key}/index`` and
+    one series per draw at ``{key}/draw_{n}``.  Only the index and the
+    requested draw are read.
 
     Parameters
     ----------
@@ -64,16 +149,16 @@ def read_data_by_draw(artifact_path: str, key : str, draw: int) -> pd.DataFrame:
     key
         The entity key associated with the data to read.
     draw
-        The data to retrieve.
+        The draw to retrieve.
+
+    Returns
+    -------
+        The index columns and a ``value`` column holding the draw, as
+        returned by ``builder.data.load``.
 
     """
-    key = key.replace(".", "/")
+    key = EntityKey(key)
     with pd.HDFStore(artifact_path, mode='r') as store:
-        index = store.get(f'{key}/index')
-        draw = store.get(f'{key}/draw_{draw}')
-    draw = draw.rename("value")
-    data = pd.concat([index, draw], axis=1)
-    data = data.drop(columns='location')
-    data = pivot_categorical(data)
-    data[project_globals.LBWSG_MISSING_CATEGORY.CAT] = project_globals.LBWSG_MISSING_CATEGORY.EXPOSURE
-    return data
+        index = store.get(f'{key.path}/index')
+        draw = store.get(f'{key.path}/draw_{draw}')
+    return index.assign(value=draw.values)
@@ -0,0 +1,220 @@
+"""Verification of simulated disease rates against the artifact inputs.
+
+For every modeled cause the simulated incidence rate, prevalence and
+excess mortality rate are computed per (year, sex, age group) stratum from
+the simulation result columns:
+
+- incidence rate: the susceptible to infected transition count over the
+  person time spent susceptible,
+- prevalence: the person time spent infected over all person time,
+- excess mortality rate: the deaths due to the cause over the person time
+  spent infected.
+
+These columns are written by the model specification's ``DiseaseObserver``
+for each cause and its ``MortalityObserver``; outputs without them can't
+be validated.
+
+The numerator and denominator of every check are compiled once, at import,
+into positions in :data:`~vivarium_conic_vitamin_a_supp.results_processing.schema.RESULTS_SCHEMA`,
+so rates for every job of a grid are computed with a single array division.
+Each job's rates are compared to the input draw it ran with and strata
+outside a relative tolerance are flagged.
+
+.. admonition::
+
+   Logging in this module should be done at the ``debug`` level.
+
+"""
+import itertools
+import json
+from pathlib import Path
+from typing import Dict, Union
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+from vivarium.framework.artifact import Artifact
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.results_processing.schema import RESULTS_SCHEMA
+
+VALIDATED_MODELS = (project_globals.DIARRHEA_MODEL_NAME, project_globals.MEASLES_MODEL_NAME,
+                    project_globals.LRI_MODEL_NAME)
+MEASURES = ('incidence_rate', 'prevalence', 'excess_mortality_rate')
+STRATUM_COLUMNS = ['year', 'sex', 'age_group']
+JOB_COLUMNS = [project_globals.OUTPUT_SCENARIO_COLUMN, project_globals.INPUT_DRAW_COLUMN,
+               project_globals.RANDOM_SEED_COLUMN]
+
+DEFAULT_RELATIVE_TOLERANCE = 0.25
+# Strata with less person time than this in the denominator are too noisy to flag.
+DEFAULT_MIN_PERSON_TIME = 100.
+
+
+def _compile_checks() -> pd.DataFrame:
+    rows = []
+    for model in VALIDATED_MODELS:
+        incidence = project_globals.DISEASE_MODEL_MAP[model]['transitions'][0]
+        susceptible, infected = incidence.from_state.lower(), incidence.to_state.lower()
+        for year, sex, age_group in itertools.product(project_globals.YEARS, project_globals.SEXES,
+                                                      project_globals.AGE_GROUPS):
+            stratum = {'YEAR': year, 'SEX': sex, 'AGE_GROUP': age_group}
+            state_person_time = project_globals.STATE_PERSON_TIME_COLUMN_TEMPLATE
+            numerators = {
+                'incidence_rate': project_globals.TRANSITION_COUNT_COLUMN_TEMPLATE.format(TRANSITION=incidence,
+                                                                                          **stratum),
+                'prevalence': state_person_time.format(STATE=infected, **stratum),
+                'excess_mortality_rate': project_globals.DEATH_COLUMN_TEMPLATE.format(CAUSE_OF_DEATH=infected,
+                                                                                      **stratum),
+            }
+            denominators = {
+                'incidence_rate': state_person_time.format(STATE=susceptible, **stratum),
+                'prevalence': project_globals.PERSON_TIME_COLUMN_TEMPLATE.format(**stratum),
+                'excess_mortality_rate': state_person_time.format(STATE=infected, **stratum),
+            }
+            for measure in MEASURES:
+                rows.append((measure, model, year, sex, age_group, numerators[measure], denominators[measure]))
+    checks = pd.DataFrame(rows, columns=['measure', 'cause'] + STRATUM_COLUMNS + ['numerator', 'denominator'])
+    checks['numerator'] = RESULTS_SCHEMA.get_positions(checks['numerator'])
+    checks['denominator'] = RESULTS_SCHEMA.get_positions(checks['denominator'])
+    return checks
+
+
+# One row per (measure, cause, year, sex, age group) with the schema positions of its rate's parts.
+RATE_CHECKS = _compile_checks()
+# The result columns the checks are computed from.
+REQUIRED_COLUMNS = [RESULTS_SCHEMA.columns[position]
+                    for position in np.unique(RATE_CHECKS[['numerator', 'denominator']].to_numpy())]
+
+
+def compute_simulated_rates(outputs: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Computes the simulated rate of every check for every job.
+
+    Parameters
+    ----------
+    outputs
+        One row of result columns per job.
+
+    Returns
+    -------
+        The ``rate`` and its ``denominator`` for each job and check, as
+        arrays with a row per job and a column per row of
+        :data:`RATE_CHECKS`.
+
+    Raises
+    ------
+    ValueError
+        If the outputs are missing any of the :data:`REQUIRED_COLUMNS`.
+
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in outputs]
+    if missing:
+        raise ValueError(f'The outputs are missing {len(missing)} of the {len(REQUIRED_COLUMNS)} result columns the '
+                         f'rate checks are computed from, e.g. {missing[:3]}. State person time and transition '
+                         f'counts are written by a DiseaseObserver for each cause, person time and deaths by the '
+                         f'MortalityObserver.')
+    values = outputs.reindex(columns=RESULTS_SCHEMA.columns).to_numpy(dtype=float)
+    numerators = values[:, RATE_CHECKS['numerator'].to_numpy()]
+    denominators = values[:, RATE_CHECKS['denominator'].to_numpy()]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = numerators / denominators
+    return {'rate': rates, 'denominator': denominators}
+
+
+def load_expected_rates(artifact_path: Union[str, Path]) -> pd.DataFrame:
+    """Loads the artifact input for every check.
+
+    Returns
+    -------
+        One row per row of :data:`RATE_CHECKS` and one column per draw.
+        Checks without artifact data are missing.
+
+    """
+    artifact = Artifact(artifact_path)
+    age_bins = artifact.load(project_globals.POPULATION.AGE_BINS)
+    age_groups = pd.Series(age_bins['age_group_name'].str.replace(' ', '_').str.lower().values,
+                           index=age_bins['age_start'].values)
+
+    tables = []
+    for (measure, cause), checks in RATE_CHECKS.groupby(['measure', 'cause'], sort=False):
+        key = f'cause.{cause}.{measure}'
+        if key not in artifact:
+            logger.debug(f'{key} is not in {str(artifact_path)}. Skipping its checks.')
+            continue
+        data = artifact.load(key).reset_index()
+        artifact.clear_cache()
+        data = data.assign(year=data['year_start'], sex=data['sex'].str.lower(),
+                           age_group=data['age_start'].map(age_groups))
+        draws = [c for c in data if str(c).startswith('draw_')]
+        tables.append(checks[STRATUM_COLUMNS].reset_index().merge(data[STRATUM_COLUMNS + draws], on=STRATUM_COLUMNS,
+                                                                  how='left').set_index('index')[draws])
+    expected = pd.concat(tables) if tables else pd.DataFrame()
+    return expected.reindex(RATE_CHECKS.index)
+
+
+def validate_rates(outputs: pd.DataFrame, artifact_path: Union[str, Path],
+                   relative_tolerance: Union[float, Dict[str, float]] = DEFAULT_RELATIVE_TOLERANCE,
+                   min_person_time: float = DEFAULT_MIN_PERSON_TIME) -> pd.DataFrame:
+    """Compares the simulated rates of many jobs to the artifact inputs.
+
+    Parameters
+    ----------
+    outputs
+        One row of result columns per job, with the input draw it ran.
+    artifact_path
+        The artifact the jobs ran with.
+    relative_tolerance
+        The largest acceptable relative error of a simulated rate, either
+        for every measure or per measure.
+    min_person_time
+        Strata whose rate denominator has less person time than this are
+        never flagged.
+
+    Returns
+    -------
+        One row per job and check with the simulated and expected rates,
+        the relative error, the denominator and whether it was flagged.
+
+    """
+    simulated = compute_simulated_rates(outputs)
+    expected_table = load_expected_rates(artifact_path)
+    draw_positions = {int(c.split('_')[-1]): i for i, c in enumerate(expected_table.columns)}
+    draws = outputs[project_globals.INPUT_DRAW_COLUMN].astype(int)
+    missing_draws = set(draws).difference(draw_positions)
+    if missing_draws:
+        raise ValueError(f'Input draws {sorted(missing_draws)} are not in {str(artifact_path)}.')
+    expected = expected_table.to_numpy()[:, [draw_positions[draw] for draw in draws]].T
+
+    if isinstance(relative_tolerance, dict):
+        tolerance = RATE_CHECKS['measure'].map(relative_tolerance).fillna(DEFAULT_RELATIVE_TOLERANCE).to_numpy()
+    else:
+        tolerance = np.full(len(RATE_CHECKS), relative_tolerance)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative_error = (simulated['rate'] - expected) / expected
+    flagged = ((simulated['denominator'] >= min_person_time) & np.isfinite(expected)
+               & ~(np.abs(relative_error) <= tolerance))
+
+    jobs = outputs[[c for c in JOB_COLUMNS if c in outputs]].reset_index(drop=True)
+    result = pd.concat([jobs.loc[jobs.index.repeat(len(RATE_CHECKS))].reset_index(drop=True),
+                        pd.concat([RATE_CHECKS[['measure', 'cause'] + STRATUM_COLUMNS]] * len(outputs),
+                                  ignore_index=True)], axis=1)
+    return result.assign(simulated=simulated['rate'].ravel(), expected=expected.ravel(),
+                         relative_error=relative_error.ravel(), denominator=simulated['denominator'].ravel(),
+                         flagged=flagged.ravel())
+
+
+def read_outputs(output_dir: Union[str, Path]) -> pd.DataFrame:
+    """Reads the outputs of a grid, one row per job.
+
+    Reads the ``output.hdf`` written by ``psimulate`` if there is one,
+    otherwise the per-job json files written by the local runner.
+
+    """
+    output_dir = Path(output_dir)
+    if (output_dir / 'output.hdf').exists():
+        return pd.read_hdf(output_dir / 'output.hdf').reset_index(drop=True)
+    rows = []
+    for path in sorted(output_dir.glob('*.json')):
+        if not path.name.startswith('.'):
+            with path.open() as f:
+                rows.append(json.load(f))
+    return pd.DataFrame(rows)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from vivarium import InteractiveContext
+from vivarium.framework.artifact import Artifact
+
+DRAW_KEY = 'cause.diarrheal_diseases.incidence_rate'
+METADATA_KEY = 'cause.diarrheal_diseases.restrictions'
+RESTRICTIONS = {'yld_only': False, 'yll_age_group_id_start': 2}
+DRAW_AWARE_PLUGIN = {
+    'required': {
+        'data': {
+            'controller': 'vivarium_conic_vitamin_a_supp.plugins.DrawAwareArtifactManager',
+            'builder_interface': 'vivarium.framework.artifact.ArtifactInterface',
+        }
+    }
+}
+
+
+class DataLoader:
+    """Loads artifact data during setup, the only time ``builder.data`` is available."""
+
+    def __init__(self, **column_filters):
+        self.column_filters = column_filters
+        self.data = {}
+
+    @property
+    def name(self):
+        return 'data_loader'
+
+    def setup(self, builder):
+        self.data['draws'] = builder.data.load(DRAW_KEY, **self.column_filters)
+        self.data['metadata'] = builder.data.load(METADATA_KEY)
+
+
+@pytest.fixture
+def draw_key():
+    return DRAW_KEY
+
+
+@pytest.fixture
+def metadata():
+    return METADATA_KEY, RESTRICTIONS
+
+
+@pytest.fixture
+def draw_data():
+    index = pd.MultiIndex.from_product([['Kenya'], ['Male', 'Female'], [0., 1., 5.], [2017]],
+                                       names=['location', 'sex', 'age_start', 'year_start'])
+    draws = np.random.default_rng(0).random((len(index), 10))
+    return pd.DataFrame(draws, index=index, columns=[f'draw_{i}' for i in range(10)])
+
+
+@pytest.fixture
+def draw_aware_plugin():
+    """Plugin configuration replacing the artifact manager with the draw-aware one."""
+    return DRAW_AWARE_PLUGIN
+
+
+@pytest.fixture
+def wide_artifact(tmp_path, draw_data):
+    """An HDF artifact with a table of draws and a metadata key."""
+    path = tmp_path / 'wide.hdf'
+    artifact = Artifact(path)
+    artifact.write(DRAW_KEY, draw_data)
+    artifact.write(METADATA_KEY, RESTRICTIONS)
+    return path
+
+
+@pytest.fixture
+def load_data():
+    """Loads the draw and metadata keys through ``builder.data`` in a simulation."""
+    def _load(artifact_path, input_draw_number, plugin_configuration=None, **column_filters):
+        loader = DataLoader(**column_filters)
+        configuration = {'input_data': {'artifact_path': str(artifact_path),
+                                        'input_draw_number': input_draw_number}}
+        InteractiveContext(components=[loader], configuration=configuration,
+                           plugin_configuration=plugin_configuration)
+        return loader.data
+    return _load
@@ -0,0 +1,216 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from vivarium_conic_vitamin_a_supp.results_processing.aggregation import (ResultsAggregator, Stratum,
+                                                                          aggregate_job_outputs, parse_column)
+from vivarium_conic_vitamin_a_supp.results_processing.statistics import DrawSummary
+
+
+@pytest.mark.parametrize('column, stratum', [
+    ('death_due_to_measles_in_2017_among_female_in_age_group_1_to_4',
+     Stratum('deaths', 'measles', 2017, 'female', '1_to_4')),
+    ('diarrheal_diseases_event_count_in_2017_among_male_in_age_group_early_neonatal',
+     Stratum('transition_count', 'diarrheal_diseases', 2017, 'male', 'early_neonatal')),
+    ('person_time_in_2017_among_male_in_age_group_1_to_4', Stratum('person_time', None, 2017, 'male', '1_to_4')),
+    ('total_population_living', Stratum('population', 'living', None, None, None)),
+    ('total_population', Stratum('total_population', None, None, None, None)),
+    ('random_seed', None),
+])
+def test_parse_column(column, stratum):
+    assert parse_column(column) == stratum
+
+
+def make_jobs(seeds=4):
+    rng = np.random.default_rng(0)
+    jobs = []
+    for scenario in ['baseline', 'supplementation']:
+        for draw in [0, 1, 2]:
+            for seed in range(seeds):
+                jobs.append({'scenario': scenario, 'input_draw': draw, 'random_seed': seed,
+                             'total_population': float(rng.integers(90, 110)),
+                             'death_due_to_measles_in_2017_among_female_in_age_group_1_to_4': rng.random()})
+    return jobs
+
+
+def test_streamed_jobs_match_frame(tmp_path):
+    jobs = make_jobs()
+    for i, job in enumerate(jobs):
+        with (tmp_path / f'job_{i}.json').open('w') as f:
+            json.dump(job, f)
+    aggregator = aggregate_job_outputs(sorted(tmp_path.glob('*.json')))
+
+    frame = pd.DataFrame(jobs)
+    expected = (frame.groupby(['scenario', 'input_draw'])['total_population'].mean()
+                .groupby('scenario').agg(['mean', 'std']))
+    summary = aggregator.summarize().set_index(['scenario', 'measure']).xs('total_population', level='measure')
+
+    assert aggregator.jobs == len(jobs)
+    assert len(aggregator._schemas) == 1
+    np.testing.assert_allclose(summary[['mean', 'std']].to_numpy(), expected.to_numpy())
+    assert (summary['draws'] == 3).all()
+
+    from_frame = ResultsAggregator()
+    from_frame.add_frame(frame)
+    sort = ['scenario', 'input_draw', 'measure']
+    pd.testing.assert_frame_equal(from_frame.tidy().sort_values(sort, ignore_index=True),
+                                  aggregator.tidy().sort_values(sort, ignore_index=True))
+
+
+def test_merge_with_new_strata():
+    jobs = make_jobs(seeds=2)
+    first, second = ResultsAggregator(), ResultsAggregator()
+    for job in jobs[:len(jobs) // 2]:
+        first.add(job)
+    for job in jobs[len(jobs) // 2:]:
+        job = dict(job, total_population_living=job['total_population'])
+        second.add(job)
+    combined = ResultsAggregator()
+    for job in jobs:
+        combined.add(job)
+    first.merge(second)
+
+    assert first.jobs == len(jobs)
+    assert len(first.strata) == 3
+    tidy = first.tidy().set_index(['scenario', 'input_draw', 'measure', 'cause'])['value']
+    expected = combined.tidy().set_index(['scenario', 'input_draw', 'measure', 'cause'])['value']
+    pd.testing.assert_series_equal(tidy.loc[expected.index], expected)
+
+
+def test_sketched_summary_matches_exact():
+    aggregator = ResultsAggregator()
+    for job in make_jobs(seeds=2):
+        aggregator.add(job)
+    exact = aggregator.summarize()
+    sketched = aggregator.summarize(compression=100)
+    columns = ['mean', 'std', 'lower', 'upper', 'draws']
+    pd.testing.assert_frame_equal(sketched[columns], exact[columns])
+
+
+def test_antithetic_pairs_are_averaged():
+    jobs = make_jobs(seeds=4)
+    aggregator = ResultsAggregator(antithetic=True)
+    for job in jobs:
+        aggregator.add(job)
+    expected = (pd.DataFrame(jobs).assign(pair=lambda df: df['random_seed'] // 2).drop(columns='random_seed')
+                .groupby(['scenario', 'input_draw', 'pair']).mean())
+
+    assert aggregator.jobs == len(jobs)
+    assert aggregator.replicates == len(expected) == len(jobs) // 2
+    assert aggregator.unpaired_jobs == 0
+    tidy = aggregator.tidy().set_index(['scenario', 'input_draw', 'measure'])
+    assert (tidy['count'] == 2).all()
+    means = expected.groupby(['scenario', 'input_draw'])['total_population'].mean()
+    np.testing.assert_allclose(tidy.xs('total_population', level='measure')['value'].loc[means.index], means)
+
+    from_frame = ResultsAggregator(antithetic=True)
+    from_frame.add_frame(pd.DataFrame(jobs))
+    pd.testing.assert_frame_equal(from_frame.tidy(), aggregator.tidy())
+
+
+def test_unpaired_antithetic_jobs_are_kept():
+    jobs = make_jobs(seeds=2)
+    first_seeds = [job for job in jobs if job['random_seed'] == 0]
+    second_seeds = [job for job in jobs if job['random_seed'] == 1]
+    aggregator = ResultsAggregator(antithetic=True)
+    for job in first_seeds:
+        aggregator.add(job)
+    assert aggregator.unpaired_jobs == len(first_seeds)
+    assert aggregator.tidy().empty
+
+    # Unpaired jobs survive a round trip through the persisted state.
+    restored = ResultsAggregator.from_frame(aggregator.to_frame(), antithetic=True)
+    assert restored.unpaired_jobs == len(first_seeds)
+    for job in second_seeds:
+        restored.add(job)
+
+    expected = ResultsAggregator(antithetic=True)
+    for job in jobs:
+        expected.add(job)
+    assert restored.unpaired_jobs == 0
+    sort = ['scenario', 'input_draw', 'measure']
+    pd.testing.assert_frame_equal(restored.tidy().sort_values(sort, ignore_index=True),
+                                  expected.tidy().sort_values(sort, ignore_index=True))
+
+    with pytest.raises(ValueError, match='added twice'):
+        aggregator.add(first_seeds[0])
+
+
+def make_records(jobs):
+    """Long format records of supplemented days for the jobs."""
+    return pd.DataFrame([{'scenario': job['scenario'], 'input_draw': job['input_draw'],
+                          'random_seed': job['random_seed'], 'measure': 'supplemented_days', 'cause': None,
+                          'year': 2017, 'sex': sex, 'age_group': '1_to_4', 'value': job['total_population'] / 2}
+                         for job in jobs for sex in ['male', 'female']])
+
+
+@pytest.mark.parametrize('antithetic', [False, True])
+def test_records_are_added_to_their_jobs(antithetic):
+    jobs = make_jobs(seeds=2)
+    aggregator = ResultsAggregator(antithetic)
+    aggregator.add_records(make_records(jobs))
+    # Records alone add no jobs, so there is nothing to summarize yet.
+    assert aggregator.jobs == 0
+    assert aggregator.tidy().empty
+
+    # Records survive a round trip through the persisted state.
+    aggregator = ResultsAggregator.from_frame(aggregator.to_frame(), antithetic)
+    for job in jobs:
+        aggregator.add(job)
+    tidy = aggregator.tidy().set_index(['scenario', 'input_draw', 'measure'])
+    population = tidy.xs('total_population', level='measure')['value']
+    supplemented = tidy.xs('supplemented_days', level='measure')
+    assert (supplemented['sex'].groupby(level=[0, 1]).nunique() == 2).all()
+    np.testing.assert_allclose(supplemented['value'].groupby(level=[0, 1]).sum().loc[population.index], population)
+
+
+def test_sketches_merge_across_draws():
+    jobs = make_jobs(seeds=2)
+    combined = ResultsAggregator()
+    summary = DrawSummary(compression=None)
+    for draw in [0, 1, 2]:
+        aggregator = ResultsAggregator()
+        for job in jobs:
+            if job['input_draw'] == draw:
+                aggregator.add(job)
+                combined.add(job)
+        # Only the draw summary outlives the aggregator of its draw.
+        summary.merge(aggregator.sketch_draws(compression=None))
+
+    group_columns = ['scenario', 'measure', 'cause', 'year', 'sex', 'age_group']
+    columns = ['mean', 'std', 'lower', 'upper', 'draws']
+    pd.testing.assert_frame_equal(summary.to_frame(group_columns)[columns], combined.summarize()[columns])
+
+
+def test_records_of_incomplete_pairs_are_held():
+    jobs = make_jobs(seeds=4)
+    complete = [job for job in jobs if job['random_seed'] != 3]
+    aggregator = ResultsAggregator(antithetic=True)
+    aggregator.add_records(make_records(jobs))
+    for job in complete:
+        aggregator.add(job)
+    assert aggregator.held_records == len(jobs) // 4
+    assert aggregator.unpaired_jobs == len(jobs) // 4
+
+    # Only the records of complete pairs are summed, before and after a round trip through the persisted state.
+    expected = ResultsAggregator(antithetic=True)
+    expected.add_records(make_records([job for job in complete if job['random_seed'] < 2]))
+    for job in complete:
+        expected.add(job)
+    sort = ['scenario', 'input_draw', 'measure', 'sex']
+    for result in [aggregator, ResultsAggregator.from_frame(aggregator.to_frame(), antithetic=True)]:
+        assert result.held_records == len(jobs) // 4
+        pd.testing.assert_frame_equal(result.tidy().sort_values(sort, ignore_index=True),
+                                      expected.tidy().sort_values(sort, ignore_index=True))
+
+    restored = ResultsAggregator.from_frame(aggregator.to_frame(), antithetic=True)
+    for job in jobs:
+        if job['random_seed'] == 3:
+            restored.add(job)
+    assert (restored.held_records, restored.unpaired_jobs) == (0, 0)
+    tidy = restored.tidy().set_index(['scenario', 'input_draw', 'measure'])
+    population = tidy.xs('total_population', level='measure')['value']
+    supplemented = tidy.xs('supplemented_days', level='measure')['value'].groupby(level=[0, 1]).sum()
+    np.testing.assert_allclose(supplemented.loc[population.index], population)
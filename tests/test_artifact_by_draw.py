@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+from vivarium.framework.artifact import Artifact, EntityKey, hdf
+
+from vivarium_conic_vitamin_a_supp.plugins.artifact import get_keys_by_draw
+from vivarium_conic_vitamin_a_supp.utilities import read_data_by_draw
+
+
+@pytest.fixture
+def by_draw_artifact(tmp_path, draw_key, draw_data, metadata):
+    """An artifact equivalent to the wide artifact with the draw key stored by draw."""
+    path = tmp_path / 'by_draw.hdf'
+    artifact = Artifact(path)
+    artifact.write(*metadata)
+    key = EntityKey(draw_key)
+    with pd.HDFStore(str(path), mode='a') as store:
+        store.put(f'{key.path}/index', draw_data.index.to_frame(index=False))
+        for column, values in draw_data.reset_index(drop=True).items():
+            store.put(f'{key.path}/{column}', values)
+    hdf.remove(path, 'metadata.keyspace')
+    hdf.write(path, 'metadata.keyspace', artifact.keys + [draw_key])
+    return path
+
+
+def test_get_keys_by_draw(wide_artifact, by_draw_artifact, draw_key):
+    assert get_keys_by_draw(str(wide_artifact), Artifact(wide_artifact).keys) == set()
+    assert get_keys_by_draw(str(by_draw_artifact), Artifact(by_draw_artifact).keys) == {draw_key}
+
+
+def test_read_data_by_draw(by_draw_artifact, draw_key, draw_data):
+    data = read_data_by_draw(str(by_draw_artifact), draw_key, 3)
+    expected = draw_data.reset_index().drop(columns=[f'draw_{i}' for i in range(10) if i != 3])
+    pd.testing.assert_frame_equal(data, expected.rename(columns={'draw_3': 'value'}))
+
+
+@pytest.mark.parametrize('input_draw_number', [0, 7, None])
+@pytest.mark.parametrize('column_filters', [{}, {'sex': 'Female'}])
+def test_draw_aware_load_matches_full_load(wide_artifact, by_draw_artifact, load_data, draw_aware_plugin,
+                                           input_draw_number, column_filters):
+    expected = load_data(wide_artifact, input_draw_number, **column_filters)
+    draw_aware = load_data(by_draw_artifact, input_draw_number, draw_aware_plugin, **column_filters)
+
+    pd.testing.assert_frame_equal(draw_aware['draws'], expected['draws'])
+    assert draw_aware['metadata'] == expected['metadata']
+
+
+def test_draw_aware_load_of_wide_artifact(wide_artifact, load_data, draw_aware_plugin):
+    expected = load_data(wide_artifact, 4)
+    draw_aware = load_data(wide_artifact, 4, draw_aware_plugin)
+    pd.testing.assert_frame_equal(draw_aware['draws'], expected['draws'])
@@ -0,0 +1,175 @@
+import time
+
+import pandas as pd
+import pytest
+from vivarium.framework.artifact import Artifact, ArtifactException
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.data import builder
+from vivarium_conic_vitamin_a_supp.data.cache import LoaderCache
+from vivarium_conic_vitamin_a_supp.data.manifest import ArtifactManifest, find_corrupt_keys
+from vivarium_conic_vitamin_a_supp.plugins.artifact import get_keys_by_draw, read_all_draws
+from vivarium_conic_vitamin_a_supp.utilities import draw_chunks, read_data_by_draw
+
+LOCATION = 'Kenya'
+OTHER_DRAW_KEY = 'cause.measles.incidence_rate'
+TABLE_KEY = 'population.structure'
+ARTIFACT_KEYS = {'metadata.keyspace', project_globals.METADATA_LOCATIONS}
+
+
+@pytest.fixture
+def source_data(draw_key, draw_data, metadata):
+    metadata_key, restrictions = metadata
+    table = draw_data.iloc[:, :1].rename(columns={'draw_0': 'value'})
+    return {draw_key: draw_data, metadata_key: restrictions, OTHER_DRAW_KEY: draw_data * 2, TABLE_KEY: table}
+
+
+@pytest.fixture
+def loads(monkeypatch, source_data):
+    """Replaces the loader with the source data and records the keys loaded."""
+    loads = []
+
+    def get_data(key, location, cache=None, draws_per_chunk=None):
+        assert location == LOCATION
+        loads.append(key)
+        time.sleep(0.01)
+        return source_data[key]
+
+    monkeypatch.setattr(builder, 'get_data', get_data)
+    return loads
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    return builder.open_artifact(tmp_path / 'kenya.hdf', LOCATION)
+
+
+def assert_artifact_matches(path, data):
+    artifact = Artifact(path)
+    for key, value in data.items():
+        if isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(artifact.load(key), value)
+        else:
+            assert artifact.load(key) == value
+    # The manifest is kept up to date with every write.
+    assert ArtifactManifest.read(path).keys == artifact.keys
+    assert not find_corrupt_keys(path)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_load_and_write_data_concurrently(artifact, source_data, loads, draw_key, metadata, workers):
+    builder.write_data(artifact, draw_key, source_data[draw_key])
+    key_groups = [[draw_key, metadata[0]], [OTHER_DRAW_KEY], [TABLE_KEY]]
+
+    builder.load_and_write_data_concurrently(artifact, key_groups, LOCATION, workers=workers)
+
+    assert sorted(loads) == sorted([metadata[0], OTHER_DRAW_KEY, TABLE_KEY])
+    assert set(artifact.keys) == set(source_data) | ARTIFACT_KEYS
+    assert_artifact_matches(artifact.path, source_data)
+
+
+def test_load_and_write_data_concurrently_by_draw(artifact, source_data, loads, draw_key, metadata):
+    key_groups = [[draw_key, metadata[0]], [OTHER_DRAW_KEY, TABLE_KEY]]
+
+    builder.load_and_write_data_concurrently(artifact, key_groups, LOCATION, workers=2, draws_per_chunk=3)
+
+    assert set(artifact.keys) == set(source_data) | ARTIFACT_KEYS
+    assert set(get_keys_by_draw(artifact.path, artifact.keys)) == {draw_key, OTHER_DRAW_KEY}
+    for key in [draw_key, OTHER_DRAW_KEY]:
+        index = source_data[key].index.to_frame(index=False)
+        for draw in [0, 4, 9]:
+            expected = index.assign(value=source_data[key][f'draw_{draw}'].values)
+            pd.testing.assert_frame_equal(read_data_by_draw(artifact.path, key, draw), expected)
+    assert_artifact_matches(artifact.path, {k: source_data[k] for k in [metadata[0], TABLE_KEY]})
+
+
+def test_load_and_write_data_concurrently_propagates_load_errors(artifact, monkeypatch, draw_key):
+    def get_data(key, location, cache=None, draws_per_chunk=None):
+        raise ValueError(f'No data for {key}.')
+
+    monkeypatch.setattr(builder, 'get_data', get_data)
+    with pytest.raises(ValueError):
+        builder.load_and_write_data_concurrently(artifact, [[draw_key]], LOCATION, workers=2)
+    assert draw_key not in Artifact(artifact.path)
+
+
+def test_load_and_write_key_group(artifact, source_data, loads, draw_key, metadata):
+    builder.load_and_write_key_group(artifact, [draw_key, metadata[0]], LOCATION)
+    builder.load_and_write_key_group(artifact, [draw_key, TABLE_KEY], LOCATION)
+
+    assert loads == [draw_key, metadata[0], TABLE_KEY]
+    assert_artifact_matches(artifact.path, {k: source_data[k] for k in [draw_key, metadata[0], TABLE_KEY]})
+
+
+def test_write_data_batch(artifact, source_data):
+    builder.write_data_batch(artifact, source_data)
+
+    # The in-memory keyspace matches the keyspace of the artifact reopened from disk.
+    assert artifact.keys == Artifact(artifact.path).keys
+    assert set(artifact.keys) == set(source_data) | ARTIFACT_KEYS
+    assert_artifact_matches(artifact.path, source_data)
+
+    # The artifact's own methods keep working on the refreshed keyspace.
+    artifact.remove(TABLE_KEY)
+    artifact.write(TABLE_KEY, source_data[TABLE_KEY])
+    assert artifact.keys == Artifact(artifact.path).keys
+
+
+def test_write_data_batch_errors(artifact, source_data, draw_key):
+    builder.write_data_batch(artifact, {draw_key: source_data[draw_key]})
+    keys = list(artifact.keys)
+
+    with pytest.raises(ArtifactException, match='already in artifact'):
+        builder.write_data_batch(artifact, {TABLE_KEY: source_data[TABLE_KEY], draw_key: source_data[draw_key]})
+    with pytest.raises(ArtifactException, match='no data'):
+        builder.write_data_batch(artifact, {TABLE_KEY: None})
+    # Nothing is written when any key in the batch is invalid.
+    assert Artifact(artifact.path).keys == keys
+
+    builder.write_data_batch(artifact, {})
+    assert Artifact(artifact.path).keys == keys
+
+
+@pytest.mark.parametrize('draws_per_chunk', [1, 3, 10])
+def test_write_data_by_draw(artifact, draw_key, draw_data, draws_per_chunk):
+    builder.write_data_by_draw(artifact, draw_key, draw_chunks(draw_data, draws_per_chunk))
+
+    assert draw_key in Artifact(artifact.path)
+    assert get_keys_by_draw(artifact.path, artifact.keys) == {draw_key}
+    pd.testing.assert_frame_equal(read_all_draws(artifact.path, draw_key), draw_data.reset_index())
+    assert ArtifactManifest.read(artifact.path).keys_by_draw == {draw_key}
+    assert not find_corrupt_keys(artifact.path)
+
+
+def test_write_data_by_draw_errors(artifact, draw_key, draw_data):
+    mismatched = [draw_data.iloc[:, :5], draw_data.iloc[1:, 5:]]
+    with pytest.raises(ArtifactException, match='same index'):
+        builder.write_data_by_draw(artifact, draw_key, mismatched)
+    with pytest.raises(ArtifactException, match='no data'):
+        builder.write_data_by_draw(artifact, OTHER_DRAW_KEY, [])
+    assert not {draw_key, OTHER_DRAW_KEY} & set(Artifact(artifact.path).keys)
+
+    # The partial write left behind is replaced by the next one.
+    builder.write_data_by_draw(artifact, draw_key, draw_chunks(draw_data.iloc[:, :4], 2))
+    pd.testing.assert_frame_equal(read_all_draws(artifact.path, draw_key), draw_data.iloc[:, :4].reset_index())
+    with pytest.raises(ArtifactException, match='already in artifact'):
+        builder.write_data_by_draw(artifact, draw_key, draw_chunks(draw_data, 2))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_load_and_write_data_by_draw_through_cache(tmp_path, monkeypatch, source_data, draw_key, metadata, workers):
+    cache = LoaderCache(tmp_path / 'cache')
+    monkeypatch.setattr(cache, 'get_data', lambda key, location, draws_per_chunk=None: cache.load(
+        key, location, lambda k, _: source_data[k], draws_per_chunk=draws_per_chunk))
+    key_groups = [[draw_key, metadata[0]], [OTHER_DRAW_KEY]]
+
+    # Once from the loader, and once from the cache entries.
+    for output_path in [tmp_path / 'first.hdf', tmp_path / 'second.hdf']:
+        artifact = builder.open_artifact(output_path, LOCATION)
+        builder.load_and_write_data_concurrently(artifact, key_groups, LOCATION, workers=workers, cache=cache,
+                                                 draws_per_chunk=3)
+        assert get_keys_by_draw(artifact.path, artifact.keys) == {draw_key, OTHER_DRAW_KEY}
+        for key in [draw_key, OTHER_DRAW_KEY]:
+            pd.testing.assert_frame_equal(read_all_draws(artifact.path, key), source_data[key].reset_index())
+        assert Artifact(artifact.path).load(metadata[0]) == metadata[1]
+    assert (cache.hits, cache.misses) == (3, 3)
@@ -0,0 +1,172 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import pandas as pd
+import pytest
+
+from vivarium_conic_vitamin_a_supp.data.cache import LoaderCache, get_cache_key
+from vivarium_conic_vitamin_a_supp.utilities import draw_chunks
+
+KEY = 'cause.diarrheal_diseases.incidence_rate'
+
+
+def make_loader(data):
+    """Makes a load function that records its calls."""
+    def load(key, location):
+        load.calls.append((key, location))
+        return data
+    load.calls = []
+    return load
+
+
+def load_table(key, location):
+    pass
+
+
+def load_metadata(key, location):
+    pass
+
+
+def test_get_cache_key():
+    cache_key = get_cache_key(KEY, 'Kenya', load_table)
+    assert cache_key == get_cache_key(KEY, 'Kenya', load_table)
+    assert len({cache_key,
+                get_cache_key(KEY, 'Ethiopia', load_table),
+                get_cache_key(KEY, None, load_table),
+                get_cache_key('cause.measles.incidence_rate', 'Kenya', load_table),
+                get_cache_key(KEY, 'Kenya', load_metadata)}) == 5
+
+
+@pytest.mark.parametrize('data_fixture, suffix', [('draw_data', '.parquet'), ('metadata', '.json')])
+def test_hit_and_miss(tmp_path, request, data_fixture, suffix):
+    data = request.getfixturevalue(data_fixture)
+    data = data.reset_index() if isinstance(data, pd.DataFrame) else data[1]
+    load_function = make_loader(data)
+    cache = LoaderCache(tmp_path)
+
+    first = cache.load(KEY, 'Kenya', load_function)
+    second = cache.load(KEY, 'Kenya', load_function)
+
+    assert load_function.calls == [(KEY, 'Kenya')]
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate == 0.5
+    assert [p.suffix for p in tmp_path.iterdir()] == [suffix]
+    if isinstance(data, pd.DataFrame):
+        pd.testing.assert_frame_equal(second, data)
+    else:
+        assert second == first == data
+
+    # A new cache over the same directory reads the entry written by the first.
+    assert LoaderCache(tmp_path).load(KEY, 'Kenya', load_function) is not None
+    assert len(load_function.calls) == 1
+
+
+def test_locations(tmp_path, metadata):
+    load_function = make_loader(metadata[1])
+    cache = LoaderCache(tmp_path)
+
+    cache.load(KEY, 'Kenya', load_function)
+    cache.load(KEY, 'Ethiopia', load_function)
+    assert cache.misses == 2
+
+    cache.load(KEY, 'Kenya', load_function, location_independent=True)
+    cache.load(KEY, 'Ethiopia', load_function, location_independent=True)
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert load_function.calls[-1] == (KEY, 'Kenya')
+
+
+def test_uncacheable_data_is_returned(tmp_path):
+    data = {'not_json': {1, 2}}
+    cache = LoaderCache(tmp_path)
+    assert cache.load(KEY, 'Kenya', make_loader(data)) == data
+    assert not list(tmp_path.iterdir())
+
+
+def test_eviction(tmp_path, draw_data):
+    data = draw_data.reset_index()
+    cache = LoaderCache(tmp_path)
+    keys = [f'cause.cause_{i}.incidence_rate' for i in range(3)]
+    for age, key in enumerate(keys):
+        load_function = make_loader(data)
+        cache.load(key, 'Kenya', load_function)
+        os.utime(tmp_path / f'{get_cache_key(key, "Kenya", load_function)}.parquet', (age, age))
+    # Reading the oldest entry makes it the most recently used.
+    cache.load(keys[0], 'Kenya', make_loader(data))
+    assert cache.hits == 1
+
+    cache.max_size = 2 * max(p.stat().st_size for p in tmp_path.iterdir())
+    cache.evict()
+    assert len(list(tmp_path.iterdir())) == 2
+
+    load_function = make_loader(data)
+    cache.load(keys[0], 'Kenya', load_function)
+    cache.load(keys[2], 'Kenya', load_function)
+    assert not load_function.calls
+    cache.load(keys[1], 'Kenya', load_function)
+    assert load_function.calls == [(keys[1], 'Kenya')]
+
+
+def test_thread_safety(tmp_path, draw_data):
+    data = draw_data.reset_index()
+    cache = LoaderCache(tmp_path)
+    keys = [f'cause.cause_{i}.incidence_rate' for i in range(4)] * 25
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda key: cache.load(key, 'Kenya', make_loader(data)), keys))
+
+    assert cache.hits + cache.misses == len(keys)
+    assert cache.misses >= 4
+    for result in results:
+        pd.testing.assert_frame_equal(result, data)
+    # No partial entries are left behind.
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == ['.parquet'] * 4
+
+
+def test_load_by_draw(tmp_path, draw_data):
+    load_function = make_loader(draw_data)
+    cache = LoaderCache(tmp_path)
+    expected = list(draw_chunks(draw_data, 4))
+
+    for _ in range(2):  # A miss, then a hit.
+        chunks = list(cache.load(KEY, 'Kenya', load_function, draws_per_chunk=4))
+        assert len(chunks) == len(expected)
+        for chunk, expected_chunk in zip(chunks, expected):
+            pd.testing.assert_frame_equal(chunk, expected_chunk)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Chunks are still read if the entry is evicted after they are requested.
+    chunks = cache.load(KEY, 'Kenya', load_function, draws_per_chunk=4)
+    for path in tmp_path.iterdir():
+        path.unlink()
+    pd.testing.assert_frame_equal(pd.concat(list(chunks), axis=1), draw_data)
+
+    with pytest.raises(ValueError, match='at least one draw'):
+        cache.load(KEY, 'Kenya', load_function, draws_per_chunk=0)
+
+
+def test_load_by_draw_other_data(tmp_path, draw_data, metadata):
+    table = draw_data.reset_index()
+    cache = LoaderCache(tmp_path)
+    for data in [table, metadata[1], table]:
+        key = f'{KEY}.{type(data).__name__}'
+        loaded = cache.load(key, 'Kenya', make_loader(data), draws_per_chunk=4)
+        if isinstance(data, pd.DataFrame):
+            pd.testing.assert_frame_equal(loaded, data)
+        else:
+            assert loaded == data
+    assert cache.hits == 1
+
+
+def test_entry_evicted_after_read(tmp_path, monkeypatch, metadata):
+    load_function = make_loader(metadata[1])
+    cache = LoaderCache(tmp_path)
+    cache.load(KEY, 'Kenya', load_function)
+
+    def utime(path):
+        # Another build evicts the entry just after it was read.
+        os.unlink(path)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, 'utime', utime)
+    assert cache.load(KEY, 'Kenya', load_function) == metadata[1]
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+from vivarium import InteractiveContext
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.data.synthetic import GBD_AGE_BINS, SyntheticArtifactSpec, write_synthetic_artifact
+from vivarium_conic_vitamin_a_supp.utilities import chunk_index
+
+CLOCK_PLUGIN = {
+    'required': {
+        'clock': {
+            'controller': 'vivarium_conic_vitamin_a_supp.plugins.AdaptiveStepClock',
+            'builder_interface': 'vivarium.framework.time.TimeInterface',
+        }
+    }
+}
+RANDOMNESS_PLUGIN = {
+    'required': {
+        'randomness': {
+            'controller': 'vivarium_conic_vitamin_a_supp.plugins.CounterBasedRandomnessManager',
+            'builder_interface': 'vivarium.framework.randomness.RandomnessInterface',
+        }
+    }
+}
+STRATIFIED_RANDOMNESS = {'variance_reduction': {'stratified_initialization': True}}
+
+
+@pytest.fixture(scope='module')
+def synthetic_artifact(tmp_path_factory):
+    path = tmp_path_factory.mktemp('synthetic') / 'kenya.hdf'
+    write_synthetic_artifact(path, 'Kenya', SyntheticArtifactSpec(draws=2, age_bins=GBD_AGE_BINS.iloc[:5]))
+    return path
+
+
+@pytest.fixture
+def run_simulation(synthetic_artifact, monkeypatch):
+    # vivarium_public_health bins ages with np.asscalar, which numpy 1.23 removed.
+    monkeypatch.setattr(np, 'asscalar', lambda a: a.item(), raising=False)
+
+    def _run(chunk_size, plugin_configuration=None, randomness=None):
+        from vivarium_public_health.population import BasePopulation
+        from vivarium_conic_vitamin_a_supp.components import (DisabilityObserver, DiseaseObserver, Mortality,
+                                                              NeonatalSIS, Risk, RiskEffect, SIS)
+
+        components = [BasePopulation(), Mortality(), SIS(project_globals.DIARRHEA_MODEL_NAME),
+                      NeonatalSIS(project_globals.LRI_MODEL_NAME), Risk('risk_factor.vitamin_a_deficiency'),
+                      RiskEffect('risk_factor.vitamin_a_deficiency', 'cause.diarrheal_diseases.incidence_rate'),
+                      DisabilityObserver(), DiseaseObserver(project_globals.DIARRHEA_MODEL_NAME)]
+        configuration = {
+            'input_data': {'artifact_path': str(synthetic_artifact), 'input_draw_number': 1, 'location': 'Kenya'},
+            'population': {'population_size': 500, 'age_start': 0, 'age_end': 5, 'exit_age': 5,
+                           'chunk_size': chunk_size},
+            'time': {'start': {'year': 2017, 'month': 1, 'day': 1}, 'end': {'year': 2017, 'month': 2, 'day': 1},
+                     'step_size': 1},
+            'metrics': {'disability': {'by_age': True, 'by_sex': True, 'by_year': True},
+                        'diarrheal_diseases_observer': {'by_age': True, 'by_sex': True, 'by_year': True}},
+        }
+        if randomness is not None:
+            configuration['randomness'] = randomness
+        simulation = InteractiveContext(components=components, configuration=configuration,
+                                        plugin_configuration=plugin_configuration)
+        simulation.take_steps(5)
+        population = simulation.get_population(untracked=True)
+        return population, pd.Series(simulation.get_value('metrics')(population.index))
+    return _run
+
+
+@pytest.mark.parametrize('plugin_configuration, randomness', [(None, None), (CLOCK_PLUGIN, None),
+                                                                (RANDOMNESS_PLUGIN, STRATIFIED_RANDOMNESS)])
+def test_chunked_simulation_matches_unchunked(run_simulation, plugin_configuration, randomness):
+    population, metrics = run_simulation(None, plugin_configuration, randomness)
+    chunked_population, chunked_metrics = run_simulation(200, plugin_configuration, randomness)
+
+    pd.testing.assert_frame_equal(chunked_population, population)
+    # Chunks only change the order in which person-level disability is summed.
+    pd.testing.assert_series_equal(chunked_metrics, metrics, check_exact=False, rtol=1e-12)
+    if randomness is None:
+        # Checks the default streams exercise deaths; other streams need not in five days.
+        assert (population['alive'] == 'dead').any()
+    assert metrics.filter(like='ylds_due_to_diarrheal_diseases').sum() > 0
+    assert metrics.filter(like='diarrheal_diseases_event_count').sum() > 0
+
+
+def test_chunk_index():
+    index = pd.Index(range(10))
+    assert [chunk.tolist() for chunk in chunk_index(index, 4)] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert [chunk.tolist() for chunk in chunk_index(index, None)] == [list(range(10))]
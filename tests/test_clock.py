@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+from vivarium.framework.engine import SimulationContext
+
+from vivarium_conic_vitamin_a_supp.plugins.clock import AdaptiveStepClock, get_at_risk_index
+
+CLOCK_PLUGIN = {
+    'required': {
+        'clock': {
+            'controller': 'vivarium_conic_vitamin_a_supp.plugins.AdaptiveStepClock',
+            'builder_interface': 'vivarium.framework.time.TimeInterface',
+        }
+    }
+}
+# Remission rates that allow steps of about 3 days for the infected and 1 day for everyone else.
+INFECTED_REMISSION_RATE = 1.
+SUSCEPTIBLE_REMISSION_RATE = 100.
+
+
+@pytest.fixture
+def clock():
+    clock = AdaptiveStepClock()
+    clock.min_step_size = pd.Timedelta(days=1)
+    clock.max_step_size = pd.Timedelta(days=10)
+    clock.max_event_probability = 0.01
+    clock._stop_time = pd.Timestamp('2018-06-01')
+    return clock
+
+
+@pytest.mark.parametrize('max_rate, days', [(0., 10), (1e-3, 10), (1., 3), (3.65, 1), (100., 1)])
+def test_get_step_size(clock, max_rate, days):
+    assert clock.get_step_size(max_rate, pd.Timestamp('2017-03-01')) == pd.Timedelta(days=days)
+
+
+def test_get_step_size_stops_at_boundaries(clock):
+    assert clock.get_step_size(0., pd.Timestamp('2017-12-28')) == pd.Timedelta(days=4)
+    assert clock.get_step_size(0., pd.Timestamp('2018-05-30')) == pd.Timedelta(days=2)
+
+
+def test_get_at_risk_index():
+    population = pd.DataFrame({'measles': ['measles', 'susceptible_to_measles', 'measles']}, index=[3, 5, 8])
+    assert get_at_risk_index('measles.remission_rate', population).tolist() == [3, 8]
+    assert get_at_risk_index('measles.incidence_rate', population).tolist() == [5]
+    assert get_at_risk_index('mortality_rate', population).tolist() == [3, 5, 8]
+    assert get_at_risk_index('diarrheal_diseases.remission_rate', population).tolist() == [3, 5, 8]
+
+
+class ToyDisease:
+    """Half the simulants are infected, and simulants are untracked as they age out."""
+
+    @property
+    def name(self):
+        return 'toy_disease'
+
+    def setup(self, builder):
+        self.population_view = builder.population.get_view(['toy', 'alive', 'tracked'])
+        builder.population.initializes_simulants(self.on_initialize_simulants, creates_columns=['toy', 'alive'])
+        builder.value.register_rate_producer('toy.remission_rate', source=self.remission_rate)
+        builder.event.register_listener('time_step', self.on_time_step)
+
+    def on_initialize_simulants(self, pop_data):
+        infected = np.arange(len(pop_data.index)) % 2 == 0
+        self.population_view.update(pd.DataFrame({
+            'toy': np.where(infected, 'toy', 'susceptible_to_toy'),
+            'alive': 'alive',
+        }, index=pop_data.index))
+
+    def on_time_step(self, event):
+        self.population_view.update(pd.Series(False, index=event.index[:10], name='tracked'))
+
+    def remission_rate(self, index):
+        pop = self.population_view.get(index)
+        if not pop['tracked'].all():
+            # Like vph risk effects, which have no exposure for untracked simulants.
+            raise KeyError(f'{index[~pop["tracked"]].tolist()} not in index')
+        return pd.Series(np.where(pop['toy'] == 'toy', INFECTED_REMISSION_RATE, SUSCEPTIBLE_REMISSION_RATE),
+                         index=index)
+
+
+def test_adaptive_step_clock_simulation():
+    configuration = {
+        'population': {'population_size': 100},
+        'time': {
+            'start': {'year': 2017, 'month': 12, 'day': 20},
+            'end': {'year': 2018, 'month': 1, 'day': 10},
+            'adaptive_step_size': {'rate_pipelines': ['toy.remission_rate'], 'max_event_probability': 0.01},
+        },
+    }
+    simulation = SimulationContext(components=[ToyDisease()], configuration=configuration,
+                                   plugin_configuration=CLOCK_PLUGIN)
+    simulation.setup()
+    simulation.initialize_simulants()
+    times = [simulation._clock.time]
+    while simulation._clock.time < simulation._clock.stop_time:
+        simulation.step()
+        times.append(simulation._clock.time)
+
+    steps = [(end - start).days for start, end in zip(times, times[1:])]
+    # A first daily step, steps of 3 days limited by the infected and a short step to the new year.
+    assert steps == [1, 3, 3, 3, 2, 3, 3, 3]
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+from vivarium.framework.artifact import Artifact
+
+from vivarium_conic_vitamin_a_supp.data import columnar
+
+COLUMNAR_PLUGIN = {
+    'required': {
+        'data': {
+            'controller': 'vivarium_conic_vitamin_a_supp.plugins.ColumnarArtifactManager',
+            'builder_interface': 'vivarium.framework.artifact.ArtifactInterface',
+        }
+    }
+}
+
+
+@pytest.fixture
+def columnar_artifact(tmp_path, wide_artifact):
+    path = columnar.get_columnar_path(wide_artifact, tmp_path)
+    columnar.export_artifact(wide_artifact, path)
+    return path
+
+
+def test_round_trip(tmp_path, wide_artifact, columnar_artifact):
+    imported_path = tmp_path / 'imported' / 'wide.hdf'
+    imported_path.parent.mkdir()
+    columnar.import_artifact(columnar_artifact, imported_path)
+
+    original, imported = Artifact(wide_artifact), Artifact(imported_path)
+    assert sorted(original.keys) == sorted(imported.keys)
+    for key in original.keys:
+        if isinstance(original.load(key), pd.DataFrame):
+            pd.testing.assert_frame_equal(imported.load(key), original.load(key))
+        else:
+            assert imported.load(key) == original.load(key)
+
+
+def test_load_single_draw_columns(columnar_artifact, draw_key):
+    data = columnar.ColumnarArtifact(columnar_artifact, draw=2).load(draw_key)
+    assert data.columns.tolist() == ['draw_2']
+
+
+@pytest.mark.parametrize('input_draw_number', [0, 7, None])
+@pytest.mark.parametrize('column_filters', [{}, {'sex': 'Male'}])
+def test_columnar_load_matches_hdf_load(wide_artifact, columnar_artifact, load_data,
+                                        input_draw_number, column_filters):
+    expected = load_data(wide_artifact, input_draw_number, **column_filters)
+    loaded = load_data(columnar_artifact, input_draw_number, COLUMNAR_PLUGIN, **column_filters)
+
+    pd.testing.assert_frame_equal(loaded['draws'], expected['draws'])
+    assert loaded['metadata'] == expected['metadata']
+
+
+def test_benchmark_loads(wide_artifact, columnar_artifact):
+    results = columnar.benchmark_loads(wide_artifact, columnar_artifact, draw=1)
+    assert results['matches'].all()
+    assert (results[['hdf', 'columnar']] > 0).all().all()
@@ -0,0 +1,83 @@
+import pytest
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.tools import make_artifacts
+from vivarium_conic_vitamin_a_supp.tools.executors import (BuildJob, Executor, FakeExecutor, JobResult,
+                                                           ResourceHistory, format_runtime, parse_memory, run_jobs)
+
+LOCATIONS = project_globals.LOCATIONS[:2]
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    return [BuildJob(location, tmp_path / f'{location}.hdf') for location in LOCATIONS]
+
+
+def test_builds_are_retried_with_more_memory(tmp_path, jobs):
+    failures = {LOCATIONS[0]: 1}
+
+    def run_job(job, resources):
+        if failures.get(job.location):
+            failures[job.location] -= 1
+            return JobResult(job.location, False, 1., None, 'MemoryError')
+        return JobResult(job.location, True, 60., 2.)
+
+    executor = FakeExecutor(run_job)
+    results = run_jobs(executor, jobs, ResourceHistory(tmp_path / 'history.json'), max_retries=2, backoff=0)
+
+    assert all(result.succeeded for result in results.values())
+    assert results[LOCATIONS[0]].attempts == 2
+    assert results[LOCATIONS[1]].attempts == 1
+    memory = [request.memory for job, request in executor.submissions if job.location == LOCATIONS[0]]
+    assert memory[1] > memory[0]
+
+
+def test_builds_fail_after_max_retries(tmp_path, jobs):
+    executor = FakeExecutor(lambda job, resources: JobResult(job.location, False, 1., None, 'Error'))
+    results = run_jobs(executor, jobs, ResourceHistory(tmp_path / 'history.json'), max_retries=1, backoff=0)
+
+    assert not any(result.succeeded for result in results.values())
+    assert len(executor.submissions) == 2 * len(jobs)
+
+
+def test_requests_are_sized_from_history(tmp_path, jobs):
+    history_path = tmp_path / 'history.json'
+    executor = FakeExecutor(lambda job, resources: JobResult(job.location, True, 1800., 3.5))
+    run_jobs(executor, jobs, ResourceHistory(history_path))
+
+    history = ResourceHistory(history_path)
+    request = history.get_request(LOCATIONS[0], threads=4)
+    assert request.memory == 5  # 3.5G with headroom, rounded up.
+    assert format_runtime(request.runtime) == '0:45:00'
+    assert request.threads == 4
+
+    default = history.get_request('Atlantis', threads=1)
+    assert default.memory == parse_memory(project_globals.MAKE_ARTIFACT_MEM)
+    assert format_runtime(default.runtime) == project_globals.MAKE_ARTIFACT_RUNTIME
+
+
+def test_cluster_job_arguments(tmp_path):
+    job = BuildJob('Burkina Faso', tmp_path / 'burkina_faso.hdf', 4, None, 100, 'compact')
+    assert job.args == [str(tmp_path / 'burkina_faso.hdf'), '"Burkina Faso"', '4', '""', '100', 'compact']
+
+
+def test_executors_must_submit_and_wait():
+    class SubmitOnly(Executor):
+        def submit(self, job, resources):
+            return 'job'
+
+    with pytest.raises(TypeError):
+        SubmitOnly()
+
+
+@pytest.mark.parametrize('fresh_process', [True, False])
+def test_local_builds_report_peak_memory_of_fresh_processes(tmp_path, monkeypatch, fresh_process):
+    monkeypatch.setattr(make_artifacts, 'FRESH_PROCESS_PER_BUILD', fresh_process)
+    monkeypatch.setattr(make_artifacts, 'build_single_location_artifact', lambda *args, **kwargs: None)
+    # The build would otherwise remove the test session's log handlers.
+    monkeypatch.setattr(make_artifacts.logger, 'remove', lambda *args: None)
+
+    result = make_artifacts._build_local_artifact(BuildJob(LOCATIONS[0], tmp_path / 'artifact.hdf'))
+
+    assert result.succeeded
+    assert (result.peak_memory is not None) == fresh_process
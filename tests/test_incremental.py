@@ -0,0 +1,66 @@
+import json
+
+import pandas as pd
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.results_processing import long_format
+from vivarium_conic_vitamin_a_supp.results_processing.aggregation import aggregate_job_outputs
+from vivarium_conic_vitamin_a_supp.results_processing.incremental import (AVERTED_FILE, SUMMARY_FILE, ResultsLedger,
+                                                                          get_job_output_name, process_outputs)
+from vivarium_conic_vitamin_a_supp.tools.local_runner import Job
+
+
+def write_jobs(output_dir, scenario, draws, seeds, offset=0.):
+    for draw in draws:
+        for seed in seeds:
+            metrics = {'scenario': scenario, 'input_draw': draw, 'random_seed': seed,
+                       project_globals.TOTAL_YLLS_COLUMN: 10. * draw + seed + offset,
+                       project_globals.TOTAL_YLDS_COLUMN: 1. + offset}
+            with (output_dir / f'{scenario}_draw_{draw}_seed_{seed}.json').open('w') as f:
+                json.dump(metrics, f)
+
+
+def test_outputs_are_ingested_once(tmp_path):
+    write_jobs(tmp_path, 'intervention', draws=[0, 1], seeds=[0, 1])
+    assert process_outputs(tmp_path, baseline='baseline') == 4
+    assert not (tmp_path / AVERTED_FILE).exists()
+
+    write_jobs(tmp_path, 'baseline', draws=[0, 1], seeds=[0, 1], offset=2.)
+    assert process_outputs(tmp_path, baseline='baseline') == 4
+    assert process_outputs(tmp_path, baseline='baseline') == 0
+    assert len(ResultsLedger.read(tmp_path)) == 8
+    assert len(list(tmp_path.glob('.results_state_*.parquet'))) == 1
+
+    expected = aggregate_job_outputs(ResultsLedger(tmp_path).find_new_outputs())
+    summary = pd.read_csv(tmp_path / SUMMARY_FILE).set_index(['scenario', 'measure'])['mean']
+    expected = expected.summarize().set_index(['scenario', 'measure'])['mean']
+    pd.testing.assert_series_equal(summary.sort_index(), expected.sort_index())
+
+    averted = pd.read_csv(tmp_path / AVERTED_FILE).set_index('measure')
+    assert averted.loc[project_globals.TOTAL_YLLS_COLUMN, 'mean'] == 2.
+    assert averted.loc['dalys', 'mean'] == 4.
+    assert averted.loc['dalys', 'draws'] == 2
+
+
+def test_long_format_outputs_are_ingested(tmp_path):
+    records = [('supplemented_days', None, 2017, 'female', '1_to_4', 5.)]
+    for draw in [0, 1]:
+        long_format.write_partition(long_format.encode_records(records), tmp_path / 'long_format', 'baseline',
+                                    draw, 0)
+    write_jobs(tmp_path, 'baseline', draws=[0], seeds=[0])
+    # The records of draw 1 wait for its job output, which is written once its simulation has finished.
+    assert process_outputs(tmp_path) == 2
+    summary = pd.read_csv(tmp_path / SUMMARY_FILE).set_index('measure')
+    assert summary.loc['supplemented_days', ['mean', 'draws']].tolist() == [5., 1]
+
+    write_jobs(tmp_path, 'baseline', draws=[1], seeds=[0])
+    assert process_outputs(tmp_path) == 2
+    assert process_outputs(tmp_path) == 0
+    assert sum(name.startswith('long_format/') for name in ResultsLedger.read(tmp_path).ingested) == 2
+    summary = pd.read_csv(tmp_path / SUMMARY_FILE).set_index('measure')
+    assert summary.loc['supplemented_days', ['mean', 'draws']].tolist() == [5., 2]
+
+
+def test_get_job_output_name():
+    job = Job('baseline', {}, input_draw=3, random_seed=7)
+    assert get_job_output_name('baseline', 3, 7) == f'{job.name}.json'
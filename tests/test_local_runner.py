@@ -0,0 +1,132 @@
+import json
+
+import pytest
+
+from vivarium_conic_vitamin_a_supp.tools.local_runner import (Job, Outcome, ReplicateTracker, run_adaptive_grid,
+                                                              run_grid, uses_antithetic_randomness)
+
+OUTCOME = Outcome('deaths', {'CAUSE_OF_DEATH': 'measles'})
+SCENARIOS = {'baseline': {}, 'supplementation': {'vitamin_a_supplementation': {'target_coverage': 0.9}}}
+
+
+def get_metrics(value):
+    return {OUTCOME.columns[0]: value}
+
+
+def steady_runner(model_specification, job):
+    # Ten deaths averted, give or take one.
+    deaths = 100. if job.scenario == 'baseline' else 90. + job.random_seed % 2
+    return get_metrics(deaths)
+
+
+def noisy_runner(model_specification, job):
+    deaths = 100. if job.scenario == 'baseline' else 100. - 20. * (job.random_seed % 2)
+    return get_metrics(deaths)
+
+
+def failing_runner(model_specification, job):
+    if job.input_draw == 1 and job.random_seed == 1 and job.scenario == 'supplementation':
+        raise RuntimeError('Simulation failed.')
+    return steady_runner(model_specification, job)
+
+
+def test_replicate_tracker():
+    tracker = ReplicateTracker(0, list(SCENARIOS), [OUTCOME], baseline='baseline')
+    tracker.add_result(Job('baseline', {}, 0, 0), get_metrics(100.))
+    assert tracker.rounds_completed == 0
+
+    tracker.add_result(Job('supplementation', {}, 0, 0), get_metrics(90.))
+    tracker.add_result(Job('supplementation', {}, 0, 1), get_metrics(88.))
+    tracker.add_result(Job('baseline', {}, 0, 1), get_metrics(100.))
+    assert tracker.rounds_completed == 2
+    assert tracker.summary() == {'supplementation.deaths_measles': 11.}
+    assert tracker.relative_ci_width() > 0
+    assert not tracker.is_converged(target=10., min_seeds=3)
+    assert tracker.is_converged(target=10., min_seeds=2)
+
+
+def test_replicate_tracker_antithetic_pairs():
+    tracker = ReplicateTracker(0, list(SCENARIOS), [OUTCOME], baseline='baseline', antithetic=True)
+    assert tracker.get_round_seeds(1) == [2, 3]
+    for seed, deaths in enumerate([90., 86., 95., 93.]):
+        tracker.add_result(Job('baseline', {}, 0, seed), get_metrics(100.))
+        tracker.add_result(Job('supplementation', {}, 0, seed), get_metrics(deaths))
+    # Each pair is a single replicate: (10 + 14) / 2 and (5 + 7) / 2 deaths averted.
+    assert tracker.rounds_completed == 2
+    assert tracker.moments[('supplementation', OUTCOME.name)].variance == pytest.approx(18.)
+    assert tracker.summary() == {'supplementation.deaths_measles': 9.}
+
+
+def test_replicate_tracker_failures():
+    tracker = ReplicateTracker(0, list(SCENARIOS), [OUTCOME], baseline='baseline')
+    tracker.rounds_launched = 2
+    tracker.add_result(Job('baseline', {}, 0, 0), get_metrics(100.))
+    tracker.add_failure(Job('supplementation', {}, 0, 0))
+    tracker.add_result(Job('baseline', {}, 0, 1), get_metrics(100.))
+    assert tracker.rounds_outstanding == 1
+    tracker.add_result(Job('supplementation', {}, 0, 1), get_metrics(90.))
+
+    assert tracker.rounds_failed == 1
+    assert tracker.rounds_completed == 1
+    assert tracker.rounds_outstanding == 0
+    assert tracker.summary() == {'supplementation.deaths_measles': 10.}
+
+
+def test_run_grid_skips_failed_jobs(tmp_path):
+    jobs = [Job(scenario, branch, draw, seed) for scenario, branch in SCENARIOS.items()
+            for draw in [0, 1] for seed in [0, 1]]
+    failed = run_grid('spec.yaml', jobs, tmp_path, workers=2, job_runner=failing_runner)
+
+    assert failed == [Job('supplementation', SCENARIOS['supplementation'], 1, 1)]
+    outputs = {path.stem for path in tmp_path.glob('*.json')}
+    assert outputs == {job.name for job in jobs if job not in failed}
+    metrics = json.loads((tmp_path / f'{jobs[0].name}.json').read_text())
+    assert metrics == get_metrics(100.)
+
+
+def test_adaptive_grid_stops_at_convergence(tmp_path):
+    trackers = run_adaptive_grid('spec.yaml', SCENARIOS, [0, 1], [OUTCOME], tmp_path, target_relative_ci_width=0.5,
+                                 baseline='baseline', min_seeds=3, max_seeds=20, workers=2,
+                                 job_runner=steady_runner, antithetic=False)
+    for tracker in trackers.values():
+        assert tracker.rounds_completed == tracker.rounds_launched == 3
+        assert tracker.is_converged(0.5, 3)
+    assert len(list(tmp_path.glob('*.json'))) == 2 * 3 * len(SCENARIOS)
+
+
+def test_adaptive_grid_limits(tmp_path):
+    trackers = run_adaptive_grid('spec.yaml', SCENARIOS, [0], [OUTCOME], tmp_path / 'max_seeds',
+                                 target_relative_ci_width=0.01, baseline='baseline', min_seeds=2, max_seeds=6,
+                                 job_runner=noisy_runner, antithetic=False)
+    assert trackers[0].rounds_completed == 6
+    assert not trackers[0].is_converged(0.01, 2)
+
+    trackers = run_adaptive_grid('spec.yaml', SCENARIOS, [0, 1], [OUTCOME], tmp_path / 'budget',
+                                 target_relative_ci_width=0.01, baseline='baseline', min_seeds=2, max_seeds=6,
+                                 job_budget=11, job_runner=noisy_runner, antithetic=False)
+    assert sum(tracker.rounds_launched for tracker in trackers.values()) == 5
+
+
+def test_adaptive_grid_replaces_failed_rounds(tmp_path):
+    trackers = run_adaptive_grid('spec.yaml', SCENARIOS, [0, 1], [OUTCOME], tmp_path, target_relative_ci_width=0.5,
+                                 baseline='baseline', min_seeds=3, max_seeds=20, job_runner=failing_runner,
+                                 antithetic=False)
+    assert trackers[1].rounds_failed == 1
+    assert trackers[1].rounds_completed == 3
+    assert trackers[1].rounds_launched == 4
+    assert trackers[0].rounds_launched == 3
+
+
+def test_adaptive_grid_runs_antithetic_pairs(tmp_path):
+    spec = tmp_path / 'spec.yaml'
+    spec.write_text('configuration:\n    randomness:\n        variance_reduction:\n            antithetic: True\n')
+    assert uses_antithetic_randomness(spec)
+
+    trackers = run_adaptive_grid(str(spec), SCENARIOS, [0], [OUTCOME], tmp_path / 'output',
+                                 target_relative_ci_width=0.2, baseline='baseline', min_seeds=2, max_seeds=20,
+                                 job_runner=noisy_runner)
+    # Averaging antithetic seeds cancels the noise, so the draw converges at the minimum number of pairs.
+    assert trackers[0].antithetic
+    assert trackers[0].rounds_completed == 2
+    assert trackers[0].summary() == {'supplementation.deaths_measles': 10.}
+    assert sorted(int(path.stem.rsplit('_', 1)[1]) for path in (tmp_path / 'output').glob('supp*.json')) == [0, 1, 2, 3]
@@ -0,0 +1,140 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from vivarium import InteractiveContext
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.data.synthetic import GBD_AGE_BINS, SyntheticArtifactSpec, write_synthetic_artifact
+from vivarium_conic_vitamin_a_supp.results_processing import long_format
+from vivarium_conic_vitamin_a_supp.results_processing.aggregation import ResultsAggregator, aggregate_job_outputs
+from vivarium_conic_vitamin_a_supp.results_processing.schema import RESULTS_SCHEMA
+
+
+def test_encode_metrics():
+    columns = RESULTS_SCHEMA.get_columns('deaths', SEX='female')
+    metrics = dict({column: float(i) for i, column in enumerate(columns)}, total_population=10., random_seed=3)
+    data = long_format.encode_metrics(metrics)
+
+    assert len(data) == len(columns) + 1
+    assert data.dtypes.to_dict() == long_format.COLUMN_DTYPES
+    decoded = long_format.decode(data).set_index('measure')
+    assert decoded.loc['total_population', 'value'] == 10.
+    assert np.isnan(decoded.loc['total_population', 'year'])
+    deaths = decoded.loc['deaths']
+    assert (deaths['sex'] == 'female').all()
+    assert set(deaths['cause']) == set(project_globals.CAUSES_OF_DEATH)
+
+
+def write_seed(output_dir, scenario, seed):
+    records = [('supplemented_days', None, 2017, sex, '1_to_4', float(seed)) for sex in project_globals.SEXES]
+    return long_format.write_partition(long_format.encode_records(records), output_dir, scenario, 0, seed)
+
+
+def test_concurrent_writes(tmp_path):
+    tasks = [(scenario, seed) for scenario in ['baseline', 'supplementation'] for seed in range(4)]
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(write_seed, tmp_path, scenario, seed) for scenario, seed in tasks]
+        paths = [future.result() for future in futures]
+    write_seed(tmp_path, 'baseline', 0)
+
+    assert all(path.exists() for path in paths)
+    data = long_format.read_dataset(tmp_path)
+    assert len(data) == 2 * (len(tasks) + 1)
+    assert list(data.columns) == long_format.PARTITION_COLUMNS + long_format.LONG_FORMAT_COLUMNS
+    assert (data['measure'] == 'supplemented_days').all()
+    assert data['cause'].isna().all()
+
+    baseline = long_format.read_dataset(tmp_path, scenario='baseline', random_seed=0)
+    assert len(baseline) == 4
+    pd.testing.assert_series_equal(baseline['value'], pd.Series(0., index=baseline.index, name='value'))
+
+
+class SupplementationExposure:
+    """Supplements every other simulant."""
+
+    @property
+    def name(self):
+        return 'supplementation_exposure'
+
+    def setup(self, builder):
+        builder.value.register_value_producer('lack_of_vitamin_a_supplementation.exposure',
+                                              source=lambda index: pd.Series(np.where(index % 2, 'cat1', 'cat2'),
+                                                                             index=index))
+
+
+@pytest.fixture(scope='module')
+def synthetic_artifact(tmp_path_factory):
+    path = tmp_path_factory.mktemp('synthetic') / 'kenya.hdf'
+    write_synthetic_artifact(path, 'Kenya', SyntheticArtifactSpec(draws=2, age_bins=GBD_AGE_BINS.iloc[:5]))
+    return path
+
+
+@pytest.fixture
+def run_observer(synthetic_artifact, monkeypatch):
+    # vivarium_public_health bins ages with np.asscalar, which numpy 1.23 removed.
+    monkeypatch.setattr(np, 'asscalar', lambda a: a.item(), raising=False)
+
+    def _run(long_format_dir=''):
+        from vivarium_public_health.population import BasePopulation
+        from vivarium_conic_vitamin_a_supp.components import SupplementedDaysObserver
+
+        configuration = {
+            'input_data': {'artifact_path': str(synthetic_artifact), 'input_draw_number': 1, 'location': 'Kenya'},
+            'randomness': {'random_seed': 3},
+            'population': {'population_size': 200, 'age_start': 0, 'age_end': 5, 'exit_age': 5},
+            'time': {'start': {'year': 2017, 'month': 12, 'day': 30}, 'end': {'year': 2018, 'month': 2, 'day': 1},
+                     'step_size': 1},
+            'metrics': {'supplemented_days': {'by_age': True, 'by_sex': True, 'by_year': True,
+                                              'long_format': {'output_directory': str(long_format_dir),
+                                                              'scenario': 'supplementation'}}},
+        }
+        simulation = InteractiveContext(components=[BasePopulation(), SupplementationExposure(),
+                                                    SupplementedDaysObserver()],
+                                        configuration=configuration)
+        simulation.take_steps(3)
+        simulation.finalize()
+        population = simulation.get_population()
+        metrics = dict(simulation.get_value('metrics')(population.index))
+        return dict(metrics, scenario='supplementation', input_draw=1, random_seed=3)
+    return _run
+
+
+def test_observer_long_format_output(run_observer, tmp_path):
+    metrics = run_observer()
+    long_format_metrics = run_observer(tmp_path / 'long_format')
+
+    supplemented_days = {k: v for k, v in metrics.items() if k.startswith('supplemented_days')}
+    assert sum(supplemented_days.values()) > 0
+    assert set(metrics) - set(long_format_metrics) == set(supplemented_days)
+    paths = list(tmp_path.glob(f'long_format/{long_format.PARTITION_FILE_PATTERN}'))
+    assert [path.parent.relative_to(tmp_path).as_posix() for path in paths] == [
+        'long_format/scenario=supplementation/input_draw=1/random_seed=3']
+
+    # The records hold the wide metrics, stratified as in their names, and aggregate alongside the other metrics.
+    wide = ResultsAggregator()
+    wide.add(metrics)
+    job_path = tmp_path / 'job.json'
+    job_path.write_text(json.dumps(long_format_metrics))
+    for records in [tmp_path / 'long_format', paths[0]]:
+        aggregator = aggregate_job_outputs([job_path, records])
+        assert aggregator.held_records == 0
+        tidy = aggregator.tidy().set_index('measure')
+        pd.testing.assert_frame_equal(tidy.drop(index='supplemented_days'), wide.tidy().set_index('measure'),
+                                      check_dtype=False)
+        supplemented = tidy.loc['supplemented_days']
+        columns = supplemented[['year', 'sex', 'age_group', 'value']].itertuples(index=False)
+        assert {f'supplemented_days_in_{int(year)}_among_{sex}_in_age_group_{age_group}': value
+                for year, sex, age_group, value in columns} == supplemented_days
+
+
+def test_read_partition_file(tmp_path):
+    path = write_seed(tmp_path, 'baseline', 2)
+    data = long_format.read_partition_file(path)
+    pd.testing.assert_frame_equal(data, long_format.read_dataset(tmp_path))
+    assert long_format.read_partition_file(path, decode_codes=False)['sex'].dtype != object
+
+    with pytest.raises(ValueError, match='not in a long format dataset partition'):
+        long_format.read_partition_file(path.rename(tmp_path / path.name))
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+from vivarium.framework.artifact import Artifact, ArtifactException
+
+from vivarium_conic_vitamin_a_supp.data.manifest import ArtifactManifest, LazyArtifact, find_corrupt_keys
+
+
+def test_build_manifest(wide_artifact, draw_key, draw_data):
+    manifest = ArtifactManifest.build(wide_artifact)
+
+    assert ArtifactManifest.read(wide_artifact).entries == manifest.entries
+    assert manifest.keys == Artifact(wide_artifact).keys
+    entry = manifest.entries[draw_key]
+    assert entry['kind'] == 'draws'
+    assert entry['shape'] == list(draw_data.shape)
+    assert entry['draws'] == 10
+    assert entry['bytes'] > 0
+    assert find_corrupt_keys(wide_artifact) == []
+
+
+def test_manifest_is_stale_after_write(wide_artifact):
+    ArtifactManifest.build(wide_artifact)
+    Artifact(wide_artifact).write('cause.measles.restrictions', {'yld_only': False})
+
+    assert ArtifactManifest.read(wide_artifact) is None
+    with pytest.raises(ArtifactException):
+        LazyArtifact(wide_artifact)
+
+
+def test_lazy_artifact_loads(wide_artifact):
+    ArtifactManifest.build(wide_artifact)
+    lazy, artifact = LazyArtifact(wide_artifact, ['draw == 3']), Artifact(wide_artifact, ['draw == 3'])
+
+    assert lazy.keys == artifact.keys
+    for key in artifact.keys:
+        if isinstance(artifact.load(key), pd.DataFrame):
+            pd.testing.assert_frame_equal(lazy.load(key), artifact.load(key))
+        else:
+            assert lazy.load(key) == artifact.load(key)
+    with pytest.raises(ArtifactException):
+        lazy.load('cause.measles.incidence_rate')
+
+
+@pytest.mark.parametrize('input_draw_number', [2, None])
+def test_draw_aware_load_with_manifest(wide_artifact, load_data, draw_aware_plugin, input_draw_number):
+    expected = load_data(wide_artifact, input_draw_number, sex='Male')
+    ArtifactManifest.build(wide_artifact)
+    loaded = load_data(wide_artifact, input_draw_number, draw_aware_plugin, sex='Male')
+
+    pd.testing.assert_frame_equal(loaded['draws'], expected['draws'])
+    assert loaded['metadata'] == expected['metadata']
@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+from vivarium import InteractiveContext
+from vivarium.framework.randomness import RandomnessStream, RESIDUAL_CHOICE
+
+from vivarium_conic_vitamin_a_supp.plugins.randomness import CounterBasedRandomnessStream
+
+POPULATION_SIZE = 100_000
+START = pd.Timestamp('2017-01-01')
+RANDOMNESS_PLUGIN = {
+    'required': {
+        'randomness': {
+            'controller': 'vivarium_conic_vitamin_a_supp.plugins.CounterBasedRandomnessManager',
+            'builder_interface': 'vivarium.framework.randomness.RandomnessInterface',
+        }
+    }
+}
+
+
+def make_stream(key='test_stream', seed=0, time=START, **kwargs):
+    return CounterBasedRandomnessStream(key, lambda: time, seed, **kwargs)
+
+
+def make_base_stream(key='test_stream', seed=0, time=START):
+    # Without an index map the simulant ids index the base stream's draws directly.
+    return RandomnessStream(key, lambda: time, seed)
+
+
+@pytest.fixture
+def index():
+    return pd.RangeIndex(POPULATION_SIZE)
+
+
+def test_draws_are_deterministic(index):
+    draw = make_stream().get_draw(index)
+    pd.testing.assert_series_equal(make_stream().get_draw(index), draw)
+    pd.testing.assert_series_equal(make_stream().get_draw(index, 'extra'), make_stream().get_draw(index, 'extra'))
+
+
+def test_draws_do_not_depend_on_the_index_subset(index):
+    stream = make_stream()
+    draw = stream.get_draw(index)
+
+    chunks = pd.concat([stream.get_draw(index[start:start + 999]) for start in range(0, len(index), 999)])
+    pd.testing.assert_series_equal(chunks, draw, check_index_type=False)
+
+    subset = pd.Index([99_999, 3, 17, 64_001, 4, 5])
+    pd.testing.assert_series_equal(stream.get_draw(subset), draw.loc[subset], check_index_type=False)
+    assert stream.filter_for_probability(subset, 0.5).tolist() == [i for i in subset if draw[i] < 0.5]
+
+
+def test_initialization_draws_depend_on_position():
+    stream = make_stream(for_initialization=True)
+    first = stream.get_draw(pd.Index([10, 11, 12]))
+    second = stream.get_draw(pd.Index([20, 21, 22]))
+    np.testing.assert_array_equal(first.values, second.values)
+
+
+@pytest.mark.parametrize('other', [make_stream(key='other_stream'), make_stream(seed=1),
+                                   make_stream(time=START + pd.Timedelta(days=1))])
+def test_streams_are_distinct(index, other):
+    draw = make_stream().get_draw(index)
+    other_draw = other.get_draw(index)
+    assert not (draw == other_draw).any()
+    assert abs(np.corrcoef(draw, other_draw)[0, 1]) < 0.02
+    assert not (draw == make_stream().get_draw(index, 'extra')).any()
+
+
+def test_get_draw_is_uniform(index):
+    draw = make_stream().get_draw(index)
+    assert ((0 <= draw) & (draw < 1)).all()
+    assert stats.kstest(draw, 'uniform').pvalue > 0.001
+    assert stats.kstest(make_base_stream().get_draw(index), 'uniform').pvalue > 0.001
+
+
+def test_filter_for_probability(index):
+    population = pd.DataFrame({'value': np.arange(len(index))}, index=index)
+    for stream in [make_stream(), make_base_stream()]:
+        filtered = stream.filter_for_probability(population, 0.25)
+        assert isinstance(filtered, pd.DataFrame)
+        assert len(filtered) / len(index) == pytest.approx(0.25, abs=0.01)
+
+        probability = pd.Series(np.where(index < POPULATION_SIZE // 2, 0., 1.), index=index)
+        assert stream.filter_for_probability(index, probability).equals(index[POPULATION_SIZE // 2:])
+
+    assert make_stream().filter_for_probability(pd.Index([]), 0.5).empty
+
+
+def test_choice(index):
+    choices = ['a', 'b', 'c']
+    for stream in [make_stream(), make_base_stream()]:
+        chosen = stream.choice(index, choices, p=[0.2, 0.3, 0.5])
+        assert chosen.index.equals(index)
+        frequencies = chosen.value_counts(normalize=True)
+        np.testing.assert_allclose(frequencies[choices], [0.2, 0.3, 0.5], atol=0.01)
+
+        uniform = stream.choice(index, choices).value_counts(normalize=True)
+        np.testing.assert_allclose(uniform[choices], 1 / 3, atol=0.01)
+
+        residual = stream.choice(index, choices, p=[0.1, 0.1, RESIDUAL_CHOICE]).value_counts(normalize=True)
+        np.testing.assert_allclose(residual[choices], [0.1, 0.1, 0.8], atol=0.01)
+
+
+class Sampler:
+
+    @property
+    def name(self):
+        return 'sampler'
+
+    def setup(self, builder):
+        self.randomness = builder.randomness.get_stream('sampler')
+        self.draws = []
+        builder.event.register_listener('time_step', self.on_time_step)
+
+    def on_time_step(self, event):
+        # Two slices of the population, drawn separately.
+        self.draws.append(pd.concat([self.randomness.get_draw(event.index[::2]),
+                                     self.randomness.get_draw(event.index[1::2])]).sort_index())
+
+
+def test_manager_streams():
+    configuration = {'population': {'population_size': 100}, 'randomness': {'random_seed': 3}}
+    samplers = [Sampler(), Sampler()]
+    for sampler in samplers:
+        simulation = InteractiveContext(components=[sampler], configuration=configuration,
+                                        plugin_configuration=RANDOMNESS_PLUGIN)
+        simulation.take_steps(2)
+
+    first, second = samplers
+    pd.testing.assert_series_equal(first.draws[0], second.draws[0])
+    assert not (first.draws[0] == first.draws[1]).any()
+
+
+def test_antithetic_stream(index):
+    draw = make_stream().get_draw(index)
+    antithetic_draw = make_stream(antithetic=True).get_draw(index)
+    pd.testing.assert_series_equal(antithetic_draw, 1 - draw)
+    assert np.corrcoef(draw, antithetic_draw)[0, 1] == pytest.approx(-1)
+
+
+def test_stratified_stream():
+    index = pd.RangeIndex(1000)
+    draw = make_stream().get_draw(index)
+    stratified = make_stream(stratified=True).get_draw(index)
+
+    # Every simulant falls in its own stratum, at its unstratified draw's position within it.
+    strata = np.floor(stratified * len(index)).astype(int)
+    assert sorted(strata) == list(range(len(index)))
+    np.testing.assert_allclose(stratified * len(index) - strata, draw)
+    pd.testing.assert_series_equal(make_stream(stratified=True).get_draw(index), stratified)
+
+
+@pytest.mark.parametrize('seeds, antithetic', [((2, 3), True), ((2, 4), False)])
+def test_manager_antithetic_pairs(seeds, antithetic):
+    samplers = [Sampler(), Sampler()]
+    for seed, sampler in zip(seeds, samplers):
+        configuration = {'population': {'population_size': 100},
+                         'randomness': {'random_seed': seed, 'variance_reduction': {'antithetic': True}}}
+        simulation = InteractiveContext(components=[sampler], configuration=configuration,
+                                        plugin_configuration=RANDOMNESS_PLUGIN)
+        simulation.take_steps(1)
+
+    first, second = samplers
+    # Only the members of a seed pair are antithetic to each other.
+    assert np.allclose(first.draws[0], 1 - second.draws[0]) == antithetic
+
+
+class InitialSampler(Sampler):
+
+    def __init__(self, chunk_size=None):
+        super().__init__()
+        self.chunk_size = chunk_size
+
+    def setup(self, builder):
+        self.randomness = builder.randomness.get_stream('initial_sampler')
+        self.draws = []
+        # Simulants are registered with the randomness manager when their age is initialized.
+        builder.population.initializes_simulants(self.on_initialize_simulants, requires_columns=['age'])
+
+    def on_initialize_simulants(self, pop_data):
+        index = pop_data.index
+        chunk_size = self.chunk_size or len(index)
+        self.draws.append(pd.concat([self.randomness.get_draw(index[start:start + chunk_size])
+                                     for start in range(0, len(index), chunk_size)]))
+
+
+def test_stratification_is_independent_of_chunks():
+    from vivarium.examples.disease_model.population import BasePopulation
+
+    configuration = {'population': {'population_size': 1000},
+                     'randomness': {'key_columns': ['entrance_time', 'age'],
+                                    'variance_reduction': {'stratified_initialization': True}}}
+    samplers = [InitialSampler(), InitialSampler(chunk_size=300)]
+    for sampler in samplers:
+        InteractiveContext(components=[BasePopulation(), sampler], configuration=configuration,
+                           plugin_configuration=RANDOMNESS_PLUGIN)
+
+    draw, chunked_draw = samplers[0].draws[0], samplers[1].draws[0]
+    pd.testing.assert_series_equal(chunked_draw, draw)
+    assert sorted(np.floor(draw * len(draw)).astype(int)) == list(range(len(draw)))
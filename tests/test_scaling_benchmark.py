@@ -0,0 +1,63 @@
+import pytest
+import yaml
+
+from vivarium_conic_vitamin_a_supp import paths
+from vivarium_conic_vitamin_a_supp.tools.scaling_benchmark import (ScalingMeasurement, format_measurements,
+                                                                    render_model_specification,
+                                                                    summarize_clock_comparison)
+
+
+def make_measurement(population_size, step_size, step_time):
+    return ScalingMeasurement(population_size=population_size, step_size=step_size, steps=2,
+                              simulated_days=2. * step_size, setup_time=1.,
+                              step_time_mean=step_time, step_time_median=step_time, step_time_max=step_time,
+                              simulant_steps_per_second=population_size / step_time,
+                              simulant_days_per_second=population_size * step_size / step_time, peak_memory=0.5)
+
+
+def test_render_model_specification(tmp_path):
+    path = render_model_specification(paths.MODEL_SPEC_DIR / 'model_spec.in', 'Kenya', tmp_path, tmp_path)
+    spec = yaml.safe_load(path.read_text())
+    assert path.name == 'kenya.yaml'
+    assert spec['configuration']['input_data']['location'] == 'Kenya'
+    assert spec['configuration']['input_data']['artifact_path'] == str(tmp_path.resolve() / 'kenya.hdf')
+
+
+def test_format_measurements():
+    measurements = [make_measurement(10_000, 1, 2.), make_measurement(1_000, 7, 1.), make_measurement(1_000, 1, 1.)]
+    table = format_measurements(measurements)
+    assert table[['step_size', 'population_size']].values.tolist() == [[1, 1_000], [1, 10_000], [7, 1_000]]
+    assert table['relative_throughput'].tolist() == [1., 5., 1.]
+
+
+def test_summarize_clock_comparison():
+    daily = [{'outcomes': {'deaths.measles': 10., 'ylds.measles': 1.}}, {'outcomes': {'deaths.measles': 12.}}]
+    adaptive = [{'outcomes': {'deaths.measles': 11., 'ylds.measles': 2.}}, {'outcomes': {'deaths.measles': 15.}}]
+    table = summarize_clock_comparison(daily, adaptive).set_index('outcome')
+    deaths = table.loc['deaths.measles']
+    assert deaths[['daily', 'adaptive', 'difference', 'difference_se']].tolist() == [11., 13., 2., 1.]
+    assert deaths['relative_difference'] == pytest.approx(2 / 11)
+    assert table.loc['ylds.measles', ['daily', 'adaptive', 'difference']].tolist() == [0.5, 1., 0.5]
+
+
+def test_measure_configuration_reads_the_clock(tmp_path):
+    from vivarium_conic_vitamin_a_supp.tools.scaling_benchmark import measure_configuration
+
+    spec = {
+        'plugins': {'required': {'clock': {
+            'controller': 'vivarium_conic_vitamin_a_supp.plugins.AdaptiveStepClock',
+            'builder_interface': 'vivarium.framework.time.TimeInterface',
+        }}},
+        'components': {'vivarium.examples.disease_model.population': ['BasePopulation()']},
+        'configuration': {'time': {'start': {'year': 2017, 'month': 1, 'day': 1},
+                                   'end': {'year': 2017, 'month': 12, 'day': 31}},
+                          'randomness': {'key_columns': ['entrance_time', 'age']}},
+    }
+    path = tmp_path / 'spec.yaml'
+    path.write_text(yaml.safe_dump(spec))
+
+    measurement = measure_configuration(str(path), population_size=10, step_size=1, steps=3)
+    # With no hazards, the adaptive clock takes its longest steps after the configured first step.
+    assert measurement.simulated_days == 21
+    assert measurement.simulant_days_per_second == pytest.approx(
+        10 * 21 / (measurement.step_time_mean * measurement.steps))
@@ -0,0 +1,32 @@
+import numpy as np
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.results_processing.schema import RESULTS_SCHEMA
+
+
+def test_result_columns_are_stable():
+    # STATES and TRANSITIONS used to be generators exhausted by the first call.
+    first = project_globals.RESULT_COLUMNS('state_person_time')
+    assert first
+    assert project_globals.RESULT_COLUMNS('state_person_time') == first
+    assert len(project_globals.RESULT_COLUMNS()) == len(RESULTS_SCHEMA) == len(set(RESULTS_SCHEMA.columns))
+
+
+def test_fields_round_trip():
+    column = project_globals.DEATH_COLUMN_TEMPLATE.format(CAUSE_OF_DEATH='measles', YEAR=2017, SEX='male',
+                                                          AGE_GROUP='1_to_4')
+    assert RESULTS_SCHEMA.get_fields(column) == {'kind': 'deaths', 'CAUSE_OF_DEATH': 'measles', 'YEAR': 2017,
+                                                 'SEX': 'male', 'AGE_GROUP': '1_to_4'}
+    assert RESULTS_SCHEMA.get_columns('deaths', CAUSE_OF_DEATH='measles', YEAR='2017', SEX='male',
+                                      AGE_GROUP='1_to_4') == [column]
+
+
+def test_to_array():
+    columns = RESULTS_SCHEMA.get_columns('ylds', SEX='female')
+    metrics = {column: 1. for column in columns}
+    metrics['random_seed'] = 3
+    values = RESULTS_SCHEMA.to_series(RESULTS_SCHEMA.to_array(metrics))
+
+    assert values.sum() == len(columns)
+    female_ylds = values.xs(('ylds', 'female'), level=['kind', 'sex'])
+    assert np.all(female_ylds == 1.)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from vivarium_conic_vitamin_a_supp.results_processing.statistics import DrawSummary, ExactQuantiles, QuantileSketch
+
+
+@pytest.mark.parametrize('distribution', ['normal', 'lognormal', 'exponential'])
+def test_merged_sketch_error(distribution):
+    values = getattr(np.random.default_rng(0), distribution)(size=20000)
+    sketch = QuantileSketch(compression=100)
+    for part in np.array_split(values, 7):
+        worker_sketch = QuantileSketch(compression=100)
+        for value in part:
+            worker_sketch.update(value)
+        sketch.merge(worker_sketch)
+
+    quantiles = np.array([0.001, 0.025, 0.5, 0.975, 0.999])
+    ranks = np.array([(values <= estimate).mean() for estimate in sketch.quantile(quantiles)])
+    assert np.abs(ranks - quantiles).max() < 0.005
+    assert sketch.count == len(values)
+    assert sketch.moments.mean == pytest.approx(values.mean())
+    assert sketch.moments.variance == pytest.approx(values.var(ddof=1))
+
+
+def test_small_sketch_is_exact():
+    values = np.random.default_rng(1).normal(size=50)
+    sketch, exact = QuantileSketch(compression=100), ExactQuantiles()
+    for value in values:
+        sketch.update(value)
+        exact.update(value)
+    np.testing.assert_allclose(sketch.quantile([0.025, 0.975]), exact.quantile([0.025, 0.975]))
+    np.testing.assert_allclose(exact.quantile([0.025, 0.975]), np.quantile(values, [0.025, 0.975]))
+
+
+def test_draw_summary_merge():
+    first, second = DrawSummary(compression=None), DrawSummary(compression=None)
+    for draw in range(10):
+        (first if draw % 2 else second).add(('baseline', 'deaths'), float(draw))
+    first.merge(second)
+    summary = first.to_frame(['scenario', 'measure'], interval=0.9)
+
+    assert summary.loc[0, 'draws'] == 10
+    assert summary.loc[0, 'mean'] == 4.5
+    np.testing.assert_allclose(summary.loc[0, ['lower', 'upper']].astype(float), np.quantile(range(10), [0.05, 0.95]))
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from vivarium.framework.artifact import Artifact
+
+from vivarium_conic_vitamin_a_supp.data import builder
+from vivarium_conic_vitamin_a_supp.data.storage import (STORAGE_PROFILES, apply_profile, get_max_relative_error,
+                                                         get_storage_profile)
+
+
+def test_default_profile_leaves_data_unchanged(draw_data):
+    pd.testing.assert_frame_equal(apply_profile(draw_data, get_storage_profile('default')), draw_data)
+
+
+def test_compact_profile(draw_data):
+    profile = get_storage_profile('compact')
+    data = apply_profile(draw_data, profile)
+
+    assert (data.dtypes == 'float32').all()
+    assert data.index.get_level_values('sex').dtype == 'category'
+    assert data.index.get_level_values('age_start').dtype == 'float64'
+    assert 0 < get_max_relative_error(draw_data, data) <= profile.max_relative_error
+
+
+def test_downcast_beyond_tolerance_keeps_full_precision(draw_data):
+    # float32 can't represent values this small to within the tolerance.
+    data = draw_data * 1e-42
+    assert apply_profile(data, get_storage_profile('compact')).dtypes.eq('float64').all()
+
+
+def test_metadata_is_unchanged():
+    metadata = {'yld_only': False}
+    for profile in STORAGE_PROFILES.values():
+        assert apply_profile(metadata, profile) == metadata
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        get_storage_profile('smallest')
+
+
+@pytest.mark.parametrize('draw_aware', [False, True])
+def test_compact_profile_round_trip(tmp_path, request, draw_key, draw_data, metadata, load_data, draw_aware):
+    profile = get_storage_profile('compact')
+    stored = apply_profile(draw_data, profile)
+    path = tmp_path / 'compact.hdf'
+    builder.write_data_batch(Artifact(path), {draw_key: draw_data, metadata[0]: metadata[1]}, profile)
+
+    loaded = Artifact(path).load(draw_key)
+    pd.testing.assert_frame_equal(loaded, stored)
+    assert loaded.index.get_level_values('sex').dtype == 'category'
+    assert (loaded.dtypes == 'float32').all()
+
+    plugin_configuration = request.getfixturevalue('draw_aware_plugin') if draw_aware else None
+    data = load_data(path, 3, plugin_configuration)
+    expected = stored[['draw_3']].rename(columns={'draw_3': 'value'}).reset_index()
+    pd.testing.assert_frame_equal(data['draws'], expected)
+    assert data['metadata'] == metadata[1]
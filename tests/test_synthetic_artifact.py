@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from vivarium import InteractiveContext
+from vivarium.framework.artifact import Artifact
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.data.synthetic import (GBD_AGE_BINS, SyntheticArtifactSpec, make_synthetic_data,
+                                                          write_synthetic_artifact)
+
+SPEC = SyntheticArtifactSpec(draws=3, age_bins=GBD_AGE_BINS.iloc[:5])
+
+
+@pytest.fixture(scope='module')
+def synthetic_artifact(tmp_path_factory):
+    path = tmp_path_factory.mktemp('synthetic') / 'kenya.hdf'
+    write_synthetic_artifact(path, 'Kenya', SPEC)
+    return path
+
+
+def get_value(data, key, draw=0):
+    return data[key][f'draw_{draw}'].to_numpy()
+
+
+def test_synthetic_artifact_keys(synthetic_artifact):
+    artifact = Artifact(synthetic_artifact)
+    expected = {key for group in project_globals.SYNTHETIC_ARTIFACT_KEY_GROUPS for key in group}
+    assert expected.issubset(artifact.keys)
+    assert artifact.load(project_globals.POPULATION_LOCATION) == 'Kenya'
+
+    # Every table loads through the artifact's draw filter.
+    artifact = Artifact(synthetic_artifact, ['draw == 2'])
+    structure = artifact.load(project_globals.POPULATION.STRUCTURE)
+    assert list(structure.columns) == ['value']
+    assert len(structure) == 2 * len(SPEC.years) * len(SPEC.age_bins)
+    incidence = artifact.load(project_globals.LRI.LRI_INCIDENCE_RATE)
+    assert list(incidence.columns) == ['draw_2']
+    assert list(incidence.index.names) == ['sex', 'age_start', 'age_end', 'year_start', 'year_end']
+
+
+def test_synthetic_data_is_consistent():
+    data = make_synthetic_data('Kenya', SPEC)
+    csmr_total = 0
+    for cause in [project_globals.DIARRHEA_MODEL_NAME, project_globals.MEASLES_MODEL_NAME,
+                  project_globals.LRI_MODEL_NAME]:
+        for draw in range(SPEC.draws):
+            csmr = get_value(data, f'cause.{cause}.cause_specific_mortality_rate', draw)
+            np.testing.assert_allclose(csmr, get_value(data, f'cause.{cause}.prevalence', draw)
+                                       * get_value(data, f'cause.{cause}.excess_mortality_rate', draw))
+        csmr_total += get_value(data, f'cause.{cause}.cause_specific_mortality_rate')
+    assert (get_value(data, project_globals.POPULATION.ACMR) > csmr_total).all()
+
+    keys = project_globals.VITAMIN_A_DEFICIENCY
+    exposure = data[keys.VITAMIN_A_DEFICIENCY_EXPOSURE].groupby('parameter')['draw_0'].first()
+    relative_risk = data[keys.VITAMIN_A_DEFICIENCY_RELATIVE_RISK].groupby('parameter')['draw_0'].first()
+    paf = data[keys.VITAMIN_A_DEFICIENCY_PAF]['draw_0']
+    np.testing.assert_allclose(paf, 1 - 1 / (exposure * relative_risk).sum())
+    assert data[keys.VITAMIN_A_DEFICIENCY_DISTRIBUTION] == 'dichotomous'
+
+
+def test_polytomous_exposure():
+    data = make_synthetic_data('Kenya', SPEC._replace(exposure_categories=4))
+    keys = project_globals.VITAMIN_A_DEFICIENCY
+    assert data[keys.VITAMIN_A_DEFICIENCY_DISTRIBUTION] == 'ordered_polytomous'
+    assert list(data[keys.VITAMIN_A_DEFICIENCY_CATEGORIES]) == ['cat1', 'cat2', 'cat3', 'cat4']
+    exposure = data[keys.VITAMIN_A_DEFICIENCY_EXPOSURE]['draw_0']
+    np.testing.assert_allclose(exposure.groupby(['sex', 'age_start', 'year_start']).sum(), 1.)
+
+
+@pytest.mark.parametrize('spec', [SPEC._replace(draws=0), SPEC._replace(years=(2017,)),
+                                  SPEC._replace(exposure_categories=1)])
+def test_invalid_spec(spec):
+    with pytest.raises(ValueError):
+        make_synthetic_data('Kenya', spec)
+
+
+def test_simulation_runs(synthetic_artifact):
+    from vivarium_public_health.population import BasePopulation, Mortality
+    from vivarium_conic_vitamin_a_supp.components import NeonatalSIS, Risk, RiskEffect, SIS
+
+    components = [BasePopulation(), Mortality(), SIS(project_globals.DIARRHEA_MODEL_NAME),
+                  NeonatalSIS(project_globals.LRI_MODEL_NAME), Risk('risk_factor.vitamin_a_deficiency'),
+                  RiskEffect('risk_factor.vitamin_a_deficiency', 'cause.diarrheal_diseases.incidence_rate')]
+    configuration = {
+        'input_data': {'artifact_path': str(synthetic_artifact), 'input_draw_number': 1, 'location': 'Kenya'},
+        'population': {'population_size': 500, 'age_start': 0, 'age_end': 5},
+        'time': {'start': {'year': 2017, 'month': 1, 'day': 1}, 'step_size': 1},
+    }
+    sim = InteractiveContext(components=components, configuration=configuration)
+    sim.take_steps(5)
+    population = sim.get_population()
+    assert len(population) == 500
+    assert set(population[project_globals.DIARRHEA_MODEL_NAME]).issubset(project_globals.DIARRHEA_MODEL_STATES)
@@ -0,0 +1,90 @@
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from vivarium.exceptions import VivariumError
+from vivarium.framework.engine import SimulationContext
+
+from vivarium_conic_vitamin_a_supp.components import ComponentTimer
+from vivarium_conic_vitamin_a_supp.components.timing import get_manager
+from vivarium_conic_vitamin_a_supp.results_processing.timing import summarize_timings
+
+STEPS = 3
+
+
+class Source:
+
+    @property
+    def name(self):
+        return 'source'
+
+    def setup(self, builder):
+        builder.value.register_value_producer('value', source=self.source)
+
+    def source(self, index):
+        time.sleep(0.01)
+        return pd.Series(1., index=index)
+
+
+class Consumer:
+
+    @property
+    def name(self):
+        return 'consumer'
+
+    def setup(self, builder):
+        self.value = builder.value.get_value('value')
+        builder.value.register_value_modifier('value', modifier=lambda index, value: value * 2)
+        builder.event.register_listener('time_step', self.on_time_step)
+
+    def on_time_step(self, event):
+        self.value(event.index)
+
+
+@pytest.fixture
+def timings(tmp_path):
+    configuration = {
+        'population': {'population_size': 10},
+        'time': {'start': {'year': 2017, 'month': 1, 'day': 1}, 'end': {'year': 2017, 'month': 1, 'day': 1 + STEPS},
+                 'step_size': 1},
+        'timing': {'output_path': str(tmp_path / 'timing' / 'job.csv')},
+    }
+    simulation = SimulationContext(components=[Source(), Consumer(), ComponentTimer()], configuration=configuration)
+    simulation.setup()
+    simulation.initialize_simulants()
+    simulation.run()
+    simulation.finalize()
+    return pd.read_csv(tmp_path / 'timing' / 'job.csv')
+
+
+def test_component_timer(timings):
+    time_steps = timings[timings['stage'] == 'time_step'].set_index(['step', 'component', 'phase', 'name'])
+    assert timings.loc[timings['stage'] == 'time_step', 'step'].unique().tolist() == list(range(1, STEPS + 1))
+
+    listener = time_steps.xs(('consumer', 'event', 'time_step'), level=['component', 'phase', 'name'])
+    source = time_steps.xs(('source', 'value_source', 'value'), level=['component', 'phase', 'name'])
+    modifier = time_steps.xs(('Consumer', 'value_modifier', 'value'), level=['component', 'phase', 'name'])
+    assert (listener['calls'] == 1).all() and (source['calls'] == 1).all() and (modifier['calls'] == 1).all()
+    # The listener's self time excludes the pipeline stages it calls.
+    assert (source['total_time'] >= 0.01).all()
+    assert (listener['total_time'] >= source['total_time'] + modifier['total_time']).all()
+    assert (listener['self_time'] < source['self_time']).all()
+
+
+def test_summarize_timings(timings):
+    summary = summarize_timings(pd.concat([timings.assign(job='a'), timings.assign(job='b')]))
+    source = summary.set_index(['component', 'phase', 'name']).loc[('source', 'value_source', 'value')]
+    assert summary['share'].sum() == pytest.approx(1.)
+    assert summary['self_time'].is_monotonic_decreasing
+    assert source['calls'] == STEPS
+    assert source['self_time_per_step'] == pytest.approx(source['self_time'] / STEPS)
+
+
+def test_get_manager():
+    manager = {'value': None}
+    assert get_manager(SimpleNamespace(_manager=manager), ['items']) is manager
+    with pytest.raises(VivariumError, match='vivarium 0.10.9'):
+        get_manager(SimpleNamespace(), ['items'])
+    with pytest.raises(VivariumError, match='list_events'):
+        get_manager(SimpleNamespace(_manager=manager), ['list_events'])
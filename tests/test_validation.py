@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+from vivarium.framework.artifact import Artifact
+
+from vivarium_conic_vitamin_a_supp import globals as project_globals
+from vivarium_conic_vitamin_a_supp.verification_and_validation.rates import (RATE_CHECKS, REQUIRED_COLUMNS,
+                                                                             validate_rates)
+
+AGE_BINS = pd.DataFrame({
+    'age_group_name': ['Early Neonatal', 'Late Neonatal', 'Post Neonatal', '1 to 4'],
+    'age_start': [0., 0.01917808, 0.07671233, 1.],
+    'age_end': [0.01917808, 0.07671233, 1., 5.],
+})
+DRAWS = 3
+
+
+@pytest.fixture
+def rates_artifact(tmp_path):
+    path = tmp_path / 'artifact.hdf'
+    artifact = Artifact(path)
+    artifact.write(project_globals.POPULATION.AGE_BINS, AGE_BINS)
+    index = pd.MultiIndex.from_product([['Male', 'Female'], AGE_BINS['age_start'], [2017]],
+                                       names=['sex', 'age_start', 'year_start'])
+    for i, key in enumerate([project_globals.MEASLES.MEASLES_INCIDENCE_RATE,
+                             project_globals.MEASLES.MEASLES_PREVALENCE]):
+        draws = np.arange(1, DRAWS + 1) * (i + 1) / 10 * np.ones((len(index), 1))
+        artifact.write(key, pd.DataFrame(draws, index=index, columns=[f'draw_{d}' for d in range(DRAWS)]))
+    return path
+
+
+def make_outputs(jobs, person_time=1000.):
+    rows = []
+    for job in range(jobs):
+        draw = job % DRAWS
+        row = {'scenario': 'baseline', 'input_draw': draw, 'random_seed': job}
+        # Only measles is observed, every other count is zero.
+        row.update({column: 0. for column in REQUIRED_COLUMNS})
+        for _, check in RATE_CHECKS[RATE_CHECKS['cause'] == 'measles'].iterrows():
+            stratum = {'YEAR': check['year'], 'SEX': check['sex'], 'AGE_GROUP': check['age_group']}
+            row[project_globals.PERSON_TIME_COLUMN_TEMPLATE.format(**stratum)] = 2 * person_time
+            for state in ['measles', 'susceptible_to_measles']:
+                column = project_globals.STATE_PERSON_TIME_COLUMN_TEMPLATE.format(STATE=state, **stratum)
+                row[column] = person_time
+            transition = project_globals.MEASLES_MODEL_TRANSITIONS[0]
+            column = project_globals.TRANSITION_COUNT_COLUMN_TEMPLATE.format(TRANSITION=transition, **stratum)
+            row[column] = person_time * (draw + 1) / 10
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def test_validate_rates(rates_artifact):
+    outputs = make_outputs(jobs=6)
+    # Prevalence is 0.5 in every job, but the artifact draws are 0.2, 0.4 and 0.6.
+    result = validate_rates(outputs, rates_artifact, relative_tolerance=0.3).set_index(['measure', 'cause'])
+
+    incidence = result.loc[('incidence_rate', 'measles')]
+    assert len(incidence) == 6 * 2 * 4
+    np.testing.assert_allclose(incidence['simulated'], incidence['expected'])
+    assert not incidence['flagged'].any()
+
+    prevalence = result.loc[('prevalence', 'measles')]
+    assert (prevalence['flagged'] == (prevalence['input_draw'] == 0)).all()
+
+    # Missing artifact data and strata without person time are never flagged.
+    assert not result.loc[('excess_mortality_rate', 'measles'), 'flagged'].any()
+    assert not result.loc[('incidence_rate', 'diarrheal_diseases'), 'flagged'].any()
+
+
+def test_missing_columns(rates_artifact):
+    outputs = make_outputs(jobs=3).drop(columns=[c for c in REQUIRED_COLUMNS if '_event_count_' in c])
+    with pytest.raises(ValueError, match='DiseaseObserver'):
+        validate_rates(outputs, rates_artifact)
+
+
+def test_small_strata_are_not_flagged(rates_artifact):
+    result = validate_rates(make_outputs(jobs=3, person_time=10.), rates_artifact, relative_tolerance=0.)
+    assert not result['flagged'].any()